@@ -1,17 +1,30 @@
 """ClickHouse adapter for EmbedAnything: stream embeddings to pipeline_events.
 
-upsert() runs in the same thread as embed_file and uses that thread's event loop.
+upsert() runs in the same thread as embed_file. It only converts the batch
+and hands it to a background inserter thread, so the model keeps embedding
+while rows are written. The inserter coalesces batches into large inserts
+(EMBED_INSERT_MAX_ROWS / EMBED_INSERT_MAX_BYTES) and its bounded queue
+(EMBED_INSERT_QUEUE_BATCHES) blocks upsert() when inserts fall behind.
+The inserter opens its own sessionless client on its own event loop, so it
+never shares a session (or a loop) with the embed thread's cache queries.
+Call close() after embed_file to flush and surface insert errors.
 """
 
 import asyncio
+import contextlib
 import logging
-import uuid
+import os
+import queue
+import threading
 from datetime import UTC, datetime
 from typing import Any
 
 from embed_anything import EmbedData
 from embed_anything.vectordb import Adapter
 
+from src.database.connection import get_clickhouse_async_client
+from src.utils.event_ids import chunk_event_id, dedup_token
+
 logger = logging.getLogger(__name__)
 
 PIPELINE_EVENTS_COLUMNS = [
@@ -25,17 +38,152 @@ PIPELINE_EVENTS_COLUMNS = [
     "transformed_data",
     "tags",
     "embedding",
+    "embedding_model",
     "event_timestamp",
     "ingested_at",
 ]
 
+EMBED_INSERT_MAX_ROWS = int(
+    os.getenv("EMBED_INSERT_MAX_ROWS", "2000")
+)
+EMBED_INSERT_MAX_BYTES = int(
+    os.getenv("EMBED_INSERT_MAX_BYTES", str(16 * 1024 * 1024))
+)
+EMBED_INSERT_QUEUE_BATCHES = int(
+    os.getenv("EMBED_INSERT_QUEUE_BATCHES", "64")
+)
+# Rough per-row overhead (ids, tags, timestamps) on top of text and vector
+_ROW_OVERHEAD_BYTES = 256
+_CLOSE = object()
+
+
+class _PipelinedInserter:
+    """Background thread that coalesces row batches into large inserts.
+
+    Blocks are cut only on the row/byte thresholds and at close, never on
+    timing, so a retry of the same ingestion produces the same blocks and
+    the insert deduplication tokens still match. dedup_salt (the calling
+    activity run) keeps a later ingestion of the same file from matching.
+    """
+
+    def __init__(
+        self,
+        table_name: str,
+        *,
+        max_rows: int = EMBED_INSERT_MAX_ROWS,
+        max_bytes: int = EMBED_INSERT_MAX_BYTES,
+        queue_batches: int = EMBED_INSERT_QUEUE_BATCHES,
+        dedup_salt: str = "",
+    ) -> None:
+        self.table_name = table_name
+        self.dedup_salt = dedup_salt
+        self.max_rows = max(1, max_rows)
+        self.max_bytes = max(1, max_bytes)
+        self.insert_count = 0
+        self.inserts = 0
+        self._queue: queue.Queue[Any] = queue.Queue(
+            maxsize=max(1, queue_batches)
+        )
+        self._error: BaseException | None = None
+        self._thread = threading.Thread(
+            target=self._run, name="embed-inserter", daemon=True
+        )
+        self._thread.start()
+
+    def put(self, rows: list[list[Any]], size_bytes: int) -> None:
+        """Queue a batch; blocks while the queue is full (backpressure)."""
+        if self._error is not None:
+            raise self._error
+        self._queue.put((rows, size_bytes))
+
+    def close(self, *, flush: bool = True) -> None:
+        """Stop the thread (inserting what is buffered when flush) and re-raise its error."""
+        if not flush and self._error is None:
+            self._error = RuntimeError("inserter aborted")
+        self._queue.put(_CLOSE)
+        self._thread.join()
+        if flush and self._error is not None:
+            raise self._error
+
+    async def _insert(
+        self, client: Any, rows: list[list[Any]]
+    ) -> None:
+        """One bulk insert via AsyncClient.
+
+        Row ids are derived from dataset, source, chunk index and text, and the
+        block carries a deduplication token over them and the salt, so an
+        activity retry inserts nothing new.
+        """
+        await client.insert(
+            table=self.table_name,
+            data=rows,
+            column_names=PIPELINE_EVENTS_COLUMNS,
+            settings={
+                "insert_deduplication_token": dedup_token(
+                    [self.dedup_salt, *(row[0] for row in rows)]
+                )
+            },
+        )
+        self.insert_count += len(rows)
+        self.inserts += 1
+        logger.debug(
+            "ClickHouseEmbedAdapter: inserted %d rows (total %d)",
+            len(rows),
+            self.insert_count,
+        )
+
+    def _run(self) -> None:
+        loop = asyncio.new_event_loop()
+        client: Any = None
+        buffer: list[list[Any]] = []
+        buffered_bytes = 0
+        try:
+            try:
+                client = loop.run_until_complete(
+                    get_clickhouse_async_client(sessionless=True)
+                )
+            except Exception as e:  # noqa: BLE001 (re-raised in the embed thread)
+                self._error = e
+            while True:
+                item = self._queue.get()
+                if item is _CLOSE:
+                    break
+                if self._error is not None:
+                    # Drain so a blocked put() can return and see the error
+                    continue
+                rows, size_bytes = item
+                buffer.extend(rows)
+                buffered_bytes += size_bytes
+                if (
+                    len(buffer) >= self.max_rows
+                    or buffered_bytes >= self.max_bytes
+                ):
+                    try:
+                        loop.run_until_complete(
+                            self._insert(client, buffer)
+                        )
+                    except Exception as e:  # noqa: BLE001 (re-raised in the embed thread)
+                        self._error = e
+                    buffer, buffered_bytes = [], 0
+            if buffer and self._error is None:
+                try:
+                    loop.run_until_complete(
+                        self._insert(client, buffer)
+                    )
+                except Exception as e:  # noqa: BLE001 (re-raised in the embed thread)
+                    self._error = e
+        finally:
+            if client is not None:
+                with contextlib.suppress(Exception):
+                    loop.run_until_complete(client.close())
+            loop.close()
+
 
 class ClickHouseEmbedAdapter(Adapter):
-    """Stream EmbedAnything output to ClickHouse; call from thread that runs embed_file with its loop set."""
+    """Stream EmbedAnything output to ClickHouse; close() once embed_file returns."""
 
     def __init__(  # noqa: PLR0913
         self,
-        client: Any,  # clickhouse_connect.driver.AsyncClient
         *,
         agent_id: str,
         workspace_id: str,
@@ -45,8 +193,9 @@ class ClickHouseEmbedAdapter(Adapter):
         task_id: str | None = None,
         tags: list[str] | None = None,
         table_name: str = "pipeline_events",
+        embedding_model: str = "",
+        dedup_salt: str = "",
     ) -> None:
-        self.client = client
         self.agent_id = agent_id
         self.task_id = task_id
         self.workspace_id = workspace_id
@@ -55,8 +204,25 @@ class ClickHouseEmbedAdapter(Adapter):
         self.source_filename = source_filename
         self.tags = tags or []
         self.table_name = table_name
+        self.embedding_model = embedding_model
         self._chunk_offset = 0
-        self.insert_count = 0
+        self._inserter = _PipelinedInserter(
+            table_name, dedup_salt=dedup_salt
+        )
+
+    @property
+    def insert_count(self) -> int:
+        """Rows inserted so far (all rows once close() returned)."""
+        return self._inserter.insert_count
+
+    def close(self, *, flush: bool = True) -> None:
+        """Wait for pending inserts (or drop them when not flush); raises insert errors."""
+        self._inserter.close(flush=flush)
+        logger.info(
+            "ClickHouseEmbedAdapter: %d rows in %d inserts",
+            self._inserter.insert_count,
+            self._inserter.inserts,
+        )
 
     def create_index(
         self,
@@ -99,7 +265,13 @@ class ClickHouseEmbedAdapter(Adapter):
                     emb = []
             emb_list = emb if isinstance(emb, list) else []
             row = {
-                "id": str(uuid.uuid4()),
+                "id": chunk_event_id(
+                    self.workspace_id,
+                    self.dataset_id,
+                    self.source_filename,
+                    chunk_index,
+                    text,
+                ),
                 "agent_id": self.agent_id,
                 "task_id": self.task_id,
                 "workspace_id": self.workspace_id,
@@ -114,32 +286,17 @@ class ClickHouseEmbedAdapter(Adapter):
                 "transformed_data": None,
                 "tags": [*self.tags, f"chunk_{chunk_index}"],
                 "embedding": emb_list,
+                "embedding_model": (
+                    self.embedding_model if emb_list else ""
+                ),
                 "event_timestamp": event_ts,
                 "ingested_at": datetime.now(tz=UTC),
             }
             rows.append(row)
         return rows
 
-    async def _insert_batch_async(
-        self, formatted: list[list[Any]]
-    ) -> None:
-        """One bulk insert via AsyncClient."""
-        if not formatted:
-            return
-        await self.client.insert(
-            table=self.table_name,
-            data=formatted,
-            column_names=PIPELINE_EVENTS_COLUMNS,
-        )
-        self.insert_count += len(formatted)
-        logger.debug(
-            "ClickHouseEmbedAdapter: inserted %d rows (total %d)",
-            len(formatted),
-            self.insert_count,
-        )
-
     def upsert(self, data: list[EmbedData]) -> None:
-        """Convert batch to rows and bulk insert via AsyncClient."""
+        """Convert batch to rows and queue them for the inserter thread."""
         if not data:
             return
         rows = self.convert(data)
@@ -148,7 +305,10 @@ class ClickHouseEmbedAdapter(Adapter):
             for r in rows
         ]
         self._chunk_offset += len(rows)
-        loop = asyncio.get_event_loop()
-        loop.run_until_complete(
-            self._insert_batch_async(formatted)
+        size_bytes = sum(
+            len(r["raw_data"]["text"])
+            + 4 * len(r["embedding"])
+            + _ROW_OVERHEAD_BYTES
+            for r in rows
         )
+        self._inserter.put(formatted, size_bytes)
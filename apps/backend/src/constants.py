@@ -9,3 +9,6 @@ TASK_QUEUE = "backend"
 
 TASK_QUEUE_EMBED = "backend-embed"
 """Task queue for the embed worker."""
+
+TASK_QUEUE_EMBED_QUERY = "backend-embed-query"
+"""Task queue for online text embedding (embed_texts) in the embed worker."""
@@ -26,6 +26,9 @@ class Workspace(Base):
     id = Column(UUID(as_uuid=True), primary_key=True)
     name = Column(String(255), nullable=False)
     is_admin = Column(Boolean, nullable=False, default=False)
+    trace_retention_days = Column(
+        Integer, nullable=True
+    )  # Days to keep task_traces; NULL keeps them indefinitely
     created_at = Column(
         DateTime,
         default=lambda: datetime.now(tz=UTC).replace(tzinfo=None),
@@ -640,6 +643,38 @@ class Task(Base):
     )
 
 
+class TaskView(Base):
+    """One row per view in tasks.view_specs, keyed for dataset lookups."""
+
+    __tablename__ = "task_views"
+
+    workspace_id = Column(
+        UUID(as_uuid=True),
+        ForeignKey("workspaces.id", ondelete="CASCADE"),
+        primary_key=True,
+    )
+    dataset_id = Column(Text, primary_key=True)
+    view_id = Column(Text, primary_key=True)
+    task_id = Column(
+        UUID(as_uuid=True),
+        ForeignKey("tasks.id", ondelete="CASCADE"),
+        nullable=False,
+    )
+    position = Column(
+        Integer, nullable=False, default=0
+    )  # Index within tasks.view_specs
+    spec = Column(JSONB, nullable=False)
+    updated_at = Column(
+        DateTime,
+        default=lambda: datetime.now(tz=UTC).replace(tzinfo=None),
+        onupdate=lambda: datetime.now(tz=UTC).replace(
+            tzinfo=None
+        ),
+    )
+
+    __table_args__ = (Index("idx_task_views_task", "task_id"),)
+
+
 class UserOAuthConnection(Base):
     __tablename__ = "user_oauth_connections"
 
@@ -1,6 +1,10 @@
 """Analytics Helper Functions.
 
 Shared utilities for querying ClickHouse analytics data.
+
+Aggregations over task_metrics read the hourly and daily rollups
+(task_metrics_hourly, task_metrics_daily; ClickHouse migration 010) through
+rollup_source instead of scanning raw rows.
 """
 
 from dataclasses import dataclass
@@ -58,9 +62,44 @@ def build_filter_clause(
         >>> params
         {'workspace_id': 'abc-123', 'agent_id': 'xyz-789'}
     """
+    where_clause, params = build_rollup_filter_clause(
+        filters, include_version=include_version
+    )
+
+    # Date range filter (using created_at for unified task_metrics table)
+    days = parse_date_range(filters.date_range)
+    where_clauses = [
+        where_clause,
+        f"created_at >= now() - INTERVAL {days} DAY",
+    ]
+
+    # Additional custom filters
+    if additional_filters:
+        where_clauses.extend(additional_filters)
+
+    return " AND ".join(where_clauses), params
+
+
+def build_rollup_filter_clause(
+    filters: AnalyticsFilters,
+    *,
+    include_version: bool = False,
+    metric_category: str | None = None,
+) -> tuple[str, dict]:
+    """WHERE clause and parameters on the columns rollups share with task_metrics.
+
+    No date range: rollup_source applies it per source.
+    """
     where_clauses = ["workspace_id = {workspace_id:UUID}"]
     params = {"workspace_id": filters.workspace_id}
 
+    # A fixed category name from the caller, inlined so two filters for
+    # different categories can share one parameter set
+    if metric_category:
+        where_clauses.append(
+            f"metric_category = '{metric_category}'"
+        )
+
     # Optional agent filter
     if filters.agent_id:
         where_clauses.append("agent_id = {agent_id:UUID}")
@@ -71,14 +110,77 @@ def build_filter_clause(
         where_clauses.append("agent_version = {version:String}")
         params["version"] = filters.version
 
-    # Date range filter (using created_at for unified task_metrics table)
-    days = parse_date_range(filters.date_range)
-    where_clauses.append(
-        f"created_at >= now() - INTERVAL {days} DAY"
-    )
+    return " AND ".join(where_clauses), params
 
-    # Additional custom filters
-    if additional_filters:
-        where_clauses.extend(additional_filters)
 
-    return " AND ".join(where_clauses), params
+# Rollup states from raw task_metrics rows, as the migration 010 views build
+# them; the types must match so raw and rollup rows can be unioned.
+ROLLUP_STATES = """
+    count(),
+    countIf(ifNull(status, '') = 'completed'),
+    countIf(passed = 1),
+    countIf(passed = 0),
+    sumIf(ifNull(cost_usd, 0), ifNull(status, '') = 'completed'),
+    avgIfState(duration_ms, ifNull(status, '') = 'completed'),
+    avgIfState(input_tokens + output_tokens, ifNull(status, '') = 'completed'),
+    quantilesIfState(0.5, 0.95)(duration_ms, ifNull(status, '') = 'completed'),
+    avgState(score),
+    uniqExactState(task_id)
+"""
+ROLLUP_COLUMNS = """
+    row_count,
+    completed_count,
+    passed_count,
+    failed_count,
+    completed_cost,
+    completed_duration_avg,
+    completed_tokens_avg,
+    completed_duration_quantiles,
+    score_avg,
+    tasks
+"""
+
+
+def rollup_source(where_clause: str, days: int | None) -> str:
+    """Subquery of task_metrics rollup rows since now() - days DAY (None: all).
+
+    Columns: workspace_id, agent_id, agent_version, metric_category,
+    metric_name ('' when none), bucket (start of hour or day) and the
+    ROLLUP_COLUMNS states; several rows can share a bucket, so aggregate
+    them (sum for counts, -Merge for states). where_clause may only use the
+    columns listed. Exact for the window: raw rows for its first partial
+    hour, hourly rollups for the rest of its first day, daily after that.
+    """
+    keys = (
+        "workspace_id, agent_id, agent_version, metric_category"
+    )
+    if days is None:
+        return f"""(
+        SELECT {keys}, metric_name, toDateTime(day) AS bucket, {ROLLUP_COLUMNS}
+        FROM task_metrics_daily
+        WHERE {where_clause}
+    )"""  # noqa: S608
+    cutoff = f"now() - INTERVAL {days} DAY"
+    return f"""(
+        SELECT {keys}, metric_name, toDateTime(day) AS bucket, {ROLLUP_COLUMNS}
+        FROM task_metrics_daily
+        WHERE {where_clause} AND day > toDate({cutoff})
+        UNION ALL
+        SELECT {keys}, metric_name, hour, {ROLLUP_COLUMNS}
+        FROM task_metrics_hourly
+        WHERE {where_clause}
+          AND hour >= toStartOfHour({cutoff}) + INTERVAL 1 HOUR
+          AND hour < toStartOfDay({cutoff}) + INTERVAL 1 DAY
+        UNION ALL
+        SELECT
+            {keys},
+            ifNull(task_metrics.metric_name, ''),
+            toDateTime(toStartOfHour(created_at)),
+            {ROLLUP_STATES}
+        FROM task_metrics
+        WHERE {where_clause}
+          AND created_at >= {cutoff}
+          AND created_at < toStartOfHour({cutoff}) + INTERVAL 1 HOUR
+        GROUP BY {keys}, ifNull(task_metrics.metric_name, ''),
+            toDateTime(toStartOfHour(created_at))
+    )"""  # noqa: S608
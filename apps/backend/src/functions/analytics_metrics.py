@@ -1,10 +1,27 @@
 """Analytics Functions.
 
 Consolidated, efficient analytics queries with parallel execution.
+
+Each section (performance, quality, overview, feedback) is one query, run
+concurrently on a sessionless client with its own timeout; a section that
+fails or times out is left out and reported under "errors".
+
+Sections are cached in-process per normalized AnalyticsFilters: fresh for
+ANALYTICS_CACHE_TTL_SECONDS, then served stale for up to
+ANALYTICS_CACHE_STALE_SECONDS more while one background query refreshes
+them. Concurrent requests for the same section share one query.
+
+Env: ANALYTICS_CACHE_TTL_SECONDS, ANALYTICS_CACHE_STALE_SECONDS,
+ANALYTICS_CACHE_MAX_ENTRIES, ANALYTICS_SECTION_TIMEOUT_SECONDS.
 """
 # ruff: noqa: S608
 
+import asyncio
+import math
+import os
+import time
 import uuid
+from collections.abc import Awaitable, Callable
 from typing import Any, Literal
 
 from restack_ai.function import function, log
@@ -17,11 +34,51 @@ from src.database.connection import (
 from src.functions.analytics_helpers import (
     AnalyticsFilters,
     build_filter_clause,
+    build_rollup_filter_clause,
     parse_date_range,
+    rollup_source,
 )
 
 MetricType = Literal["performance", "quality", "overview", "all"]
 
+ANALYTICS_CACHE_TTL_SECONDS = float(
+    os.getenv("ANALYTICS_CACHE_TTL_SECONDS", "30")
+)
+ANALYTICS_CACHE_STALE_SECONDS = float(
+    os.getenv("ANALYTICS_CACHE_STALE_SECONDS", "300")
+)
+ANALYTICS_CACHE_MAX_ENTRIES = int(
+    os.getenv("ANALYTICS_CACHE_MAX_ENTRIES", "1024")
+)
+# Below the workflow step's 15 s start_to_close_timeout
+ANALYTICS_SECTION_TIMEOUT_SECONDS = float(
+    os.getenv("ANALYTICS_SECTION_TIMEOUT_SECONDS", "10")
+)
+
+# Failures that leave one section out instead of failing the request
+_SECTION_ERRORS = (
+    ValueError,
+    TypeError,
+    RuntimeError,
+    AttributeError,
+    ConnectionError,
+    OSError,  # includes TimeoutError
+)
+
+_SectionKey = tuple[str, str, str | None, str | None, int]
+_SectionFetcher = Callable[
+    [Any, AnalyticsFilters], Awaitable[dict[str, Any]]
+]
+
+# key -> (monotonic time fetched, section)
+_section_cache: dict[
+    _SectionKey, tuple[float, dict[str, Any]]
+] = {}
+_section_queries: dict[
+    _SectionKey, asyncio.Task[dict[str, Any]]
+] = {}
+_client: Any = None
+
 
 @function.defn()
 async def get_analytics_metrics(
@@ -50,7 +107,8 @@ async def get_analytics_metrics(
             },
             overview: {
                 timeseries: [...]
-            }
+            },
+            errors: {section: message}  # only if a section failed
         }
     """
     # Extract metric_types before creating AnalyticsFilters
@@ -64,73 +122,171 @@ async def get_analytics_metrics(
 
     # Determine which metrics to fetch
     fetch_all = metric_types == "all"
-    fetch_performance = fetch_all or "performance" in metric_types
-    fetch_quality = fetch_all or "quality" in metric_types
-    fetch_overview = fetch_all or "overview" in metric_types
-    fetch_feedback = fetch_all or "feedback" in metric_types
+    sections = [
+        section
+        for section in _SECTION_FETCHERS
+        if fetch_all or section in metric_types
+    ]
 
     log.info(
         f"Fetching analytics for workspace {filters.workspace_id}, types: {metric_types}"
     )
 
-    result = {}
+    result: dict[str, Any] = {}
 
     try:
-        client = await get_clickhouse_async_client()
-
-        # Performance metrics (parallel queries)
-        if fetch_performance:
-            result[
-                "performance"
-            ] = await _get_performance_metrics(client, filters)
-
-        # Quality metrics (parallel queries)
-        if fetch_quality:
-            result["quality"] = await _get_quality_metrics(
-                client, filters
-            )
+        client = await _analytics_client()
+    except _SECTION_ERRORS as e:
+        log.error(f"Failed to fetch analytics metrics: {e}")
+        return result
 
-        # Overview (task counts & success rates)
-        if fetch_overview:
-            result["overview"] = await _get_overview_metrics(
-                client, filters
+    outcomes = await asyncio.gather(
+        *(
+            _get_section(section, client, filters)
+            for section in sections
+        ),
+        return_exceptions=True,
+    )
+    errors = {}
+    for section, outcome in zip(sections, outcomes, strict=True):
+        if isinstance(outcome, _SECTION_ERRORS):
+            log.error(
+                f"Failed to fetch {section} analytics: {outcome!r}"
             )
-
-        # Feedback metrics
-        if fetch_feedback:
-            result["feedback"] = await _get_feedback_metrics(
-                client, filters
+            # Return partial results
+            errors[section] = (
+                str(outcome) or type(outcome).__name__
             )
-
-    except (
-        ValueError,
-        TypeError,
-        RuntimeError,
-        AttributeError,
-        ConnectionError,
-        OSError,
-    ) as e:
-        log.error(f"Failed to fetch analytics metrics: {e}")
-        # Return partial results if available
-        return result
+        elif isinstance(outcome, BaseException):
+            raise outcome
+        else:
+            result[section] = outcome
+    if errors:
+        result["errors"] = errors
     return result
 
 
+async def _analytics_client() -> Any:
+    """Process-wide sessionless client, so sections can query at once."""
+    global _client  # noqa: PLW0603
+    if _client is None:
+        _client = await get_clickhouse_async_client(
+            sessionless=True
+        )
+    return _client
+
+
+def _section_key(
+    section: str, filters: AnalyticsFilters
+) -> _SectionKey:
+    """Cache key: filters as the queries see them (ids lowercased, range in days)."""
+    return (
+        section,
+        filters.workspace_id.lower(),
+        filters.agent_id.lower() if filters.agent_id else None,
+        filters.version or None,
+        parse_date_range(filters.date_range),
+    )
+
+
+def _query_section(
+    key: _SectionKey,
+    section: str,
+    client: Any,
+    filters: AnalyticsFilters,
+) -> asyncio.Task[dict[str, Any]]:
+    """The running query for key, starting one if there is none."""
+    task = _section_queries.get(key)
+    if task is None:
+        task = asyncio.create_task(
+            _fetch_section(key, section, client, filters)
+        )
+        _section_queries[key] = task
+        task.add_done_callback(
+            lambda done: _section_query_done(key, done)
+        )
+    return task
+
+
+def _section_query_done(
+    key: _SectionKey, task: asyncio.Task[dict[str, Any]]
+) -> None:
+    _section_queries.pop(key, None)
+    # Retrieve the error so a failed background refresh is logged once
+    if not task.cancelled() and task.exception() is not None:
+        log.error(
+            f"Analytics {key[0]} query failed: {task.exception()!r}"
+        )
+
+
+async def _fetch_section(
+    key: _SectionKey,
+    section: str,
+    client: Any,
+    filters: AnalyticsFilters,
+) -> dict[str, Any]:
+    value = await _SECTION_FETCHERS[section](client, filters)
+    # Re-inserted at the end, so the first entry is the oldest
+    _section_cache.pop(key, None)
+    _section_cache[key] = (time.monotonic(), value)
+    while len(_section_cache) > ANALYTICS_CACHE_MAX_ENTRIES:
+        del _section_cache[next(iter(_section_cache))]
+    return value
+
+
+async def _get_section(
+    section: str, client: Any, filters: AnalyticsFilters
+) -> dict[str, Any]:
+    """One section: cached, stale while refreshing, or queried with a timeout."""
+    key = _section_key(section, filters)
+    cached = _section_cache.get(key)
+    if cached is not None:
+        age = time.monotonic() - cached[0]
+        if age < ANALYTICS_CACHE_TTL_SECONDS:
+            return cached[1]
+        if (
+            age
+            < ANALYTICS_CACHE_TTL_SECONDS
+            + ANALYTICS_CACHE_STALE_SECONDS
+        ):
+            _query_section(key, section, client, filters)
+            return cached[1]
+    try:
+        # Shielded: a caller timing out leaves the query running for
+        # the others waiting on it (and for the cache)
+        return await asyncio.wait_for(
+            asyncio.shield(
+                _query_section(key, section, client, filters)
+            ),
+            ANALYTICS_SECTION_TIMEOUT_SECONDS,
+        )
+    except _SECTION_ERRORS:
+        if cached is None:
+            raise
+        log.warning(
+            f"Serving expired {section} analytics after a failed query"
+        )
+        return cached[1]
+
+
 async def _get_performance_metrics(
     client: Any, filters: AnalyticsFilters
 ) -> dict[str, Any]:
-    """Fetch performance metrics (summary + timeseries) in one query."""
-    where_clause, params = build_filter_clause(
+    """Fetch performance metrics (summary + timeseries) in one query.
+
+    Completed tasks only; reads the task_metrics rollups.
+    """
+    where_clause, params = build_rollup_filter_clause(
         filters,
         include_version=True,
-        additional_filters=["status = 'completed'"],
+        metric_category="performance",
     )
 
     days = parse_date_range(filters.date_range)
+    source = rollup_source(where_clause, days)
 
     # Combined query for both summary and timeseries with full date range
-    query = (
-        f"""
+    query = f"""
         WITH date_range AS (
             SELECT
                 toDate(now() - INTERVAL number DAY) as date
@@ -138,28 +294,32 @@ async def _get_performance_metrics(
         ),
         metrics AS (
             SELECT
-                toDate(created_at) as date,
-                avg(duration_ms) as avg_duration,
-                avg(input_tokens + output_tokens) as avg_tokens,
-                sum(cost_usd) as total_cost,
-                count(*) as task_count
-            FROM task_metrics
-            WHERE metric_category = 'performance' AND """
-        + where_clause
-        + """
+                toDate(bucket) as date,
+                avgIfMerge(completed_duration_avg) as avg_duration,
+                avgIfMerge(completed_tokens_avg) as avg_tokens,
+                sum(completed_cost) as total_cost,
+                sum(completed_count) as task_count
+            FROM {source}
             GROUP BY date
+            HAVING task_count > 0
         )
         SELECT
             dr.date as date,
             coalesce(m.avg_duration, 0) as avg_duration,
             coalesce(m.avg_tokens, 0) as avg_tokens,
             coalesce(m.total_cost, 0) as total_cost,
-            coalesce(m.task_count, 0) as task_count
+            coalesce(m.task_count, 0) as task_count,
+            (
+                SELECT quantilesIfMerge(0.5, 0.95)(
+                    completed_duration_quantiles
+                )
+                FROM {source}
+                WHERE bucket >= toDate(now() - INTERVAL {days - 1} DAY)
+            ) as duration_quantiles
         FROM date_range dr
         LEFT JOIN metrics m ON dr.date = m.date
         ORDER BY dr.date ASC
     """
-    )
 
     result = await client.query(query, parameters=params)
     rows = list(result.named_results())
@@ -171,6 +331,8 @@ async def _get_performance_metrics(
                 "avgTokens": 0,
                 "totalCost": 0,
                 "taskCount": 0,
+                "p50Duration": 0,
+                "p95Duration": 0,
             },
             "timeseries": [],
         }
@@ -200,6 +362,12 @@ async def _get_performance_metrics(
         else 0,
         "totalCost": round(total_cost, 4),
         "taskCount": total_tasks,
+        "p50Duration": _quantile(
+            rows[0]["duration_quantiles"], 0
+        ),
+        "p95Duration": _quantile(
+            rows[0]["duration_quantiles"], 1
+        ),
     }
 
     # Build timeseries
@@ -222,45 +390,47 @@ async def _get_performance_metrics(
     return {"summary": summary, "timeseries": timeseries}
 
 
+def _quantile(values: list[float] | None, index: int) -> float:
+    """One value of a quantiles() result; 0 when there was no data (nan)."""
+    if not values or not math.isfinite(values[index]):
+        return 0
+    return round(values[index], 2)
+
+
 async def _get_quality_metrics(
     client: Any, filters: AnalyticsFilters
 ) -> dict[str, Any]:
     """Fetch quality metrics (summary + timeseries) in one query."""
-    where_clause, params = build_filter_clause(filters)
+    where_clause, params = build_rollup_filter_clause(
+        filters, metric_category="quality"
+    )
 
     days = parse_date_range(filters.date_range)
+    source = rollup_source(where_clause, days)
 
-    query = (
-        f"""
+    query = f"""
         WITH date_range AS (
             SELECT
                 toDate(now() - INTERVAL number DAY) as date
             FROM numbers({days})
         ),
+        metrics AS (
+            SELECT
+                metric_name,
+                toDate(bucket) as date,
+                sum(passed_count) as passed_count,
+                sum(row_count) as eval_count,
+                avgMerge(score_avg) as avg_score
+            FROM {source}
+            GROUP BY metric_name, date
+        ),
         metric_names AS (
-            SELECT DISTINCT metric_name
-            FROM task_metrics
-            WHERE metric_category = 'quality' AND """
-        + where_clause
-        + """
+            SELECT DISTINCT metric_name FROM metrics
         ),
         date_metric_cross AS (
             SELECT dr.date, mn.metric_name
             FROM date_range dr
             CROSS JOIN metric_names mn
-        ),
-        metrics AS (
-            SELECT
-                metric_name,
-                toDate(created_at) as date,
-                countIf(passed = true) as passed_count,
-                count(*) as eval_count,
-                avg(score) as avg_score
-            FROM task_metrics
-            WHERE metric_category = 'quality' AND """
-        + where_clause
-        + """
-                GROUP BY metric_name, date
         )
         SELECT
             dmc.metric_name,
@@ -272,7 +442,6 @@ async def _get_quality_metrics(
         LEFT JOIN metrics m ON dmc.date = m.date AND dmc.metric_name = m.metric_name
         ORDER BY dmc.metric_name, dmc.date ASC
     """
-    )
 
     result = await client.query(query, parameters=params)
     rows = list(result.named_results())
@@ -392,14 +561,15 @@ async def _get_overview_metrics(
     client: Any, filters: AnalyticsFilters
 ) -> dict[str, Any]:
     """Fetch overview metrics (task counts & fail rates)."""
-    where_clause, params = build_filter_clause(
-        filters, include_version=True
+    where_clause, params = build_rollup_filter_clause(
+        filters,
+        include_version=True,
+        metric_category="performance",
     )
 
     days = parse_date_range(filters.date_range)
 
-    query = (
-        f"""
+    query = f"""
         WITH date_range AS (
             SELECT
                 toDate(now() - INTERVAL number DAY) as date
@@ -407,13 +577,10 @@ async def _get_overview_metrics(
         ),
         metrics AS (
             SELECT
-                toDate(created_at) as date,
-                count(*) as task_count,
-                countIf(status = 'completed') as completed_count
-            FROM task_metrics
-            WHERE metric_category = 'performance' AND """
-        + where_clause
-        + """
+                toDate(bucket) as date,
+                sum(row_count) as task_count,
+                sum(completed_count) as completed_count
+            FROM {rollup_source(where_clause, days)}
             GROUP BY date
         )
         SELECT
@@ -424,7 +591,6 @@ async def _get_overview_metrics(
         LEFT JOIN metrics m ON dr.date = m.date
         ORDER BY dr.date ASC
     """
-    )
 
     result = await client.query(query, parameters=params)
 
@@ -450,11 +616,16 @@ async def _get_feedback_metrics(
     Returns only timeseries data - frontend calculates summaries from it.
     """
     # Get base filter for tasks
-    task_where_filter, task_params = build_filter_clause(
-        filters, include_version=True
+    task_where_filter, task_params = build_rollup_filter_clause(
+        filters,
+        include_version=True,
+        metric_category="performance",
     )
 
     # Feedback-specific filter
+    feedback_rollup_filter, _ = build_rollup_filter_clause(
+        filters, metric_category="feedback"
+    )
     feedback_where_filter, feedback_params = build_filter_clause(
         filters
     )
@@ -463,8 +634,7 @@ async def _get_feedback_metrics(
     days = parse_date_range(filters.date_range)
 
     # Combined timeseries query with task counts and feedback including full date range
-    timeseries_query = (
-        f"""
+    timeseries_query = f"""
         WITH date_range AS (
             SELECT
                 toDate(now() - INTERVAL number DAY) as date
@@ -472,25 +642,19 @@ async def _get_feedback_metrics(
         ),
         task_counts AS (
             SELECT
-                toDate(created_at) as date,
-                count(DISTINCT task_id) as total_tasks
-            FROM task_metrics
-            WHERE metric_category = 'performance' AND """
-        + task_where_filter
-        + """
+                toDate(bucket) as date,
+                uniqExactMerge(tasks) as total_tasks
+            FROM {rollup_source(task_where_filter, days)}
             GROUP BY date
         ),
         feedback_counts AS (
             SELECT
-                toDate(created_at) as date,
-                countIf(passed = 1) as positive_count,
-                countIf(passed = 0) as negative_count,
-                count() as feedback_count,
-                count(DISTINCT task_id) as tasks_with_feedback
-            FROM task_metrics
-            WHERE """
-        + feedback_where_filter
-        + """
+                toDate(bucket) as date,
+                sum(passed_count) as positive_count,
+                sum(failed_count) as negative_count,
+                sum(row_count) as feedback_count,
+                uniqExactMerge(tasks) as tasks_with_feedback
+            FROM {rollup_source(feedback_rollup_filter, days)}
             GROUP BY date
         )
         SELECT
@@ -505,7 +669,6 @@ async def _get_feedback_metrics(
         LEFT JOIN feedback_counts f ON dr.date = f.date
         ORDER BY date ASC
     """
-    )
 
     # Merge params from both filters
     merged_params = {**task_params, **feedback_params}
@@ -570,3 +733,11 @@ async def _get_feedback_metrics(
         "timeseries": timeseries,
         "detailed": detailed_feedbacks,
     }
+
+
+_SECTION_FETCHERS: dict[str, _SectionFetcher] = {
+    "performance": _get_performance_metrics,
+    "quality": _get_quality_metrics,
+    "overview": _get_overview_metrics,
+    "feedback": _get_feedback_metrics,
+}
@@ -0,0 +1,91 @@
+"""Garbage collection for uploads that were staged but never ingested.
+
+The upload route writes one blob per upload under 'uploads/<workspace_id>/',
+and stage_load_chunks one blob per load chunk under 'pipeline_events/';
+ingestion deletes them once stored. Blobs of uploads abandoned in the UI
+and of loads that failed or were cancelled are removed here once older
+than UPLOAD_TTL_HOURS. Meant to run on an hourly Restack schedule.
+"""
+
+import asyncio
+import logging
+import os
+from datetime import UTC, datetime, timedelta
+
+from pydantic import BaseModel, Field
+from restack_ai.function import function
+
+from src.functions.data_ingestion import STAGED_LOAD_PREFIX
+from src.utils.blob_store import get_blob_store
+
+logger = logging.getLogger(__name__)
+
+UPLOAD_PREFIX = "uploads"
+SWEPT_PREFIXES = (UPLOAD_PREFIX, STAGED_LOAD_PREFIX)
+DEFAULT_UPLOAD_TTL_HOURS = 24
+
+
+class SweepUploadsInput(BaseModel):
+    max_age_hours: int | None = Field(
+        default=None,
+        gt=0,
+        description="Delete uploads older than this; defaults to UPLOAD_TTL_HOURS (24).",
+    )
+    dry_run: bool = False
+
+
+class SweepUploadsOutput(BaseModel):
+    success: bool
+    dry_run: bool
+    cutoff: str
+    deleted_keys: list[str] = Field(default_factory=list)
+    error: str | None = None
+
+
+def _sweep(cutoff: datetime, *, dry_run: bool) -> list[str]:
+    store = get_blob_store()
+    keys = [
+        key
+        for prefix in SWEPT_PREFIXES
+        for key in store.list_older_than(prefix, cutoff)
+    ]
+    if not dry_run:
+        for key in keys:
+            store.delete(key)
+    return keys
+
+
+@function.defn()
+async def sweep_abandoned_uploads(
+    function_input: SweepUploadsInput,
+) -> SweepUploadsOutput:
+    """Delete staged uploads and load chunks older than the TTL."""
+    hours = function_input.max_age_hours or int(
+        os.environ.get(
+            "UPLOAD_TTL_HOURS", DEFAULT_UPLOAD_TTL_HOURS
+        )
+    )
+    cutoff = datetime.now(tz=UTC) - timedelta(hours=hours)
+    try:
+        keys = await asyncio.to_thread(
+            _sweep, cutoff, dry_run=function_input.dry_run
+        )
+    except (ValueError, OSError) as e:
+        return SweepUploadsOutput(
+            success=False,
+            dry_run=function_input.dry_run,
+            cutoff=cutoff.isoformat(),
+            error=str(e),
+        )
+    logger.info(
+        "Swept %d abandoned uploads older than %s%s",
+        len(keys),
+        cutoff.isoformat(),
+        " (dry run)" if function_input.dry_run else "",
+    )
+    return SweepUploadsOutput(
+        success=True,
+        dry_run=function_input.dry_run,
+        cutoff=cutoff.isoformat(),
+        deleted_keys=keys,
+    )
@@ -0,0 +1,600 @@
+"""Dataset views compiled into ClickHouse tables.
+
+A view spec (tasks.view_specs) lists raw_data keys to show for a dataset.
+Rendering it used to re-read whole events and extract JSON on every open.
+Here each view gets a view_rows_<hash> table ordered by event_timestamp and
+fed by a materialized view over pipeline_events that pre-extracts the view's
+columns for the dataset's rows only (from promoted rd_<path> columns where
+a path is promoted, see raw_data_paths). Existing rows are backfilled once. The
+table is a ReplacingMergeTree and is read with FINAL, so an event that both
+the backfill and the materialized view picked up shows once.
+
+compiled_views (ClickHouse) maps a view to its table. The table name hashes
+the spec, so an edited view compiles into a new table that replaces the old
+one once backfilled; views removed from a task are dropped. Views whose keys
+are not plain raw_data paths, or whose dataset is not in pipeline_events,
+are served by query_dataset_events as before.
+"""
+
+import hashlib
+import json
+import logging
+import re
+import uuid
+from datetime import UTC, datetime
+from typing import Any, Literal
+
+from clickhouse_connect.driver.binding import format_query_value
+from pydantic import BaseModel, Field
+from restack_ai.function import function, function_info, heartbeat
+from sqlalchemy import text
+
+from src.database.connection import (
+    get_async_db,
+    get_clickhouse_async_client,
+)
+from src.functions.datasets_crud import (
+    DatasetRef,
+    QueryDatasetEventsInput,
+    QueryDatasetEventsOutput,
+    _build_where_conditions,
+    _get_dataset_ref,
+    query_dataset_events,
+)
+from src.functions.raw_data_paths import (
+    get_raw_data_promotions,
+    is_raw_data_path,
+)
+
+logger = logging.getLogger(__name__)
+
+COMPILED_VIEW_SOURCE_TABLE = "pipeline_events"
+COMPILED_VIEW_TABLE_PREFIX = "view_rows_"
+# Part of the spec hash: bump to recompile every view table (2: Replacing)
+COMPILED_VIEW_TABLE_VERSION = 2
+COMPILED_VIEWS_COLUMNS = [
+    "workspace_id",
+    "dataset_id",
+    "view_id",
+    "task_id",
+    "table_name",
+    "spec_hash",
+    "column_keys",
+    "status",
+    "updated_at",
+    "is_deleted",
+]
+
+# Passes of sync_compiled_views while the task's view_specs keep changing
+SYNC_MAX_PASSES = 3
+
+_PARAM_RE = re.compile(r"\{(\w+):[^}]+\}")
+_DATASET_ID_RE = re.compile(r"^[\w-]{1,64}$")
+
+
+class SyncCompiledViewsInput(BaseModel):
+    task_id: str = Field(..., min_length=1)
+
+
+class CompiledViewResult(BaseModel):
+    view_id: str
+    dataset_id: str
+    table_name: str | None = None
+    action: Literal["created", "unchanged", "dropped", "skipped"]
+    reason: str | None = None
+
+
+class SyncCompiledViewsOutput(BaseModel):
+    success: bool
+    views: list[CompiledViewResult] = Field(default_factory=list)
+    error: str | None = None
+
+
+class QueryViewRowsInput(BaseModel):
+    workspace_id: str = Field(..., min_length=1)
+    dataset_id: str = Field(..., min_length=1)
+    view_id: str = Field(..., min_length=1)
+    limit: int = 100
+    offset: int = 0
+
+
+def _inline_params(condition: str, params: dict[str, Any]) -> str:
+    """Replace {name:Type} placeholders with literals (DDL takes no parameters)."""
+    return _PARAM_RE.sub(
+        lambda m: format_query_value(params[m.group(1)]),
+        condition,
+    )
+
+
+def _view_where_clause(dataset: DatasetRef) -> str:
+    """Dataset scope and storage filters as a literal WHERE clause."""
+    conditions, params = _build_where_conditions(
+        dataset.storage_config, dataset.workspace_id, dataset.id
+    )
+    return " AND ".join(
+        _inline_params(condition, params)
+        for condition in conditions
+    )
+
+
+def _column_keys(view: dict) -> list[str] | None:
+    """The view's column keys, or None if any is not a raw_data path."""
+    keys = [
+        column.get("key")
+        for column in view.get("columns") or []
+        if isinstance(column, dict)
+    ]
+    if not keys or not all(
+        isinstance(key, str) and is_raw_data_path(key)
+        for key in keys
+    ):
+        return None
+    return list(dict.fromkeys(keys))
+
+
+def _table_name(
+    workspace_id: str,
+    dataset_id: str,
+    view_id: str,
+    spec_hash: str,
+) -> str:
+    digest = hashlib.sha256(
+        f"{workspace_id}|{dataset_id}|{view_id}|{spec_hash}".encode()
+    ).hexdigest()
+    return f"{COMPILED_VIEW_TABLE_PREFIX}{digest[:20]}"
+
+
+def _column_value(key: str, promoted: dict[str, str]) -> str:
+    # keys passed is_raw_data_path: dotted identifiers only
+    value = f"toString(raw_data.{key})"
+    column = promoted.get(key)
+    if column is None:
+        return value
+    # The promoted column is NULL where the value has another type
+    return f"ifNull(toString({column}), {value})"
+
+
+def _column_select(
+    keys: list[str], promoted: dict[str, str]
+) -> str:
+    return ", ".join(
+        f"{_column_value(key, promoted)} AS c{i}"
+        for i, key in enumerate(keys)
+    )
+
+
+async def _registered_views(
+    client: Any, task_id: str
+) -> dict[tuple[str, str], dict[str, Any]]:
+    """Live registry rows of a task keyed by (dataset_id, view_id)."""
+    result = await client.query(
+        """
+        SELECT dataset_id, view_id, table_name, spec_hash, status,
+               workspace_id
+        FROM compiled_views FINAL
+        WHERE task_id = {task_id:String} AND is_deleted = 0
+        """,
+        parameters={"task_id": task_id},
+    )
+    return {
+        (row[0], row[1]): {
+            "table_name": row[2],
+            "spec_hash": row[3],
+            "status": row[4],
+            "workspace_id": str(row[5]),
+        }
+        for row in result.result_rows or []
+    }
+
+
+async def _register(  # noqa: PLR0913
+    client: Any,
+    *,
+    workspace_id: str,
+    dataset_id: str,
+    view_id: str,
+    task_id: str,
+    table_name: str = "",
+    spec_hash: str = "",
+    column_keys: list[str] | None = None,
+    status: str = "ready",
+    is_deleted: int = 0,
+) -> None:
+    await client.insert(
+        "compiled_views",
+        [
+            [
+                workspace_id,
+                dataset_id,
+                view_id,
+                task_id,
+                table_name,
+                spec_hash,
+                column_keys or [],
+                status,
+                datetime.now(tz=UTC),
+                is_deleted,
+            ]
+        ],
+        column_names=COMPILED_VIEWS_COLUMNS,
+    )
+
+
+async def _drop_view_table(client: Any, table_name: str) -> None:
+    if not table_name.startswith(COMPILED_VIEW_TABLE_PREFIX):
+        return
+    await client.command(f"DROP VIEW IF EXISTS {table_name}_mv")
+    await client.command(f"DROP TABLE IF EXISTS {table_name}")
+
+
+def _backfilled_partitions(table_name: str) -> set[str]:
+    """Partitions of table_name a previous attempt of this activity backfilled."""
+    try:
+        details = function_info().heartbeat_details
+    except RuntimeError:
+        return set()
+    for detail in details or []:
+        if (
+            isinstance(detail, dict)
+            and detail.get("table") == table_name
+        ):
+            return set(detail.get("partitions") or [])
+    return set()
+
+
+async def _source_partitions(client: Any) -> list[str]:
+    result = await client.query(
+        """
+        SELECT DISTINCT partition_id
+        FROM system.parts
+        WHERE database = currentDatabase()
+          AND table = {table:String}
+          AND active
+        ORDER BY partition_id
+        """,
+        parameters={"table": COMPILED_VIEW_SOURCE_TABLE},
+    )
+    return [row[0] for row in result.result_rows or []]
+
+
+async def _create_view_table(
+    client: Any,
+    table_name: str,
+    keys: list[str],
+    where_clause: str,
+    promoted: dict[str, str],
+) -> None:
+    """Create the rows table, start feeding it, then backfill older rows.
+
+    The backfill cutoff is taken once the materialized view exists, so no
+    row falls between the two. Rows the view already fed that the backfill
+    also reads (e.g. buffered inserts with an earlier ingested_at) share
+    their sorting key and collapse in the ReplacingMergeTree.
+
+    The backfill runs one pipeline_events partition per insert and
+    heartbeats the partitions done, so a retried activity keeps the table
+    and its materialized view and goes on with the remaining partitions.
+    """
+    value_columns = ", ".join(
+        f"c{i} Nullable(String)" for i in range(len(keys))
+    )
+    await client.command(
+        f"CREATE TABLE IF NOT EXISTS {table_name} ("
+        "id UUID, event_timestamp DateTime64(3), source String, "
+        f"{value_columns}"
+        ") ENGINE = ReplacingMergeTree ORDER BY (event_timestamp, id)"
+    )
+    select = (
+        "SELECT id, event_timestamp, "  # noqa: S608
+        "ifNull(toString(raw_data.source), '') AS source, "
+        f"{_column_select(keys, promoted)} "
+        f"FROM {COMPILED_VIEW_SOURCE_TABLE} WHERE {where_clause}"
+    )
+    await client.command(
+        f"CREATE MATERIALIZED VIEW IF NOT EXISTS {table_name}_mv "
+        f"TO {table_name} AS {select}"
+    )
+    # Rows ingested from here on arrive through the materialized view
+    cutoff = datetime.now(tz=UTC)
+    done = _backfilled_partitions(table_name)
+    for partition_id in await _source_partitions(client):
+        if partition_id in done:
+            continue
+        await client.command(
+            f"INSERT INTO {table_name} {select} "
+            "AND _partition_id = {partition_id:String} "
+            "AND ingested_at < fromUnixTimestamp64Milli({cutoff_ms:Int64})",
+            parameters={
+                "partition_id": partition_id,
+                "cutoff_ms": int(cutoff.timestamp() * 1000),
+            },
+        )
+        done.add(partition_id)
+        heartbeat(
+            {"table": table_name, "partitions": sorted(done)}
+        )
+
+
+async def _compile_view(
+    client: Any,
+    task_id: str,
+    workspace_id: str,
+    view: dict,
+    current: dict[str, Any] | None,
+) -> CompiledViewResult:
+    view_id = str(view.get("id") or "")
+    dataset_id = str(view.get("dataset_id") or "")
+    result = CompiledViewResult(
+        view_id=view_id, dataset_id=dataset_id, action="skipped"
+    )
+    keys = _column_keys(view)
+    if keys is None:
+        result.reason = "columns are not plain raw_data paths"
+        return result
+    if not _DATASET_ID_RE.match(dataset_id):
+        result.reason = "invalid dataset_id"
+        return result
+    dataset = await _get_dataset_ref(workspace_id, dataset_id)
+    if (
+        dataset is None
+        or dataset.storage_type != "clickhouse"
+        or dataset.storage_config.get(
+            "table", COMPILED_VIEW_SOURCE_TABLE
+        )
+        != COMPILED_VIEW_SOURCE_TABLE
+    ):
+        result.reason = "dataset is not stored in pipeline_events"
+        return result
+
+    where_clause = _view_where_clause(dataset)
+    promotions = await get_raw_data_promotions(client)
+    promoted = {
+        key: promotions[key].column
+        for key in keys
+        if key in promotions
+    }
+    # A newly promoted column recompiles the view onto it
+    spec_hash = hashlib.sha256(
+        json.dumps(
+            [
+                keys,
+                where_clause,
+                promoted,
+                COMPILED_VIEW_TABLE_VERSION,
+            ]
+        ).encode()
+    ).hexdigest()
+    result.table_name = _table_name(
+        workspace_id, dataset_id, view_id, spec_hash
+    )
+    if (
+        current is not None
+        and current["spec_hash"] == spec_hash
+        and current["status"] == "ready"
+    ):
+        result.action = "unchanged"
+        return result
+
+    registration = {
+        "workspace_id": workspace_id,
+        "dataset_id": dataset_id,
+        "view_id": view_id,
+        "task_id": task_id,
+        "table_name": result.table_name,
+        "spec_hash": spec_hash,
+        "column_keys": keys,
+    }
+    if current is None:
+        await _register(
+            client, **registration, status="backfilling"
+        )
+    # A table left by an interrupted attempt has this same spec; it is kept
+    # and its backfill resumed (rows inserted twice collapse)
+    await _create_view_table(
+        client, result.table_name, keys, where_clause, promoted
+    )
+    await _register(client, **registration, status="ready")
+    if (
+        current is not None
+        and current["table_name"] != result.table_name
+    ):
+        await _drop_view_table(client, current["table_name"])
+    result.action = "created"
+    return result
+
+
+async def _task_views(
+    task_id: str,
+) -> tuple[str, list[dict]] | None:
+    """(workspace_id, view_specs) of a task, or None if it does not exist."""
+    async for db in get_async_db():
+        result = await db.execute(
+            text(
+                "SELECT workspace_id, view_specs FROM tasks WHERE id = :task_id"
+            ),
+            {"task_id": task_id},
+        )
+        row = result.fetchone()
+        if row is None:
+            return None
+        specs = (
+            row.view_specs
+            if isinstance(row.view_specs, list)
+            else []
+        )
+        return str(row.workspace_id), [
+            spec for spec in specs if isinstance(spec, dict)
+        ]
+    return None
+
+
+async def _sync_pass(
+    client: Any,
+    task_id: str,
+    task: tuple[str, list[dict]] | None,
+) -> list[CompiledViewResult]:
+    """Compile the given views of a task and drop the other registered ones."""
+    results: list[CompiledViewResult] = []
+    registered = await _registered_views(client, task_id)
+    workspace_id, specs = task if task is not None else ("", [])
+    for view in specs:
+        key = (
+            str(view.get("dataset_id") or ""),
+            str(view.get("id") or ""),
+        )
+        current = registered.pop(key, None)
+        result = await _compile_view(
+            client, task_id, workspace_id, view, current
+        )
+        results.append(result)
+        if result.action == "skipped" and current is not None:
+            # No longer compilable: drop the stale table below
+            registered[key] = current
+
+    # Views removed from the task (or the whole task is gone)
+    for (dataset_id, view_id), current in registered.items():
+        await _drop_view_table(client, current["table_name"])
+        await _register(
+            client,
+            workspace_id=current["workspace_id"],
+            dataset_id=dataset_id,
+            view_id=view_id,
+            task_id=task_id,
+            is_deleted=1,
+        )
+        results.append(
+            CompiledViewResult(
+                view_id=view_id,
+                dataset_id=dataset_id,
+                table_name=current["table_name"],
+                action="dropped",
+            )
+        )
+    return results
+
+
+@function.defn()
+async def sync_compiled_views(
+    function_input: SyncCompiledViewsInput,
+) -> SyncCompiledViewsOutput:
+    """Compile a task's views and drop compiled views it no longer has.
+
+    Called after view_specs change; a deleted task drops all its views.
+    Syncs of a task run one at a time (one workflow id per task), so a
+    change made while a sync runs is picked up by that sync: it compiles
+    again until the specs it read are still the task's specs.
+    """
+    results: list[CompiledViewResult] = []
+    try:
+        uuid.UUID(function_input.task_id)
+        client = await get_clickhouse_async_client()
+        task = await _task_views(function_input.task_id)
+        for _ in range(SYNC_MAX_PASSES):
+            results = await _sync_pass(
+                client, function_input.task_id, task
+            )
+            latest = await _task_views(function_input.task_id)
+            if latest == task:
+                break
+            task = latest
+        else:
+            logger.warning(
+                "view_specs of task %s kept changing during sync",
+                function_input.task_id,
+            )
+    except (ValueError, TypeError, ConnectionError) as e:
+        logger.exception("sync_compiled_views failed")
+        return SyncCompiledViewsOutput(
+            success=False, views=results, error=str(e)
+        )
+    return SyncCompiledViewsOutput(success=True, views=results)
+
+
+@function.defn()
+async def query_view_rows(
+    function_input: QueryViewRowsInput,
+) -> QueryDatasetEventsOutput:
+    """Newest rows of a view, from its compiled table when it is ready.
+
+    Events carry only the view's columns in raw_data; views that are not
+    compiled (yet) fall back to query_dataset_events.
+    """
+    try:
+        client = await get_clickhouse_async_client()
+        compiled = await client.query(
+            """
+            SELECT table_name, column_keys
+            FROM compiled_views FINAL
+            WHERE workspace_id = {workspace_id:UUID}
+              AND dataset_id = {dataset_id:String}
+              AND view_id = {view_id:String}
+              AND is_deleted = 0
+              AND status = 'ready'
+            LIMIT 1
+            """,
+            parameters={
+                "workspace_id": function_input.workspace_id,
+                "dataset_id": function_input.dataset_id,
+                "view_id": function_input.view_id,
+            },
+        )
+        if not compiled.result_rows:
+            return await query_dataset_events(
+                QueryDatasetEventsInput(
+                    workspace_id=function_input.workspace_id,
+                    dataset_id=function_input.dataset_id,
+                    limit=function_input.limit,
+                    offset=function_input.offset,
+                )
+            )
+        table_name, keys = compiled.result_rows[0]
+        if not table_name.startswith(COMPILED_VIEW_TABLE_PREFIX):
+            msg = f"Invalid compiled view table: {table_name}"
+            raise ValueError(msg)
+        params = {
+            "limit": function_input.limit,
+            "offset": function_input.offset,
+        }
+        rows_result = await client.query(
+            f"""
+            SELECT *
+            FROM {table_name} FINAL
+            ORDER BY event_timestamp DESC
+            LIMIT {{limit:UInt32}} OFFSET {{offset:UInt32}}
+            """,  # noqa: S608
+            parameters=params,
+        )
+        count_result = await client.query(
+            f"SELECT count() FROM {table_name} FINAL"  # noqa: S608
+        )
+    except (ValueError, TypeError, ConnectionError) as e:
+        return QueryDatasetEventsOutput(
+            success=False,
+            error=str(e),
+            events=[],
+            total_count=0,
+            limit=function_input.limit,
+            offset=function_input.offset,
+        )
+
+    events = [
+        {
+            "id": row[0],
+            "event_timestamp": row[1].isoformat()
+            if row[1]
+            else None,
+            "raw_data": dict(zip(keys, row[3:], strict=False)),
+        }
+        for row in rows_result.result_rows
+    ]
+    return QueryDatasetEventsOutput(
+        success=True,
+        events=events,
+        total_count=(
+            count_result.result_rows[0][0]
+            if count_result.result_rows
+            else 0
+        ),
+        limit=function_input.limit,
+        offset=function_input.offset,
+    )
@@ -1,22 +1,93 @@
 """Universal data ingestion functions for ClickHouse pipeline events."""
 
+import asyncio
+import io
+import itertools
+import json
 import logging
+import os
+import random
+import time
 import uuid
+from collections.abc import Iterable, Iterator, Sequence
 from datetime import UTC, datetime
 from typing import Any
 
 import asyncpg
 import clickhouse_connect
 from pydantic import BaseModel, Field
-from restack_ai.function import function
+from restack_ai.function import (
+    NonRetryableError,
+    function,
+    function_info,
+    heartbeat,
+)
 
 from src.database.connection import (
     get_clickhouse_async_client,
+    get_clickhouse_shared_client,
     get_cockroachdb_pool,
 )
+from src.functions.raw_data_paths import prepare_raw_data_query
+from src.utils.blob_store import get_blob_store
+from src.utils.event_ids import (
+    dedup_token,
+    event_id,
+    event_ids,
+)
 
 logger = logging.getLogger(__name__)
 
+PIPELINE_EVENTS_COLUMNS = [
+    "id",
+    "agent_id",
+    "task_id",
+    "workspace_id",
+    "dataset_id",
+    "event_name",
+    "raw_data",
+    "transformed_data",
+    "tags",
+    "embedding",
+    "event_timestamp",
+    "ingested_at",
+]
+
+DATASET_FILE_CHUNKS_COLUMNS = [
+    "workspace_id",
+    "dataset_id",
+    "source",
+    "task_id",
+    "chunk_count",
+    "size_bytes",
+    "last_ingested_at",
+]
+
+# Blob prefix of chunks staged by stage_load_chunks; swept like uploads.
+STAGED_LOAD_PREFIX = "pipeline_events"
+
+# Rows per ClickHouse insert block. Override via CLICKHOUSE_INGEST_BLOCK_SIZE.
+INGEST_BLOCK_SIZE = 50_000
+
+# Synchronous inserts: pipeline_events is a non-replicated MergeTree, where
+# async inserts ignore insert_deduplication_token. Each block carries a token
+# over its deterministic ids salted with the calling activity (see
+# insert_dedup_salt), so a retried block is dropped instead of inserted
+# twice while a later load of the same rows is still written.
+CLICKHOUSE_INSERT_SETTINGS: dict[str, Any] = {"async_insert": 0}
+
+# Rows per CockroachDB UPSERT. Small multi-row statements keep each implicit
+# transaction short, which is what CockroachDB recommends for bulk writes.
+# Override via COCKROACHDB_INGEST_BATCH_SIZE; clamped so a statement stays
+# within the 32767 bind parameters asyncpg allows (12 per row: 2730 rows).
+COCKROACHDB_INGEST_BATCH_SIZE = 500
+COCKROACHDB_MAX_PARAMS = 32767
+# Concurrent batches; keep at or below the pool's max_size.
+COCKROACHDB_INGEST_PARALLELISM = 4
+# Attempts per batch on serialization conflicts (SQLSTATE 40001).
+COCKROACHDB_MAX_ATTEMPTS = 5
+COCKROACHDB_RETRY_BASE_DELAY = 0.1
+
 
 class PipelineEventInput(BaseModel):
     # Required pipeline tracking
@@ -54,282 +125,686 @@ class PipelineEventInput(BaseModel):
     )
 
 
+class PipelineEventsColumnarInput(BaseModel):
+    """Pre-chunked events; each chunk is inserted as one ClickHouse block."""
+
+    chunks: list[list[dict[str, Any]]] = Field(
+        default_factory=list,
+        description="Event chunks with the same fields as PipelineEventInput.",
+    )
+    blob_keys: list[str] = Field(
+        default_factory=list,
+        description="Chunks staged with stage_load_chunks; removed once inserted.",
+    )
+    load_id: str = Field(
+        default="",
+        description="Id of the load the inline chunks belong to; salts their event ids.",
+    )
+    first_row: int = Field(
+        default=0,
+        ge=0,
+        description="Row number in the load of the first inline event.",
+    )
+
+
+class StageLoadChunksInput(BaseModel):
+    """Records staged by the caller, to be split into ingest chunks."""
+
+    blob_key: str = Field(
+        ...,
+        description="Upload key (uploads/<workspace_id>/...) of a JSON array or JSON Lines file of records.",
+    )
+    workspace_id: str = Field(..., min_length=1)
+    agent_id: str
+    task_id: str | None = None
+    dataset_id: str
+    event_name: str
+    tags: list[str] = Field(default_factory=list)
+    chunk_indexes: list[int] | None = Field(
+        default=None,
+        description="Stage only these chunks (resume); the others are only counted.",
+    )
+    max_chunk_rows: int = Field(default=5_000, gt=0)
+    max_chunk_bytes: int = Field(default=1_000_000, gt=0)
+
+
+class StagedLoadChunk(BaseModel):
+    """One chunk of a staged load; blob_key is None when it was not selected."""
+
+    index: int
+    rows: int
+    blob_key: str | None = None
+
+
+class StagedLoadChunksOutput(BaseModel):
+    chunks: list[StagedLoadChunk]
+    total_rows: int
+
+
+class CockroachBatchStats(BaseModel):
+    """Throughput of one CockroachDB UPSERT batch."""
+
+    rows: int
+    attempts: int
+    execution_time_ms: int
+    rows_per_second: float
+
+
 class DataIngestionOutput(BaseModel):
     success: bool
     inserted_rows: int
     table_name: str = "pipeline_events"
     execution_time_ms: int = 0
+    insert_blocks: int = 0
+    rows_per_second: float = 0.0
+    batch_stats: list[CockroachBatchStats] = Field(
+        default_factory=list
+    )
     error: str | None = None
 
 
-def _process_event_uuids(
-    event: PipelineEventInput, event_index: int
-) -> tuple[str, str | None, str]:
-    """Process and validate UUIDs for an event."""
-    try:
-        logger.debug("Processing UUIDs for event %d", event_index)
-        logger.debug(
-            "agent_id: %s (type: %s)",
-            event.agent_id,
-            type(event.agent_id),
-        )
-        logger.debug(
-            "task_id: %s (type: %s)",
-            event.task_id,
-            type(event.task_id),
-        )
-        logger.debug(
-            "workspace_id: %s (type: %s)",
-            event.workspace_id,
-            type(event.workspace_id),
+def _ingest_block_size() -> int:
+    """Rows per insert block."""
+    return int(
+        os.environ.get(
+            "CLICKHOUSE_INGEST_BLOCK_SIZE", INGEST_BLOCK_SIZE
         )
+    )
 
-        # Simple UUID conversion - assuming all UUIDs are properly formatted at source
-        agent_uuid = (
-            str(uuid.UUID(event.agent_id))
-            if event.agent_id
-            else None
-        )
-        task_uuid = (
-            str(uuid.UUID(event.task_id))
-            if event.task_id
-            else None
-        )
-        workspace_uuid = (
-            str(uuid.UUID(event.workspace_id))
-            if event.workspace_id
-            else None
-        )
 
-        logger.debug(
-            "Converted UUIDs - agent: %s, task: %s, workspace: %s",
-            agent_uuid,
-            task_uuid,
-            workspace_uuid,
+def _chunked(
+    events: Sequence[Any], size: int
+) -> Iterator[Sequence[Any]]:
+    """Split events into insert blocks of at most size rows."""
+    for start in range(0, len(events), size):
+        yield events[start : start + size]
+
+
+def _uuid_column(
+    values: list[Any], column: str, *, nullable: bool
+) -> list[str | None]:
+    """Validate a UUID column once per distinct value and return canonical strings."""
+    canonical: dict[Any, str | None] = {}
+    for value in set(values):
+        if not value:
+            if not nullable:
+                msg = f"{column} is required for every event"
+                raise ValueError(msg)
+            canonical[value] = None
+            continue
+        try:
+            canonical[value] = str(uuid.UUID(str(value)))
+        except ValueError as ve:
+            msg = (
+                f"Invalid UUID format in {column}='{value}': {ve}"
+            )
+            raise ValueError(msg) from ve
+    return [canonical[value] for value in values]
+
+
+def _timestamp_column(
+    values: list[str | None], now: datetime
+) -> list[datetime]:
+    """Parse ISO timestamps once per distinct value; missing values use now."""
+    parsed: dict[str | None, datetime] = {}
+    for value in set(values):
+        if not value:
+            parsed[value] = now
+            continue
+        dt = datetime.fromisoformat(value.rstrip("Z"))
+        parsed[value] = (
+            dt if dt.tzinfo else dt.replace(tzinfo=UTC)
         )
-    except ValueError as ve:
-        msg = f"Invalid UUID format in agent_id='{event.agent_id}', task_id='{event.task_id}', workspace_id='{event.workspace_id}': {ve}"
-        logger.exception("UUID conversion error: %s", msg)
-        raise Exception(msg) from ve
-    except (TypeError, ConnectionError) as e:
-        msg = f"Unexpected error processing UUIDs for event {event_index}: {type(e).__name__}: {e}"
-        logger.exception("Unexpected UUID error: %s", msg)
-        raise Exception(msg) from e
-    else:
-        return agent_uuid, task_uuid, workspace_uuid
-
-
-def _create_event_row(
-    event: PipelineEventInput,
-    agent_uuid: str,
-    task_uuid: str | None,
-    workspace_uuid: str,
-    event_ts: datetime,
-) -> dict:
-    """Create a data row for ClickHouse insertion."""
-    return {
-        "id": str(uuid.uuid4()),
-        "agent_id": agent_uuid,
-        "task_id": task_uuid,
-        "workspace_id": workspace_uuid,
-        "dataset_id": event.dataset_id,
-        "event_name": event.event_name,
-        "raw_data": event.raw_data,
-        "transformed_data": event.transformed_data,
-        "tags": event.tags or [],
-        "embedding": event.embedding or [],
-        "event_timestamp": event_ts,
-        "ingested_at": datetime.now(tz=UTC),
-    }
-
-
-async def _insert_data_to_clickhouse(
-    client: clickhouse_connect.driver.AsyncClient,
-    data_rows: list[dict],
-) -> None:
-    """Insert data rows to ClickHouse with proper error handling."""
-    try:
-        column_names = [
-            "id",
+    return [parsed[value] for value in values]
+
+
+def _build_event_columns(
+    events: Sequence[Any],
+    salt: str = "",
+    first_row: int = 0,
+) -> list[list[Any]]:
+    """Build pipeline_events column arrays (PIPELINE_EVENTS_COLUMNS order).
+
+    Accepts PipelineEventInput models or plain dicts with the same fields.
+    Checks run per column rather than per row. Ids are deterministic (see
+    src.utils.event_ids; dicts may carry one already in "id", and salt and
+    first_row place the events in a larger load) so retried inserts write
+    the same rows; events given the same "id" within the batch are written
+    once.
+    """
+    rows = [
+        event if isinstance(event, dict) else dict(event)
+        for event in events
+    ]
+    now = datetime.now(tz=UTC)
+
+    if not all(
+        isinstance(row.get("raw_data") or {}, dict)
+        for row in rows
+    ):
+        msg = "raw_data must be a JSON object for every event"
+        raise TypeError(msg)
+    rows_by_id: dict[str, dict[str, Any]] = {}
+    for row_id, row in zip(
+        event_ids(rows, salt, first_row), rows, strict=True
+    ):
+        rows_by_id.setdefault(row_id, row)
+    ids = list(rows_by_id)
+    rows = list(rows_by_id.values())
+
+    event_names = [row.get("event_name") for row in rows]
+    if not all(event_names):
+        msg = "event_name is required for every event"
+        raise ValueError(msg)
+
+    return [
+        ids,
+        _uuid_column(
+            [row.get("agent_id") for row in rows],
             "agent_id",
+            nullable=False,
+        ),
+        _uuid_column(
+            [row.get("task_id") for row in rows],
             "task_id",
+            nullable=True,
+        ),
+        _uuid_column(
+            [row.get("workspace_id") for row in rows],
             "workspace_id",
-            "dataset_id",
-            "event_name",
-            "raw_data",
-            "transformed_data",
-            "tags",
-            "embedding",
-            "event_timestamp",
-            "ingested_at",
-        ]
+            nullable=False,
+        ),
+        [row.get("dataset_id") for row in rows],
+        event_names,
+        [row.get("raw_data") or {} for row in rows],
+        [row.get("transformed_data") for row in rows],
+        [row.get("tags") or [] for row in rows],
+        [row.get("embedding") or [] for row in rows],
+        _timestamp_column(
+            [row.get("event_timestamp") for row in rows], now
+        ),
+        [now] * len(rows),
+    ]
 
-        # Convert dictionary rows to list of lists format expected by ClickHouse
-        formatted_rows = []
-        for row in data_rows:
-            formatted_row = [row[col] for col in column_names]
-            formatted_rows.append(formatted_row)
 
+def insert_dedup_salt() -> str:
+    """Identity of the calling activity run; stable across its retries.
+
+    Empty outside an activity, where tokens fall back to the ids alone.
+    """
+    try:
+        info = function_info()
+    except RuntimeError:
+        return ""
+    return f"{info.workflow_run_id}/{info.activity_id}"
+
+
+def _file_chunk_rows(
+    columns: list[list[Any]], column_names: list[str]
+) -> list[list[Any]]:
+    """dataset_file_chunks rows for a block: its chunks per file source."""
+    by_name = dict(zip(column_names, columns, strict=True))
+    files: dict[tuple[Any, str, str], list[Any]] = {}
+    for (
+        workspace_id,
+        dataset_id,
+        task_id,
+        raw_data,
+        ingested_at,
+    ) in zip(
+        by_name["workspace_id"],
+        by_name["dataset_id"],
+        by_name["task_id"],
+        by_name["raw_data"],
+        by_name["ingested_at"],
+        strict=True,
+    ):
+        source = (raw_data or {}).get("source")
+        if source is None or source == "":
+            continue
+        key = (workspace_id, dataset_id or "", str(source))
+        text = raw_data.get("text")
+        size = len(text) if isinstance(text, str) else 0
+        row = files.get(key)
+        if row is None:
+            files[key] = [*key, task_id, 1, size, ingested_at]
+        else:
+            row[4] += 1
+            row[5] += size
+            row[6] = max(row[6], ingested_at)
+    return list(files.values())
+
+
+async def _insert_columns_to_clickhouse(
+    client: clickhouse_connect.driver.AsyncClient,
+    columns: list[list[Any]],
+    column_names: list[str] = PIPELINE_EVENTS_COLUMNS,
+) -> None:
+    """Insert one column-oriented block (Native format) into pipeline_events.
+
+    Chunks that name a file (raw_data.source) are also counted per file in
+    dataset_file_chunks, which list_dataset_files reads. Both inserts carry
+    the block's deduplication token, so a retried block counts once.
+    """
+    settings = {
+        **CLICKHOUSE_INSERT_SETTINGS,
+        "insert_deduplication_token": dedup_token(
+            [insert_dedup_salt(), *columns[0]]
+        ),
+    }
+    try:
         await client.insert(
             "pipeline_events",
-            formatted_rows,
+            columns,
             column_names=column_names,
+            column_oriented=True,
+            settings=settings,
         )
-        logger.info(
-            "Successfully inserted %d rows", len(formatted_rows)
-        )
-    except Exception as insert_error:
+        file_rows = _file_chunk_rows(columns, column_names)
+        if file_rows:
+            await client.insert(
+                "dataset_file_chunks",
+                file_rows,
+                column_names=DATASET_FILE_CHUNKS_COLUMNS,
+                settings=settings,
+            )
+    except Exception:
         logger.exception("ClickHouse insert failed")
-        logger.debug(
-            "Insert error args: %s",
-            getattr(insert_error, "args", "No args"),
-        )
         raise
 
 
+async def _ingest_event_blocks(
+    blocks: Iterable[Sequence[Any]],
+    salt: str = "",
+    first_row: int = 0,
+) -> DataIngestionOutput:
+    """Insert each block in turn on the shared client and report throughput.
+
+    Blocks are consecutive rows of one load starting at first_row (see
+    _build_event_columns). Blocks inserted before a failing one stay
+    committed, so the error output counts them rather than reporting
+    the whole load as lost.
+    """
+    client = await get_clickhouse_shared_client()
+    start_time = time.perf_counter()
+    inserted_rows = 0
+    insert_blocks = 0
+    row = first_row
+
+    try:
+        for block in blocks:
+            if not block:
+                continue
+            columns = _build_event_columns(block, salt, row)
+            row += len(block)
+            await _insert_columns_to_clickhouse(client, columns)
+            inserted_rows += len(columns[0])
+            insert_blocks += 1
+            heartbeat(f"ingested {inserted_rows} rows")
+    except (ValueError, TypeError, ConnectionError, OSError) as e:
+        logger.exception(
+            "Ingestion failed after %d rows in %d blocks",
+            inserted_rows,
+            insert_blocks,
+        )
+        return _ingestion_error_output(
+            e,
+            inserted_rows=inserted_rows,
+            insert_blocks=insert_blocks,
+            execution_time_ms=int(
+                (time.perf_counter() - start_time) * 1000
+            ),
+        )
+
+    elapsed = time.perf_counter() - start_time
+    rows_per_second = (
+        inserted_rows / elapsed if elapsed > 0 else 0.0
+    )
+    logger.info(
+        "Inserted %d rows in %d blocks (%.0f rows/s)",
+        inserted_rows,
+        insert_blocks,
+        rows_per_second,
+    )
+    return DataIngestionOutput(
+        success=True,
+        inserted_rows=inserted_rows,
+        table_name="pipeline_events",
+        execution_time_ms=int(elapsed * 1000),
+        insert_blocks=insert_blocks,
+        rows_per_second=round(rows_per_second, 1),
+    )
+
+
+def _ingestion_error_output(
+    e: Exception,
+    *,
+    inserted_rows: int = 0,
+    insert_blocks: int = 0,
+    execution_time_ms: int = 0,
+) -> DataIngestionOutput:
+    """Failure output with the error type and any driver error code.
+
+    inserted_rows and insert_blocks count what was committed before the
+    failure.
+    """
+    error_msg = f"{type(e).__name__}: {e!s}"
+    if hasattr(e, "code"):
+        error_msg += f" (Code: {e.code})"
+    return DataIngestionOutput(
+        success=False,
+        inserted_rows=inserted_rows,
+        table_name="pipeline_events",
+        execution_time_ms=execution_time_ms,
+        insert_blocks=insert_blocks,
+        error=error_msg,
+    )
+
+
 @function.defn()
 async def ingest_pipeline_events(
     events: list[PipelineEventInput],
 ) -> DataIngestionOutput:
     """Ingest ANY type of event from pipeline agents with vector embeddings for semantic search."""
     try:
-        # Normalize to PipelineEventInput (e.g. when received as dicts from workflows)
-        events = [
-            PipelineEventInput(
-                **(e if isinstance(e, dict) else e.model_dump())
-            )
-            for e in events
-        ]
-        logger.debug(
-            "ingest_pipeline_events called with %d events",
-            len(events),
-        )
-        logger.debug(
-            "First event type: %s",
-            type(events[0]) if events else "No events",
+        return await _ingest_event_blocks(
+            _chunked(events, _ingest_block_size())
         )
+    except (ValueError, TypeError, ConnectionError) as e:
+        logger.exception("Exception in ingest_pipeline_events")
+        return _ingestion_error_output(e)
 
-        client = await get_clickhouse_async_client()
-        start_time = datetime.now(tz=UTC)
 
-        data_rows = []
-        for i, event in enumerate(events):
-            logger.debug(
-                "Processing event %d: %s", i, type(event)
-            )
-            logger.debug("Event data: %s", event)
+def _load_staged_chunks(
+    blob_keys: list[str],
+) -> Iterator[list[dict[str, Any]]]:
+    """Read staged chunks one at a time so only one is held in memory."""
+    store = get_blob_store()
+    for key in blob_keys:
+        yield json.loads(store.get_bytes(key))
 
-            # Process timestamp - parse ISO format or use current time
-            if event.event_timestamp:
-                dt = datetime.fromisoformat(
-                    event.event_timestamp.rstrip("Z")
-                )
-                event_ts = (
-                    dt if dt.tzinfo else dt.replace(tzinfo=UTC)
-                )
-            else:
-                event_ts = datetime.now(tz=UTC)
 
-            agent_uuid, task_uuid, workspace_uuid = (
-                _process_event_uuids(event, i)
+def _read_staged_records(blob_key: str) -> list[Any]:
+    """Records of a JSON array or JSON Lines blob."""
+    data = get_blob_store().get_bytes(blob_key)
+    try:
+        records = json.loads(data)
+    except json.JSONDecodeError:
+        records = [
+            json.loads(line)
+            for line in data.splitlines()
+            if line.strip()
+        ]
+    if not isinstance(records, list):
+        records = [records]
+    for index, record in enumerate(records):
+        if not isinstance(record, dict):
+            msg = f"Record {index} is {type(record).__name__}, expected an object"
+            raise TypeError(msg)
+    return records
+
+
+def _stage_load_chunks(
+    function_input: StageLoadChunksInput,
+) -> StagedLoadChunksOutput:
+    """Split the records like LoadIntoDataset's inline chunks and stage the selected ones."""
+    records = _read_staged_records(function_input.blob_key)
+    store = get_blob_store()
+    # Ids are fixed here, numbered by row in the upload: equal records in
+    # different chunks stay apart, and a resumed load re-stages the same ids.
+    rows = itertools.count()
+    # One prefix per staging run: identical chunks, in one load or in
+    # concurrent ones, never share a key that the first insert deletes. A
+    # retried run writes the same keys again.
+    run = insert_dedup_salt() or uuid.uuid4().hex
+    prefix = f"{STAGED_LOAD_PREFIX}/{function_input.workspace_id}/{run}"
+    selected = (
+        None
+        if function_input.chunk_indexes is None
+        else set(function_input.chunk_indexes)
+    )
+    chunks: list[StagedLoadChunk] = []
+    current: list[dict[str, Any]] = []
+    current_bytes = 0
+
+    def flush() -> None:
+        index = len(chunks)
+        blob_key = None
+        if selected is None or index in selected:
+            blob_key = store.put_stream(
+                io.BytesIO(
+                    json.dumps(current, default=str).encode()
+                ),
+                prefix=prefix,
+                suffix=f"-{index}.json",
             )
-            row = _create_event_row(
-                event,
-                agent_uuid,
-                task_uuid,
-                workspace_uuid,
-                event_ts,
+        chunks.append(
+            StagedLoadChunk(
+                index=index, rows=len(current), blob_key=blob_key
             )
-            logger.debug("Created row %d: %s", i, row)
-            data_rows.append(row)
-
-        logger.debug(
-            "About to insert %d rows into ClickHouse",
-            len(data_rows),
         )
-        logger.debug(
-            "Sample row structure: %s",
-            data_rows[0] if data_rows else "No rows",
+
+    for record in records:
+        event = {
+            "agent_id": function_input.agent_id,
+            "task_id": function_input.task_id,
+            "workspace_id": function_input.workspace_id,
+            "dataset_id": function_input.dataset_id,
+            "event_name": function_input.event_name,
+            "raw_data": record,
+            "tags": function_input.tags,
+        }
+        event["id"] = event_id(
+            event, next(rows), function_input.blob_key
         )
+        size = len(json.dumps(record, default=str)) + 256
+        if current and (
+            len(current) >= function_input.max_chunk_rows
+            or current_bytes + size
+            > function_input.max_chunk_bytes
+        ):
+            flush()
+            current, current_bytes = [], 0
+        current.append(event)
+        current_bytes += size
+    if current:
+        flush()
+    return StagedLoadChunksOutput(
+        chunks=chunks, total_rows=len(records)
+    )
 
-        await _insert_data_to_clickhouse(client, data_rows)
 
-        execution_time = int(
-            (datetime.now(tz=UTC) - start_time).total_seconds()
-            * 1000
-        )
+@function.defn()
+async def stage_load_chunks(
+    function_input: StageLoadChunksInput,
+) -> StagedLoadChunksOutput:
+    """Split caller-staged records into chunk blobs; workflows pass only keys.
+
+    The records never enter workflow history: the caller uploads them and
+    passes the key, and each chunk is ingested by its own key. The upload
+    itself is kept for retries and expires with other uploads.
+    """
+    if not function_input.blob_key.startswith(
+        f"uploads/{function_input.workspace_id}/"
+    ):
+        msg = "blob_key is not an upload of this workspace"
+        raise NonRetryableError(msg)
+    return await asyncio.to_thread(
+        _stage_load_chunks, function_input
+    )
 
-        return DataIngestionOutput(
-            success=True,
-            inserted_rows=len(data_rows),
-            table_name="pipeline_events",
-            execution_time_ms=execution_time,
+
+@function.defn()
+async def ingest_pipeline_events_columnar(
+    function_input: PipelineEventsColumnarInput,
+) -> DataIngestionOutput:
+    """Ingest pre-chunked events into ClickHouse, one insert block per chunk.
+
+    Inline chunks are inserted first, then staged chunks. Staged blobs are
+    deleted only after a successful insert so a failed step can be retried.
+    """
+    try:
+        output = await _ingest_event_blocks(
+            itertools.chain(
+                function_input.chunks,
+                _load_staged_chunks(function_input.blob_keys),
+            ),
+            function_input.load_id,
+            function_input.first_row,
+        )
+    except (ValueError, TypeError, ConnectionError, OSError) as e:
+        logger.exception(
+            "Exception in ingest_pipeline_events_columnar"
         )
+        return _ingestion_error_output(e)
+    if not output.success:
+        return output
+    store = get_blob_store()
+    for key in function_input.blob_keys:
+        await asyncio.to_thread(store.delete, key)
+    return output
+
+
+def _cockroachdb_batch_size() -> int:
+    """Rows per CockroachDB UPSERT statement, within the parameter limit."""
+    size = int(
+        os.environ.get(
+            "COCKROACHDB_INGEST_BATCH_SIZE",
+            COCKROACHDB_INGEST_BATCH_SIZE,
+        )
+    )
+    max_rows = COCKROACHDB_MAX_PARAMS // len(
+        PIPELINE_EVENTS_COLUMNS
+    )
+    return min(max(size, 1), max_rows)
 
-    except (ValueError, TypeError, ConnectionError) as e:
-        # Get more detailed error information
-        logger.exception("Exception in ingest_pipeline_events")
-        logger.debug(
-            "Exception args: %s", getattr(e, "args", "No args")
+
+def _cockroachdb_parallelism() -> int:
+    """Batches in flight at once, each on its own pool connection."""
+    return int(
+        os.environ.get(
+            "COCKROACHDB_INGEST_PARALLELISM",
+            COCKROACHDB_INGEST_PARALLELISM,
         )
+    )
 
-        error_msg = f"{type(e).__name__}: {e!s}"
-        if hasattr(e, "code"):
-            error_msg += f" (Code: {e.code})"
-        if hasattr(e, "args") and e.args:
-            error_msg += f" (Args: {e.args})"
 
-        return DataIngestionOutput(
-            success=False,
-            inserted_rows=0,
-            table_name="pipeline_events",
-            execution_time_ms=0,
-            error=error_msg,
+def _build_cockroachdb_upsert(row_count: int) -> str:
+    """Multi-row UPSERT with one placeholder group per row."""
+    width = len(PIPELINE_EVENTS_COLUMNS)
+    values = ",\n".join(
+        "("
+        + ", ".join(
+            f"${row * width + col + 1}" for col in range(width)
         )
+        + ")"
+        for row in range(row_count)
+    )
+    return (
+        "UPSERT INTO pipeline_events ("
+        + ", ".join(PIPELINE_EVENTS_COLUMNS)
+        + ") VALUES\n"
+        + values
+    )
 
 
-async def _insert_data_to_cockroachdb(
+def _cockroachdb_batch_args(
+    columns: list[list[Any]], start: int, stop: int
+) -> list[Any]:
+    """Flatten rows [start, stop) of the column arrays into statement args."""
+    json_columns = {
+        PIPELINE_EVENTS_COLUMNS.index("raw_data"),
+        PIPELINE_EVENTS_COLUMNS.index("transformed_data"),
+    }
+    args: list[Any] = []
+    for row in range(start, stop):
+        for col, values in enumerate(columns):
+            value = values[row]
+            if col in json_columns and value is not None:
+                value = json.dumps(value, default=str)
+            args.append(value)
+    return args
+
+
+async def _upsert_cockroachdb_batch(
     pool: asyncpg.Pool,
-    data_rows: list[dict],
-) -> None:
-    """Insert data rows into CockroachDB pipeline_events table."""
-    import json as _json
-
-    insert_sql = """
-        INSERT INTO pipeline_events
-            (id, agent_id, task_id, workspace_id, dataset_id,
-             event_name, raw_data, transformed_data, tags, embedding,
-             event_timestamp, ingested_at)
-        VALUES
-            ($1, $2, $3, $4, $5, $6, $7, $8, $9, $10, $11, $12)
+    semaphore: asyncio.Semaphore,
+    columns: list[list[Any]],
+    start: int,
+    stop: int,
+) -> CockroachBatchStats:
+    """Upsert one batch in its own implicit transaction, retrying on 40001.
+
+    Row ids are deterministic, so a retried batch or activity overwrites
+    instead of duplicating.
     """
+    async with semaphore:
+        sql = _build_cockroachdb_upsert(stop - start)
+        args = _cockroachdb_batch_args(columns, start, stop)
+        batch_start = time.perf_counter()
+        for attempt in range(1, COCKROACHDB_MAX_ATTEMPTS + 1):
+            try:
+                async with pool.acquire() as conn:
+                    await conn.execute(sql, *args)
+                break
+            except asyncpg.exceptions.SerializationError:
+                if attempt == COCKROACHDB_MAX_ATTEMPTS:
+                    raise
+                delay = COCKROACHDB_RETRY_BASE_DELAY * 2 ** (
+                    attempt - 1
+                )
+                logger.warning(
+                    "Serialization conflict on rows %d-%d (attempt %d), retrying in %.2fs",
+                    start,
+                    stop,
+                    attempt,
+                    delay,
+                )
+                await asyncio.sleep(
+                    delay * (1 + random.random())  # noqa: S311
+                )
+        elapsed = time.perf_counter() - batch_start
+
+    rows = stop - start
+    stats = CockroachBatchStats(
+        rows=rows,
+        attempts=attempt,
+        execution_time_ms=int(elapsed * 1000),
+        rows_per_second=round(
+            rows / elapsed if elapsed > 0 else 0.0, 1
+        ),
+    )
+    logger.info(
+        "Upserted CockroachDB batch of %d rows in %dms (%.0f rows/s, %d attempts)",
+        stats.rows,
+        stats.execution_time_ms,
+        stats.rows_per_second,
+        stats.attempts,
+    )
+    return stats
 
-    records = [
-        (
-            row["id"],
-            row["agent_id"],
-            row["task_id"],
-            row["workspace_id"],
-            row["dataset_id"],
-            row["event_name"],
-            _json.dumps(row["raw_data"]),
-            _json.dumps(row["transformed_data"])
-            if row["transformed_data"] is not None
-            else None,
-            row["tags"] or [],
-            row["embedding"] or [],
-            row["event_timestamp"],
-            row["ingested_at"],
-        )
-        for row in data_rows
-    ]
-
-    async with pool.acquire() as conn:
-        await conn.executemany(insert_sql, records)
 
-    logger.info(
-        "Successfully inserted %d rows into CockroachDB",
-        len(records),
+async def _insert_data_to_cockroachdb(
+    pool: asyncpg.Pool,
+    columns: list[list[Any]],
+) -> list[CockroachBatchStats]:
+    """Upsert column arrays into pipeline_events as parallel multi-row batches."""
+    row_count = len(columns[0]) if columns else 0
+    batch_size = _cockroachdb_batch_size()
+    semaphore = asyncio.Semaphore(_cockroachdb_parallelism())
+    return list(
+        await asyncio.gather(
+            *(
+                _upsert_cockroachdb_batch(
+                    pool,
+                    semaphore,
+                    columns,
+                    start,
+                    min(start + batch_size, row_count),
+                )
+                for start in range(0, row_count, batch_size)
+            )
+        )
     )
 
 
@@ -338,6 +813,13 @@ async def ingest_pipeline_events_cockroachdb(
     events: list[PipelineEventInput],
 ) -> DataIngestionOutput:
     """Ingest pipeline events into CockroachDB (used when dataset storage_type='cockroachdb')."""
+    return await _ingest_cockroachdb(events)
+
+
+async def _ingest_cockroachdb(
+    events: Sequence[Any], salt: str = "", first_row: int = 0
+) -> DataIngestionOutput:
+    """Upsert events into CockroachDB; salt and first_row as in _build_event_columns."""
     try:
         logger.debug(
             "ingest_pipeline_events_cockroachdb called with %d events",
@@ -345,65 +827,87 @@ async def ingest_pipeline_events_cockroachdb(
         )
 
         pool = await get_cockroachdb_pool()
-        start_time = datetime.now(tz=UTC)
-
-        data_rows = []
-        for i, event in enumerate(events):
-            if event.event_timestamp:
-                dt = datetime.fromisoformat(
-                    event.event_timestamp.rstrip("Z")
-                )
-                event_ts = (
-                    dt if dt.tzinfo else dt.replace(tzinfo=UTC)
-                )
-            else:
-                event_ts = datetime.now(tz=UTC)
-
-            agent_uuid, task_uuid, workspace_uuid = (
-                _process_event_uuids(event, i)
-            )
-            row = _create_event_row(
-                event,
-                agent_uuid,
-                task_uuid,
-                workspace_uuid,
-                event_ts,
-            )
-            data_rows.append(row)
+        start_time = time.perf_counter()
 
-        await _insert_data_to_cockroachdb(pool, data_rows)
+        columns = _build_event_columns(events, salt, first_row)
+        batch_stats = await _insert_data_to_cockroachdb(
+            pool, columns
+        )
 
-        execution_time = int(
-            (datetime.now(tz=UTC) - start_time).total_seconds()
-            * 1000
+        elapsed = time.perf_counter() - start_time
+        rows_per_second = (
+            len(columns[0]) / elapsed if elapsed > 0 else 0.0
+        )
+        logger.info(
+            "Inserted %d rows into CockroachDB in %d batches (%.0f rows/s)",
+            len(columns[0]),
+            len(batch_stats),
+            rows_per_second,
         )
 
         return DataIngestionOutput(
             success=True,
-            inserted_rows=len(data_rows),
+            inserted_rows=len(columns[0]),
             table_name="pipeline_events",
-            execution_time_ms=execution_time,
+            execution_time_ms=int(elapsed * 1000),
+            insert_blocks=len(batch_stats),
+            rows_per_second=round(rows_per_second, 1),
+            batch_stats=batch_stats,
         )
 
-    except (ValueError, TypeError, ConnectionError, OSError) as e:
+    except (
+        ValueError,
+        TypeError,
+        ConnectionError,
+        OSError,
+        asyncpg.PostgresError,
+    ) as e:
         logger.exception(
             "Exception in ingest_pipeline_events_cockroachdb"
         )
-        error_msg = f"{type(e).__name__}: {e!s}"
-        return DataIngestionOutput(
-            success=False,
-            inserted_rows=0,
-            table_name="pipeline_events",
-            execution_time_ms=0,
-            error=error_msg,
-        )
+        return _ingestion_error_output(e)
+
+
+@function.defn()
+async def ingest_staged_pipeline_events_cockroachdb(
+    function_input: PipelineEventsColumnarInput,
+) -> DataIngestionOutput:
+    """CockroachDB counterpart of ingest_pipeline_events_columnar.
+
+    Takes inline chunks of a load (numbered from first_row) or staged chunks.
+    """
+    store = get_blob_store()
+    events: list[dict[str, Any]] = list(
+        itertools.chain.from_iterable(function_input.chunks)
+    )
+    try:
+        for key in function_input.blob_keys:
+            events.extend(
+                json.loads(
+                    await asyncio.to_thread(store.get_bytes, key)
+                )
+            )
+    except (ValueError, OSError) as e:
+        return _ingestion_error_output(e)
+    output = await _ingest_cockroachdb(
+        events, function_input.load_id, function_input.first_row
+    )
+    if output.success:
+        for key in function_input.blob_keys:
+            await asyncio.to_thread(store.delete, key)
+    return output
 
 
 @function.defn()
 async def query_clickhouse_data(query: str) -> dict[str, Any]:
-    """Execute a query against ClickHouse and return results."""
+    """Execute a query against ClickHouse and return results.
+
+    raw_data paths are recorded for promotion and rewritten to promoted
+    columns where available.
+    """
     try:
         client = await get_clickhouse_async_client()
+        query = await prepare_raw_data_query(client, query)
         start_time = datetime.now(tz=UTC)
 
         # Execute query
@@ -0,0 +1,333 @@
+"""Re-embed a dataset into another model (ReembedDatasetWorkflow steps).
+
+A dataset's vectors all come from storage_config.embedding.model, and reads
+(semantic search) are pinned to it. Switching models:
+
+1. start_dataset_reembed records reembed.target_model; reads stay on the
+   current model.
+2. reembed_dataset_batch re-embeds the next batch of the dataset's chunks
+   (keyset on (ingested_at, id), so files added meanwhile are picked up) with
+   the target model and writes them to pipeline_event_embeddings; the cursor
+   is saved after each batch, so a restarted workflow resumes there.
+   ingested_at is set when a row is built, so buffered inserts can commit
+   behind the cursor; a missing_only pass (chunks with no target vector yet)
+   picks those up before the switch.
+3. complete_dataset_reembed makes the target the dataset's model: new files
+   are embedded with it and searches read it.
+
+Batches run on the file queue (TASK_QUEUE_EMBED) through a bulk embedder,
+not the query micro-batcher. Only allowed models can be targets.
+
+pipeline_events rows keep their original vectors; nothing is copied or
+rewritten there, so compiled views and stats are unaffected.
+
+Env: REEMBED_BATCH_SIZE, REEMBED_ROWS_PER_SECOND (workflow defaults).
+"""
+
+import logging
+import os
+from typing import Any
+
+from pydantic import BaseModel, Field
+from restack_ai.function import function
+
+from src.database.connection import get_clickhouse_async_client
+from src.functions.datasets_crud import (
+    DatasetEmbeddingConfig,
+    DatasetReembedState,
+    get_dataset_embedding_config,
+    save_dataset_embedding_config,
+)
+from src.functions.embed_model_loader import check_embed_model
+from src.functions.embed_texts import get_text_embedder
+from src.functions.embed_worker_pool import EmbedWorkerError
+from src.utils.event_ids import dedup_token
+
+logger = logging.getLogger(__name__)
+
+REEMBED_BATCH_SIZE = int(os.getenv("REEMBED_BATCH_SIZE", "500"))
+REEMBED_ROWS_PER_SECOND = float(
+    os.getenv("REEMBED_ROWS_PER_SECOND", "200")
+)
+PIPELINE_EVENT_EMBEDDINGS_COLUMNS = [
+    "workspace_id",
+    "dataset_id",
+    "embedding_model",
+    "id",
+    "source",
+    "embedding",
+]
+# Cursor start: before any row
+_CURSOR_START = (
+    "1970-01-01 00:00:00.000",
+    "00000000-0000-0000-0000-000000000000",
+)
+
+
+class ReembedDatasetInput(BaseModel):
+    workspace_id: str = Field(..., min_length=1)
+    dataset_id: str = Field(..., min_length=1)
+    target_model: str = Field(..., min_length=1)
+    batch_size: int = Field(
+        default=REEMBED_BATCH_SIZE, ge=1, le=5000
+    )
+    rows_per_second: float = Field(
+        default=REEMBED_ROWS_PER_SECOND,
+        gt=0,
+        description="Upper bound on chunks re-embedded per second.",
+    )
+
+
+class ReembedDatasetStateOutput(BaseModel):
+    success: bool
+    config: DatasetEmbeddingConfig | None = None
+    error: str | None = None
+
+
+class ReembedBatchInput(BaseModel):
+    workspace_id: str = Field(..., min_length=1)
+    dataset_id: str = Field(..., min_length=1)
+    source_model: str = Field(..., min_length=1)
+    target_model: str = Field(..., min_length=1)
+    after_ingested_at: str | None = None
+    after_id: str | None = None
+    batch_size: int = Field(
+        default=REEMBED_BATCH_SIZE, ge=1, le=5000
+    )
+    save_cursor: bool = Field(
+        default=True,
+        description="Record progress in storage_config.embedding.reembed.",
+    )
+    missing_only: bool = Field(
+        default=False,
+        description="Ignore the cursor; take chunks with no target_model vector yet.",
+    )
+
+
+class ReembedBatchOutput(BaseModel):
+    success: bool
+    scanned: int = 0
+    embedded: int = 0
+    after_ingested_at: str | None = None
+    after_id: str | None = None
+    error: str | None = None
+
+
+@function.defn()
+async def start_dataset_reembed(
+    function_input: ReembedDatasetInput,
+) -> ReembedDatasetStateOutput:
+    """Record the target model (or return the re-embed already in progress)."""
+    try:
+        check_embed_model(function_input.target_model)
+        config = await get_dataset_embedding_config(
+            function_input.workspace_id, function_input.dataset_id
+        )
+        if config.model == function_input.target_model:
+            return ReembedDatasetStateOutput(
+                success=True, config=config
+            )
+        if config.reembed is not None:
+            if (
+                config.reembed.target_model
+                != function_input.target_model
+            ):
+                return ReembedDatasetStateOutput(
+                    success=False,
+                    config=config,
+                    error=f"Dataset is already being re-embedded into {config.reembed.target_model}",
+                )
+            return ReembedDatasetStateOutput(
+                success=True, config=config
+            )
+        config.reembed = DatasetReembedState(
+            target_model=function_input.target_model
+        )
+        await save_dataset_embedding_config(
+            function_input.workspace_id,
+            function_input.dataset_id,
+            config,
+        )
+    except (ValueError, TypeError, ConnectionError) as e:
+        logger.exception("start_dataset_reembed failed")
+        return ReembedDatasetStateOutput(
+            success=False, error=str(e)
+        )
+    return ReembedDatasetStateOutput(success=True, config=config)
+
+
+@function.defn()
+async def complete_dataset_reembed(
+    function_input: ReembedDatasetInput,
+) -> ReembedDatasetStateOutput:
+    """Switch the dataset (new files and reads) to the target model."""
+    try:
+        config = DatasetEmbeddingConfig(
+            model=function_input.target_model
+        )
+        await save_dataset_embedding_config(
+            function_input.workspace_id,
+            function_input.dataset_id,
+            config,
+        )
+    except (ValueError, TypeError, ConnectionError) as e:
+        logger.exception("complete_dataset_reembed failed")
+        return ReembedDatasetStateOutput(
+            success=False, error=str(e)
+        )
+    return ReembedDatasetStateOutput(success=True, config=config)
+
+
+_MISSING_ROWS_QUERY = """
+    SELECT
+        toString(id),
+        ifNull(toString(raw_data.text), ''),
+        source,
+        toString(ingested_at)
+    FROM pipeline_events
+    WHERE workspace_id = {workspace_id:UUID}
+      AND dataset_id = {dataset_id:String}
+      AND embedding_model = {source_model:String}
+      AND notEmpty(trimBoth(ifNull(toString(raw_data.text), '')))
+      AND id NOT IN (
+          SELECT id FROM pipeline_event_embeddings
+          WHERE workspace_id = {workspace_id:UUID}
+            AND dataset_id = {dataset_id:String}
+            AND embedding_model = {target_model:String}
+      )
+    ORDER BY id
+    LIMIT {batch_size:UInt32}
+"""
+
+
+async def _next_rows(
+    client: Any, function_input: ReembedBatchInput
+) -> list[tuple[Any, ...]]:
+    """(id, text, source, ingested_at) of the next batch after the cursor."""
+    if function_input.missing_only:
+        result = await client.query(
+            _MISSING_ROWS_QUERY,
+            parameters={
+                "workspace_id": function_input.workspace_id,
+                "dataset_id": function_input.dataset_id,
+                "source_model": function_input.source_model,
+                "target_model": function_input.target_model,
+                "batch_size": function_input.batch_size,
+            },
+        )
+        return list(result.result_rows)
+    result = await client.query(
+        """
+        SELECT
+            toString(id),
+            ifNull(toString(raw_data.text), ''),
+            source,
+            toString(ingested_at)
+        FROM pipeline_events
+        WHERE workspace_id = {workspace_id:UUID}
+          AND dataset_id = {dataset_id:String}
+          AND embedding_model = {source_model:String}
+          AND (ingested_at, id) > (
+              {after_ingested_at:DateTime64(3)}, {after_id:UUID}
+          )
+        ORDER BY ingested_at, id
+        LIMIT {batch_size:UInt32}
+        """,
+        parameters={
+            "workspace_id": function_input.workspace_id,
+            "dataset_id": function_input.dataset_id,
+            "source_model": function_input.source_model,
+            "after_ingested_at": function_input.after_ingested_at
+            or _CURSOR_START[0],
+            "after_id": function_input.after_id
+            or _CURSOR_START[1],
+            "batch_size": function_input.batch_size,
+        },
+    )
+    return list(result.result_rows)
+
+
+async def _save_cursor(
+    function_input: ReembedBatchInput, output: ReembedBatchOutput
+) -> None:
+    config = await get_dataset_embedding_config(
+        function_input.workspace_id, function_input.dataset_id
+    )
+    state = config.reembed
+    if (
+        state is None
+        or state.target_model != function_input.target_model
+    ):
+        return
+    state.after_ingested_at = output.after_ingested_at
+    state.after_id = output.after_id
+    state.rows_done += output.embedded
+    await save_dataset_embedding_config(
+        function_input.workspace_id,
+        function_input.dataset_id,
+        config,
+    )
+
+
+@function.defn()
+async def reembed_dataset_batch(
+    function_input: ReembedBatchInput,
+) -> ReembedBatchOutput:
+    """Re-embed the next batch of chunks into pipeline_event_embeddings."""
+    try:
+        client = await get_clickhouse_async_client()
+        rows = await _next_rows(client, function_input)
+        if not rows:
+            return ReembedBatchOutput(
+                success=True,
+                after_ingested_at=function_input.after_ingested_at,
+                after_id=function_input.after_id,
+            )
+        texts = [row for row in rows if row[1].strip()]
+        if texts:
+            embeddings = await get_text_embedder(
+                function_input.target_model, bulk=True
+            ).embed_batch([row[1] for row in texts])
+            ids = [row[0] for row in texts]
+            await client.insert(
+                table="pipeline_event_embeddings",
+                data=[
+                    [
+                        function_input.workspace_id,
+                        function_input.dataset_id,
+                        function_input.target_model,
+                        row[0],
+                        row[2],
+                        embedding,
+                    ]
+                    for row, embedding in zip(
+                        texts, embeddings, strict=True
+                    )
+                ],
+                column_names=PIPELINE_EVENT_EMBEDDINGS_COLUMNS,
+                settings={
+                    # A retried batch writes the same block
+                    "insert_deduplication_token": dedup_token(
+                        [function_input.target_model, *ids]
+                    ),
+                },
+            )
+        output = ReembedBatchOutput(
+            success=True,
+            scanned=len(rows),
+            embedded=len(texts),
+            after_ingested_at=rows[-1][3],
+            after_id=rows[-1][0],
+        )
+        if function_input.save_cursor:
+            await _save_cursor(function_input, output)
+    except (
+        EmbedWorkerError,
+        ValueError,
+        TypeError,
+        ConnectionError,
+        OSError,
+    ) as e:
+        logger.exception("reembed_dataset_batch failed")
+        return ReembedBatchOutput(success=False, error=str(e))
+    return output
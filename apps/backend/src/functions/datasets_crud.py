@@ -1,23 +1,86 @@
 """Storage-agnostic datasets CRUD that works with PostgreSQL datasets table."""
 
+import asyncio
+import base64
+import contextlib
+import hashlib
+import io
+import os
+import re
+import tempfile
+import time
+import uuid
 from datetime import UTC, datetime
-from typing import Any
-
-from pydantic import BaseModel, Field
-from restack_ai.function import NonRetryableError, function
+from pathlib import Path
+from typing import IO, Any, Literal
+
+from anyio import Path as AnyioPath
+from pydantic import BaseModel, Field, ValidationError
+from restack_ai.function import (
+    NonRetryableError,
+    function,
+    heartbeat,
+)
 from sqlalchemy import text
+from sqlalchemy.exc import DataError
 from sqlalchemy.ext.asyncio import AsyncSession
 
 # Import the centralized database connections
 from src.database.connection import (
     get_async_db,
     get_clickhouse_async_client,
+    get_clickhouse_shared_client,
     get_cockroachdb_pool,
 )
+from src.functions.embed_model_loader import DEFAULT_MODEL_ID
+from src.utils.blob_store import get_blob_store
 
 # Max length for file source identifiers (raw_data.source); must match DB/API limits.
 MAX_SOURCE_LENGTH = 500
 
+# ClickHouse output format and file extension per export format
+EXPORT_FORMATS = {
+    "parquet": ("Parquet", "parquet"),
+    "arrow": ("ArrowStream", "arrow"),
+    "ndjson": ("JSONEachRow", "ndjson"),
+}
+# Bytes copied from the ClickHouse response to disk per read
+EXPORT_READ_CHUNK_BYTES = 1 << 20
+EXPORT_HEARTBEAT_INTERVAL_SECONDS = 30
+
+DATASET_FILES_COLUMNS = [
+    "workspace_id",
+    "dataset_id",
+    "source",
+    "task_id",
+    "chunk_count",
+    "size_bytes",
+    "content_hash",
+    "embed_model",
+    "ingested_at",
+    "is_deleted",
+]
+
+# Escapes ClickHouse applies when it formats a String literal
+_LITERAL_ESCAPES = str.maketrans(
+    {
+        "\\": "\\\\",
+        "'": "\\'",
+        "\b": "\\b",
+        "\f": "\\f",
+        "\n": "\\n",
+        "\r": "\\r",
+        "\t": "\\t",
+        "\0": "\\0",
+    }
+)
+
+# Seconds a name -> dataset resolution stays cached in-process. Writes in this
+# process invalidate immediately; other workers see changes after the TTL.
+DATASET_RESOLVE_CACHE_TTL_SECONDS = float(
+    os.getenv("DATASET_RESOLVE_CACHE_TTL_SECONDS", "30")
+)
+
 
 # Input models
 class DatasetGetByWorkspaceInput(BaseModel):
@@ -40,6 +103,50 @@ class DatasetCreateInput(BaseModel):
         default=None,
         description="If provided (and valid), link this dataset to the build task that created it.",
     )
+    embedding_model: str | None = Field(
+        default=None,
+        min_length=1,
+        description=f"Model that embeds the dataset's files (default {DEFAULT_MODEL_ID}).",
+    )
+
+
+class DatasetResolveByNameInput(BaseModel):
+    workspace_id: str = Field(..., min_length=1)
+    name: str = Field(..., min_length=1, max_length=255)
+
+
+class DatasetRetentionPolicy(BaseModel):
+    """Stored at storage_config.retention; applied by ApplyRetentionPoliciesWorkflow."""
+
+    delete_after_days: int = Field(..., ge=1)
+
+
+class DatasetReembedState(BaseModel):
+    """In-progress switch to target_model (ReembedDatasetWorkflow).
+
+    The cursor is the last (ingested_at, id) re-embedded; a restarted
+    workflow continues after it.
+    """
+
+    target_model: str = Field(..., min_length=1)
+    after_ingested_at: str | None = None
+    after_id: str | None = None
+    rows_done: int = 0
+
+
+class DatasetEmbeddingConfig(BaseModel):
+    """Stored at storage_config.embedding.
+
+    model embeds new files and is the version reads are pinned to; it only
+    changes when a re-embed into reembed.target_model completes.
+    """
+
+    model: str = Field(default=DEFAULT_MODEL_ID, min_length=1)
+    reembed: DatasetReembedState | None = None
+
+
+class DatasetEmbeddingConfigOutput(BaseModel):
+    config: DatasetEmbeddingConfig
 
 
 class DatasetUpdateInput(BaseModel):
@@ -47,6 +154,7 @@ class DatasetUpdateInput(BaseModel):
     workspace_id: str = Field(..., min_length=1)
     name: str | None = Field(None, min_length=1, max_length=255)
     description: str | None = None
+    retention: DatasetRetentionPolicy | None = None
 
 
 class QueryDatasetEventsInput(BaseModel):
@@ -72,10 +180,14 @@ class ListDatasetFilesInput(BaseModel):
 
 
 class DatasetFileSummary(BaseModel):
-    """One file (source) with its chunk count."""
+    """One file (source) with its chunk count and manifest details."""
 
     source: str
     chunk_count: int
+    size_bytes: int = 0
+    content_hash: str = ""
+    embed_model: str = ""
+    ingested_at: str | None = None
 
 
 class ListDatasetFilesOutput(BaseModel):
@@ -96,11 +208,42 @@ class DeleteDatasetEventsBySourceInput(BaseModel):
     )
 
 
+class DatasetDeleteJob(BaseModel):
+    """Handle for an asynchronous delete by source; poll with get_dataset_delete_status."""
+
+    workspace_id: str = Field(..., min_length=1)
+    dataset_id: str = Field(..., min_length=1)
+    source: str = Field(
+        ..., min_length=1, max_length=MAX_SOURCE_LENGTH
+    )
+    requested_at: str = Field(
+        ...,
+        description="ISO timestamp; chunks ingested up to this time are deleted.",
+    )
+    mutation_ids: list[str] = Field(
+        default_factory=list,
+        description="system.mutations ids of the delete on the dataset table.",
+    )
+
+
 class DeleteDatasetEventsBySourceOutput(BaseModel):
     """Result of delete by source."""
 
     success: bool
     deleted_count: int = 0
+    job: DatasetDeleteJob | None = None
+    error: str | None = None
+
+
+class DatasetDeleteStatusOutput(BaseModel):
+    """Progress of a delete by source."""
+
+    success: bool
+    status: str = Field(
+        default="pending",
+        description="pending, completed or failed",
+    )
+    remaining_rows: int = 0
     error: str | None = None
 
 
@@ -127,6 +270,20 @@ class DatasetSingleOutput(BaseModel):
     dataset: DatasetOutput | None = None
 
 
+class DatasetRef(BaseModel):
+    """What writers need to target a dataset; no storage stats."""
+
+    id: str
+    workspace_id: str
+    name: str
+    storage_type: str
+    storage_config: dict
+
+
+class DatasetResolveOutput(BaseModel):
+    dataset: DatasetRef | None = None
+
+
 class QueryDatasetEventsOutput(BaseModel):
     success: bool
     events: list[dict[str, Any]]
@@ -136,41 +293,103 @@ class QueryDatasetEventsOutput(BaseModel):
     error: str | None = None
 
 
+class ExportDatasetEventsInput(BaseModel):
+    """Export a dataset (same filters as query_dataset_events) to a file."""
+
+    workspace_id: str = Field(..., min_length=1)
+    dataset_id: str = Field(..., min_length=1)
+    tags: list[str] | None = None
+    search_query: str | None = None
+    format: Literal["parquet", "arrow", "ndjson"] = "parquet"
+
+
+class ExportDatasetEventsOutput(BaseModel):
+    success: bool
+    format: str = ""
+    blob_key: str | None = None
+    url: str | None = None
+    size_bytes: int = 0
+    error: str | None = None
+
+
+class CreateUploadUrlInput(BaseModel):
+    """Key the frontend will PUT an upload to (uploads/<workspace_id>/...)."""
+
+    workspace_id: str = Field(..., min_length=1)
+    blob_key: str = Field(..., min_length=1)
+
+
+class CreateUploadUrlOutput(BaseModel):
+    """url is None when the blob store is local (the frontend writes it directly)."""
+
+    url: str | None = None
+
+
+class StageInlineFilesInput(BaseModel):
+    """Legacy inline files ({ filename, content_base64 }) to stage as uploads."""
+
+    workspace_id: str = Field(..., min_length=1)
+    files: list[dict[str, Any]] = Field(default_factory=list)
+
+
+class StageInlineFilesOutput(BaseModel):
+    """The same files as upload references ({ filename, blob_key, ... })."""
+
+    files: list[dict[str, Any]] = Field(default_factory=list)
+
+
+class GetDatasetFilesInput(BaseModel):
+    """Manifest rows for a set of file sources."""
+
+    workspace_id: str = Field(..., min_length=1)
+    dataset_id: str = Field(..., min_length=1)
+    sources: list[str] = Field(default_factory=list)
+
+
 # Database connection helpers - using centralized connections
 
 
-def _build_where_conditions(
-    storage_config: dict, workspace_id: str, dataset_id: str
-) -> list[str]:
-    """Build WHERE clause conditions: scope by workspace and dataset id."""
-    where_conditions = [
-        f"workspace_id = '{workspace_id}'",
-        f"dataset_id = '{dataset_id}'",
-    ]
+def _clickhouse_param_type(value: Any) -> str:
+    """ClickHouse type name used to bind a storage_config filter value."""
+    if isinstance(value, bool):
+        return "Bool"
+    if isinstance(value, int):
+        return "Int64"
+    if isinstance(value, float):
+        return "Float64"
+    return "String"
 
-    # Handle tag-based filtering
-    if (
-        "filter" in storage_config
-        and "tags" in storage_config["filter"]
-    ):
-        tag_conditions = [
-            f"has(tags, '{tag}')"
-            for tag in storage_config["filter"]["tags"]
-        ]
-        if tag_conditions:
-            where_conditions.append(
-                f"({' OR '.join(tag_conditions)})"
-            )
 
-    # Handle other filters
-    if "filter" in storage_config:
-        for key, value in storage_config["filter"].items():
-            if (
-                key != "tags" and value
-            ):  # Skip tags (already handled) and empty values
-                where_conditions.append(f"{key} = '{value}'")
+def _validate_column_name(column_name: str) -> None:
+    """Validate a storage_config filter key before using it as a column."""
+    if not column_name.replace("_", "").isalnum():
+        msg = f"Invalid filter column: {column_name}"
+        raise ValueError(msg)
 
-    return where_conditions
+
+def _escape_like(value: str) -> str:
+    """Escape LIKE wildcards so user input is matched literally."""
+    return (
+        value.replace("\\", "\\\\")
+        .replace("%", "\\%")
+        .replace("_", "\\_")
+    )
+
+
+def _build_where_conditions(
+    storage_config: dict, workspace_id: str, dataset_id: str
+) -> tuple[list[str], dict[str, Any]]:
+    """Build WHERE conditions and bound parameters scoped by workspace and dataset id."""
+    where_conditions, params = _build_dataset_filters(
+        storage_config, workspace_id, dataset_id
+    )
+    for conditions, extra_params in (
+        _build_tag_filters(storage_config),
+        _build_other_storage_filters(storage_config),
+    ):
+        where_conditions.extend(conditions)
+        params.update(extra_params)
+    return where_conditions, params
 
 
 async def _get_clickhouse_stats(
@@ -180,24 +399,16 @@ async def _get_clickhouse_stats(
     try:
         client = await get_clickhouse_async_client()
 
-        where_conditions = _build_where_conditions(
+        where_conditions, params = _build_where_conditions(
             storage_config, workspace_id, dataset_id
         )
 
-        # Additional filtering is handled in _build_where_conditions helper
-
         where_clause = " AND ".join(where_conditions)
         table_name = storage_config.get(
             "table", "pipeline_events"
         )
 
-        # Validate table name to prevent SQL injection
-        def _raise_invalid_table_name() -> None:
-            msg = "Invalid table name"
-            raise ValueError(msg)
-
-        if not table_name.replace("_", "").isalnum():
-            _raise_invalid_table_name()
+        _validate_table_name(table_name)
 
         # Get stats for this dataset
         # table_name is validated above to contain only alphanumeric and underscores
@@ -216,7 +427,9 @@ async def _get_clickhouse_stats(
         """
         )
 
-        query_result = await client.query(stats_query)
+        query_result = await client.query(
+            stats_query, parameters=params
+        )
         if query_result.result_rows:
             last_updated_at, event_names, agents = (
                 query_result.result_rows[0]
@@ -241,34 +454,25 @@ async def _get_clickhouse_stats(
 
 
 def _build_cockroachdb_where_conditions(
-    storage_config: dict, workspace_id: str
+    storage_config: dict, workspace_id: str, args: list[Any]
 ) -> list[str]:
-    """Build WHERE clause conditions for CockroachDB using PostgreSQL syntax."""
-    where_conditions = [f"workspace_id = '{workspace_id}'"]
-
-    if "dataset_id" in storage_config:
-        where_conditions.append(
-            f"dataset_id = '{storage_config['dataset_id']}'"
-        )
+    """Build WHERE clause conditions for CockroachDB using PostgreSQL syntax.
 
-    if (
-        "filter" in storage_config
-        and "tags" in storage_config["filter"]
-    ):
-        tag_conditions = [
-            f"'{tag}' = ANY(tags)"
-            for tag in storage_config["filter"]["tags"]
-        ]
-        if tag_conditions:
-            where_conditions.append(
-                f"({' OR '.join(tag_conditions)})"
-            )
+    Values are appended to ``args`` and referenced as ``$n`` placeholders.
+    """
+    args.append(workspace_id)
+    where_conditions = [f"workspace_id = ${len(args)}"]
 
-    if "filter" in storage_config:
-        for key, value in storage_config["filter"].items():
-            if key != "tags" and value:
-                where_conditions.append(f"{key} = '{value}'")
+    if "dataset_id" in storage_config:
+        args.append(str(storage_config["dataset_id"]))
+        where_conditions.append(f"dataset_id = ${len(args)}")
 
+    where_conditions.extend(
+        _build_tag_filters_pg(storage_config, args)
+    )
+    where_conditions.extend(
+        _build_other_storage_filters_pg(storage_config, args)
+    )
     return where_conditions
 
 
@@ -279,8 +483,9 @@ async def _get_cockroachdb_stats(
     try:
         pool = await get_cockroachdb_pool()
 
+        args: list[Any] = []
         where_conditions = _build_cockroachdb_where_conditions(
-            storage_config, workspace_id
+            storage_config, workspace_id, args
         )
         where_clause = " AND ".join(where_conditions)
         table_name = storage_config.get(
@@ -299,7 +504,7 @@ async def _get_cockroachdb_stats(
         )
 
         async with pool.acquire() as conn:
-            row = await conn.fetchrow(stats_query)
+            row = await conn.fetchrow(stats_query, *args)
 
         if row:
             return {
@@ -443,6 +648,7 @@ async def datasets_get_by_id(
                     stats = await _get_clickhouse_stats(
                         row.storage_config,
                         function_input.workspace_id,
+                        function_input.dataset_id,
                     )
                 elif row.storage_type == "cockroachdb":
                     stats = await _get_cockroachdb_stats(
@@ -509,6 +715,171 @@ async def datasets_get_by_id(
         return DatasetSingleOutput(dataset=None)
 
 
+# (workspace_id, name) -> (expires_at, DatasetRef). Misses are not cached so
+# a dataset created by another worker resolves on the next call.
+_dataset_name_cache: dict[
+    tuple[str, str], tuple[float, DatasetRef]
+] = {}
+
+
+def _invalidate_dataset_name_cache(
+    workspace_id: str, dataset_id: str | None = None
+) -> None:
+    """Drop cached resolutions for a workspace (or only those of one dataset)."""
+    for key, (_, ref) in list(_dataset_name_cache.items()):
+        if key[0] == workspace_id and (
+            dataset_id is None or ref.id == dataset_id
+        ):
+            _dataset_name_cache.pop(key, None)
+
+
+@function.defn()
+async def datasets_resolve_by_name(
+    function_input: DatasetResolveByNameInput,
+) -> DatasetResolveOutput:
+    """Resolve a dataset by (workspace_id, name) without computing storage stats.
+
+    One probe of the unique_dataset_name_per_workspace index, cached briefly
+    in-process; datasets_create / datasets_update invalidate the cache.
+    dataset is None only when no such dataset exists; invalid input raises
+    NonRetryableError and database outages raise (and are retried).
+    """
+    cache_key = (function_input.workspace_id, function_input.name)
+    cached = _dataset_name_cache.get(cache_key)
+    if cached is not None and cached[0] > time.monotonic():
+        return DatasetResolveOutput(dataset=cached[1])
+
+    try:
+        async for db in get_async_db():
+            result = await db.execute(
+                text("""
+                    SELECT id, workspace_id, name, storage_type, storage_config
+                    FROM datasets
+                    WHERE workspace_id = :workspace_id AND name = :name
+                    LIMIT 1
+                """),
+                {
+                    "workspace_id": function_input.workspace_id,
+                    "name": function_input.name,
+                },
+            )
+            row = result.fetchone()
+            if not row:
+                _dataset_name_cache.pop(cache_key, None)
+                return DatasetResolveOutput(dataset=None)
+
+            ref = DatasetRef(
+                id=str(row.id),
+                workspace_id=str(row.workspace_id),
+                name=row.name,
+                storage_type=row.storage_type,
+                storage_config=row.storage_config or {},
+            )
+            _dataset_name_cache[cache_key] = (
+                time.monotonic()
+                + DATASET_RESOLVE_CACHE_TTL_SECONDS,
+                ref,
+            )
+            return DatasetResolveOutput(dataset=ref)
+
+    except (ValueError, TypeError, DataError) as e:
+        # e.g. a workspace_id that is not a UUID; connection errors are
+        # left to propagate so the step is retried
+        msg = f"Cannot resolve dataset '{function_input.name}': {e!s}"
+        raise NonRetryableError(msg) from e
+    return DatasetResolveOutput(dataset=None)
+
+
+async def _get_dataset_ref(
+    workspace_id: str, dataset_id: str
+) -> DatasetRef | None:
+    """Primary-key lookup of a dataset's storage settings, without stats."""
+    async for db in get_async_db():
+        result = await db.execute(
+            text("""
+                SELECT id, workspace_id, name, storage_type, storage_config
+                FROM datasets
+                WHERE id = :dataset_id AND workspace_id = :workspace_id
+            """),
+            {
+                "dataset_id": dataset_id,
+                "workspace_id": workspace_id,
+            },
+        )
+        row = result.fetchone()
+        if not row:
+            return None
+        return DatasetRef(
+            id=str(row.id),
+            workspace_id=str(row.workspace_id),
+            name=row.name,
+            storage_type=row.storage_type,
+            storage_config=row.storage_config or {},
+        )
+    return None
+
+
+def dataset_embedding_config(
+    storage_config: dict,
+) -> DatasetEmbeddingConfig:
+    """Embedding settings from storage_config (defaults when absent or invalid)."""
+    try:
+        return DatasetEmbeddingConfig.model_validate(
+            storage_config.get("embedding") or {}
+        )
+    except ValidationError:
+        return DatasetEmbeddingConfig()
+
+
+async def get_dataset_embedding_config(
+    workspace_id: str, dataset_id: str
+) -> DatasetEmbeddingConfig:
+    """Embedding settings of a dataset (defaults for unknown datasets)."""
+    ref = await _get_dataset_ref(workspace_id, dataset_id)
+    return dataset_embedding_config(
+        ref.storage_config if ref is not None else {}
+    )
+
+
+async def save_dataset_embedding_config(
+    workspace_id: str,
+    dataset_id: str,
+    config: DatasetEmbeddingConfig,
+) -> None:
+    """Write storage_config.embedding."""
+    async for db in get_async_db():
+        await db.execute(
+            text("""
+                UPDATE datasets
+                SET storage_config = jsonb_set(COALESCE(storage_config, CAST('{}' AS jsonb)), '{embedding}', CAST(:embedding AS jsonb)),
+                    updated_at = NOW()
+                WHERE id = :dataset_id AND workspace_id = :workspace_id
+            """),
+            {
+                "embedding": config.model_dump_json(),
+                "dataset_id": dataset_id,
+                "workspace_id": workspace_id,
+            },
+        )
+        await db.commit()
+    _invalidate_dataset_name_cache(workspace_id, dataset_id)
+
+
+@function.defn()
+async def datasets_get_embedding_config(
+    function_input: DatasetGetByIdInput,
+) -> DatasetEmbeddingConfigOutput:
+    """Embedding model (and re-embed in progress) of a dataset."""
+    try:
+        config = await get_dataset_embedding_config(
+            function_input.workspace_id, function_input.dataset_id
+        )
+    except (ValueError, TypeError, ConnectionError) as e:
+        msg = f"Failed to read dataset embedding config: {e!s}"
+        raise NonRetryableError(msg) from e
+    return DatasetEmbeddingConfigOutput(config=config)
+
+
 async def _resolve_build_task_id(
     db: AsyncSession,
     build_task_id_str: str | None,
@@ -573,6 +944,10 @@ async def datasets_create(  # noqa: C901
 
         # Scope queries to this dataset's events (by UUID)
         storage_config["dataset_id"] = dataset_id
+        if function_input.embedding_model:
+            storage_config["embedding"] = DatasetEmbeddingConfig(
+                model=function_input.embedding_model
+            ).model_dump(exclude_none=True)
 
         # Add tag-based filtering if tags are provided (applies to all storage types)
         if function_input.tags and storage_config is not None:
@@ -666,6 +1041,9 @@ async def datasets_create(  # noqa: C901
                 },
             )
             await db.commit()
+            _invalidate_dataset_name_cache(
+                function_input.workspace_id
+            )
 
             return await datasets_get_by_id(
                 DatasetGetByIdInput(
@@ -683,7 +1061,7 @@ async def datasets_create(  # noqa: C901
 async def datasets_update(
     function_input: DatasetUpdateInput,
 ) -> DatasetSingleOutput:
-    """Update an existing dataset (name, description)."""
+    """Update an existing dataset (name, description, retention)."""
     try:
         async for db in get_async_db():
             existing = await db.execute(
@@ -710,6 +1088,13 @@ async def datasets_update(
             if function_input.description is not None:
                 updates.append("description = :description")
                 params["description"] = function_input.description
+            if function_input.retention is not None:
+                updates.append(
+                    "storage_config = jsonb_set(COALESCE(storage_config, CAST('{}' AS jsonb)), '{retention}', CAST(:retention AS jsonb))"
+                )
+                params["retention"] = (
+                    function_input.retention.model_dump_json()
+                )
             if not updates:
                 return await datasets_get_by_id(
                     DatasetGetByIdInput(
@@ -717,7 +1102,7 @@ async def datasets_update(
                         workspace_id=function_input.workspace_id,
                     )
                 )
-            # Column names in updates are from allowlisted fields (name, description only)
+            # Column names in updates are from allowlisted fields (name, description, retention only)
             await db.execute(
                 text(
                     "UPDATE datasets SET "  # noqa: S608
@@ -727,6 +1112,10 @@ async def datasets_update(
                 params,
             )
             await db.commit()
+            _invalidate_dataset_name_cache(
+                function_input.workspace_id,
+                function_input.dataset_id,
+            )
             return await datasets_get_by_id(
                 DatasetGetByIdInput(
                     dataset_id=function_input.dataset_id,
@@ -803,21 +1192,24 @@ async def _query_cockroachdb_events(
         pool = await get_cockroachdb_pool()
         storage_config = dataset.storage_config
 
-        where_conditions = []
-        where_conditions.extend(
-            _build_dataset_filters(
-                storage_config, function_input.workspace_id
-            )
-        )
+        args: list[Any] = [
+            function_input.workspace_id,
+            function_input.dataset_id,
+        ]
+        where_conditions = [
+            "workspace_id = $1",
+            "dataset_id = $2",
+        ]
         where_conditions.extend(
-            _build_tag_filters_pg(storage_config)
+            _build_tag_filters_pg(storage_config, args)
         )
         where_conditions.extend(
-            _build_other_storage_filters(storage_config)
+            _build_other_storage_filters_pg(storage_config, args)
         )
         where_conditions.extend(
-            _build_user_filters_pg(function_input)
+            _build_user_filters_pg(function_input, args)
         )
+        order_by = _build_search_order_pg(function_input, args)
 
         where_clause = " AND ".join(where_conditions)
         table_name = storage_config.get(
@@ -826,19 +1218,23 @@ async def _query_cockroachdb_events(
 
         _validate_table_name(table_name)
 
+        count_args = list(args)
+        args.extend([function_input.limit, function_input.offset])
         events_query = (
             f"SELECT id, agent_id, task_id, event_name, raw_data, "  # noqa: S608
             f"transformed_data, tags, event_timestamp "
             f"FROM {table_name} "
             f"WHERE {where_clause} "
-            f"ORDER BY event_timestamp DESC "
-            f"LIMIT {function_input.limit} OFFSET {function_input.offset}"
+            f"ORDER BY {order_by} "
+            f"LIMIT ${len(args) - 1} OFFSET ${len(args)}"
         )
         count_query = f"SELECT COUNT(*) FROM {table_name} WHERE {where_clause}"  # noqa: S608
 
         async with pool.acquire() as conn:
-            rows = await conn.fetch(events_query)
-            count_row = await conn.fetchrow(count_query)
+            rows = await conn.fetch(events_query, *args)
+            count_row = await conn.fetchrow(
+                count_query, *count_args
+            )
 
         total_count = count_row[0] if count_row else 0
 
@@ -887,108 +1283,151 @@ async def _query_cockroachdb_events(
 
 def _build_dataset_filters(
     _storage_config: dict, workspace_id: str, dataset_id: str
-) -> list[str]:
+) -> tuple[list[str], dict[str, Any]]:
     """Build WHERE conditions: always scope by workspace and requested dataset id."""
-    return [
-        f"workspace_id = '{workspace_id}'",
-        f"dataset_id = '{dataset_id}'",
-    ]
+    return (
+        [
+            "workspace_id = {workspace_id:UUID}",
+            "dataset_id = {dataset_id:String}",
+        ],
+        {"workspace_id": workspace_id, "dataset_id": dataset_id},
+    )
 
 
-def _build_tag_filters(storage_config: dict) -> list[str]:
+def _build_tag_filters(
+    storage_config: dict,
+) -> tuple[list[str], dict[str, Any]]:
     """Build tag-based WHERE conditions from storage config."""
-    if (
-        "filter" not in storage_config
-        or "tags" not in storage_config["filter"]
-    ):
-        return []
-
-    tag_conditions = [
-        f"has(tags, '{tag}')"
-        for tag in storage_config["filter"]["tags"]
-    ]
-    if tag_conditions:
-        return [f"({' OR '.join(tag_conditions)})"]
-    return []
+    tags = storage_config.get("filter", {}).get("tags")
+    if not tags:
+        return [], {}
+    return (
+        ["hasAny(tags, {storage_tags:Array(String)})"],
+        {"storage_tags": [str(tag) for tag in tags]},
+    )
 
 
 def _build_other_storage_filters(
     storage_config: dict,
-) -> list[str]:
+) -> tuple[list[str], dict[str, Any]]:
     """Build non-tag WHERE conditions from storage config."""
-    if "filter" not in storage_config:
-        return []
-
-    conditions = []
-    for key, value in storage_config["filter"].items():
-        if key == "tags":  # Skip tags, handled separately
+    conditions: list[str] = []
+    params: dict[str, Any] = {}
+    for key, value in storage_config.get("filter", {}).items():
+        if key == "tags" or value in (None, ""):
             continue
-        if isinstance(value, str):
-            conditions.append(f"{key} = '{value}'")
-        else:
-            conditions.append(f"{key} = {value}")
-    return conditions
+        _validate_column_name(key)
+        param_name = f"filter_{key}"
+        conditions.append(
+            f"{key} = {{{param_name}:{_clickhouse_param_type(value)}}}"
+        )
+        params[param_name] = value
+    return conditions, params
+
+
+def _normalize_search_query(search_query: str | None) -> str:
+    """Lower-case and trim a search query to match the search_text column."""
+    return (search_query or "").strip().lower()
 
 
 def _build_user_filters(
     function_input: QueryDatasetEventsInput,
-) -> list[str]:
-    """Build WHERE conditions from user-provided filters (ClickHouse syntax)."""
-    conditions = []
+) -> tuple[list[str], dict[str, Any]]:
+    """Build WHERE conditions from user-provided filters (ClickHouse syntax).
+
+    Text search runs against the materialized ``search_text`` column so the
+    token and ngram bloom filter indexes can skip granules.
+    """
+    conditions: list[str] = []
+    params: dict[str, Any] = {}
 
     if function_input.tags:
-        user_tag_conditions = [
-            f"has(tags, '{tag}')" for tag in function_input.tags
-        ]
-        conditions.append(f"({' OR '.join(user_tag_conditions)})")
+        conditions.append(
+            "hasAny(tags, {user_tags:Array(String)})"
+        )
+        params["user_tags"] = list(function_input.tags)
 
-    if function_input.search_query:
+    search = _normalize_search_query(function_input.search_query)
+    if search:
         conditions.append(
-            f"(event_name ILIKE '%{function_input.search_query}%' OR "
-            f"toString(raw_data.content) ILIKE '%{function_input.search_query}%')"
+            "search_text LIKE {search_pattern:String}"
         )
+        params["search_pattern"] = f"%{_escape_like(search)}%"
+        params["search_query"] = search
 
-    return conditions
+    return conditions, params
 
 
-def _build_tag_filters_pg(storage_config: dict) -> list[str]:
-    """Build tag-based WHERE conditions using PostgreSQL ANY() syntax."""
-    if (
-        "filter" not in storage_config
-        or "tags" not in storage_config["filter"]
-    ):
+def _build_search_order(
+    function_input: QueryDatasetEventsInput,
+) -> str:
+    """ORDER BY for ClickHouse event queries: rank by search hits, then recency."""
+    if not _normalize_search_query(function_input.search_query):
+        return "event_timestamp DESC"
+    return (
+        "countSubstrings(search_text, {search_query:String}) DESC, "
+        "event_timestamp DESC"
+    )
+
+
+def _build_tag_filters_pg(
+    storage_config: dict, args: list[Any]
+) -> list[str]:
+    """Build tag-based WHERE conditions using PostgreSQL array overlap."""
+    tags = storage_config.get("filter", {}).get("tags")
+    if not tags:
         return []
+    args.append([str(tag) for tag in tags])
+    return [f"tags && ${len(args)}::TEXT[]"]
 
-    tag_conditions = [
-        f"'{tag}' = ANY(tags)"
-        for tag in storage_config["filter"]["tags"]
-    ]
-    if tag_conditions:
-        return [f"({' OR '.join(tag_conditions)})"]
-    return []
+
+def _build_other_storage_filters_pg(
+    storage_config: dict, args: list[Any]
+) -> list[str]:
+    """Build non-tag WHERE conditions from storage config (PostgreSQL syntax)."""
+    conditions = []
+    for key, value in storage_config.get("filter", {}).items():
+        if key == "tags" or value in (None, ""):
+            continue
+        _validate_column_name(key)
+        args.append(value)
+        conditions.append(f"{key} = ${len(args)}")
+    return conditions
 
 
 def _build_user_filters_pg(
-    function_input: QueryDatasetEventsInput,
+    function_input: QueryDatasetEventsInput, args: list[Any]
 ) -> list[str]:
-    """Build WHERE conditions from user-provided filters (PostgreSQL syntax)."""
+    """Build WHERE conditions from user-provided filters (PostgreSQL syntax).
+
+    Text search uses the stored ``search_text`` column, which carries a
+    trigram GIN index so ``LIKE '%q%'`` does not scan the table.
+    """
     conditions = []
 
     if function_input.tags:
-        user_tag_conditions = [
-            f"'{tag}' = ANY(tags)" for tag in function_input.tags
-        ]
-        conditions.append(f"({' OR '.join(user_tag_conditions)})")
+        args.append(list(function_input.tags))
+        conditions.append(f"tags && ${len(args)}::TEXT[]")
 
-    if function_input.search_query:
-        conditions.append(
-            f"(event_name ILIKE '%{function_input.search_query}%' OR "
-            f"raw_data->>'content' ILIKE '%{function_input.search_query}%')"
-        )
+    search = _normalize_search_query(function_input.search_query)
+    if search:
+        args.append(f"%{_escape_like(search)}%")
+        conditions.append(f"search_text LIKE ${len(args)}")
 
     return conditions
 
 
+def _build_search_order_pg(
+    function_input: QueryDatasetEventsInput, args: list[Any]
+) -> str:
+    """ORDER BY for CockroachDB event queries: rank by trigram similarity, then recency."""
+    search = _normalize_search_query(function_input.search_query)
+    if not search:
+        return "event_timestamp DESC"
+    args.append(search)
+    return f"similarity(search_text, ${len(args)}) DESC, event_timestamp DESC"
+
+
 def _validate_table_name(table_name: str) -> None:
     """Validate table name to prevent SQL injection."""
     if not table_name.replace("_", "").isalnum():
@@ -1005,24 +1444,17 @@ async def _query_clickhouse_events(
         client = await get_clickhouse_async_client()
         storage_config = dataset.storage_config
 
-        # Build WHERE conditions from various sources
-        where_conditions = []
-        where_conditions.extend(
-            _build_dataset_filters(
-                storage_config,
-                function_input.workspace_id,
-                function_input.dataset_id,
-            )
-        )
-        where_conditions.extend(
-            _build_tag_filters(storage_config)
-        )
-        where_conditions.extend(
-            _build_other_storage_filters(storage_config)
+        # Build WHERE conditions and bound parameters from various sources
+        where_conditions, params = _build_where_conditions(
+            storage_config,
+            function_input.workspace_id,
+            function_input.dataset_id,
         )
-        where_conditions.extend(
-            _build_user_filters(function_input)
+        user_conditions, user_params = _build_user_filters(
+            function_input
         )
+        where_conditions.extend(user_conditions)
+        params.update(user_params)
 
         where_clause = " AND ".join(where_conditions)
         table_name = storage_config.get(
@@ -1032,6 +1464,9 @@ async def _query_clickhouse_events(
         # Validate table name to prevent SQL injection
         _validate_table_name(table_name)
 
+        params["limit"] = function_input.limit
+        params["offset"] = function_input.offset
+
         # Query for events
         # table_name is validated above to contain only alphanumeric and underscores
         events_query = (
@@ -1051,20 +1486,22 @@ async def _query_clickhouse_events(
         WHERE """
             + where_clause
             + """
-        ORDER BY event_timestamp DESC
-        LIMIT """
-            + str(function_input.limit)
-            + """ OFFSET """
-            + str(function_input.offset)
+        ORDER BY """
+            + _build_search_order(function_input)
             + """
+        LIMIT {limit:UInt32} OFFSET {offset:UInt32}
         """
         )
 
         # Count total - table name already validated above
         count_query = f"SELECT count() FROM {table_name} WHERE {where_clause}"  # noqa: S608
 
-        events_result = await client.query(events_query)
-        count_result = await client.query(count_query)
+        events_result = await client.query(
+            events_query, parameters=params
+        )
+        count_result = await client.query(
+            count_query, parameters=params
+        )
 
         total_count = (
             count_result.result_rows[0][0]
@@ -1107,76 +1544,198 @@ async def _query_clickhouse_events(
         )
 
 
-def _sanitize_source_for_sql(source: str) -> str:
-    """Escape single quotes in source to prevent SQL injection."""
-    if not source or len(source) > MAX_SOURCE_LENGTH:
-        return ""
-    return source.replace("'", "''")
+async def record_dataset_file(  # noqa: PLR0913
+    *,
+    workspace_id: str,
+    dataset_id: str,
+    source: str,
+    chunk_count: int,
+    size_bytes: int,
+    content_hash: str,
+    embed_model: str,
+    task_id: str | None = None,
+) -> None:
+    """Write (or replace) a file's row in the dataset_files manifest."""
+    client = await get_clickhouse_shared_client()
+    await client.insert(
+        "dataset_files",
+        [
+            [
+                workspace_id,
+                dataset_id,
+                source,
+                task_id,
+                chunk_count,
+                size_bytes,
+                content_hash,
+                embed_model,
+                datetime.now(tz=UTC),
+                0,
+            ]
+        ],
+        column_names=DATASET_FILES_COLUMNS,
+    )
+
+
+async def get_dataset_file(
+    workspace_id: str, dataset_id: str, source: str
+) -> DatasetFileSummary | None:
+    """Current manifest row for one file, or None if absent or deleted."""
+    client = await get_clickhouse_shared_client()
+    result = await client.query(
+        """
+        SELECT source, chunk_count, size_bytes, content_hash,
+               embed_model, ingested_at
+        FROM dataset_files FINAL
+        WHERE workspace_id = {workspace_id:UUID}
+          AND dataset_id = {dataset_id:String}
+          AND source = {source:String}
+          AND is_deleted = 0
+        LIMIT 1
+        """,
+        parameters={
+            "workspace_id": workspace_id,
+            "dataset_id": dataset_id,
+            "source": source,
+        },
+    )
+    if not result.result_rows:
+        return None
+    row = result.result_rows[0]
+    return DatasetFileSummary(
+        source=row[0] or "",
+        chunk_count=row[1] or 0,
+        size_bytes=row[2] or 0,
+        content_hash=row[3] or "",
+        embed_model=row[4] or "",
+        ingested_at=row[5].isoformat() if row[5] else None,
+    )
+
+
+async def _mark_dataset_file_deleted(
+    workspace_id: str, dataset_id: str, source: str
+) -> None:
+    """Supersede a file's manifest row with a deleted marker."""
+    client = await get_clickhouse_shared_client()
+    await client.insert(
+        "dataset_files",
+        [
+            [
+                workspace_id,
+                dataset_id,
+                source,
+                None,
+                0,
+                0,
+                "",
+                "",
+                datetime.now(tz=UTC),
+                1,
+            ]
+        ],
+        column_names=DATASET_FILES_COLUMNS,
+    )
+
+
+async def compiled_view_tables(
+    workspace_id: str, dataset_id: str
+) -> list[str]:
+    """view_rows_* tables of the dataset's compiled views (see compiled_views)."""
+    client = await get_clickhouse_shared_client()
+    result = await client.query(
+        """
+        SELECT table_name
+        FROM compiled_views FINAL
+        WHERE workspace_id = {workspace_id:UUID}
+          AND dataset_id = {dataset_id:String}
+          AND is_deleted = 0
+        """,
+        parameters={
+            "workspace_id": workspace_id,
+            "dataset_id": dataset_id,
+        },
+    )
+    return [row[0] for row in result.result_rows or []]
 
 
 @function.defn()
 async def list_dataset_files(
     function_input: ListDatasetFilesInput,
 ) -> ListDatasetFilesOutput:
-    """List unique file sources (raw_data.source) in a dataset with chunk counts."""
+    """List files in a dataset.
+
+    Files uploaded through EmbedAnything or as tables come from the
+    dataset_files manifest; other sources named by raw_data.source (generic,
+    staged or MCP ingestion) from dataset_file_chunks.
+    """
     try:
-        dataset_result = await datasets_get_by_id(
-            DatasetGetByIdInput(
-                dataset_id=function_input.dataset_id,
-                workspace_id=function_input.workspace_id,
-            )
+        dataset = await _get_dataset_ref(
+            function_input.workspace_id, function_input.dataset_id
         )
-        if not dataset_result.dataset:
+        if dataset is None:
             return ListDatasetFilesOutput(
                 success=False,
                 error=f"Dataset {function_input.dataset_id} not found",
             )
-        dataset = dataset_result.dataset
         if dataset.storage_type != "clickhouse":
             return ListDatasetFilesOutput(
                 success=False,
                 error="Listing files by source is only supported for clickhouse storage",
             )
         client = await get_clickhouse_async_client()
-        storage_config = dataset.storage_config
-        where_conditions = _build_dataset_filters(
-            storage_config,
-            function_input.workspace_id,
-            function_input.dataset_id,
-        )
+        where_conditions = [
+            "workspace_id = {workspace_id:UUID}",
+            "dataset_id = {dataset_id:String}",
+        ]
+        params: dict[str, Any] = {
+            "workspace_id": function_input.workspace_id,
+            "dataset_id": function_input.dataset_id,
+        }
+        scope_clause = " AND ".join(where_conditions)
+        chunks_having = ""
         if function_input.task_id:
-            where_conditions.append(
-                f"task_id = '{function_input.task_id}'"
-            )
-        where_conditions.extend(
-            _build_tag_filters(storage_config)
-        )
-        where_conditions.extend(
-            _build_other_storage_filters(storage_config)
-        )
+            where_conditions.append("task_id = {task_id:UUID}")
+            params["task_id"] = function_input.task_id
+            chunks_having = "HAVING any(task_id) = {task_id:UUID}"
         where_clause = " AND ".join(where_conditions)
-        table_name = storage_config.get(
-            "table", "pipeline_events"
-        )
-        _validate_table_name(table_name)
-        # Only consider events that have raw_data.source (file chunks).
-        # Use raw_data.source (dot notation) for Dynamic/JSON column; avoid ORDER BY raw_data.* per ClickHouse docs.
-        source_expr = "toString(raw_data.source)"
-        # table_name and where_clause come from validated storage_config, not user input
+        # FINAL collapses re-ingested files to their latest row and drops
+        # deleted ones; the key prefix (workspace_id, dataset_id) bounds the
+        # reads of both tables.
         files_query = f"""
-        SELECT
-            {source_expr} AS source,
-            count() AS chunk_count
-        FROM {table_name}
-        WHERE {where_clause}
-          AND length({source_expr}) > 0
-        GROUP BY {source_expr}
+        SELECT *
+        FROM (
+            SELECT source, chunk_count, size_bytes, content_hash,
+                   embed_model, ingested_at
+            FROM dataset_files FINAL
+            WHERE {where_clause} AND is_deleted = 0
+            UNION ALL
+            SELECT source, toUInt32(sum(chunk_count)), sum(size_bytes),
+                   '', '', max(last_ingested_at)
+            FROM dataset_file_chunks
+            WHERE {scope_clause}
+              AND source NOT IN (
+                  SELECT source
+                  FROM dataset_files FINAL
+                  WHERE {scope_clause} AND is_deleted = 0
+              )
+            GROUP BY source
+            {chunks_having}
+        )
         ORDER BY chunk_count DESC
         """  # noqa: S608
-        result = await client.query(files_query)
+        result = await client.query(
+            files_query, parameters=params
+        )
         files = [
             DatasetFileSummary(
-                source=row[0] or "", chunk_count=row[1] or 0
+                source=row[0] or "",
+                chunk_count=row[1] or 0,
+                size_bytes=row[2] or 0,
+                content_hash=row[3] or "",
+                embed_model=row[4] or "",
+                ingested_at=row[5].isoformat()
+                if row[5]
+                else None,
             )
             for row in (result.result_rows or [])
         ]
@@ -1188,67 +1747,508 @@ async def list_dataset_files(
         )
 
 
+async def _dataset_source_scope(
+    workspace_id: str, dataset_id: str, source: str
+) -> tuple[str, str, dict[str, Any]]:
+    """Resolve (table_name, where_clause, params) selecting one file's chunks."""
+    dataset = await _get_dataset_ref(workspace_id, dataset_id)
+    if dataset is None:
+        msg = f"Dataset {dataset_id} not found"
+        raise ValueError(msg)
+    if dataset.storage_type != "clickhouse":
+        msg = "Delete by source is only supported for clickhouse storage"
+        raise ValueError(msg)
+    storage_config = dataset.storage_config
+    where_conditions, params = _build_where_conditions(
+        storage_config, workspace_id, dataset_id
+    )
+    where_conditions.append("source = {source:String}")
+    params["source"] = source
+    table_name = storage_config.get("table", "pipeline_events")
+    _validate_table_name(table_name)
+    return table_name, " AND ".join(where_conditions), params
+
+
+def _quoted_literal(value: str) -> str:
+    """Quote value the way ClickHouse formats a String literal."""
+    return "'" + value.translate(_LITERAL_ESCAPES) + "'"
+
+
+async def _source_delete_mutations(
+    client: Any, table_name: str, source: str, since: datetime
+) -> list[str]:
+    """Ids of the lightweight deletes of source on table_name since a time.
+
+    A lightweight delete is a mutation setting _row_exists; its command
+    holds the source predicate with the literal quoted. Only an exact
+    `source = '<literal>'` counts, so deleting "a" does not claim the
+    mutations of "ab" or of another column equal to "a".
+    """
+    predicate = f"source = {_quoted_literal(source)}"
+    result = await client.query(
+        """
+        SELECT mutation_id, command
+        FROM system.mutations
+        WHERE database = currentDatabase()
+          AND table = {table_name:String}
+          AND create_time >= toDateTime({since:Int64})
+          AND position(command, '_row_exists') > 0
+          AND position(command, {predicate:String}) > 0
+        """,
+        parameters={
+            "table_name": table_name,
+            "since": int(since.timestamp()),
+            "predicate": predicate,
+        },
+    )
+    exact = re.compile(
+        rf"(?<![\w.`]){re.escape(predicate)}(?![\w'])"
+    )
+    return [
+        mutation_id
+        for mutation_id, command in result.result_rows or []
+        if exact.search(command)
+    ]
+
+
+async def delete_source_rows(
+    workspace_id: str, dataset_id: str, source: str
+) -> list[str]:
+    """Queue lightweight deletes of one file's rows; returns the mutation ids.
+
+    Covers the dataset table, its compiled view tables, re-embedded vectors
+    and dataset_file_chunks, but not the dataset_files manifest. Rows
+    inserted after this returns are not affected.
+    """
+    (
+        table_name,
+        where_clause,
+        params,
+    ) = await _dataset_source_scope(
+        workspace_id, dataset_id, source
+    )
+    requested_at = datetime.now(tz=UTC)
+    client = await get_clickhouse_async_client()
+    # table_name and where_clause come from validated storage_config, not user input
+    await client.command(
+        f"DELETE FROM {table_name} WHERE {where_clause}",  # noqa: S608
+        parameters=params,
+        settings={"lightweight_deletes_sync": 0},
+    )
+    mutation_ids = await _source_delete_mutations(
+        client, table_name, source, requested_at
+    )
+    for view_table in await compiled_view_tables(
+        workspace_id, dataset_id
+    ):
+        _validate_table_name(view_table)
+        await client.command(
+            f"DELETE FROM {view_table} WHERE source = {{source:String}}",  # noqa: S608
+            parameters={"source": source},
+            settings={"lightweight_deletes_sync": 0},
+        )
+    scope = {
+        "workspace_id": workspace_id,
+        "dataset_id": dataset_id,
+        "source": source,
+    }
+    # Vectors re-embedded for other models (ReembedDatasetWorkflow)
+    await client.command(
+        """
+        DELETE FROM pipeline_event_embeddings
+        WHERE workspace_id = {workspace_id:UUID}
+          AND dataset_id = {dataset_id:String}
+          AND source = {source:String}
+        """,
+        parameters=scope,
+        settings={"lightweight_deletes_sync": 0},
+    )
+    # Per-file chunk counts start over if the source is loaded again
+    await client.command(
+        """
+        DELETE FROM dataset_file_chunks
+        WHERE workspace_id = {workspace_id:UUID}
+          AND dataset_id = {dataset_id:String}
+          AND source = {source:String}
+        """,
+        parameters=scope,
+        settings={"lightweight_deletes_sync": 0},
+    )
+    return mutation_ids
+
+
 @function.defn()
 async def delete_dataset_events_by_source(
     function_input: DeleteDatasetEventsBySourceInput,
 ) -> DeleteDatasetEventsBySourceOutput:
-    """Delete all events (chunks) in a dataset that have the given raw_data.source."""
+    """Delete all events (chunks) in a dataset that have the given source.
+
+    Issues a lightweight DELETE without waiting for it: the call returns
+    once the delete is queued, rows stop being visible when ClickHouse
+    applies it in the background and are physically dropped by later
+    merges. Returns a job handle for get_dataset_delete_status.
+    """
     try:
-        dataset_result = await datasets_get_by_id(
-            DatasetGetByIdInput(
-                dataset_id=function_input.dataset_id,
+        requested_at = datetime.now(tz=UTC)
+        mutation_ids = await delete_source_rows(
+            function_input.workspace_id,
+            function_input.dataset_id,
+            function_input.source,
+        )
+        await _mark_dataset_file_deleted(
+            function_input.workspace_id,
+            function_input.dataset_id,
+            function_input.source,
+        )
+        return DeleteDatasetEventsBySourceOutput(
+            success=True,
+            deleted_count=-1,
+            job=DatasetDeleteJob(
                 workspace_id=function_input.workspace_id,
+                dataset_id=function_input.dataset_id,
+                source=function_input.source,
+                requested_at=requested_at.isoformat(),
+                mutation_ids=mutation_ids,
+            ),
+        )
+    except (ValueError, TypeError, ConnectionError) as e:
+        return DeleteDatasetEventsBySourceOutput(
+            success=False,
+            error=str(e),
+        )
+
+
+@function.defn()
+async def get_dataset_delete_status(
+    function_input: DatasetDeleteJob,
+) -> DatasetDeleteStatusOutput:
+    """Report whether a delete by source has been applied.
+
+    Completed once no chunk of the file ingested before the request is
+    visible; failed if the job's own delete reports an error.
+    """
+    try:
+        (
+            table_name,
+            where_clause,
+            params,
+        ) = await _dataset_source_scope(
+            function_input.workspace_id,
+            function_input.dataset_id,
+            function_input.source,
+        )
+        requested_at = datetime.fromisoformat(
+            function_input.requested_at
+        )
+        params["requested_at_ms"] = int(
+            requested_at.timestamp() * 1000
+        )
+        client = await get_clickhouse_async_client()
+        remaining_query = f"""
+        SELECT count()
+        FROM {table_name}
+        WHERE {where_clause}
+          AND ingested_at <= fromUnixTimestamp64Milli({{requested_at_ms:Int64}})
+        """  # noqa: S608
+        remaining_result = await client.query(
+            remaining_query, parameters=params
+        )
+        remaining_rows = int(
+            remaining_result.result_rows[0][0]
+            if remaining_result.result_rows
+            else 0
+        )
+        if remaining_rows == 0:
+            return DatasetDeleteStatusOutput(
+                success=True, status="completed"
+            )
+
+        # Handles from before mutation ids were kept: find them again
+        mutation_ids = (
+            function_input.mutation_ids
+            or await _source_delete_mutations(
+                client,
+                table_name,
+                function_input.source,
+                requested_at,
             )
         )
-        if not dataset_result.dataset:
-            return DeleteDatasetEventsBySourceOutput(
+        failure_result = await client.query(
+            """
+            SELECT latest_fail_reason
+            FROM system.mutations
+            WHERE database = currentDatabase()
+              AND table = {table_name:String}
+              AND mutation_id IN {mutation_ids:Array(String)}
+              AND is_done = 0
+              AND latest_fail_reason != ''
+            LIMIT 1
+            """,
+            parameters={
+                "table_name": table_name,
+                "mutation_ids": mutation_ids,
+            },
+        )
+        if failure_result.result_rows:
+            return DatasetDeleteStatusOutput(
+                success=True,
+                status="failed",
+                remaining_rows=remaining_rows,
+                error=failure_result.result_rows[0][0],
+            )
+        return DatasetDeleteStatusOutput(
+            success=True,
+            status="pending",
+            remaining_rows=remaining_rows,
+        )
+    except (ValueError, TypeError, ConnectionError) as e:
+        return DatasetDeleteStatusOutput(
+            success=False,
+            status="failed",
+            error=str(e),
+        )
+
+
+def _export_select(fmt: str) -> str:
+    """Exported columns; columnar formats get UUIDs and JSON as strings."""
+    if fmt == "ndjson":
+        return (
+            "id, agent_id, task_id, event_name, raw_data, "
+            "transformed_data, tags, event_timestamp"
+        )
+    return (
+        "toString(id) AS id, toString(agent_id) AS agent_id, "
+        "toString(task_id) AS task_id, event_name, "
+        "toString(raw_data) AS raw_data, "
+        "toString(transformed_data) AS transformed_data, "
+        "tags, event_timestamp"
+    )
+
+
+def _copy_stream(stream: IO[bytes], path: Path) -> int:
+    """Copy a response body to path in fixed-size reads; returns bytes written."""
+    size_bytes = 0
+    with contextlib.closing(stream), path.open("wb") as out:
+        while chunk := stream.read(EXPORT_READ_CHUNK_BYTES):
+            out.write(chunk)
+            size_bytes += len(chunk)
+    return size_bytes
+
+
+@function.defn()
+async def export_dataset_events(
+    function_input: ExportDatasetEventsInput,
+) -> ExportDatasetEventsOutput:
+    """Stream a ClickHouse dataset to Parquet, Arrow IPC or NDJSON in the blob store.
+
+    ClickHouse encodes the file server-side and the response is copied to
+    disk in EXPORT_READ_CHUNK_BYTES reads, so worker memory stays flat
+    regardless of row count. Rows are not ordered.
+    """
+    fmt = function_input.format
+    try:
+        dataset = await _get_dataset_ref(
+            function_input.workspace_id, function_input.dataset_id
+        )
+        if dataset is None:
+            return ExportDatasetEventsOutput(
                 success=False,
+                format=fmt,
                 error=f"Dataset {function_input.dataset_id} not found",
             )
-        dataset = dataset_result.dataset
         if dataset.storage_type != "clickhouse":
-            return DeleteDatasetEventsBySourceOutput(
-                success=False,
-                error="Delete by source is only supported for clickhouse storage",
-            )
-        source_safe = _sanitize_source_for_sql(
-            function_input.source
-        )
-        if not source_safe and function_input.source:
-            return DeleteDatasetEventsBySourceOutput(
+            return ExportDatasetEventsOutput(
                 success=False,
-                error="Invalid source value",
+                format=fmt,
+                error="Export is only supported for clickhouse storage",
             )
-        client = await get_clickhouse_async_client()
         storage_config = dataset.storage_config
-        where_conditions = _build_dataset_filters(
+        where_conditions, params = _build_where_conditions(
             storage_config,
             function_input.workspace_id,
             function_input.dataset_id,
         )
-        where_conditions.extend(
-            _build_tag_filters(storage_config)
-        )
-        where_conditions.extend(
-            _build_other_storage_filters(storage_config)
+        user_conditions, user_params = _build_user_filters(
+            QueryDatasetEventsInput(
+                workspace_id=function_input.workspace_id,
+                dataset_id=function_input.dataset_id,
+                tags=function_input.tags,
+                search_query=function_input.search_query,
+            )
         )
+        where_conditions.extend(user_conditions)
+        params.update(user_params)
         table_name = storage_config.get(
             "table", "pipeline_events"
         )
         _validate_table_name(table_name)
-        delete_where = " AND ".join(where_conditions)
-        # Use ALTER TABLE DELETE; match source (dot notation for Dynamic/JSON column)
-        delete_query = f"""
-        ALTER TABLE {table_name}
-        DELETE WHERE {delete_where}
-          AND toString(raw_data.source) = '{source_safe}'
-        """
-        await client.command(delete_query)
-        return DeleteDatasetEventsBySourceOutput(
-            success=True, deleted_count=-1
+        # table_name and where_clause come from validated storage_config, not user input
+        export_query = f"""
+        SELECT {_export_select(fmt)}
+        FROM {table_name}
+        WHERE {" AND ".join(where_conditions)}
+        """  # noqa: S608
+
+        clickhouse_format, extension = EXPORT_FORMATS[fmt]
+        client = await get_clickhouse_async_client()
+        stream = await client.raw_stream(
+            export_query,
+            parameters=params,
+            fmt=clickhouse_format,
         )
-    except (ValueError, TypeError, ConnectionError) as e:
-        return DeleteDatasetEventsBySourceOutput(
+        fd, tmp_name = tempfile.mkstemp(
+            prefix="export_", suffix=f".{extension}"
+        )
+        os.close(fd)
+        tmp_path = Path(tmp_name)
+
+        async def send_heartbeats() -> None:
+            while True:
+                await asyncio.sleep(
+                    EXPORT_HEARTBEAT_INTERVAL_SECONDS
+                )
+                heartbeat("export_dataset_events: streaming...")
+
+        heartbeat_task = asyncio.create_task(send_heartbeats())
+        try:
+            size_bytes = await asyncio.to_thread(
+                _copy_stream, stream, tmp_path
+            )
+            store = get_blob_store()
+            blob_key = await asyncio.to_thread(
+                store.put_file,
+                tmp_path,
+                key=(
+                    f"exports/{function_input.workspace_id}/"
+                    f"{function_input.dataset_id}/{uuid.uuid4()}.{extension}"
+                ),
+            )
+        finally:
+            heartbeat_task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await heartbeat_task
+            with contextlib.suppress(OSError):
+                await AnyioPath(tmp_path).unlink(missing_ok=True)
+
+        return ExportDatasetEventsOutput(
+            success=True,
+            format=fmt,
+            blob_key=blob_key,
+            url=store.url(blob_key),
+            size_bytes=size_bytes,
+        )
+    except (ValueError, TypeError, ConnectionError, OSError) as e:
+        return ExportDatasetEventsOutput(
             success=False,
+            format=fmt,
             error=str(e),
         )
+
+
+@function.defn()
+async def create_upload_url(
+    function_input: CreateUploadUrlInput,
+) -> CreateUploadUrlOutput:
+    """Presigned PUT URL for an upload when blobs live in an object store."""
+    prefix = f"uploads/{function_input.workspace_id}/"
+    if not function_input.blob_key.startswith(prefix):
+        msg = f"blob_key must start with {prefix}"
+        raise NonRetryableError(msg)
+    store = get_blob_store()
+    return CreateUploadUrlOutput(
+        url=await asyncio.to_thread(
+            store.upload_url, function_input.blob_key
+        )
+    )
+
+
+def _stage_inline_file(
+    workspace_id: str, item: dict[str, Any]
+) -> dict[str, Any]:
+    content = base64.b64decode(
+        item.get("content_base64") or "", validate=True
+    )
+    filename = item.get("filename") or "document.pdf"
+    # Same key shape as the upload route: unique per upload
+    key = get_blob_store().put_stream(
+        io.BytesIO(content),
+        prefix=f"uploads/{workspace_id}",
+        suffix=f"-{uuid.uuid4().hex}{Path(filename).suffix}",
+    )
+    return {
+        **{
+            k: v for k, v in item.items() if k != "content_base64"
+        },
+        "filename": filename,
+        "blob_key": key,
+        "size_bytes": len(content),
+        "content_hash": hashlib.sha256(content).hexdigest(),
+    }
+
+
+@function.defn()
+async def stage_inline_files(
+    function_input: StageInlineFilesInput,
+) -> StageInlineFilesOutput:
+    """Write legacy base64 files to the upload store; workflows pass keys.
+
+    Keeps the contents out of child workflow inputs and per-file steps.
+    Staged files are released after ingestion like any upload, or swept.
+    """
+    try:
+        files = [
+            await asyncio.to_thread(
+                _stage_inline_file,
+                function_input.workspace_id,
+                item,
+            )
+            for item in function_input.files
+        ]
+    except (ValueError, OSError) as e:
+        raise NonRetryableError(
+            message=f"Could not stage inline files: {e}"
+        ) from e
+    return StageInlineFilesOutput(files=files)
+
+
+@function.defn()
+async def get_dataset_files(
+    function_input: GetDatasetFilesInput,
+) -> ListDatasetFilesOutput:
+    """Live dataset_files manifest rows for the given sources."""
+    try:
+        client = await get_clickhouse_async_client()
+        result = await client.query(
+            """
+            SELECT source, chunk_count, size_bytes, content_hash,
+                   embed_model, ingested_at
+            FROM dataset_files FINAL
+            WHERE workspace_id = {workspace_id:UUID}
+              AND dataset_id = {dataset_id:String}
+              AND source IN {sources:Array(String)}
+              AND is_deleted = 0
+            """,
+            parameters={
+                "workspace_id": function_input.workspace_id,
+                "dataset_id": function_input.dataset_id,
+                "sources": function_input.sources,
+            },
+        )
+    except (ValueError, TypeError, ConnectionError) as e:
+        return ListDatasetFilesOutput(success=False, error=str(e))
+    return ListDatasetFilesOutput(
+        success=True,
+        files=[
+            DatasetFileSummary(
+                source=row[0] or "",
+                chunk_count=row[1] or 0,
+                size_bytes=row[2] or 0,
+                content_hash=row[3] or "",
+                embed_model=row[4] or "",
+                ingested_at=row[5].isoformat()
+                if row[5]
+                else None,
+            )
+            for row in result.result_rows or []
+        ],
+    )
@@ -1,35 +1,70 @@
 """PDF → extract, chunk, embed → pipeline_events via EmbedAnything and ClickHouse adapter.
 
-One subprocess per PDF (child exits so OS reclaims memory). Vector streaming to ClickHouse.
-Env: EMBED_CHUNK_SIZE, EMBED_BATCH_SIZE, EMBED_BUFFER_SIZE.
+Files arrive as blob store references (staged by the upload route) or, for
+older callers, inline base64. Files go to a pool of long-lived embed worker
+processes that keep the model loaded (embed_worker_pool); workers are
+recycled to keep memory bounded.
+With EMBED_CACHE=1, chunks already embedded anywhere (same model, chunking
+and text) come from the embedding cache (embed_chunk_cache).
+CSV and Parquet files are not chunked: each row becomes one event
+(tabular_ingestion), embedded only for the requested columns.
+Vector streaming to ClickHouse.
+Env: EMBED_CHUNK_SIZE, EMBED_BATCH_SIZE, EMBED_BUFFER_SIZE, EMBED_POOL_*,
+EMBED_CACHE.
 """
 
 import asyncio
 import base64
 import contextlib
-import json
-import os
-import subprocess
-import sys
+import csv
+import hashlib
 import tempfile
 from pathlib import Path
 from typing import Any
 
 from anyio import Path as AnyioPath
-from pydantic import BaseModel, Field
+from clickhouse_connect.driver.exceptions import DatabaseError
+from pydantic import BaseModel, Field, model_validator
 from restack_ai.function import function, heartbeat, log
 
+from src.functions.data_ingestion import insert_dedup_salt
+from src.functions.datasets_crud import (
+    delete_source_rows,
+    get_dataset_embedding_config,
+    get_dataset_file,
+    record_dataset_file,
+)
+from src.functions.embed_model_loader import DEFAULT_MODEL_ID
+from src.functions.embed_subprocess_runner import (
+    DATASET_ONLY_AGENT_ID,
+)
+from src.functions.embed_worker_pool import (
+    EmbedWorkerError,
+    get_embed_worker_pool,
+)
+from src.functions.tabular_ingestion import (
+    TabularFile,
+    ingest_tabular_file,
+    is_tabular,
+)
+from src.utils.blob_store import get_blob_store, hash_blob
+
 HEARTBEAT_INTERVAL_SECONDS = 45
 
 
 class EmbedAnythingPdfInput(BaseModel):
-    """Input: one PDF as base64 + pipeline context."""
+    """Input: one file (blob reference or base64) + pipeline context."""
 
     filename: str = Field(
         ..., description="Original filename (e.g. document.pdf)"
     )
-    content_base64: str = Field(
-        ..., description="PDF content as base64"
+    blob_key: str | None = Field(
+        default=None,
+        description="Staged upload key (uploads/<workspace_id>/...); preferred over content_base64.",
+    )
+    content_base64: str | None = Field(
+        default=None,
+        description="File content as base64 (legacy)",
     )
     agent_id: str | None = Field(
         default=None,
@@ -46,6 +81,24 @@ class EmbedAnythingPdfInput(BaseModel):
     tags: list[str] | None = Field(
         default_factory=lambda: ["pdf", "embed_anything"]
     )
+    embed_columns: list[str] = Field(
+        default_factory=list,
+        description="CSV/Parquet: columns whose text is embedded per row (none by default).",
+    )
+
+    @model_validator(mode="after")
+    def requires_blob_key_or_content(
+        self,
+    ) -> "EmbedAnythingPdfInput":
+        if not self.blob_key and not self.content_base64:
+            msg = "blob_key or content_base64 is required"
+            raise ValueError(msg)
+        if self.blob_key and not self.blob_key.startswith(
+            f"uploads/{self.workspace_id}/"
+        ):
+            msg = "blob_key is not an upload of this workspace"
+            raise ValueError(msg)
+        return self
 
 
 class EmbedAnythingPdfOutput(BaseModel):
@@ -57,42 +110,294 @@ class EmbedAnythingPdfOutput(BaseModel):
         default=False,
         description="True when ClickHouse adapter was used (events already in DB).",
     )
+    cache_hits: int = Field(
+        default=0,
+        description="Chunks whose embedding came from the embedding cache.",
+    )
+    cache_misses: int = Field(
+        default=0, description="Chunks embedded by the model."
+    )
     error: str | None = None
 
 
-@function.defn()
-async def embed_anything_pdf_to_events(
+async def _record_manifest(
     input_data: EmbedAnythingPdfInput,
-) -> EmbedAnythingPdfOutput:
-    """PDF → extract, chunk, embed; stream directly to ClickHouse via adapter (low RAM).
+    chunks_count: int,
+    size_bytes: int,
+    content_hash: str,
+    model_id: str,
+) -> None:
+    """Add the file to the dataset_files manifest; failures are logged only.
 
-    Uses EmbedAnything with a ClickHouse adapter so embeddings are written in batches
-    instead of accumulated in memory. Returns chunks_count and ingested_via_adapter=True;
-    caller should skip ingest_pipeline_events.
+    Chunks are already stored, so failing the activity would re-embed on retry.
     """
     try:
-        content = base64.b64decode(
-            input_data.content_base64, validate=True
+        await record_dataset_file(
+            workspace_id=input_data.workspace_id,
+            dataset_id=input_data.dataset_id,
+            source=input_data.filename,
+            chunk_count=chunks_count,
+            size_bytes=size_bytes,
+            content_hash=content_hash,
+            embed_model=model_id,
+            task_id=input_data.task_id,
         )
-    except (ValueError, TypeError) as e:
+    except (ValueError, TypeError, ConnectionError, OSError) as e:
         log.error(
-            f"embed_anything: invalid base64 filename={input_data.filename} error={e}"
+            f"embed_anything: manifest write failed filename={input_data.filename} {e}"
+        )
+
+
+async def _skip_if_unchanged(
+    input_data: EmbedAnythingPdfInput,
+    content_hash: str,
+    model_id: str,
+) -> EmbedAnythingPdfOutput | None:
+    """Output for a file whose exact content is already embedded, else None.
+
+    When an earlier version of the file (other content or model) is in the
+    dataset, its rows are deleted first so the new chunks replace them; an
+    error output is returned if that delete cannot be queued.
+    """
+    try:
+        existing = await get_dataset_file(
+            input_data.workspace_id,
+            input_data.dataset_id,
+            input_data.filename,
+        )
+    except (ValueError, TypeError, ConnectionError, OSError) as e:
+        log.error(
+            f"embed_anything: manifest lookup failed filename={input_data.filename} {e}"
+        )
+        return None
+    if (
+        existing is not None
+        and existing.content_hash == content_hash
+        and existing.embed_model == model_id
+    ):
+        log.info(
+            f"embed_anything: {input_data.filename} unchanged, skipping re-embed"
         )
         return EmbedAnythingPdfOutput(
-            error=f"Invalid base64: {e}"
+            chunks_count=existing.chunk_count,
+            ingested_via_adapter=True,
         )
+    if existing is not None:
+        try:
+            await delete_source_rows(
+                input_data.workspace_id,
+                input_data.dataset_id,
+                input_data.filename,
+            )
+        except (
+            ValueError,
+            TypeError,
+            ConnectionError,
+            OSError,
+            DatabaseError,
+        ) as e:
+            log.error(
+                f"embed_anything: previous version delete failed filename={input_data.filename} {e}"
+            )
+            return EmbedAnythingPdfOutput(
+                error=f"Could not replace the previous version: {e}"
+            )
+        log.info(
+            f"embed_anything: {input_data.filename} changed, previous version deleted"
+        )
+    return None
+
+
+async def _dataset_model(
+    input_data: EmbedAnythingPdfInput,
+) -> str:
+    """The dataset's embedding model (storage_config.embedding.model)."""
+    try:
+        config = await get_dataset_embedding_config(
+            input_data.workspace_id, input_data.dataset_id
+        )
+    except (ValueError, TypeError, ConnectionError, OSError) as e:
+        log.error(
+            f"embed_anything: dataset config lookup failed, using {DEFAULT_MODEL_ID} {e}"
+        )
+        return DEFAULT_MODEL_ID
+    return config.model
+
 
+def _write_temp_file(
+    input_data: EmbedAnythingPdfInput,
+) -> tuple[str, int, str]:
+    """Copy the file to a temp path (the worker needs a file); returns path, size, sha256."""
     suffix = Path(input_data.filename).suffix or ".pdf"
+    digest = hashlib.sha256()
     with tempfile.NamedTemporaryFile(
         delete=False,
         suffix=suffix,
         prefix="embed_",
     ) as tmp:
-        tmp.write(content)
-        path = tmp.name
-    del content
+        if input_data.blob_key:
+            with get_blob_store().open(
+                input_data.blob_key
+            ) as src:
+                while chunk := src.read(1 << 20):
+                    digest.update(chunk)
+                    tmp.write(chunk)
+        else:
+            content = base64.b64decode(
+                input_data.content_base64 or "", validate=True
+            )
+            digest.update(content)
+            tmp.write(content)
+        return tmp.name, tmp.tell(), digest.hexdigest()
+
+
+async def _stage_file(
+    input_data: EmbedAnythingPdfInput,
+) -> tuple[str, bool, int, str]:
+    """Path the embed worker reads, whether we own (delete) it, size and sha256.
+
+    A blob in the local store is read by the worker straight from its path
+    (the upload route keeps the file extension, which EmbedAnything needs);
+    anything else is copied to a temp file first.
+    """
+    store = get_blob_store()
+    local = (
+        store.local_path(input_data.blob_key)
+        if input_data.blob_key
+        else None
+    )
+    if local is not None and local.suffix and input_data.blob_key:
+        stat = await AnyioPath(local).stat()
+        content_hash = await asyncio.to_thread(
+            hash_blob, store, input_data.blob_key
+        )
+        return str(local), False, stat.st_size, content_hash
+    path, size_bytes, content_hash = await asyncio.to_thread(
+        _write_temp_file, input_data
+    )
+    return path, True, size_bytes, content_hash
+
+
+async def _release_file(
+    input_data: EmbedAnythingPdfInput,
+    path: str,
+    *,
+    owned: bool,
+    keep_upload: bool = False,
+) -> None:
+    """Drop the staged upload once its chunks are stored.
+
+    Upload keys are unique per upload, so this never removes a blob another
+    ingestion of the same file still needs.
+    """
+    if owned:
+        with contextlib.suppress(OSError):
+            await AnyioPath(path).unlink(missing_ok=True)
+    if input_data.blob_key and not keep_upload:
+        with contextlib.suppress(OSError):
+            await asyncio.to_thread(
+                get_blob_store().delete, input_data.blob_key
+            )
+
+
+async def _ingest_table(
+    input_data: EmbedAnythingPdfInput,
+    staged: tuple[str, bool, int, str],
+    model_id: str,
+) -> EmbedAnythingPdfOutput:
+    """CSV/Parquet: one event per row, inserted here rather than by an embed worker."""
+    path, owned, size_bytes, content_hash = staged
+    try:
+        rows = await ingest_tabular_file(
+            TabularFile(
+                path=path,
+                agent_id=input_data.agent_id
+                or DATASET_ONLY_AGENT_ID,
+                task_id=input_data.task_id,
+                workspace_id=input_data.workspace_id,
+                dataset_id=input_data.dataset_id,
+                event_name=input_data.event_name,
+                source=input_data.filename,
+                content_hash=content_hash,
+                tags=input_data.tags or ["tabular"],
+                embed_columns=input_data.embed_columns,
+                model_id=model_id,
+            )
+        )
+    except EmbedWorkerError as e:
+        log.error(
+            f"embed_anything: row embedding failed filename={input_data.filename} {e}"
+        )
+        return EmbedAnythingPdfOutput(error=str(e))
+    except (ValueError, TypeError, OSError, csv.Error) as e:
+        log.error(
+            f"embed_anything: table error filename={input_data.filename} {e}"
+        )
+        return EmbedAnythingPdfOutput(error=str(e))
+    finally:
+        if owned:
+            with contextlib.suppress(OSError):
+                await AnyioPath(path).unlink(missing_ok=True)
+    log.info(
+        f"embed_anything: stored {rows} rows for {input_data.filename}"
+    )
+    await _record_manifest(
+        input_data, rows, size_bytes, content_hash, model_id
+    )
+    await _release_file(input_data, path, owned=False)
+    return EmbedAnythingPdfOutput(
+        chunks_count=rows, ingested_via_adapter=True
+    )
+
+
+@function.defn()
+async def embed_anything_pdf_to_events(  # noqa: PLR0911
+    input_data: EmbedAnythingPdfInput,
+) -> EmbedAnythingPdfOutput:
+    """PDF → extract, chunk, embed; stream directly to ClickHouse via adapter (low RAM).
+
+    Uses EmbedAnything with a ClickHouse adapter so embeddings are written in batches
+    instead of accumulated in memory. Returns chunks_count and ingested_via_adapter=True;
+    caller should skip ingest_pipeline_events.
+    """
+    try:
+        staged = await _stage_file(input_data)
+    except (ValueError, TypeError) as e:
+        log.error(
+            f"embed_anything: invalid file filename={input_data.filename} error={e}"
+        )
+        return EmbedAnythingPdfOutput(error=f"Invalid file: {e}")
+    except OSError as e:
+        log.error(
+            f"embed_anything: staged file unavailable filename={input_data.filename} {e}"
+        )
+        return EmbedAnythingPdfOutput(
+            error=f"Uploaded file unavailable: {e}"
+        )
+    path, owned, size_bytes, content_hash = staged
+    tabular = is_tabular(input_data.filename)
+    # Tables without embed_columns are stored without any model
+    model_id = (
+        ""
+        if tabular and not input_data.embed_columns
+        else await _dataset_model(input_data)
+    )
+
+    skipped = await _skip_if_unchanged(
+        input_data, content_hash, model_id
+    )
+    if skipped is not None:
+        # A failed replace keeps the upload so the file can be retried
+        await _release_file(
+            input_data,
+            path,
+            owned=owned,
+            keep_upload=skipped.error is not None,
+        )
+        return skipped
+    if tabular:
+        return await _ingest_table(input_data, staged, model_id)
 
-    json_path = None
     try:
         payload = {
             "pdf_path": path,
@@ -103,73 +408,57 @@ async def embed_anything_pdf_to_events(
             "event_name": input_data.event_name,
             "source_filename": input_data.filename,
             "tags": input_data.tags or ["pdf", "embed_anything"],
+            "model_id": model_id,
+            "dedup_salt": insert_dedup_salt(),
         }
-        fd, json_path = tempfile.mkstemp(
-            prefix="embed_", suffix=".json"
-        )
-        os.close(fd)
-        await AnyioPath(json_path).write_text(json.dumps(payload))
 
         async def send_heartbeats() -> None:
             while True:
                 await asyncio.sleep(HEARTBEAT_INTERVAL_SECONDS)
                 heartbeat("embed_anything: processing...")
 
-        def run_subprocess() -> subprocess.CompletedProcess[str]:
-            return subprocess.run(  # noqa: S603 (json_path is our temp file path)
-                [
-                    sys.executable,
-                    "-m",
-                    "src.functions.embed_subprocess_runner",
-                    json_path,
-                ],
-                capture_output=True,
-                check=False,
-                text=True,
-                timeout=600,
-                env=os.environ,
-            )
-
         heartbeat_task = asyncio.create_task(send_heartbeats())
         try:
-            proc = await asyncio.to_thread(run_subprocess)
+            embedded = await get_embed_worker_pool().embed(
+                payload
+            )
         finally:
             heartbeat_task.cancel()
             with contextlib.suppress(asyncio.CancelledError):
                 await heartbeat_task
 
-        if proc.returncode != 0:
-            err = (
-                proc.stderr or ""
-            ).strip() or f"exit code {proc.returncode}"
-            log.error(
-                f"embed_anything: subprocess failed filename={input_data.filename} {err}"
-            )
-            return EmbedAnythingPdfOutput(error=err)
-        chunks_count = int(proc.stdout.strip().splitlines()[0])
+        chunks_count = embedded.insert_count
+        looked_up = embedded.cache_hits + embedded.cache_misses
         log.info(
-            f"embed_anything: streamed {chunks_count} chunks for {input_data.filename}"
+            f"embed_anything: streamed {chunks_count} chunks for {input_data.filename} "
+            f"(embedding cache {embedded.cache_hits}/{looked_up} hits)"
+        )
+        await _record_manifest(
+            input_data,
+            chunks_count,
+            size_bytes,
+            content_hash,
+            model_id,
         )
+        await _release_file(input_data, path, owned=owned)
         return EmbedAnythingPdfOutput(
             events=[],
             chunks_count=chunks_count,
             ingested_via_adapter=True,
+            cache_hits=embedded.cache_hits,
+            cache_misses=embedded.cache_misses,
         )
-    except subprocess.TimeoutExpired as e:
+    except EmbedWorkerError as e:
         log.error(
-            f"embed_anything: subprocess timeout filename={input_data.filename} {e}"
-        )
-        return EmbedAnythingPdfOutput(
-            error=f"Subprocess timeout: {e}"
+            f"embed_anything: embed worker failed filename={input_data.filename} {e}"
         )
+        return EmbedAnythingPdfOutput(error=str(e))
     except (ValueError, OSError) as e:
         log.error(
-            f"embed_anything: subprocess error filename={input_data.filename} {e}"
+            f"embed_anything: embed error filename={input_data.filename} {e}"
         )
         return EmbedAnythingPdfOutput(error=str(e))
     finally:
-        if json_path is not None:
+        if owned:
             with contextlib.suppress(OSError):
-                await AnyioPath(json_path).unlink(missing_ok=True)
-        with contextlib.suppress(OSError):
-            await AnyioPath(path).unlink(missing_ok=True)
+                await AnyioPath(path).unlink(missing_ok=True)
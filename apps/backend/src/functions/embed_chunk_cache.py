@@ -0,0 +1,337 @@
+"""Chunk-level embedding cache for the embed workers (opt-in).
+
+With EMBED_CACHE=1, text-like files (pdf, txt, md) are extracted and split
+here instead of inside embed_anything.embed_file, so every chunk can be
+looked up in the ClickHouse embedding_cache table before the model runs.
+Only misses are embedded (embed_anything.embed_query) and written back;
+re-ingesting an unchanged corpus costs lookups, not model time. Other file
+types, and files with no extractable text (scanned PDFs), still go through
+embed_file.
+
+The chunks differ from embed_file's (pypdf text, and the splitter below
+instead of embed_anything's), which is why the cache is off by default.
+Chunk boundaries are content-defined so an edit only changes the chunks
+around it: paragraphs are packed up to chunk_size, and a chunk always ends
+after an anchor paragraph (one whose text hash picks it, about one in
+_ANCHOR_EVERY), so packing falls back into step after an edit.
+
+Cache key: (model id, chunking config, sha256 of the whitespace-normalized
+chunk text). Runs in an embed worker thread on that thread's event loop,
+like ClickHouseEmbedAdapter.
+
+Env: EMBED_CACHE (default 0; 1 embeds text-like files through the cache).
+"""
+
+import asyncio
+import hashlib
+import logging
+import os
+import re
+from collections.abc import Iterator
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any
+
+logger = logging.getLogger(__name__)
+
+CACHEABLE_SUFFIXES = frozenset({".pdf", ".txt", ".md"})
+CACHE_TABLE = "embedding_cache"
+# Chunks looked up, embedded and inserted together
+CACHE_BLOCK_CHUNKS = 256
+_LOOKUP_BATCH = 1000
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+_PARAGRAPH_BREAK = re.compile(r"\n\s*\n")
+# About one paragraph in this many ends a chunk whatever came before it
+_ANCHOR_EVERY = 4
+
+
+def cache_enabled() -> bool:
+    return os.environ.get("EMBED_CACHE", "0") == "1"
+
+
+def chunk_config_key(chunk_size: int) -> str:
+    """Chunking part of the cache key; bump the prefix if the splitter changes."""
+    return f"paragraph-cdc{_ANCHOR_EVERY}:{chunk_size}"
+
+
+def normalize_chunk_text(text: str) -> str:
+    return " ".join(text.split())
+
+
+def chunk_text_hash(text: str) -> str:
+    return hashlib.sha256(
+        normalize_chunk_text(text).encode()
+    ).hexdigest()
+
+
+def extract_text_pages(
+    path: Path,
+) -> list[tuple[int | None, str]]:
+    """(page number, text) per PDF page, or one (None, text) for text files.
+
+    A PDF pypdf cannot read yields no pages (embed_file then handles it).
+    """
+    if path.suffix.lower() == ".pdf":
+        from pypdf import PdfReader
+        from pypdf.errors import PyPdfError
+
+        try:
+            reader = PdfReader(path)
+            return [
+                (number, page.extract_text() or "")
+                for number, page in enumerate(
+                    reader.pages, start=1
+                )
+            ]
+        except PyPdfError as e:
+            logger.warning("pypdf could not read %s: %s", path, e)
+            return []
+    return [
+        (None, path.read_text(encoding="utf-8", errors="replace"))
+    ]
+
+
+def _is_anchor(paragraph: str) -> bool:
+    digest = hashlib.sha256(paragraph.encode()).digest()
+    return int.from_bytes(digest[:4]) % _ANCHOR_EVERY == 0
+
+
+def _split_long(text: str, chunk_size: int) -> list[str]:
+    """Greedy sentence packing of one oversized paragraph.
+
+    Sentences longer than chunk_size are cut at whitespace (or hard-cut).
+    """
+    chunks: list[str] = []
+    current = ""
+    for piece in _SENTENCE_END.split(text):
+        sentence = piece
+        while len(sentence) > chunk_size:
+            cut = sentence.rfind(" ", 0, chunk_size)
+            cut = cut if cut > 0 else chunk_size
+            if current:
+                chunks.append(current)
+                current = ""
+            chunks.append(sentence[:cut])
+            sentence = sentence[cut:].lstrip()
+        if not sentence:
+            continue
+        if (
+            current
+            and len(current) + 1 + len(sentence) > chunk_size
+        ):
+            chunks.append(current)
+            current = sentence
+        else:
+            current = (
+                f"{current} {sentence}" if current else sentence
+            )
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def split_into_chunks(text: str, chunk_size: int) -> list[str]:
+    """Paragraphs packed up to chunk_size characters, content-defined.
+
+    A chunk never splits a paragraph unless the paragraph alone is longer
+    than chunk_size; those are split by sentence and end their chunk. A
+    chunk also ends after every anchor paragraph, so boundaries after an
+    edit line up again at the next anchor.
+    """
+    chunks: list[str] = []
+    current = ""
+    for raw in _PARAGRAPH_BREAK.split(text):
+        paragraph = normalize_chunk_text(raw)
+        if not paragraph:
+            continue
+        if len(paragraph) > chunk_size:
+            if current:
+                chunks.append(current)
+                current = ""
+            chunks.extend(_split_long(paragraph, chunk_size))
+            continue
+        if (
+            current
+            and len(current) + 1 + len(paragraph) > chunk_size
+        ):
+            chunks.append(current)
+            current = ""
+        current = (
+            f"{current} {paragraph}" if current else paragraph
+        )
+        if _is_anchor(paragraph):
+            chunks.append(current)
+            current = ""
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+@dataclass(slots=True)
+class CacheStats:
+    hits: int = 0
+    misses: int = 0
+
+
+class EmbeddingCache:
+    """Lookups and writes against embedding_cache for one model and config."""
+
+    def __init__(
+        self,
+        client: Any,  # clickhouse_connect.driver.AsyncClient
+        loop: asyncio.AbstractEventLoop,
+        *,
+        model_id: str,
+        chunk_config: str,
+    ) -> None:
+        self.client = client
+        self.loop = loop
+        self.model_id = model_id
+        self.chunk_config = chunk_config
+        self.stats = CacheStats()
+
+    async def _lookup_async(
+        self, hashes: list[str]
+    ) -> dict[str, list[float]]:
+        found: dict[str, list[float]] = {}
+        for start in range(0, len(hashes), _LOOKUP_BATCH):
+            result = await self.client.query(
+                f"""
+                SELECT text_hash, embedding
+                FROM {CACHE_TABLE}
+                WHERE model_id = {{model_id:String}}
+                  AND chunk_config = {{chunk_config:String}}
+                  AND text_hash IN {{hashes:Array(String)}}
+                """,  # noqa: S608
+                parameters={
+                    "model_id": self.model_id,
+                    "chunk_config": self.chunk_config,
+                    "hashes": hashes[
+                        start : start + _LOOKUP_BATCH
+                    ],
+                },
+            )
+            for text_hash, embedding in result.result_rows:
+                found[
+                    text_hash.decode()
+                    if isinstance(text_hash, bytes)
+                    else text_hash
+                ] = list(embedding)
+        return found
+
+    def lookup(self, hashes: list[str]) -> dict[str, list[float]]:
+        """Cached embeddings for the given text hashes (misses are absent)."""
+        unique = list(dict.fromkeys(hashes))
+        found = self.loop.run_until_complete(
+            self._lookup_async(unique)
+        )
+        hits = sum(1 for h in hashes if h in found)
+        self.stats.hits += hits
+        self.stats.misses += len(hashes) - hits
+        return found
+
+    def store(self, embeddings: dict[str, list[float]]) -> None:
+        """Write new entries; failures are logged only (the chunks are stored)."""
+        if not embeddings:
+            return
+        try:
+            self.loop.run_until_complete(
+                self.client.insert(
+                    table=CACHE_TABLE,
+                    data=[
+                        [self.model_id, self.chunk_config, h, emb]
+                        for h, emb in embeddings.items()
+                    ],
+                    column_names=[
+                        "model_id",
+                        "chunk_config",
+                        "text_hash",
+                        "embedding",
+                    ],
+                )
+            )
+        except (
+            ValueError,
+            TypeError,
+            ConnectionError,
+            OSError,
+        ) as e:
+            logger.warning("embedding cache write failed: %s", e)
+
+
+def _chunk_blocks(
+    pages: list[tuple[int | None, str]], chunk_size: int
+) -> Iterator[list[tuple[int | None, str]]]:
+    block: list[tuple[int | None, str]] = []
+    for page, text in pages:
+        for chunk in split_into_chunks(text, chunk_size):
+            block.append((page, chunk))
+            if len(block) >= CACHE_BLOCK_CHUNKS:
+                yield block
+                block = []
+    if block:
+        yield block
+
+
+def embed_file_with_cache(  # noqa: PLR0913
+    path: Path,
+    *,
+    model: Any,
+    adapter: Any,  # ClickHouseEmbedAdapter
+    cache: EmbeddingCache,
+    chunk_size: int,
+    batch_size: int,
+) -> bool:
+    """Embed path chunk by chunk through the cache into adapter.
+
+    Returns False (nothing written) when the file is not cacheable or has no
+    extractable text; the caller then falls back to embed_file.
+    """
+    if path.suffix.lower() not in CACHEABLE_SUFFIXES:
+        return False
+    pages = extract_text_pages(path)
+    if not any(text.strip() for _, text in pages):
+        return False
+    import embed_anything
+
+    for block in _chunk_blocks(pages, chunk_size):
+        hashes = [chunk_text_hash(text) for _, text in block]
+        found = cache.lookup(hashes)
+        missing = list(
+            dict.fromkeys(
+                (h, text)
+                for h, (_, text) in zip(
+                    hashes, block, strict=True
+                )
+                if h not in found
+            )
+        )
+        fresh: dict[str, list[float]] = {}
+        for start in range(0, len(missing), batch_size):
+            batch = missing[start : start + batch_size]
+            embedded = embed_anything.embed_query(
+                [text for _, text in batch], embedder=model
+            )
+            for (text_hash, _), item in zip(
+                batch, embedded, strict=True
+            ):
+                fresh[text_hash] = list(item.embedding)
+        cache.store(fresh)
+        found.update(fresh)
+        adapter.upsert(
+            [
+                {
+                    "text": text,
+                    "embedding": found[text_hash],
+                    "metadata": (
+                        {"page_number": str(page)}
+                        if page is not None
+                        else {}
+                    ),
+                }
+                for text_hash, (page, text) in zip(
+                    hashes, block, strict=True
+                )
+            ]
+        )
+    return True
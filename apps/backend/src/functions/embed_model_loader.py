@@ -1,4 +1,8 @@
-"""Config and model ID for embed subprocess runner. Override via EMBED_CHUNK_SIZE, EMBED_BATCH_SIZE, EMBED_BUFFER_SIZE."""
+"""Config and model ID for embed subprocess runner. Override via EMBED_CHUNK_SIZE, EMBED_BATCH_SIZE, EMBED_BUFFER_SIZE.
+
+Models other than DEFAULT_MODEL_ID must be listed in EMBED_ALLOWED_MODELS
+(comma-separated): each one is downloaded and kept resident on first use.
+"""
 
 import os
 
@@ -8,6 +12,30 @@ BATCH_SIZE = 8
 BUFFER_SIZE = 1
 
 
+def allowed_embed_models() -> list[str]:
+    """DEFAULT_MODEL_ID plus the models configured in EMBED_ALLOWED_MODELS."""
+    configured = os.environ.get("EMBED_ALLOWED_MODELS", "")
+    return list(
+        dict.fromkeys(
+            [
+                DEFAULT_MODEL_ID,
+                *(
+                    m.strip()
+                    for m in configured.split(",")
+                    if m.strip()
+                ),
+            ]
+        )
+    )
+
+
+def check_embed_model(model_id: str) -> None:
+    """Raise ValueError unless model_id is an allowed embedding model."""
+    if model_id not in allowed_embed_models():
+        msg = f"Embedding model {model_id} is not allowed; configure it in EMBED_ALLOWED_MODELS"
+        raise ValueError(msg)
+
+
 def _embed_config_values() -> tuple[int, int, int]:
     """Chunk, batch, buffer."""
     return (
@@ -1,45 +1,77 @@
-"""Run one PDF embed in a subprocess; child exits so OS reclaims memory.
+"""Embed PDFs in a child process so the parent worker never loads the model.
 
-Only this child process loads the embed model; the parent worker never imports
+Only child processes load the embed model; the parent worker never imports
 embed_anything, so ensure_embed_model_loaded is not needed.
-Invoked as: python -m src.functions.embed_subprocess_runner <path_to_json>
-JSON: pdf_path, agent_id, task_id, workspace_id, dataset_id, event_name, source_filename, tags.
-Prints insert_count to stdout; stderr + exit 1 on error.
+
+One-shot: python -m src.functions.embed_subprocess_runner <path_to_json>
+  JSON: pdf_path, agent_id, task_id, workspace_id, dataset_id, event_name,
+  source_filename, tags, model_id (default DEFAULT_MODEL_ID), dedup_salt. Prints insert_count to stdout; stderr + exit 1 on error.
+
+Serve (embed_worker_pool): python -m src.functions.embed_subprocess_runner
+  --serve [--concurrency N]. Loads each model once (the default at start,
+  others on first use by a dataset), then reads one JSON payload per stdin line (plus "id") and writes {"id", "insert_count", "cache_hits",
+  "cache_misses" | "error", "rss_bytes"} per line to stdout, embedding up to N
+  files at once. Exits on stdin EOF after finishing in-flight files.
+
+Serve texts (embed_texts): python -m src.functions.embed_subprocess_runner
+  --serve-texts [--model ID]. Loads the model once, then reads {"id", "texts"}
+  per stdin line and writes {"id", "model_id", "embeddings" | "error"} per line, one
+  embed_query call per request (requests are already micro-batched).
+
+With EMBED_CACHE=1, text-like files go through the chunk embedding cache
+(embed_chunk_cache); everything else through embed_anything.embed_file. CSV and Parquet never get here
+(tabular_ingestion stores them row by row).
 """
 
 import asyncio
-import contextlib
 import json
 import os
 import sys
-import tempfile
 import threading
 from dataclasses import dataclass
 from pathlib import Path
 from typing import Any
 
+from src.functions.embed_chunk_cache import (
+    CacheStats,
+    EmbeddingCache,
+    cache_enabled,
+    chunk_config_key,
+    embed_file_with_cache,
+)
+
 ARGC_EXPECTED = 2
 DATASET_ONLY_AGENT_ID = "00000000-0000-0000-0000-000000000000"
 EXIT_USAGE = 2
 
 
-def _path_for_embed_anything(
-    file_path: str,
-) -> tuple[str, Path | None]:
-    """embed_file supports pdf, md, txt, docx — normalize CSV via a temp .txt."""
-    path = Path(file_path)
-    if path.suffix.lower() != ".csv":
-        return file_path, None
-    text = path.read_text(encoding="utf-8", errors="replace")
-    fd, tmp = tempfile.mkstemp(prefix="embed_csv_", suffix=".txt")
-    os.close(fd)
-    tmp_path = Path(tmp)
-    tmp_path.write_text(text, encoding="utf-8")
-    return str(tmp_path), tmp_path
+_models: dict[str, Any] = {}
+# One lock per model, so a download blocks only files of that model
+_model_locks: dict[str, threading.Lock] = {}
+_model_locks_lock = threading.Lock()
+
+
+def _load_model(model_id: str) -> Any:
+    """The model for model_id, loaded once per process (datasets may differ)."""
+    from embed_anything import EmbeddingModel
+
+    from src.functions.embed_model_loader import check_embed_model
+
+    check_embed_model(model_id)
+    with _model_locks_lock:
+        lock = _model_locks.setdefault(model_id, threading.Lock())
+    with lock:
+        if model_id not in _models:
+            _models[model_id] = EmbeddingModel.from_pretrained_hf(
+                model_id=model_id
+            )
+        return _models[model_id]
 
 
-def _embedding_model_and_config() -> tuple[Any, Any]:
-    from embed_anything import EmbeddingModel, TextEmbedConfig
+def _embedding_model_and_config(
+    model_id: str | None = None,
+) -> tuple[Any, Any]:
+    from embed_anything import TextEmbedConfig
 
     from src.functions.embed_model_loader import (
         DEFAULT_MODEL_ID,
@@ -47,9 +79,7 @@ def _embedding_model_and_config() -> tuple[Any, Any]:
     )
 
     chunk_size, batch_size, buffer_size = _embed_config_values()
-    model = EmbeddingModel.from_pretrained_hf(
-        model_id=DEFAULT_MODEL_ID
-    )
+    model = _load_model(model_id or DEFAULT_MODEL_ID)
     config = TextEmbedConfig(
         chunk_size=chunk_size,
         batch_size=batch_size,
@@ -69,61 +99,254 @@ class _EmbedThreadContext:
     event_name: str
     source_filename: str
     tags: list[str]
+    model_id: str
     model: Any
     config: Any
+    dedup_salt: str = ""
 
 
-def _embed_worker(
+def _embed_file(
     ctx: _EmbedThreadContext,
-    result: list[int | BaseException],
-) -> None:
-    loop = asyncio.new_event_loop()
+    loop: asyncio.AbstractEventLoop,
+    client: Any,
+) -> tuple[int, CacheStats]:
+    """Embed one file through the ClickHouse adapter; returns insert_count and cache stats."""
+    from src.adapters.clickhouse_embed_adapter import (
+        ClickHouseEmbedAdapter,
+    )
+
     asyncio.set_event_loop(loop)
+    adapter = ClickHouseEmbedAdapter(
+        agent_id=ctx.agent_id,
+        task_id=ctx.task_id,
+        workspace_id=ctx.workspace_id,
+        dataset_id=ctx.dataset_id,
+        event_name=ctx.event_name,
+        source_filename=ctx.source_filename,
+        tags=ctx.tags,
+        embedding_model=ctx.model_id,
+        dedup_salt=ctx.dedup_salt,
+    )
     try:
-        from src.adapters.clickhouse_embed_adapter import (
-            ClickHouseEmbedAdapter,
-        )
-        from src.database.connection import (
-            get_clickhouse_async_client,
-        )
+        stats = _embed_into(ctx, loop, client, adapter)
+    except BaseException:
+        adapter.close(flush=False)
+        raise
+    # Waits for the inserter thread's last block
+    adapter.close()
+    return adapter.insert_count, stats
 
-        client = loop.run_until_complete(
-            get_clickhouse_async_client()
-        )
-        adapter = ClickHouseEmbedAdapter(
+
+def _embed_into(
+    ctx: _EmbedThreadContext,
+    loop: asyncio.AbstractEventLoop,
+    client: Any,
+    adapter: Any,  # ClickHouseEmbedAdapter
+) -> CacheStats:
+    """Run the file through the chunk cache or embed_file into adapter."""
+    from src.functions.embed_model_loader import (
+        _embed_config_values,
+    )
+
+    if cache_enabled():
+        chunk_size, batch_size, _ = _embed_config_values()
+        cache = EmbeddingCache(
             client,
-            agent_id=ctx.agent_id,
-            task_id=ctx.task_id,
-            workspace_id=ctx.workspace_id,
-            dataset_id=ctx.dataset_id,
-            event_name=ctx.event_name,
-            source_filename=ctx.source_filename,
-            tags=ctx.tags,
+            loop,
+            model_id=ctx.model_id,
+            chunk_config=chunk_config_key(chunk_size),
         )
-        import embed_anything
+        if embed_file_with_cache(
+            Path(ctx.pdf_path),
+            model=ctx.model,
+            adapter=adapter,
+            cache=cache,
+            chunk_size=chunk_size,
+            batch_size=batch_size,
+        ):
+            return cache.stats
 
-        embed_path, csv_txt_cleanup = _path_for_embed_anything(
-            ctx.pdf_path
-        )
-        try:
-            embed_anything.embed_file(
-                embed_path,
-                embedder=ctx.model,
-                config=ctx.config,
-                adapter=adapter,
-            )
-        finally:
-            if csv_txt_cleanup is not None:
-                with contextlib.suppress(OSError):
-                    csv_txt_cleanup.unlink(missing_ok=True)
-        result.append(adapter.insert_count)
+    import embed_anything
+
+    embed_anything.embed_file(
+        ctx.pdf_path,
+        embedder=ctx.model,
+        config=ctx.config,
+        adapter=adapter,
+    )
+    return CacheStats()
+
+
+def _new_loop_and_client() -> tuple[
+    asyncio.AbstractEventLoop, Any
+]:
+    from src.database.connection import (
+        get_clickhouse_async_client,
+    )
+
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    return loop, loop.run_until_complete(
+        get_clickhouse_async_client()
+    )
+
+
+def _embed_worker(
+    ctx: _EmbedThreadContext,
+    result: list[int | BaseException],
+) -> None:
+    loop = None
+    try:
+        loop, client = _new_loop_and_client()
+        result.append(_embed_file(ctx, loop, client)[0])
     except BaseException as e:  # noqa: BLE001 (intentionally catch all to report back)
         result.append(e)
     finally:
-        loop.close()
+        if loop is not None:
+            loop.close()
+
+
+def _context_from_payload(
+    payload: dict[str, Any],
+) -> _EmbedThreadContext:
+    from src.functions.embed_model_loader import DEFAULT_MODEL_ID
+
+    model_id = payload.get("model_id") or DEFAULT_MODEL_ID
+    model, config = _embedding_model_and_config(model_id)
+    return _EmbedThreadContext(
+        pdf_path=payload["pdf_path"],
+        agent_id=payload.get("agent_id") or DATASET_ONLY_AGENT_ID,
+        task_id=payload.get("task_id"),
+        workspace_id=payload["workspace_id"],
+        dataset_id=payload["dataset_id"],
+        event_name=payload.get("event_name", "PDF Chunk"),
+        source_filename=payload["source_filename"],
+        tags=payload.get("tags") or ["pdf", "embed_anything"],
+        model_id=model_id,
+        model=model,
+        config=config,
+        dedup_salt=payload.get("dedup_salt") or "",
+    )
+
+
+def _peak_rss_bytes() -> int:
+    import resource
+
+    # ru_maxrss is KiB on Linux
+    return (
+        resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    )
+
+
+def _protocol_stream() -> Any:
+    """Private copy of stdout for protocol lines.
+
+    Anything else printing to stdout (native libraries included) goes to
+    stderr instead.
+    """
+    protocol = os.fdopen(os.dup(sys.stdout.fileno()), "w")
+    os.dup2(sys.stderr.fileno(), sys.stdout.fileno())
+    return protocol
+
+
+def _serve(concurrency: int) -> None:
+    """Embed payloads read from stdin until EOF (see module docstring)."""
+    from concurrent.futures import ThreadPoolExecutor
+
+    protocol = _protocol_stream()
+    write_lock = threading.Lock()
+    local = threading.local()
+    # Load the default model up front; others load on first use
+    _embedding_model_and_config()
+
+    def respond(message: dict[str, Any]) -> None:
+        message["rss_bytes"] = _peak_rss_bytes()
+        with write_lock:
+            protocol.write(json.dumps(message) + "\n")
+            protocol.flush()
+
+    def handle(payload: dict[str, Any]) -> None:
+        request_id = payload.get("id")
+        try:
+            # One loop and ClickHouse client per thread, reused across files
+            if not hasattr(local, "client"):
+                local.loop, local.client = _new_loop_and_client()
+            count, stats = _embed_file(
+                _context_from_payload(payload),
+                local.loop,
+                local.client,
+            )
+            respond(
+                {
+                    "id": request_id,
+                    "insert_count": count,
+                    "cache_hits": stats.hits,
+                    "cache_misses": stats.misses,
+                }
+            )
+        except Exception as e:  # noqa: BLE001 (report every failure to the pool)
+            respond({"id": request_id, "error": str(e)})
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for line in sys.stdin:
+            if not line.strip():
+                continue
+            try:
+                payload = json.loads(line)
+            except ValueError as e:
+                respond(
+                    {"id": None, "error": f"Invalid payload: {e}"}
+                )
+                continue
+            executor.submit(handle, payload)
+
+
+def _serve_texts() -> None:
+    """Embed text batches read from stdin until EOF (see module docstring)."""
+    import embed_anything
+
+    from src.functions.embed_model_loader import DEFAULT_MODEL_ID
+
+    model_id = DEFAULT_MODEL_ID
+    if "--model" in sys.argv:
+        model_id = sys.argv[sys.argv.index("--model") + 1]
+    protocol = _protocol_stream()
+    model, _ = _embedding_model_and_config(model_id)
+    for line in sys.stdin:
+        if not line.strip():
+            continue
+        request_id = None
+        try:
+            payload = json.loads(line)
+            request_id = payload.get("id")
+            embedded = embed_anything.embed_query(
+                payload["texts"], embedder=model
+            )
+            message: dict[str, Any] = {
+                "id": request_id,
+                "model_id": model_id,
+                "embeddings": [
+                    list(item.embedding) for item in embedded
+                ],
+            }
+        except Exception as e:  # noqa: BLE001 (report every failure to the caller)
+            message = {"id": request_id, "error": str(e)}
+        protocol.write(json.dumps(message) + "\n")
+        protocol.flush()
 
 
 def _run() -> int:
+    if "--serve-texts" in sys.argv:
+        _serve_texts()
+        sys.exit(0)
+    if "--serve" in sys.argv:
+        concurrency = 1
+        if "--concurrency" in sys.argv:
+            concurrency = int(
+                sys.argv[sys.argv.index("--concurrency") + 1]
+            )
+        _serve(max(1, concurrency))
+        sys.exit(0)
     if len(sys.argv) != ARGC_EXPECTED:
         sys.stderr.write(
             "Usage: python -m src.functions.embed_subprocess_runner <json_path>\n"
@@ -135,29 +358,8 @@ def _run() -> int:
         sys.exit(EXIT_USAGE)
     payload = json.loads(json_path.read_text())
 
-    pdf_path = payload["pdf_path"]
-    agent_id = payload.get("agent_id") or DATASET_ONLY_AGENT_ID
-    task_id = payload.get("task_id")
-    workspace_id = payload["workspace_id"]
-    dataset_id = payload["dataset_id"]
-    event_name = payload.get("event_name", "PDF Chunk")
-    source_filename = payload["source_filename"]
-    tags = payload.get("tags") or ["pdf", "embed_anything"]
-
-    model, config = _embedding_model_and_config()
     result: list[int | BaseException] = []
-    ctx = _EmbedThreadContext(
-        pdf_path=pdf_path,
-        agent_id=agent_id,
-        task_id=task_id,
-        workspace_id=workspace_id,
-        dataset_id=dataset_id,
-        event_name=event_name,
-        source_filename=source_filename,
-        tags=tags,
-        model=model,
-        config=config,
-    )
+    ctx = _context_from_payload(payload)
     t = threading.Thread(
         target=_embed_worker,
         args=(ctx, result),
@@ -0,0 +1,468 @@
+"""Online text embedding with dynamic micro-batching.
+
+Interactive callers (semantic dataset search, similar-task lookup, agent
+retrieval) need a few embeddings with low latency, not the file pipeline.
+embed_texts runs on TASK_QUEUE_EMBED_QUERY in the embed service; all of its
+concurrent runs share one TextEmbedder, which
+
+- keeps the model resident in one ``embed_subprocess_runner --serve-texts``
+  process (the worker itself still never imports embed_anything),
+- answers repeated texts from an in-memory LRU cache,
+- collects texts from concurrent requests for up to EMBED_TEXTS_BATCH_WAIT_MS
+  (or until EMBED_TEXTS_MAX_BATCH texts are waiting) and embeds them in one
+  embed_query call.
+
+Texts are whitespace-normalized like stored chunks. Each model gets its own
+resident process; callers pass the dataset's model (storage_config.embedding,
+DEFAULT_MODEL_ID by default) so vectors compare with its stored chunks. Only
+allowed models are served (embed_model_loader.check_embed_model), and at
+most EMBED_TEXTS_MAX_MODELS processes are kept: the least recently used idle
+one is stopped to make room.
+
+Bulk callers (row embedding of tables, dataset re-embedding) on the file
+queue use get_text_embedder(..., bulk=True).embed_batch: a process of their
+own, no micro-batching wait and no LRU, so they neither delay queries nor
+evict their cached texts.
+
+Env: EMBED_TEXTS_BATCH_WAIT_MS, EMBED_TEXTS_MAX_BATCH, EMBED_TEXTS_CACHE_SIZE,
+EMBED_TEXTS_CONCURRENCY, EMBED_TEXTS_MAX_MODELS.
+"""
+
+import asyncio
+import contextlib
+import itertools
+import json
+import logging
+import os
+import sys
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+
+from pydantic import BaseModel, Field, field_validator
+from restack_ai.function import function
+
+from src.functions.embed_chunk_cache import normalize_chunk_text
+from src.functions.embed_model_loader import (
+    DEFAULT_MODEL_ID,
+    check_embed_model,
+)
+from src.functions.embed_worker_pool import EmbedWorkerError
+
+logger = logging.getLogger(__name__)
+
+EMBED_TEXTS_BATCH_WAIT_MS = float(
+    os.getenv("EMBED_TEXTS_BATCH_WAIT_MS", "5")
+)
+EMBED_TEXTS_MAX_BATCH = int(
+    os.getenv("EMBED_TEXTS_MAX_BATCH", "64")
+)
+EMBED_TEXTS_CACHE_SIZE = int(
+    os.getenv("EMBED_TEXTS_CACHE_SIZE", "10000")
+)
+# embed_texts runs the worker accepts at once (they share one model)
+EMBED_TEXTS_CONCURRENCY = int(
+    os.getenv("EMBED_TEXTS_CONCURRENCY", "64")
+)
+# Resident model processes (query and bulk) kept per worker
+EMBED_TEXTS_MAX_MODELS = int(
+    os.getenv("EMBED_TEXTS_MAX_MODELS", "2")
+)
+EMBED_TEXTS_TIMEOUT_SECONDS = 60
+EMBED_TEXTS_MAX_TEXTS = 256
+# Responses carry a batch of vectors as JSON
+_STREAM_LIMIT = 32 << 20
+
+
+@dataclass(eq=False)
+class _TextProcess:
+    process: asyncio.subprocess.Process
+    pending: dict[int, asyncio.Future[list[list[float]]]] = field(
+        default_factory=dict
+    )
+    reader: asyncio.Task[None] | None = None
+
+    @property
+    def alive(self) -> bool:
+        return self.process.returncode is None
+
+
+class TextEmbedder:
+    """Micro-batching, LRU-cached front end to the resident text model."""
+
+    def __init__(
+        self,
+        model_id: str = DEFAULT_MODEL_ID,
+        *,
+        batch_wait_ms: float = EMBED_TEXTS_BATCH_WAIT_MS,
+        max_batch: int = EMBED_TEXTS_MAX_BATCH,
+        cache_size: int = EMBED_TEXTS_CACHE_SIZE,
+    ) -> None:
+        self.model_id = model_id
+        self.batch_wait = max(0.0, batch_wait_ms) / 1000
+        self.max_batch = max(1, max_batch)
+        self.cache_size = max(0, cache_size)
+        self._cache: OrderedDict[str, list[float]] = OrderedDict()
+        # Texts queued or in flight, shared by every caller asking for them
+        self._waiting: dict[str, asyncio.Future[list[float]]] = {}
+        self._queue: list[str] = []
+        self._flush_handle: asyncio.TimerHandle | None = None
+        self._batches: set[asyncio.Task[None]] = set()
+        self._worker: _TextProcess | None = None
+        self._spawn_lock = asyncio.Lock()
+        self._ids = itertools.count(1)
+        self.last_used = time.monotonic()
+
+    @property
+    def idle(self) -> bool:
+        """True when no text is queued or in flight."""
+        return not self._waiting and not (
+            self._worker is not None and self._worker.pending
+        )
+
+    def _cache_get(self, text: str) -> list[float] | None:
+        embedding = self._cache.get(text)
+        if embedding is not None:
+            self._cache.move_to_end(text)
+        return embedding
+
+    def _cache_put(
+        self, text: str, embedding: list[float]
+    ) -> None:
+        if not self.cache_size:
+            return
+        self._cache[text] = embedding
+        self._cache.move_to_end(text)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    async def embed(
+        self, texts: list[str]
+    ) -> tuple[list[list[float]], int]:
+        """Embeddings for texts in order, and how many were cache hits."""
+        keys = [normalize_chunk_text(text) for text in texts]
+        loop = asyncio.get_running_loop()
+        found: dict[str, list[float]] = {}
+        waits: dict[str, asyncio.Future[list[float]]] = {}
+        for key in dict.fromkeys(keys):
+            cached = self._cache_get(key)
+            if cached is not None:
+                found[key] = cached
+            elif key in self._waiting:
+                waits[key] = self._waiting[key]
+            else:
+                future: asyncio.Future[list[float]] = (
+                    loop.create_future()
+                )
+                self._waiting[key] = future
+                self._queue.append(key)
+                waits[key] = future
+        hits = sum(1 for key in keys if key in found)
+        self._schedule_flush()
+        self.last_used = time.monotonic()
+        if waits:
+            # Shielded: one caller giving up must not cancel a text
+            # other callers are waiting for
+            embedded = await asyncio.gather(
+                *(asyncio.shield(f) for f in waits.values())
+            )
+            found.update(zip(waits, embedded, strict=True))
+        return [found[key] for key in keys], hits
+
+    def _schedule_flush(self) -> None:
+        if len(self._queue) >= self.max_batch:
+            self._flush()
+        elif self._queue and self._flush_handle is None:
+            self._flush_handle = (
+                asyncio.get_running_loop().call_later(
+                    self.batch_wait, self._flush
+                )
+            )
+
+    def _flush(self) -> None:
+        """Send everything queued, max_batch texts per request."""
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        while self._queue:
+            batch = self._queue[: self.max_batch]
+            del self._queue[: self.max_batch]
+            task = asyncio.create_task(self._embed_batch(batch))
+            self._batches.add(task)
+            task.add_done_callback(self._batches.discard)
+
+    async def embed_batch(
+        self, texts: list[str]
+    ) -> list[list[float]]:
+        """Embeddings for texts in order, bypassing the cache and the batch wait."""
+        self.last_used = time.monotonic()
+        keys = [normalize_chunk_text(text) for text in texts]
+        embeddings: list[list[float]] = []
+        for start in range(0, len(keys), self.max_batch):
+            embeddings.extend(
+                await self._request(
+                    keys[start : start + self.max_batch]
+                )
+            )
+        return embeddings
+
+    async def _embed_batch(self, batch: list[str]) -> None:
+        """Resolve the batch's waiting futures.
+
+        Whatever goes wrong (a worker error, a malformed response, the
+        task being cancelled), every future of the batch still waiting
+        fails with EmbedWorkerError, so no caller waits forever.
+        """
+        error = "embed_texts batch was cancelled"
+        try:
+            embeddings = await self._request(batch)
+            for text, embedding in zip(
+                batch, embeddings, strict=True
+            ):
+                self._cache_put(text, embedding)
+                future = self._waiting.pop(text, None)
+                if future is not None and not future.done():
+                    future.set_result(embedding)
+        except EmbedWorkerError as e:
+            error = str(e)
+        except Exception as e:
+            logger.exception("embed_texts batch failed")
+            error = f"{type(e).__name__}: {e}"
+        finally:
+            for text in batch:
+                future = self._waiting.pop(text, None)
+                if future is not None and not future.done():
+                    future.set_exception(EmbedWorkerError(error))
+
+    async def _ensure_worker(self) -> _TextProcess:
+        async with self._spawn_lock:
+            if self._worker is not None and self._worker.alive:
+                return self._worker
+            process = await asyncio.create_subprocess_exec(
+                sys.executable,
+                "-m",
+                "src.functions.embed_subprocess_runner",
+                "--serve-texts",
+                "--model",
+                self.model_id,
+                stdin=asyncio.subprocess.PIPE,
+                stdout=asyncio.subprocess.PIPE,
+                env=os.environ,
+                limit=_STREAM_LIMIT,
+            )
+            worker = _TextProcess(process=process)
+            worker.reader = asyncio.create_task(
+                self._read(worker)
+            )
+            self._worker = worker
+            logger.info(
+                "embed_texts: started %s process pid=%s",
+                self.model_id,
+                process.pid,
+            )
+            return worker
+
+    async def _read(self, worker: _TextProcess) -> None:
+        """Resolve the process's requests from its stdout until it exits."""
+        stdout = worker.process.stdout
+        try:
+            while stdout is not None and (
+                line := await stdout.readline()
+            ):
+                try:
+                    message = json.loads(line)
+                except ValueError:
+                    logger.warning(
+                        "embed_texts: bad model process line %r",
+                        line[:200],
+                    )
+                    continue
+                future = worker.pending.pop(
+                    message.get("id"), None
+                )
+                if future is None or future.done():
+                    continue
+                if message.get("error"):
+                    future.set_exception(
+                        EmbedWorkerError(message["error"])
+                    )
+                elif message.get("model_id") != self.model_id:
+                    future.set_exception(
+                        EmbedWorkerError(
+                            f"model process serves {message.get('model_id')}, expected {self.model_id}"
+                        )
+                    )
+                else:
+                    future.set_result(message["embeddings"])
+        finally:
+            if worker.alive:
+                with contextlib.suppress(ProcessLookupError):
+                    worker.process.kill()
+            await worker.process.wait()
+            for future in worker.pending.values():
+                if not future.done():
+                    future.set_exception(
+                        EmbedWorkerError(
+                            f"embed_texts model process exited with code {worker.process.returncode}"
+                        )
+                    )
+            worker.pending.clear()
+
+    async def _request(
+        self, texts: list[str]
+    ) -> list[list[float]]:
+        worker = await self._ensure_worker()
+        request_id = next(self._ids)
+        future: asyncio.Future[list[list[float]]] = (
+            asyncio.get_running_loop().create_future()
+        )
+        worker.pending[request_id] = future
+        stdin = worker.process.stdin
+        try:
+            if stdin is None:
+                msg = "embed_texts model process has no stdin"
+                raise EmbedWorkerError(msg)
+            stdin.write(
+                json.dumps(
+                    {"id": request_id, "texts": texts}
+                ).encode()
+                + b"\n"
+            )
+            await stdin.drain()
+            embeddings = await asyncio.wait_for(
+                future, EMBED_TEXTS_TIMEOUT_SECONDS
+            )
+        except TimeoutError as e:
+            with contextlib.suppress(ProcessLookupError):
+                worker.process.kill()
+            msg = f"embed_texts timed out after {EMBED_TEXTS_TIMEOUT_SECONDS}s"
+            raise EmbedWorkerError(msg) from e
+        except (BrokenPipeError, ConnectionResetError) as e:
+            msg = f"embed_texts model process unavailable: {e}"
+            raise EmbedWorkerError(msg) from e
+        finally:
+            worker.pending.pop(request_id, None)
+        if len(embeddings) != len(texts):
+            msg = f"embed_texts got {len(embeddings)} vectors for {len(texts)} texts"
+            raise EmbedWorkerError(msg)
+        return embeddings
+
+    async def close(self) -> None:
+        """Stop the model process (queued and in-flight texts fail)."""
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        worker, self._worker = self._worker, None
+        if worker is None:
+            return
+        stdin = worker.process.stdin
+        if stdin is not None and not stdin.is_closing():
+            stdin.close()
+        if worker.reader is not None:
+            await worker.reader
+
+
+_embedders: dict[tuple[str, bool], TextEmbedder] = {}
+_evictions: set[asyncio.Task[None]] = set()
+
+
+def _evict_idle_embedders(keep: tuple[str, bool]) -> None:
+    """Stop least recently used idle embedders beyond EMBED_TEXTS_MAX_MODELS."""
+    by_age = sorted(
+        _embedders.items(), key=lambda item: item[1].last_used
+    )
+    excess = len(_embedders) - max(1, EMBED_TEXTS_MAX_MODELS)
+    for key, embedder in by_age:
+        if excess <= 0:
+            return
+        if key == keep or not embedder.idle:
+            continue
+        del _embedders[key]
+        excess -= 1
+        logger.info(
+            "embed_texts: stopping idle %s process", key[0]
+        )
+        task = asyncio.create_task(embedder.close())
+        _evictions.add(task)
+        task.add_done_callback(_evictions.discard)
+
+
+def get_text_embedder(
+    model_id: str = DEFAULT_MODEL_ID, *, bulk: bool = False
+) -> TextEmbedder:
+    """Return the process-wide text embedder for model_id.
+
+    bulk embedders are separate from the query ones (see module docstring).
+    Raises ValueError for models that are not allowed.
+    """
+    key = (model_id, bulk)
+    if key not in _embedders:
+        check_embed_model(model_id)
+        _embedders[key] = (
+            TextEmbedder(model_id, batch_wait_ms=0, cache_size=0)
+            if bulk
+            else TextEmbedder(model_id)
+        )
+        _evict_idle_embedders(keep=key)
+    return _embedders[key]
+
+
+class EmbedTextsInput(BaseModel):
+    texts: list[str] = Field(
+        ..., min_length=1, max_length=EMBED_TEXTS_MAX_TEXTS
+    )
+    model_id: str = Field(
+        default=DEFAULT_MODEL_ID,
+        min_length=1,
+        description="Model of the vectors being compared against (the dataset's model).",
+    )
+    dimension: int | None = Field(
+        default=None,
+        ge=1,
+        description="Expected vector length (e.g. of stored embeddings).",
+    )
+
+    @field_validator("texts")
+    @classmethod
+    def texts_not_blank(cls, texts: list[str]) -> list[str]:
+        if any(not text.strip() for text in texts):
+            msg = "texts must not be blank"
+            raise ValueError(msg)
+        return texts
+
+
+class EmbedTextsOutput(BaseModel):
+    success: bool
+    embeddings: list[list[float]] = Field(default_factory=list)
+    model_id: str = DEFAULT_MODEL_ID
+    dimension: int = 0
+    cache_hits: int = 0
+    error: str | None = None
+
+
+@function.defn()
+async def embed_texts(
+    function_input: EmbedTextsInput,
+) -> EmbedTextsOutput:
+    """Embed short texts (queries) with the model used for stored chunks."""
+    model_id = function_input.model_id
+    try:
+        embeddings, cache_hits = await get_text_embedder(
+            model_id
+        ).embed(function_input.texts)
+    except (EmbedWorkerError, ValueError) as e:
+        logger.exception("embed_texts failed")
+        return EmbedTextsOutput(success=False, error=str(e))
+    dimension = len(embeddings[0])
+    if function_input.dimension not in (None, dimension):
+        return EmbedTextsOutput(
+            success=False,
+            error=f"Model {model_id} returns {dimension}-dim vectors, expected {function_input.dimension}",
+        )
+    return EmbedTextsOutput(
+        success=True,
+        embeddings=embeddings,
+        model_id=model_id,
+        dimension=dimension,
+        cache_hits=cache_hits,
+    )
@@ -0,0 +1,272 @@
+"""Supervised pool of long-lived embed worker processes.
+
+Each worker runs ``python -m src.functions.embed_subprocess_runner --serve``:
+it loads the embed model once and embeds files sent as JSON lines on stdin,
+answering on stdout. The parent worker still never imports embed_anything.
+
+Memory isolation is kept by recycling: a worker is retired (finishes its
+in-flight files, then exits) after EMBED_WORKER_MAX_FILES files or once its
+peak RSS passes EMBED_WORKER_MAX_RSS_MB. A worker that dies or times out is
+killed and its in-flight files fail; the next file starts a fresh one.
+
+Env: EMBED_POOL_WORKERS, EMBED_WORKER_CONCURRENCY, EMBED_WORKER_MAX_FILES,
+EMBED_WORKER_MAX_RSS_MB.
+"""
+
+import asyncio
+import contextlib
+import itertools
+import json
+import logging
+import os
+import sys
+from dataclasses import dataclass, field
+from typing import Any
+
+logger = logging.getLogger(__name__)
+
+EMBED_POOL_WORKERS = int(os.getenv("EMBED_POOL_WORKERS", "1"))
+# Files a worker embeds at once (threads sharing the loaded model)
+EMBED_WORKER_CONCURRENCY = int(
+    os.getenv("EMBED_WORKER_CONCURRENCY", "1")
+)
+EMBED_WORKER_MAX_FILES = int(
+    os.getenv("EMBED_WORKER_MAX_FILES", "50")
+)
+EMBED_WORKER_MAX_RSS_MB = int(
+    os.getenv("EMBED_WORKER_MAX_RSS_MB", "1536")
+)
+EMBED_FILE_TIMEOUT_SECONDS = 600
+# Worker responses carry a file's insert count; lines stay small
+_STREAM_LIMIT = 1 << 20
+
+
+class EmbedWorkerError(Exception):
+    """A file could not be embedded by a pool worker."""
+
+
+@dataclass(frozen=True, slots=True)
+class EmbedResult:
+    """Rows inserted for a file and its chunk embedding cache hits/misses."""
+
+    insert_count: int
+    cache_hits: int = 0
+    cache_misses: int = 0
+
+
+@dataclass(eq=False)
+class _Worker:
+    process: asyncio.subprocess.Process
+    pending: dict[int, asyncio.Future[EmbedResult]] = field(
+        default_factory=dict
+    )
+    files_done: int = 0
+    retiring: bool = False
+    reader: asyncio.Task[None] | None = None
+
+    @property
+    def alive(self) -> bool:
+        return self.process.returncode is None
+
+
+class EmbedWorkerPool:
+    """Routes files to up to ``size`` workers, ``concurrency`` files each."""
+
+    def __init__(
+        self,
+        *,
+        size: int = EMBED_POOL_WORKERS,
+        concurrency: int = EMBED_WORKER_CONCURRENCY,
+        max_files: int = EMBED_WORKER_MAX_FILES,
+        max_rss_bytes: int = EMBED_WORKER_MAX_RSS_MB
+        * 1024
+        * 1024,
+    ) -> None:
+        self.size = max(1, size)
+        self.concurrency = max(1, concurrency)
+        self.max_files = max(1, max_files)
+        self.max_rss_bytes = max_rss_bytes
+        self._workers: list[_Worker] = []
+        self._changed = asyncio.Condition()
+        self._ids = itertools.count(1)
+
+    @property
+    def capacity(self) -> int:
+        """Files the pool embeds at once."""
+        return self.size * self.concurrency
+
+    async def _spawn(self) -> _Worker:
+        process = await asyncio.create_subprocess_exec(
+            sys.executable,
+            "-m",
+            "src.functions.embed_subprocess_runner",
+            "--serve",
+            "--concurrency",
+            str(self.concurrency),
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            env=os.environ,
+            limit=_STREAM_LIMIT,
+        )
+        worker = _Worker(process=process)
+        worker.reader = asyncio.create_task(self._read(worker))
+        self._workers.append(worker)
+        logger.info(
+            "embed pool: started worker pid=%s", process.pid
+        )
+        return worker
+
+    async def _acquire(self) -> _Worker:
+        """A live worker with a free slot, spawning one if the pool has room."""
+        async with self._changed:
+            while True:
+                self._workers = [
+                    w for w in self._workers if w.alive
+                ]
+                for worker in self._workers:
+                    if (
+                        not worker.retiring
+                        and len(worker.pending) < self.concurrency
+                    ):
+                        return worker
+                if len(self._workers) < self.size:
+                    return await self._spawn()
+                await self._changed.wait()
+
+    async def _read(self, worker: _Worker) -> None:
+        """Resolve the worker's files from its stdout until it exits."""
+        stdout = worker.process.stdout
+        try:
+            while stdout is not None and (
+                line := await stdout.readline()
+            ):
+                try:
+                    message = json.loads(line)
+                except ValueError:
+                    logger.warning(
+                        "embed pool: bad worker line %r",
+                        line[:200],
+                    )
+                    continue
+                future = worker.pending.pop(
+                    message.get("id"), None
+                )
+                worker.files_done += 1
+                if (
+                    worker.files_done >= self.max_files
+                    or int(message.get("rss_bytes") or 0)
+                    > self.max_rss_bytes
+                ):
+                    worker.retiring = True
+                if future is not None and not future.done():
+                    if message.get("error"):
+                        future.set_exception(
+                            EmbedWorkerError(message["error"])
+                        )
+                    else:
+                        future.set_result(
+                            EmbedResult(
+                                insert_count=int(
+                                    message.get("insert_count")
+                                    or 0
+                                ),
+                                cache_hits=int(
+                                    message.get("cache_hits") or 0
+                                ),
+                                cache_misses=int(
+                                    message.get("cache_misses")
+                                    or 0
+                                ),
+                            )
+                        )
+                if worker.retiring and not worker.pending:
+                    await self._retire(worker)
+                async with self._changed:
+                    # A slot freed up (or the worker is retiring)
+                    self._changed.notify_all()
+        finally:
+            await self._reap(worker)
+
+    async def _retire(self, worker: _Worker) -> None:
+        """Close stdin so the worker exits after its last file."""
+        stdin = worker.process.stdin
+        if stdin is not None and not stdin.is_closing():
+            stdin.close()
+        logger.info(
+            "embed pool: recycling worker pid=%s after %d files",
+            worker.process.pid,
+            worker.files_done,
+        )
+
+    async def _reap(self, worker: _Worker) -> None:
+        """Fail whatever the worker still owed and drop it from the pool."""
+        if worker.alive:
+            with contextlib.suppress(ProcessLookupError):
+                worker.process.kill()
+        await worker.process.wait()
+        for future in worker.pending.values():
+            if not future.done():
+                future.set_exception(
+                    EmbedWorkerError(
+                        f"embed worker exited with code {worker.process.returncode}"
+                    )
+                )
+        worker.pending.clear()
+        async with self._changed:
+            if worker in self._workers:
+                self._workers.remove(worker)
+            self._changed.notify_all()
+
+    async def embed(
+        self,
+        payload: dict[str, Any],
+        *,
+        timeout_seconds: float = EMBED_FILE_TIMEOUT_SECONDS,
+    ) -> EmbedResult:
+        """Embed one file (runner payload); returns inserted chunks and cache stats."""
+        worker = await self._acquire()
+        request_id = next(self._ids)
+        future: asyncio.Future[EmbedResult] = (
+            asyncio.get_running_loop().create_future()
+        )
+        worker.pending[request_id] = future
+        stdin = worker.process.stdin
+        try:
+            if stdin is None:
+                msg = "embed worker has no stdin"
+                raise EmbedWorkerError(msg)
+            stdin.write(
+                json.dumps({"id": request_id, **payload}).encode()
+                + b"\n"
+            )
+            await stdin.drain()
+            return await asyncio.wait_for(future, timeout_seconds)
+        except TimeoutError as e:
+            # The file's thread cannot be cancelled: kill the worker
+            with contextlib.suppress(ProcessLookupError):
+                worker.process.kill()
+            msg = f"embed timed out after {timeout_seconds:.0f}s"
+            raise EmbedWorkerError(msg) from e
+        except (BrokenPipeError, ConnectionResetError) as e:
+            msg = f"embed worker unavailable: {e}"
+            raise EmbedWorkerError(msg) from e
+        finally:
+            worker.pending.pop(request_id, None)
+
+    async def close(self) -> None:
+        """Stop all workers (pending files fail)."""
+        for worker in list(self._workers):
+            await self._retire(worker)
+            if worker.reader is not None:
+                await worker.reader
+
+
+_pool: EmbedWorkerPool | None = None
+
+
+def get_embed_worker_pool() -> EmbedWorkerPool:
+    """Return the process-wide embed worker pool."""
+    global _pool  # noqa: PLW0603
+    if _pool is None:
+        _pool = EmbedWorkerPool()
+    return _pool
@@ -9,6 +9,11 @@ from pydantic import BaseModel
 from restack_ai.function import function, log
 
 from src.database.connection import get_clickhouse_async_client
+from src.functions.analytics_helpers import (
+    AnalyticsFilters,
+    build_rollup_filter_clause,
+    rollup_source,
+)
 
 
 class IngestFeedbackMetricInput(BaseModel):
@@ -213,41 +218,28 @@ async def get_feedback_analytics(
         }
         days = date_mapping.get(input_data.date_range, 7)
 
-        # Build WHERE clause
-        where_clauses = [
-            "workspace_id = {workspace_id:UUID}",
-            "metric_category = 'feedback'",
-            f"created_at >= now() - INTERVAL {days} DAY",
-        ]
-
-        if input_data.agent_id:
-            where_clauses.append("agent_id = {agent_id:UUID}")
-
-        where_clause = " AND ".join(where_clauses)
+        # Daily counts come from the task_metrics rollups
+        where_clause, parameters = build_rollup_filter_clause(
+            AnalyticsFilters(
+                workspace_id=input_data.workspace_id,
+                agent_id=input_data.agent_id,
+            ),
+            metric_category="feedback",
+        )
+        source = rollup_source(where_clause, days)
 
         # Query for timeseries data (daily aggregation)
-        timeseries_query = (
-            """
+        timeseries_query = f"""
             SELECT
-                toDate(created_at) as date,
-                countIf(passed = 1) as positive_count,
-                countIf(passed = 0) as negative_count,
-                count() as total_count,
-                if(count() > 0, (countIf(passed = 0) * 100.0 / count()), 0) as negative_percentage
-            FROM task_metrics
-            WHERE """
-            + where_clause
-            + """
+                toDate(bucket) as date,
+                sum(passed_count) as positive_count,
+                sum(failed_count) as negative_count,
+                sum(row_count) as total_count,
+                if(total_count > 0, (negative_count * 100.0 / total_count), 0) as negative_percentage
+            FROM {source}
             GROUP BY date
             ORDER BY date ASC
-        """
-        )
-
-        parameters = {
-            "workspace_id": input_data.workspace_id,
-        }
-        if input_data.agent_id:
-            parameters["agent_id"] = input_data.agent_id
+        """  # noqa: S608
 
         result = await client.query(
             timeseries_query, parameters=parameters
@@ -267,20 +259,15 @@ async def get_feedback_analytics(
         ]
 
         # Query for summary statistics
-        summary_query = (
-            """
+        summary_query = f"""
             SELECT
-                countIf(passed = 1) as total_positive,
-                countIf(passed = 0) as total_negative,
-                count() as total_feedback,
-                if(count() > 0, (countIf(passed = 0) * 100.0 / count()), 0) as negative_percentage,
-                if(count() > 0, (countIf(passed = 1) * 100.0 / count()), 0) as positive_percentage
-            FROM task_metrics
-            WHERE """
-            + where_clause
-            + """
-        """
-        )
+                sum(passed_count) as total_positive,
+                sum(failed_count) as total_negative,
+                sum(row_count) as total_feedback,
+                if(total_feedback > 0, (total_negative * 100.0 / total_feedback), 0) as negative_percentage,
+                if(total_feedback > 0, (total_positive * 100.0 / total_feedback), 0) as positive_percentage
+            FROM {source}
+        """  # noqa: S608
 
         summary_result = await client.query(
             summary_query, parameters=parameters
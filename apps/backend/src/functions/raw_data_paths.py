@@ -0,0 +1,775 @@
+"""Usage-driven promotion of raw_data JSON paths to typed columns.
+
+pipeline_events.raw_data is a native JSON column; views, metrics and agents
+read arbitrary dotted paths from it. This module:
+- records which raw_data.<path> expressions are filtered, sorted or projected
+  per dataset (raw_data_path_usage), from SQL tools and view reads;
+- promotes the hottest paths (promote_hot_raw_data_paths) to
+  Nullable(<type>) MATERIALIZED columns named rd_<path> with a skip index,
+  commented 'raw_data.<path>' so the column list is the registry;
+- rewrites raw_data.<path> to the promoted column in SQL that reads
+  pipeline_events (run_raw_data_select_query, query_clickhouse_data) and in
+  compiled view tables.
+
+Each promotion run checks the type of a path's values per dataset over all
+rows (raw_data_promotion_checks). The column takes the type most rows have
+and holds NULL for values of any other type; SQL is rewritten to it only
+when the datasets it is scoped to all had that type at the last check, so
+the typed column returns what raw_data.<path> would. Compiled views fall
+back to the JSON path where the column is NULL.
+"""
+
+import logging
+import os
+import re
+import time
+from collections import Counter
+from dataclasses import dataclass
+from datetime import UTC, datetime
+from typing import Any, Literal
+
+from clickhouse_connect.driver.exceptions import DatabaseError
+from pydantic import BaseModel, Field
+from restack_ai.function import NonRetryableError, function
+
+from src.database.connection import (
+    get_clickhouse_async_client,
+    get_clickhouse_shared_client,
+)
+
+logger = logging.getLogger(__name__)
+
+PROMOTION_TABLE = "pipeline_events"
+PROMOTED_COLUMN_PREFIX = "rd_"
+
+# Paths with fewer hits than this over the window are never promoted
+RAW_DATA_PROMOTION_MIN_HITS = int(
+    os.getenv("RAW_DATA_PROMOTION_MIN_HITS", "100")
+)
+RAW_DATA_PROMOTION_WINDOW_DAYS = int(
+    os.getenv("RAW_DATA_PROMOTION_WINDOW_DAYS", "7")
+)
+# Cap on promoted columns; each one is computed on every insert
+RAW_DATA_PROMOTION_MAX_COLUMNS = int(
+    os.getenv("RAW_DATA_PROMOTION_MAX_COLUMNS", "32")
+)
+# Seconds the promoted-column map stays cached in-process
+RAW_DATA_PROMOTED_CACHE_TTL_SECONDS = float(
+    os.getenv("RAW_DATA_PROMOTED_CACHE_TTL_SECONDS", "60")
+)
+
+UsageKind = Literal["filter", "sort", "project"]
+
+_PATH_RE = re.compile(
+    r"(?<![\w.`\"])raw_data\.([A-Za-z_]\w*(?:\.[A-Za-z_]\w*)*)"
+)
+_CLAUSE_RE = re.compile(
+    r"\b(SELECT|FROM|JOIN|ON|PREWHERE|WHERE|GROUP\s+BY|HAVING|ORDER\s+BY|LIMIT)\b",
+    re.IGNORECASE,
+)
+_STRING_LITERAL_RE = re.compile(r"'(?:[^'\\]|\\.)*'")
+_ALIAS_RE = re.compile(r"\s+AS\b", re.IGNORECASE)
+_TABLE_RE = re.compile(rf"\b{PROMOTION_TABLE}\b")
+_WORKSPACE_RE = re.compile(
+    r"\bworkspace_id\s*=\s*'([0-9a-fA-F-]{36})'"
+)
+_DATASET_RE = re.compile(r"\bdataset_id\s*=\s*'([\w-]{1,64})'")
+
+_CLAUSE_USAGE: dict[str, UsageKind | None] = {
+    "SELECT": "project",
+    "PREWHERE": "filter",
+    "WHERE": "filter",
+    "HAVING": "filter",
+    "ON": "filter",
+    "GROUP BY": "sort",
+    "ORDER BY": "sort",
+}
+
+_INT_TYPES = {
+    "Int8",
+    "Int16",
+    "Int32",
+    "Int64",
+    "UInt8",
+    "UInt16",
+    "UInt32",
+    "UInt64",
+}
+_FLOAT_TYPES = {"Float32", "Float64"}
+# dynamicType() values each promoted column type is cast from
+_COLUMN_TYPE_SOURCES = {
+    "Int64": _INT_TYPES,
+    "Float64": _INT_TYPES | _FLOAT_TYPES,
+    "Bool": {"Bool"},
+    "String": {"String"},
+}
+
+DatasetKey = tuple[str, str]
+
+
+@dataclass(frozen=True, slots=True)
+class Promotion:
+    column: str
+    column_type: str
+    # None until a promotion run has checked the path's values
+    mismatched: frozenset[DatasetKey] | None
+
+
+# path -> promotion, refreshed from system.columns and the latest checks
+_promoted_cache: tuple[float, dict[str, Promotion]] | None = None
+
+
+class RawDataPathUsage(BaseModel):
+    path: str
+    usage: UsageKind
+
+
+class RunRawDataSelectQueryInput(BaseModel):
+    query: str = Field(..., min_length=1)
+
+
+class RunRawDataSelectQueryOutput(BaseModel):
+    columns: list[str] = Field(default_factory=list)
+    rows: list[list[Any]] = Field(default_factory=list)
+
+
+class PromoteRawDataPathsInput(BaseModel):
+    dry_run: bool = Field(
+        default=False,
+        description="Report which paths would be promoted without altering the table.",
+    )
+
+
+class PromotedPath(BaseModel):
+    path: str
+    column: str
+    column_type: str | None = None
+    hits: int = 0
+    datasets: int = 0
+    usages: list[str] = Field(default_factory=list)
+    mismatched_datasets: int = 0
+    applied: bool = False
+    skipped_reason: str | None = None
+
+
+class PromoteRawDataPathsOutput(BaseModel):
+    success: bool
+    dry_run: bool
+    paths: list[PromotedPath] = Field(default_factory=list)
+    error: str | None = None
+
+
+def promoted_column_name(path: str) -> str:
+    """Column name for a promoted path: rd_ plus the path with '.' as '__'."""
+    return PROMOTED_COLUMN_PREFIX + path.replace(".", "__")
+
+
+def is_raw_data_path(path: str) -> bool:
+    """True if path is a dotted identifier path usable as raw_data.<path>."""
+    return _PATH_RE.fullmatch(f"raw_data.{path}") is not None
+
+
+def _clause_at(query: str, position: int) -> str | None:
+    """Normalized name of the last clause keyword before position."""
+    clause = None
+    for match in _CLAUSE_RE.finditer(query, 0, position):
+        clause = " ".join(match.group(1).upper().split())
+    return clause
+
+
+def _mask_literals(query: str) -> str:
+    """Blank out string literals (same length) so paths inside them are ignored."""
+    return _STRING_LITERAL_RE.sub(
+        lambda m: " " * len(m.group(0)), query
+    )
+
+
+def extract_raw_data_paths(
+    query: str,
+) -> list[RawDataPathUsage]:
+    """raw_data paths in query with how each is used (one entry per occurrence)."""
+    masked = _mask_literals(query)
+    usages: list[RawDataPathUsage] = []
+    for match in _PATH_RE.finditer(masked):
+        usage = _CLAUSE_USAGE.get(
+            _clause_at(masked, match.start()) or ""
+        )
+        if usage is not None:
+            usages.append(
+                RawDataPathUsage(path=match.group(1), usage=usage)
+            )
+    return usages
+
+
+def rewrite_raw_data_query(
+    query: str, promoted: dict[str, str]
+) -> str:
+    """Replace raw_data.<path> with its promoted column where that is safe.
+
+    Only queries reading pipeline_events are rewritten. A path is rewritten
+    at every occurrence or at none, so a GROUP BY still matches its SELECT:
+    it is left alone when any occurrence is an unaliased projection (the
+    result column name would change), typed subcolumn access
+    (raw_data.path.:Int64) or outside a known clause.
+    """
+    if not promoted or not _TABLE_RE.search(query):
+        return query
+    masked = _mask_literals(query)
+    occurrences: dict[str, list[re.Match[str]]] = {}
+    unsafe: set[str] = set()
+    for match in _PATH_RE.finditer(masked):
+        path = match.group(1)
+        if path not in promoted:
+            continue
+        occurrences.setdefault(path, []).append(match)
+        usage = _CLAUSE_USAGE.get(
+            _clause_at(masked, match.start()) or ""
+        )
+        if (
+            masked[match.end() : match.end() + 1] == "."
+            or usage is None
+            or (
+                usage == "project"
+                and not _ALIAS_RE.match(masked, match.end())
+            )
+        ):
+            unsafe.add(path)
+    matches = sorted(
+        (
+            match
+            for path, path_matches in occurrences.items()
+            if path not in unsafe
+            for match in path_matches
+        ),
+        key=lambda match: match.start(),
+    )
+    parts: list[str] = []
+    last = 0
+    for match in matches:
+        parts.extend(
+            (
+                query[last : match.start()],
+                promoted[match.group(1)],
+            )
+        )
+        last = match.end()
+    parts.append(query[last:])
+    return "".join(parts)
+
+
+def _single_match(pattern: re.Pattern[str], query: str) -> str:
+    """The one value pattern captures in query, or '' if none or several."""
+    values = set(pattern.findall(query))
+    return values.pop() if len(values) == 1 else ""
+
+
+async def _latest_checks(
+    client: Any,
+) -> dict[str, dict[DatasetKey, str]]:
+    """Path -> {(workspace_id, dataset_id): value type} from the last run."""
+    result = await client.query(
+        """
+        SELECT path, workspace_id, dataset_id, value_type
+        FROM raw_data_promotion_checks
+        WHERE (path, checked_at) IN (
+            SELECT path, max(checked_at)
+            FROM raw_data_promotion_checks
+            GROUP BY path
+        )
+        """
+    )
+    checks: dict[str, dict[DatasetKey, str]] = {}
+    for path, workspace_id, dataset_id, value_type in (
+        result.result_rows or []
+    ):
+        checks.setdefault(path, {})[
+            (workspace_id, dataset_id)
+        ] = value_type
+    return checks
+
+
+async def get_raw_data_promotions(
+    client: Any,
+) -> dict[str, Promotion]:
+    """Promoted path -> column, type and mismatched datasets (cached briefly)."""
+    global _promoted_cache  # noqa: PLW0603
+    if (
+        _promoted_cache is not None
+        and _promoted_cache[0] > time.monotonic()
+    ):
+        return _promoted_cache[1]
+    result = await client.query(
+        """
+        SELECT name, comment, type
+        FROM system.columns
+        WHERE database = currentDatabase()
+          AND table = {table:String}
+          AND startsWith(name, {prefix:String})
+          AND startsWith(comment, 'raw_data.')
+        """,
+        parameters={
+            "table": PROMOTION_TABLE,
+            "prefix": PROMOTED_COLUMN_PREFIX,
+        },
+    )
+    columns = result.result_rows or []
+    checks = await _latest_checks(client) if columns else {}
+    promotions = {}
+    for name, comment, type_name in columns:
+        path = comment.removeprefix("raw_data.")
+        column_type = type_name.removeprefix(
+            "Nullable("
+        ).removesuffix(")")
+        checked = checks.get(path)
+        promotions[path] = Promotion(
+            column=name,
+            column_type=column_type,
+            mismatched=None
+            if checked is None
+            else frozenset(
+                key
+                for key, value_type in checked.items()
+                if value_type != column_type
+            ),
+        )
+    _promoted_cache = (
+        time.monotonic() + RAW_DATA_PROMOTED_CACHE_TTL_SECONDS,
+        promotions,
+    )
+    return promotions
+
+
+def promoted_columns(
+    promotions: dict[str, Promotion],
+    *,
+    workspace_id: str = "",
+    dataset_id: str = "",
+) -> dict[str, str]:
+    """Path -> column for promotions safe to read in the given scope.
+
+    A path qualifies once checked, when no dataset in scope ('' matches
+    any workspace or dataset) had values of another type.
+    """
+    return {
+        path: promotion.column
+        for path, promotion in promotions.items()
+        if promotion.mismatched is not None
+        and not any(
+            workspace_id in ("", key[0])
+            and dataset_id in ("", key[1])
+            for key in promotion.mismatched
+        )
+    }
+
+
+async def record_raw_data_path_usage(
+    client: Any,
+    usages: list[RawDataPathUsage],
+    *,
+    workspace_id: str = "",
+    dataset_id: str = "",
+) -> None:
+    """Add usage hits for a dataset; failures are logged, never raised."""
+    if not usages:
+        return
+    counts = Counter((item.path, item.usage) for item in usages)
+    try:
+        await client.insert(
+            "raw_data_path_usage",
+            [
+                [workspace_id, dataset_id, path, usage, hits]
+                for (path, usage), hits in counts.items()
+            ],
+            column_names=[
+                "workspace_id",
+                "dataset_id",
+                "path",
+                "usage",
+                "hits",
+            ],
+            settings={
+                "async_insert": 1,
+                "wait_for_async_insert": 0,
+            },
+        )
+    except Exception:
+        logger.warning(
+            "Failed to record raw_data path usage", exc_info=True
+        )
+
+
+def _view_path(key: Any) -> str | None:
+    """raw_data path named by a view field key ('a.b' or 'raw_data.a.b')."""
+    if not isinstance(key, str):
+        return None
+    path = key.removeprefix("raw_data.")
+    return path if is_raw_data_path(path) else None
+
+
+def view_spec_path_usage(view: dict) -> list[RawDataPathUsage]:
+    """Paths a view reads: columns and entity id are projected, activity_filter keys filtered."""
+    fields: list[tuple[Any, UsageKind]] = [
+        (column.get("key"), "project")
+        for column in view.get("columns") or []
+        if isinstance(column, dict)
+    ]
+    fields.append((view.get("entity_id_field"), "project"))
+    fields.extend(
+        (key, "filter")
+        for key in (view.get("activity_filter") or {})
+    )
+    return [
+        RawDataPathUsage(path=path, usage=usage)
+        for key, usage in fields
+        if (path := _view_path(key)) is not None
+    ]
+
+
+async def record_view_path_usage(
+    view: dict, *, workspace_id: str, dataset_id: str
+) -> None:
+    """Record the raw_data paths of a view being read."""
+    try:
+        client = await get_clickhouse_shared_client()
+    except Exception:
+        logger.warning(
+            "Failed to record view path usage", exc_info=True
+        )
+        return
+    await record_raw_data_path_usage(
+        client,
+        view_spec_path_usage(view),
+        workspace_id=workspace_id,
+        dataset_id=dataset_id,
+    )
+
+
+async def prepare_raw_data_query(client: Any, query: str) -> str:
+    """Record the query's raw_data path usage and return it rewritten.
+
+    Rewrites are scoped to the workspace and dataset the query filters on
+    (workspace_id = '...', dataset_id = '...') when it names exactly one.
+    """
+    workspace_id = _single_match(_WORKSPACE_RE, query)
+    dataset_id = _single_match(_DATASET_RE, query)
+    await record_raw_data_path_usage(
+        client,
+        extract_raw_data_paths(query),
+        workspace_id=workspace_id,
+        dataset_id=dataset_id,
+    )
+    try:
+        promotions = await get_raw_data_promotions(client)
+    except Exception:
+        logger.warning(
+            "Failed to load promoted raw_data columns",
+            exc_info=True,
+        )
+        return query
+    return rewrite_raw_data_query(
+        query,
+        promoted_columns(
+            promotions,
+            workspace_id=workspace_id,
+            dataset_id=dataset_id,
+        ),
+    )
+
+
+@function.defn()
+async def run_raw_data_select_query(
+    function_input: RunRawDataSelectQueryInput,
+) -> RunRawDataSelectQueryOutput:
+    """Run a read-only SELECT after recording and rewriting its raw_data paths.
+
+    The MCP SQL tool sends queries that read raw_data here, so the rewrite
+    happens in the process that runs the query.
+    """
+    try:
+        client = await get_clickhouse_async_client()
+        query = await prepare_raw_data_query(
+            client, function_input.query
+        )
+        result = await client.query(
+            query, settings={"readonly": "1"}
+        )
+    except Exception as e:
+        raise NonRetryableError(
+            message=f"Query execution failed: {e!s}"
+        ) from e
+    return RunRawDataSelectQueryOutput(
+        columns=list(result.column_names),
+        rows=[list(row) for row in result.result_rows],
+    )
+
+
+def _promotion_type(type_counts: dict[str, int]) -> str | None:
+    """Column type when all sampled values share one scalar family."""
+    types = set(type_counts)
+    if not types:
+        return None
+    if types <= _INT_TYPES:
+        return "Int64"
+    if types <= _INT_TYPES | _FLOAT_TYPES:
+        return "Float64"
+    if types == {"Bool"}:
+        return "Bool"
+    if types == {"String"}:
+        return "String"
+    return None
+
+
+async def _hot_paths(client: Any) -> list[PromotedPath]:
+    result = await client.query(
+        """
+        SELECT
+            path,
+            sum(hits) AS total,
+            uniqExact(workspace_id, dataset_id) AS datasets,
+            groupUniqArray(usage) AS usages
+        FROM raw_data_path_usage
+        WHERE date >= today() - {window_days:UInt32}
+        GROUP BY path
+        HAVING total >= {min_hits:UInt64}
+        ORDER BY total DESC
+        LIMIT {limit:UInt32}
+        """,
+        parameters={
+            "window_days": RAW_DATA_PROMOTION_WINDOW_DAYS,
+            "min_hits": RAW_DATA_PROMOTION_MIN_HITS,
+            "limit": RAW_DATA_PROMOTION_MAX_COLUMNS,
+        },
+    )
+    return [
+        PromotedPath(
+            path=path,
+            column=promoted_column_name(path),
+            hits=int(total),
+            datasets=int(datasets),
+            usages=sorted(usages),
+        )
+        for path, total, datasets, usages in result.result_rows
+        or []
+        if is_raw_data_path(path)
+    ]
+
+
+async def _dataset_types(
+    client: Any, path: str
+) -> dict[DatasetKey, tuple[str, int]]:
+    """Per dataset, the type of raw_data.<path> and rows with a value.
+
+    The type is the column type all the dataset's values fit ('' if none),
+    over the whole table rather than a sample.
+    """
+    # path matched _PATH_RE: dotted identifiers only
+    result = await client.query(
+        f"""
+        SELECT
+            toString(workspace_id),
+            dataset_id,
+            groupUniqArray(dynamicType(raw_data.{path})),
+            count()
+        FROM {PROMOTION_TABLE}
+        WHERE raw_data.{path} IS NOT NULL
+        GROUP BY workspace_id, dataset_id
+        """  # noqa: S608
+    )
+    return {
+        (workspace_id, dataset_id): (
+            _promotion_type(dict.fromkeys(types, 1)) or "",
+            int(count),
+        )
+        for workspace_id, dataset_id, types, count in (
+            result.result_rows or []
+        )
+    }
+
+
+def _column_type(
+    dataset_types: dict[DatasetKey, tuple[str, int]],
+) -> str | None:
+    """The type of most rows among datasets whose values share one type."""
+    rows: Counter[str] = Counter()
+    for value_type, count in dataset_types.values():
+        if value_type:
+            rows[value_type] += count
+    return rows.most_common(1)[0][0] if rows else None
+
+
+async def _record_check(
+    client: Any,
+    path: str,
+    dataset_types: dict[DatasetKey, tuple[str, int]],
+    checked_at: datetime,
+) -> None:
+    if not dataset_types:
+        return
+    await client.insert(
+        "raw_data_promotion_checks",
+        [
+            [
+                checked_at,
+                path,
+                workspace_id,
+                dataset_id,
+                value_type,
+                count,
+            ]
+            for (workspace_id, dataset_id), (
+                value_type,
+                count,
+            ) in dataset_types.items()
+        ],
+        column_names=[
+            "checked_at",
+            "path",
+            "workspace_id",
+            "dataset_id",
+            "value_type",
+            "row_count",
+        ],
+    )
+
+
+async def _promote_path(
+    client: Any, candidate: PromotedPath
+) -> None:
+    """Add the typed column and its skip index, then backfill both."""
+    column = candidate.column
+    column_type = candidate.column_type or ""
+    # Values of another type stay NULL instead of being converted
+    source_types = ", ".join(
+        f"'{value_type}'"
+        for value_type in sorted(
+            _COLUMN_TYPE_SOURCES[column_type]
+        )
+    )
+    index_type = (
+        "bloom_filter" if column_type == "String" else "minmax"
+    )
+    statements = [
+        (
+            f"ALTER TABLE {PROMOTION_TABLE} ADD COLUMN IF NOT EXISTS {column} "
+            f"Nullable({column_type}) MATERIALIZED "
+            f"if(dynamicType(raw_data.{candidate.path}) IN ({source_types}), "
+            f"accurateCastOrNull(raw_data.{candidate.path}, '{column_type}'), NULL) "
+            f"COMMENT 'raw_data.{candidate.path}'"
+        ),
+        (
+            f"ALTER TABLE {PROMOTION_TABLE} ADD INDEX IF NOT EXISTS idx_{column} "
+            f"{column} TYPE {index_type} GRANULARITY 1"
+        ),
+        # Backfills run as background mutations
+        f"ALTER TABLE {PROMOTION_TABLE} MATERIALIZE COLUMN {column}",
+        f"ALTER TABLE {PROMOTION_TABLE} MATERIALIZE INDEX idx_{column}",
+    ]
+    for statement in statements:
+        await client.command(statement)
+
+
+def _mismatched(
+    dataset_types: dict[DatasetKey, tuple[str, int]],
+    column_type: str | None,
+) -> int:
+    return sum(
+        1
+        for value_type, _ in dataset_types.values()
+        if value_type != column_type
+    )
+
+
+@function.defn()
+async def promote_hot_raw_data_paths(
+    function_input: PromoteRawDataPathsInput,
+) -> PromoteRawDataPathsOutput:
+    """Promote the most used raw_data paths to typed, indexed columns.
+
+    Every run also re-checks the paths already promoted, so rewrites stop
+    for a dataset once it holds values of another type.
+    """
+    global _promoted_cache  # noqa: PLW0603
+    checked_at = datetime.now(tz=UTC)
+    try:
+        client = await get_clickhouse_async_client()
+        _promoted_cache = None
+        existing = {
+            path: promotion.column_type
+            for path, promotion in (
+                await get_raw_data_promotions(client)
+            ).items()
+        }
+        promoted = dict(existing)
+        candidates = await _hot_paths(client)
+        for candidate in candidates:
+            if candidate.path in promoted:
+                candidate.skipped_reason = "already promoted"
+                continue
+            if len(promoted) >= RAW_DATA_PROMOTION_MAX_COLUMNS:
+                candidate.skipped_reason = "column limit reached"
+                continue
+            dataset_types = await _dataset_types(
+                client, candidate.path
+            )
+            candidate.column_type = _column_type(dataset_types)
+            if candidate.column_type is None:
+                candidate.skipped_reason = (
+                    "no values or mixed/non-scalar types"
+                )
+                continue
+            candidate.mismatched_datasets = _mismatched(
+                dataset_types, candidate.column_type
+            )
+            if not function_input.dry_run:
+                await _promote_path(client, candidate)
+                await _record_check(
+                    client,
+                    candidate.path,
+                    dataset_types,
+                    checked_at,
+                )
+                candidate.applied = True
+            promoted[candidate.path] = candidate.column_type
+        if not function_input.dry_run:
+            for path, column_type in existing.items():
+                dataset_types = await _dataset_types(client, path)
+                await _record_check(
+                    client, path, dataset_types, checked_at
+                )
+                logger.info(
+                    "raw_data.%s re-checked: %d of %d datasets not %s",
+                    path,
+                    _mismatched(dataset_types, column_type),
+                    len(dataset_types),
+                    column_type,
+                )
+    except (
+        ValueError,
+        TypeError,
+        ConnectionError,
+        DatabaseError,
+    ) as e:
+        return PromoteRawDataPathsOutput(
+            success=False,
+            dry_run=function_input.dry_run,
+            error=str(e),
+        )
+    finally:
+        # Next rewrite re-reads system.columns and the checks
+        _promoted_cache = None
+
+    for candidate in candidates:
+        logger.info(
+            "raw_data.%s -> %s: %d hits%s",
+            candidate.path,
+            candidate.column,
+            candidate.hits,
+            f" (skipped: {candidate.skipped_reason})"
+            if candidate.skipped_reason
+            else "",
+        )
+    return PromoteRawDataPathsOutput(
+        success=True,
+        dry_run=function_input.dry_run,
+        paths=candidates,
+    )
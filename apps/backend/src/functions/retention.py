@@ -0,0 +1,552 @@
+"""Retention for ClickHouse pipeline_events and task_traces.
+
+Policies:
+- Datasets: storage_config.retention.delete_after_days (DatasetRetentionPolicy).
+  Expired rows are removed with a lightweight DELETE scoped to the dataset
+  (and from its compiled view tables and its re-embedded vectors in
+  pipeline_event_embeddings); the date predicate lets ClickHouse skip newer
+  monthly partitions. Files that lose chunks get their dataset_files and
+  dataset_file_chunks rows recounted, or marked deleted once empty.
+- Workspaces: workspaces.trace_retention_days for task_traces, same way.
+- Whole tables: RETENTION_MAX_DAYS drops monthly partitions older than the
+  ceiling outright, and RETENTION_COLD_VOLUME / RETENTION_MOVE_AFTER_DAYS
+  move older partitions to a cheaper volume of the table's storage policy.
+  Partitions hold every dataset and workspace, so drops and moves are
+  table-wide rather than per policy. Dropping a pipeline_events partition
+  first deletes the re-embedded vectors and compiled view rows of its rows
+  and recounts the file manifests without them.
+
+Every run returns a report of rows and bytes per action; dry_run only reports.
+"""
+
+import logging
+import os
+import re
+from datetime import UTC, datetime, timedelta
+from typing import Any, Literal
+
+from clickhouse_connect.driver.exceptions import DatabaseError
+from pydantic import BaseModel, Field, ValidationError
+from restack_ai.function import function
+from sqlalchemy import text
+
+from src.database.connection import (
+    get_async_db,
+    get_clickhouse_async_client,
+)
+from src.functions.datasets_crud import (
+    DatasetRetentionPolicy,
+    compiled_view_tables,
+)
+
+logger = logging.getLogger(__name__)
+
+# Event time column per retained table (both derive date from it)
+RETENTION_TABLES = {
+    "pipeline_events": "event_timestamp",
+    "task_traces": "started_at",
+}
+
+_IDENTIFIER_RE = re.compile(r"^[A-Za-z0-9_]+$")
+_PARTITION_ID_RE = re.compile(r"^[A-Za-z0-9_-]+$")
+
+
+class ApplyRetentionInput(BaseModel):
+    dry_run: bool = Field(
+        default=True,
+        description="Report what each policy would reclaim without changing data.",
+    )
+
+
+class RetentionAction(BaseModel):
+    table: str
+    action: Literal["delete", "drop_partition", "move_partition"]
+    scope: str = Field(
+        ...,
+        description="dataset:<id>, workspace:<id> or partition:<id>",
+    )
+    cutoff: str
+    rows: int = 0
+    bytes: int = Field(
+        default=0,
+        description="Bytes reclaimed (moved, for move_partition); estimated for deletes.",
+    )
+    applied: bool = False
+    error: str | None = None
+
+
+class RetentionReport(BaseModel):
+    success: bool
+    dry_run: bool
+    actions: list[RetentionAction] = Field(default_factory=list)
+    reclaimable_bytes: int = 0
+    error: str | None = None
+
+
+def _env_int(name: str) -> int | None:
+    value = os.environ.get(name)
+    return int(value) if value else None
+
+
+def _validate_identifier(value: str) -> None:
+    if not _IDENTIFIER_RE.match(value):
+        msg = f"Invalid identifier: {value}"
+        raise ValueError(msg)
+
+
+async def _load_policies() -> list[
+    tuple[str, str, dict[str, Any], int]
+]:
+    """(table, scope, scope filter, days) for every dataset and workspace policy."""
+    policies: list[tuple[str, str, dict[str, Any], int]] = []
+    async for db in get_async_db():
+        datasets = await db.execute(
+            text("""
+                SELECT id, workspace_id, storage_config
+                FROM datasets
+                WHERE storage_type = 'clickhouse'
+                  AND storage_config ? 'retention'
+            """)
+        )
+        for row in datasets:
+            storage_config = row.storage_config or {}
+            try:
+                policy = DatasetRetentionPolicy.model_validate(
+                    storage_config.get("retention")
+                )
+            except ValidationError:
+                logger.warning(
+                    "Skipping invalid retention policy on dataset %s",
+                    row.id,
+                )
+                continue
+            policies.append(
+                (
+                    storage_config.get(
+                        "table", "pipeline_events"
+                    ),
+                    f"dataset:{row.id}",
+                    {
+                        "workspace_id": str(row.workspace_id),
+                        "dataset_id": str(row.id),
+                    },
+                    policy.delete_after_days,
+                )
+            )
+
+        workspaces = await db.execute(
+            text("""
+                SELECT id, trace_retention_days
+                FROM workspaces
+                WHERE trace_retention_days IS NOT NULL
+            """)
+        )
+        policies.extend(
+            (
+                "task_traces",
+                f"workspace:{row.id}",
+                {"workspace_id": str(row.id)},
+                row.trace_retention_days,
+            )
+            for row in workspaces
+        )
+    return policies
+
+
+async def _avg_row_bytes(client: Any, table: str) -> float:
+    """Average on-disk bytes per row of the table's active parts."""
+    result = await client.query(
+        """
+        SELECT sum(bytes_on_disk), sum(rows)
+        FROM system.parts
+        WHERE database = currentDatabase()
+          AND table = {table:String}
+          AND active
+        """,
+        parameters={"table": table},
+    )
+    total_bytes, total_rows = (
+        result.result_rows[0] if result.result_rows else (0, 0)
+    )
+    return (total_bytes or 0) / total_rows if total_rows else 0.0
+
+
+async def _refresh_file_manifests(
+    client: Any, expired_clause: str, params: dict[str, Any]
+) -> None:
+    """Recount the manifest rows of files losing expired pipeline_events.
+
+    list_dataset_files reads only dataset_files and dataset_file_chunks,
+    so both are rewritten from each file's rows outside expired_clause:
+    the live dataset_files row is superseded with the new chunk count (a
+    deleted marker once none are left), and dataset_file_chunks, whose
+    sums cannot be decremented, is deleted and counted again. Run before
+    the expired rows are deleted or their partition dropped.
+    """
+    result = await client.query(
+        "SELECT workspace_id, ifNull(dataset_id, ''), "  # noqa: S608
+        "groupUniqArray(source) FROM pipeline_events "
+        f"WHERE ({expired_clause}) AND source != '' "
+        "GROUP BY workspace_id, dataset_id",
+        parameters=params,
+    )
+    for workspace_id, dataset_id, sources in (
+        result.result_rows or []
+    ):
+        file_params = {
+            **params,
+            "workspace_id": str(workspace_id),
+            "dataset_id": dataset_id,
+            "sources": list(sources),
+        }
+        file_scope = (
+            "workspace_id = {workspace_id:UUID} "
+            "AND ifNull(dataset_id, '') = {dataset_id:String} "
+            "AND source IN {sources:Array(String)}"
+        )
+        kept = f"{file_scope} AND NOT ({expired_clause})"
+        # One millisecond past the live row outranks it in FINAL
+        await client.command(
+            "INSERT INTO dataset_files "  # noqa: S608
+            "SELECT f.workspace_id, f.dataset_id, f.source, f.task_id, "
+            "toUInt32(k.chunks), f.size_bytes, f.content_hash, "
+            "f.embed_model, f.ingested_at + toIntervalMillisecond(1), "
+            "k.chunks = 0 "
+            "FROM (SELECT * FROM dataset_files FINAL "
+            f"WHERE {file_scope} AND is_deleted = 0) AS f "
+            "LEFT JOIN (SELECT source, count() AS chunks "
+            f"FROM pipeline_events WHERE {kept} GROUP BY source) AS k "
+            "USING (source)",
+            parameters=file_params,
+        )
+        await client.command(
+            "DELETE FROM dataset_file_chunks "
+            "WHERE workspace_id = {workspace_id:UUID} "
+            "AND dataset_id = {dataset_id:String} "
+            "AND source IN {sources:Array(String)}",
+            parameters=file_params,
+        )
+        # Same counts as earlier inserts may still be in the dedup window
+        await client.command(
+            "INSERT INTO dataset_file_chunks "  # noqa: S608
+            "SELECT workspace_id, ifNull(dataset_id, ''), source, "
+            "any(task_id), count(), "
+            "sum(length(ifNull(toString(raw_data.text), ''))), "
+            "max(ingested_at) "
+            f"FROM pipeline_events WHERE {kept} "
+            "GROUP BY workspace_id, dataset_id, source",
+            parameters=file_params,
+            settings={"insert_deduplicate": 0},
+        )
+
+
+async def _drop_partition_dependents(
+    client: Any, partition_id: str
+) -> None:
+    """Clear what derives from a pipeline_events partition before its drop.
+
+    Re-embedded vectors and compiled view rows are deleted by the
+    partition's ids, and the file manifests recounted without its rows.
+    """
+    in_partition = f"_partition_id = '{partition_id}'"
+    await client.command(
+        "DELETE FROM pipeline_event_embeddings WHERE id IN ("  # noqa: S608
+        f"SELECT id FROM pipeline_events WHERE {in_partition})"
+    )
+    views = await client.query(
+        """
+        SELECT workspace_id, dataset_id, table_name
+        FROM compiled_views FINAL
+        WHERE is_deleted = 0
+        """
+    )
+    for workspace_id, dataset_id, view_table in (
+        views.result_rows or []
+    ):
+        _validate_identifier(view_table)
+        await client.command(
+            f"DELETE FROM {view_table} WHERE id IN ("  # noqa: S608
+            f"SELECT id FROM pipeline_events WHERE {in_partition} "
+            "AND workspace_id = {workspace_id:UUID} "
+            "AND dataset_id = {dataset_id:String})",
+            parameters={
+                "workspace_id": str(workspace_id),
+                "dataset_id": dataset_id,
+            },
+        )
+    await _refresh_file_manifests(client, in_partition, {})
+
+
+async def _policy_delete(  # noqa: PLR0913
+    client: Any,
+    table: str,
+    scope: str,
+    scope_filter: dict[str, Any],
+    days: int,
+    *,
+    now: datetime,
+    dry_run: bool,
+) -> RetentionAction:
+    """Count (and unless dry_run, delete) one policy's expired rows."""
+    _validate_identifier(table)
+    ts_column = RETENTION_TABLES.get(table, "event_timestamp")
+    cutoff = now - timedelta(days=days)
+    conditions = ["workspace_id = {workspace_id:UUID}"]
+    if "dataset_id" in scope_filter:
+        conditions.append("dataset_id = {dataset_id:String}")
+    # date is the partition key source; bounding it prunes newer partitions
+    conditions.extend(
+        [
+            "date <= toDate(fromUnixTimestamp64Milli({cutoff_ms:Int64}))",
+            f"{ts_column} < fromUnixTimestamp64Milli({{cutoff_ms:Int64}})",
+        ]
+    )
+    params = {
+        **scope_filter,
+        "cutoff_ms": int(cutoff.timestamp() * 1000),
+    }
+    where_clause = " AND ".join(conditions)
+    action = RetentionAction(
+        table=table,
+        action="delete",
+        scope=scope,
+        cutoff=cutoff.isoformat(),
+    )
+
+    count_result = await client.query(
+        f"SELECT count() FROM {table} WHERE {where_clause}",  # noqa: S608
+        parameters=params,
+    )
+    action.rows = int(
+        count_result.result_rows[0][0]
+        if count_result.result_rows
+        else 0
+    )
+    action.bytes = int(
+        action.rows * await _avg_row_bytes(client, table)
+    )
+    if dry_run or action.rows == 0:
+        return action
+
+    if (
+        table == "pipeline_events"
+        and "dataset_id" in scope_filter
+    ):
+        # Synchronously, before the events: the subquery needs their ids
+        await client.command(
+            "DELETE FROM pipeline_event_embeddings "  # noqa: S608
+            "WHERE workspace_id = {workspace_id:UUID} "
+            "AND dataset_id = {dataset_id:String} "
+            f"AND id IN (SELECT id FROM {table} WHERE {where_clause})",
+            parameters=params,
+        )
+        await _refresh_file_manifests(
+            client, where_clause, params
+        )
+    await client.command(
+        f"DELETE FROM {table} WHERE {where_clause}",  # noqa: S608
+        parameters=params,
+        settings={"lightweight_deletes_sync": 0},
+    )
+    if "dataset_id" in scope_filter:
+        # Compiled views keep their own copy of the dataset's rows
+        for view_table in await compiled_view_tables(
+            scope_filter["workspace_id"],
+            scope_filter["dataset_id"],
+        ):
+            _validate_identifier(view_table)
+            await client.command(
+                f"DELETE FROM {view_table} WHERE event_timestamp < fromUnixTimestamp64Milli({{cutoff_ms:Int64}})",  # noqa: S608
+                parameters={"cutoff_ms": params["cutoff_ms"]},
+                settings={"lightweight_deletes_sync": 0},
+            )
+    action.applied = True
+    return action
+
+
+async def _partition_actions(
+    client: Any,
+    table: str,
+    *,
+    now: datetime,
+    dry_run: bool,
+) -> list[RetentionAction]:
+    """Drop partitions past RETENTION_MAX_DAYS and move ones past RETENTION_MOVE_AFTER_DAYS."""
+    max_days = _env_int("RETENTION_MAX_DAYS")
+    move_after_days = _env_int("RETENTION_MOVE_AFTER_DAYS")
+    cold_volume = os.environ.get("RETENTION_COLD_VOLUME")
+    if max_days is None and not (cold_volume and move_after_days):
+        return []
+    if cold_volume:
+        _validate_identifier(cold_volume)
+
+    result = await client.query(
+        """
+        SELECT
+            partition_id,
+            max(max_date) AS newest,
+            sum(rows),
+            sum(bytes_on_disk),
+            countIf(disk_name NOT IN (
+                SELECT arrayJoin(disks) FROM system.storage_policies
+                WHERE volume_name = {cold_volume:String}
+            )) AS parts_not_cold
+        FROM system.parts
+        WHERE database = currentDatabase()
+          AND table = {table:String}
+          AND active
+        GROUP BY partition_id
+        ORDER BY partition_id
+        """,
+        parameters={
+            "table": table,
+            "cold_volume": cold_volume or "",
+        },
+    )
+
+    actions: list[RetentionAction] = []
+    for partition_id, newest, rows, size, parts_not_cold in (
+        result.result_rows or []
+    ):
+        if not _PARTITION_ID_RE.match(partition_id):
+            continue
+        if (
+            max_days is not None
+            and newest < (now - timedelta(days=max_days)).date()
+        ):
+            kind = "drop_partition"
+            cutoff_days = max_days
+            statement = f"ALTER TABLE {table} DROP PARTITION ID '{partition_id}'"
+        elif (
+            cold_volume
+            and move_after_days is not None
+            and parts_not_cold
+            and newest
+            < (now - timedelta(days=move_after_days)).date()
+        ):
+            kind = "move_partition"
+            cutoff_days = move_after_days
+            statement = f"ALTER TABLE {table} MOVE PARTITION ID '{partition_id}' TO VOLUME '{cold_volume}'"
+        else:
+            continue
+
+        action = RetentionAction(
+            table=table,
+            action=kind,
+            scope=f"partition:{partition_id}",
+            cutoff=(
+                now - timedelta(days=cutoff_days)
+            ).isoformat(),
+            rows=int(rows or 0),
+            bytes=int(size or 0),
+        )
+        if not dry_run:
+            try:
+                if (
+                    kind == "drop_partition"
+                    and table == "pipeline_events"
+                ):
+                    await _drop_partition_dependents(
+                        client, partition_id
+                    )
+                await client.command(statement)
+                action.applied = True
+            except (
+                DatabaseError,
+                ValueError,
+                TypeError,
+                ConnectionError,
+            ) as e:
+                # e.g. a partition too large to drop or no room to move
+                # it; the report goes on with the other partitions
+                action.error = str(e)
+        actions.append(action)
+    return actions
+
+
+@function.defn()
+async def apply_retention_policies(
+    function_input: ApplyRetentionInput,
+) -> RetentionReport:
+    """Apply dataset, workspace and table retention; report bytes per action."""
+    now = datetime.now(tz=UTC)
+    actions: list[RetentionAction] = []
+    try:
+        client = await get_clickhouse_async_client()
+        for (
+            table,
+            scope,
+            scope_filter,
+            days,
+        ) in await _load_policies():
+            try:
+                actions.append(
+                    await _policy_delete(
+                        client,
+                        table,
+                        scope,
+                        scope_filter,
+                        days,
+                        now=now,
+                        dry_run=function_input.dry_run,
+                    )
+                )
+            except (
+                DatabaseError,
+                ValueError,
+                TypeError,
+                ConnectionError,
+            ) as e:
+                actions.append(
+                    RetentionAction(
+                        table=table,
+                        action="delete",
+                        scope=scope,
+                        cutoff=(
+                            now - timedelta(days=days)
+                        ).isoformat(),
+                        error=str(e),
+                    )
+                )
+        for table in RETENTION_TABLES:
+            actions.extend(
+                await _partition_actions(
+                    client,
+                    table,
+                    now=now,
+                    dry_run=function_input.dry_run,
+                )
+            )
+    except (
+        DatabaseError,
+        ValueError,
+        TypeError,
+        ConnectionError,
+    ) as e:
+        return RetentionReport(
+            success=False,
+            dry_run=function_input.dry_run,
+            actions=actions,
+            error=str(e),
+        )
+
+    for action in actions:
+        logger.info(
+            "Retention %s %s %s: %d rows, %d bytes%s",
+            action.action,
+            action.table,
+            action.scope,
+            action.rows,
+            action.bytes,
+            " (dry run)" if function_input.dry_run else "",
+        )
+    return RetentionReport(
+        success=all(action.error is None for action in actions),
+        dry_run=function_input.dry_run,
+        actions=actions,
+        reclaimable_bytes=sum(
+            action.bytes
+            for action in actions
+            if action.action != "move_partition"
+        ),
+    )
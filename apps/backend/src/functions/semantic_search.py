@@ -0,0 +1,441 @@
+"""Semantic search over dataset chunks with quantized coarse ranking.
+
+pipeline_events.embedding_i8 (migration 008) is an int8 scalar-quantized copy
+of embedding. A search ranks the dataset's rows by cosine distance over
+embedding_i8, keeps the best `candidates`, then re-ranks only those on the
+exact Float32 embedding. The coarse pass reads 1 byte per dimension instead
+of 4; re-ranking a few hundred rows restores exact ordering. The int8 copy
+is stored next to the Float32 column, so it costs disk rather than saving it.
+
+Searches are pinned to one embedding model: the dataset's current
+storage_config.embedding.model unless the caller names another. Vectors for
+it come from pipeline_events rows embedded with that model plus rows
+re-embedded into pipeline_event_embeddings (migration 009), so a dataset
+being re-embedded keeps answering from its current model until the switch.
+
+benchmark_semantic_search_recall measures recall@k of that against an exact
+scan, plus bytes read and column sizes, using stored chunks as queries.
+
+Searches by query_text are embedded first by embed_texts (embed service) in
+SemanticSearchDatasetWorkflow; this function needs query_embedding.
+
+Env: SEMANTIC_SEARCH_QUANTIZED (default 1; 0 always scans embedding),
+SEMANTIC_SEARCH_CANDIDATE_FACTOR.
+"""
+
+import logging
+import os
+import time
+from typing import Any
+
+from pydantic import BaseModel, Field, model_validator
+from restack_ai.function import function
+
+from src.database.connection import get_clickhouse_async_client
+from src.functions.datasets_crud import (
+    get_dataset_embedding_config,
+)
+
+logger = logging.getLogger(__name__)
+
+SEMANTIC_SEARCH_QUANTIZED = (
+    os.getenv("SEMANTIC_SEARCH_QUANTIZED", "1") != "0"
+)
+# Coarse candidates kept per requested result
+SEMANTIC_SEARCH_CANDIDATE_FACTOR = int(
+    os.getenv("SEMANTIC_SEARCH_CANDIDATE_FACTOR", "10")
+)
+INT8_MAX = 127
+
+_SCOPE = """
+    workspace_id = {workspace_id:UUID}
+    AND dataset_id = {dataset_id:String}
+"""
+
+
+def _vector_source(column: str, condition: str = "") -> str:
+    """(id, vector) of the dataset's `column` for {model}, from both tables."""
+    return f"""(
+        SELECT id, {column} AS vector
+        FROM pipeline_events
+        WHERE {_SCOPE}
+          AND embedding_model = {{model:String}} {condition}
+        UNION ALL
+        SELECT id, {column} AS vector
+        FROM pipeline_event_embeddings
+        WHERE {_SCOPE}
+          AND embedding_model = {{model:String}} {condition}
+    )"""  # noqa: S608
+
+
+def quantize_embedding(embedding: list[float]) -> list[int]:
+    """Python mirror of the embedding_i8 column expression."""
+    scale = max((abs(x) for x in embedding), default=0.0)
+    scale = max(scale, 1e-12)
+    return [round(x * INT8_MAX / scale) for x in embedding]
+
+
+class SemanticSearchInput(BaseModel):
+    workspace_id: str = Field(..., min_length=1)
+    dataset_id: str = Field(..., min_length=1)
+    query_embedding: list[float] | None = Field(
+        default=None, min_length=1
+    )
+    query_text: str | None = Field(
+        default=None,
+        min_length=1,
+        description="Embedded with embed_texts when query_embedding is not given.",
+    )
+    embedding_model: str | None = Field(
+        default=None,
+        min_length=1,
+        description="Model version to search (default: the dataset's current model).",
+    )
+    limit: int = Field(default=10, ge=1, le=1000)
+    candidates: int | None = Field(
+        default=None,
+        ge=1,
+        description="Coarse candidates to re-rank (default limit x SEMANTIC_SEARCH_CANDIDATE_FACTOR).",
+    )
+    exact: bool = Field(
+        default=False,
+        description="Scan the Float32 embedding only (no quantized pass).",
+    )
+
+    @model_validator(mode="after")
+    def requires_query(self) -> "SemanticSearchInput":
+        if self.query_embedding is None and not self.query_text:
+            msg = "query_embedding or query_text is required"
+            raise ValueError(msg)
+        return self
+
+
+class SemanticSearchHit(BaseModel):
+    id: str
+    text: str | None = None
+    source: str | None = None
+    chunk_index: int | None = None
+    distance: float
+
+
+class SemanticSearchOutput(BaseModel):
+    success: bool
+    hits: list[SemanticSearchHit] = Field(default_factory=list)
+    embedding_model: str | None = None
+    read_bytes: int = 0
+    error: str | None = None
+
+
+def _read_bytes(result: Any) -> int:
+    summary = getattr(result, "summary", None) or {}
+    return int(summary.get("read_bytes") or 0)
+
+
+def _scope_parameters(
+    function_input: SemanticSearchInput, model: str
+) -> dict[str, Any]:
+    return {
+        "workspace_id": function_input.workspace_id,
+        "dataset_id": function_input.dataset_id,
+        "model": model,
+        "dimension": len(function_input.query_embedding or []),
+    }
+
+
+async def _rank(
+    client: Any,
+    function_input: SemanticSearchInput,
+    model: str,
+    ids: list[str] | None = None,
+) -> tuple[list[tuple[str, float]], int]:
+    """Exact (id, distance) ranking, over all vectors or only ids."""
+    only_ids = (
+        "AND id IN {ids:Array(UUID)}" if ids is not None else ""
+    )
+    result = await client.query(
+        f"""
+        SELECT
+            toString(id),
+            cosineDistance(vector, {{query:Array(Float32)}}) AS distance
+        FROM {_vector_source("embedding", only_ids)}
+        WHERE length(vector) = {{dimension:UInt32}}
+        ORDER BY distance
+        LIMIT 1 BY id
+        LIMIT {{limit:UInt32}}
+        """,  # noqa: S608
+        parameters={
+            **_scope_parameters(function_input, model),
+            "query": function_input.query_embedding,
+            "ids": ids or [],
+            "limit": function_input.limit,
+        },
+    )
+    return (
+        [(row[0], float(row[1])) for row in result.result_rows],
+        _read_bytes(result),
+    )
+
+
+async def _hits(
+    client: Any,
+    function_input: SemanticSearchInput,
+    ranked: list[tuple[str, float]],
+) -> tuple[list[SemanticSearchHit], int]:
+    """Chunk text and source for ranked ids, in rank order."""
+    if not ranked:
+        return [], 0
+    result = await client.query(
+        f"""
+        SELECT
+            toString(id),
+            toString(raw_data.text),
+            source,
+            chunk_index
+        FROM pipeline_events
+        PREWHERE id IN {{ids:Array(UUID)}}
+        WHERE {_SCOPE}
+        LIMIT 1 BY id
+        """,  # noqa: S608
+        parameters={
+            "workspace_id": function_input.workspace_id,
+            "dataset_id": function_input.dataset_id,
+            "ids": [row_id for row_id, _ in ranked],
+        },
+    )
+    rows = {row[0]: row for row in result.result_rows}
+    # Vectors of chunks deleted since they were re-embedded are skipped
+    return [
+        SemanticSearchHit(
+            id=row_id,
+            text=rows[row_id][1] or None,
+            source=rows[row_id][2] or None,
+            chunk_index=rows[row_id][3],
+            distance=distance,
+        )
+        for row_id, distance in ranked
+        if row_id in rows
+    ], _read_bytes(result)
+
+
+async def _exact_search(
+    client: Any, function_input: SemanticSearchInput, model: str
+) -> tuple[list[SemanticSearchHit], int]:
+    ranked, rank_bytes = await _rank(
+        client, function_input, model
+    )
+    hits, hit_bytes = await _hits(client, function_input, ranked)
+    return hits, rank_bytes + hit_bytes
+
+
+async def _quantized_search(
+    client: Any, function_input: SemanticSearchInput, model: str
+) -> tuple[list[SemanticSearchHit], int]:
+    candidates = function_input.candidates or (
+        function_input.limit * SEMANTIC_SEARCH_CANDIDATE_FACTOR
+    )
+    coarse = await client.query(
+        f"""
+        SELECT id
+        FROM {_vector_source("embedding_i8")}
+        WHERE length(vector) = {{dimension:UInt32}}
+        ORDER BY cosineDistance(
+            CAST(vector, 'Array(Float32)'),
+            {{query_i8:Array(Float32)}}
+        )
+        LIMIT 1 BY id
+        LIMIT {{candidates:UInt32}}
+        """,  # noqa: S608
+        parameters={
+            **_scope_parameters(function_input, model),
+            "query_i8": [
+                float(x)
+                for x in quantize_embedding(
+                    function_input.query_embedding or []
+                )
+            ],
+            "candidates": max(candidates, function_input.limit),
+        },
+    )
+    ids = [str(row[0]) for row in coarse.result_rows]
+    if not ids:
+        return [], _read_bytes(coarse)
+    ranked, rank_bytes = await _rank(
+        client, function_input, model, ids
+    )
+    hits, hit_bytes = await _hits(client, function_input, ranked)
+    return hits, _read_bytes(coarse) + rank_bytes + hit_bytes
+
+
+async def search_model(
+    function_input: SemanticSearchInput,
+) -> str:
+    """Model version a search is pinned to."""
+    if function_input.embedding_model:
+        return function_input.embedding_model
+    config = await get_dataset_embedding_config(
+        function_input.workspace_id, function_input.dataset_id
+    )
+    return config.model
+
+
+async def search_dataset_embeddings(
+    client: Any, function_input: SemanticSearchInput, model: str
+) -> tuple[list[SemanticSearchHit], int]:
+    """Nearest chunks to the query embedding and the bytes the search read."""
+    if function_input.query_embedding is None:
+        msg = "query_text must be embedded first (embed_texts)"
+        raise ValueError(msg)
+    if function_input.exact or not SEMANTIC_SEARCH_QUANTIZED:
+        return await _exact_search(client, function_input, model)
+    return await _quantized_search(client, function_input, model)
+
+
+@function.defn()
+async def semantic_search_dataset(
+    function_input: SemanticSearchInput,
+) -> SemanticSearchOutput:
+    """Nearest dataset chunks to a query embedding (cosine distance)."""
+    try:
+        model = await search_model(function_input)
+        client = await get_clickhouse_async_client()
+        hits, read_bytes = await search_dataset_embeddings(
+            client, function_input, model
+        )
+    except (ValueError, TypeError, ConnectionError) as e:
+        logger.exception("semantic_search_dataset failed")
+        return SemanticSearchOutput(success=False, error=str(e))
+    return SemanticSearchOutput(
+        success=True,
+        hits=hits,
+        embedding_model=model,
+        read_bytes=read_bytes,
+    )
+
+
+class SemanticSearchRecallInput(BaseModel):
+    workspace_id: str = Field(..., min_length=1)
+    dataset_id: str = Field(..., min_length=1)
+    embedding_model: str | None = None
+    queries: int = Field(default=50, ge=1, le=1000)
+    limit: int = Field(default=10, ge=1, le=100)
+    candidates: int | None = Field(default=None, ge=1)
+
+
+class SemanticSearchRecallOutput(BaseModel):
+    success: bool
+    embedding_model: str | None = None
+    queries: int = 0
+    limit: int = 0
+    candidates: int = 0
+    recall_at_k: float = 0.0
+    exact_read_bytes: int = 0
+    quantized_read_bytes: int = 0
+    exact_ms: float = 0.0
+    quantized_ms: float = 0.0
+    embedding_bytes_on_disk: int = 0
+    embedding_i8_bytes_on_disk: int = 0
+    error: str | None = None
+
+
+async def _column_bytes(client: Any) -> dict[str, int]:
+    result = await client.query(
+        """
+        SELECT name, data_compressed_bytes
+        FROM system.columns
+        WHERE database = currentDatabase()
+          AND table = 'pipeline_events'
+          AND name IN ('embedding', 'embedding_i8')
+        """
+    )
+    return {name: int(size) for name, size in result.result_rows}
+
+
+@function.defn()
+async def benchmark_semantic_search_recall(
+    function_input: SemanticSearchRecallInput,
+) -> SemanticSearchRecallOutput:
+    """Recall@k of quantized search vs exact search on the dataset's own chunks."""
+    candidates = function_input.candidates or (
+        function_input.limit * SEMANTIC_SEARCH_CANDIDATE_FACTOR
+    )
+    try:
+        model = (
+            function_input.embedding_model
+            or (
+                await get_dataset_embedding_config(
+                    function_input.workspace_id,
+                    function_input.dataset_id,
+                )
+            ).model
+        )
+        client = await get_clickhouse_async_client()
+        sample = await client.query(
+            f"""
+            SELECT vector
+            FROM {_vector_source("embedding")}
+            WHERE notEmpty(vector)
+            ORDER BY cityHash64(id)
+            LIMIT {{queries:UInt32}}
+            """,  # noqa: S608
+            parameters={
+                "workspace_id": function_input.workspace_id,
+                "dataset_id": function_input.dataset_id,
+                "model": model,
+                "queries": function_input.queries,
+            },
+        )
+        found = expected = 0
+        totals = {"exact": 0, "quantized": 0}
+        elapsed = {"exact": 0.0, "quantized": 0.0}
+        for (embedding,) in sample.result_rows:
+            search_input = SemanticSearchInput(
+                workspace_id=function_input.workspace_id,
+                dataset_id=function_input.dataset_id,
+                query_embedding=list(embedding),
+                limit=function_input.limit,
+                candidates=candidates,
+            )
+            started = time.perf_counter()
+            exact, exact_bytes = await _exact_search(
+                client, search_input, model
+            )
+            elapsed["exact"] += time.perf_counter() - started
+            started = time.perf_counter()
+            approx, approx_bytes = await _quantized_search(
+                client, search_input, model
+            )
+            elapsed["quantized"] += time.perf_counter() - started
+            totals["exact"] += exact_bytes
+            totals["quantized"] += approx_bytes
+            expected += len(exact)
+            found += len(
+                {hit.id for hit in exact}
+                & {hit.id for hit in approx}
+            )
+        column_bytes = await _column_bytes(client)
+    except (ValueError, TypeError, ConnectionError) as e:
+        logger.exception(
+            "benchmark_semantic_search_recall failed"
+        )
+        return SemanticSearchRecallOutput(
+            success=False, error=str(e)
+        )
+    queries = len(sample.result_rows)
+    return SemanticSearchRecallOutput(
+        success=True,
+        embedding_model=model,
+        queries=queries,
+        limit=function_input.limit,
+        candidates=candidates,
+        recall_at_k=found / expected if expected else 0.0,
+        exact_read_bytes=totals["exact"],
+        quantized_read_bytes=totals["quantized"],
+        exact_ms=1000 * elapsed["exact"] / max(queries, 1),
+        quantized_ms=1000
+        * elapsed["quantized"]
+        / max(queries, 1),
+        embedding_bytes_on_disk=column_bytes.get("embedding", 0),
+        embedding_i8_bytes_on_disk=column_bytes.get(
+            "embedding_i8", 0
+        ),
+    )
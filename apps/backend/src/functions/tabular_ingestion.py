@@ -0,0 +1,428 @@
+"""CSV and Parquet uploads → one pipeline_events row per table row.
+
+Tables are not chunked as prose: rows are read in bounded blocks
+(CLICKHOUSE_INGEST_BLOCK_SIZE rows) and each block is one columnar insert
+(data_ingestion). raw_data holds the row's columns with typed values (CSV
+cells are parsed per column as int, float or bool when every value in the
+file parses, found by a first pass over the file, so a column has one type
+in every row; Parquet values keep their type) plus source and chunk_index
+(the row number), so the file shows up in the dataset manifest and can be
+deleted by source like any other file.
+
+Nothing is embedded unless embed_columns is given; then those columns of each
+row are joined into raw_data.text and embedded with the dataset's model
+through the resident text embedder (embed_texts), not the file embed workers.
+
+"""
+
+import asyncio
+import csv
+import itertools
+import logging
+import math
+import time
+from collections.abc import Callable, Iterator
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+from datetime import time as dt_time
+from decimal import Decimal
+from pathlib import Path
+from typing import Any
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+from restack_ai.function import heartbeat
+
+from src.database.connection import get_clickhouse_shared_client
+from src.functions.data_ingestion import (
+    PIPELINE_EVENTS_COLUMNS,
+    _build_event_columns,
+    _ingest_block_size,
+    _insert_columns_to_clickhouse,
+)
+from src.functions.embed_texts import get_text_embedder
+from src.utils.event_ids import table_row_event_ids
+
+logger = logging.getLogger(__name__)
+
+TABULAR_SUFFIXES = frozenset({".csv", ".parquet"})
+TABLE_ROW_EVENT_NAME = "Table Row"
+# raw_data keys written for every row; a table column with one of these
+# names gets a numeric suffix instead, like duplicate column names
+_ROW_KEYS = frozenset({"source", "chunk_index"})
+_INT64_LIMIT = 1 << 63
+_BOOLS = {"true": True, "false": False}
+
+CsvParser = Callable[[str], Any]
+
+
+def is_tabular(filename: str) -> bool:
+    return Path(filename).suffix.lower() in TABULAR_SUFFIXES
+
+
+@dataclass(frozen=True, slots=True)
+class TabularFile:
+    path: str
+    agent_id: str
+    task_id: str | None
+    workspace_id: str
+    dataset_id: str
+    event_name: str
+    source: str
+    content_hash: str
+    tags: list[str]
+    embed_columns: list[str]
+    model_id: str
+
+
+def _column_names(
+    header: list[str], reserved: frozenset[str]
+) -> list[str]:
+    """Header names made unique and kept clear of the row keys."""
+    seen = set(reserved)
+    names = []
+    for position, raw in enumerate(header, start=1):
+        base = raw.strip() or f"column_{position}"
+        name = base
+        suffix = 2
+        while name in seen:
+            name = f"{base}_{suffix}"
+            suffix += 1
+        seen.add(name)
+        names.append(name)
+    return names
+
+
+def _check_numeric_text(value: str) -> None:
+    """Keep codes with leading zeros (zip codes, ids) as text.
+
+    So are cells with underscores, which int() and float() would read as
+    digit separators ("1_000").
+    """
+    if "_" in value:
+        raise ValueError(value)
+    digits = value.lstrip("+-")
+    if len(digits) > 1 and digits[0] == "0" and digits[1] != ".":
+        raise ValueError(value)
+
+
+def _parse_int(value: str) -> int:
+    _check_numeric_text(value)
+    parsed = int(value)
+    if not -_INT64_LIMIT <= parsed < _INT64_LIMIT:
+        raise ValueError(value)
+    return parsed
+
+
+def _parse_float(value: str) -> float:
+    _check_numeric_text(value)
+    parsed = float(value)
+    if not math.isfinite(parsed):
+        raise ValueError(value)
+    return parsed
+
+
+def _parse_bool(value: str) -> bool:
+    return _BOOLS[value.lower()]
+
+
+_CSV_PARSERS: tuple[CsvParser, ...] = (
+    _parse_int,
+    _parse_float,
+    _parse_bool,
+)
+
+
+def _parses(parse: CsvParser, values: set[str]) -> bool:
+    try:
+        for value in values:
+            parse(value)
+    except (ValueError, KeyError):
+        return False
+    return True
+
+
+def _typed_column(
+    values: tuple[str, ...], parse: CsvParser | None
+) -> list[Any]:
+    """CSV cells parsed with the column's parser; empty cells are null.
+
+    Each distinct value is parsed once.
+    """
+    distinct = set(values)
+    distinct.discard("")
+    parsed: dict[str, Any] = (
+        {value: parse(value) for value in distinct}
+        if parse
+        else {value: value for value in distinct}
+    )
+    parsed[""] = None
+    return [parsed[value] for value in values]
+
+
+def _csv_cell_blocks(
+    path: Path, block_rows: int, reserved: frozenset[str]
+) -> Iterator[tuple[list[str], list[tuple[str, ...]]]]:
+    """(column names, column cells) per block of up to block_rows rows."""
+    with path.open(
+        newline="", encoding="utf-8-sig", errors="replace"
+    ) as f:
+        reader = csv.reader(f)
+        header = next(reader, None)
+        if header is None:
+            return
+        names = _column_names(header, reserved)
+        padding = [""] * len(names)
+        rows = (row for row in reader if row)
+        for block in itertools.batched(rows, block_rows):
+            # Short rows are padded, extra cells dropped
+            cells = [
+                (row + padding)[: len(names)] for row in block
+            ]
+            yield names, list(zip(*cells, strict=True))
+
+
+async def infer_csv_parsers(
+    path: Path, block_rows: int, reserved: frozenset[str]
+) -> list[CsvParser | None]:
+    """Per column, the first of int, float, bool all its cells parse as.
+
+    None keeps the column as text. Types are fixed per file, not per
+    block, so a column never holds numbers in some rows and text in others.
+    """
+    candidates: list[list[CsvParser]] = []
+    blocks = _csv_cell_blocks(path, block_rows, reserved)
+    rows = 0
+    while (
+        block := await asyncio.to_thread(next, blocks, None)
+    ) is not None:
+        names, columns = block
+        if not candidates:
+            candidates = [list(_CSV_PARSERS) for _ in names]
+        for parsers, values in zip(
+            candidates, columns, strict=True
+        ):
+            if not parsers:
+                continue
+            distinct = set(values)
+            distinct.discard("")
+            parsers[:] = [
+                parse
+                for parse in parsers
+                if _parses(parse, distinct)
+            ]
+        rows += len(columns[0]) if columns else 0
+        heartbeat(f"tabular: typed {rows} rows of {path.name}")
+    return [
+        parsers[0] if parsers else None for parsers in candidates
+    ]
+
+
+def _csv_blocks(
+    path: Path,
+    block_rows: int,
+    reserved: frozenset[str],
+    parsers: list[CsvParser | None],
+) -> Iterator[tuple[list[str], list[list[Any]]]]:
+    """(column names, column values) per block of up to block_rows rows."""
+    for names, columns in _csv_cell_blocks(
+        path, block_rows, reserved
+    ):
+        yield (
+            names,
+            [
+                _typed_column(values, parse)
+                for values, parse in zip(
+                    columns, parsers, strict=True
+                )
+            ],
+        )
+
+
+def _json_value(value: Any) -> Any:  # noqa: PLR0911
+    """A Parquet value as something raw_data (JSON) can hold."""
+    if isinstance(value, datetime | date | dt_time):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, timedelta):
+        return value.total_seconds()
+    if isinstance(value, bytes):
+        return value.decode("utf-8", errors="replace")
+    if isinstance(value, dict):
+        return {
+            str(key): _json_value(item)
+            for key, item in value.items()
+        }
+    if isinstance(value, list | tuple):
+        return [_json_value(item) for item in value]
+    return value
+
+
+def _parquet_blocks(
+    path: Path, block_rows: int, reserved: frozenset[str]
+) -> Iterator[tuple[list[str], list[list[Any]]]]:
+    """(column names, column values) per batch of up to block_rows rows."""
+    parquet = pq.ParquetFile(path)
+    names = _column_names(parquet.schema_arrow.names, reserved)
+    for batch in parquet.iter_batches(batch_size=block_rows):
+        columns = []
+        for column in batch.columns:
+            values = column.to_pylist()
+            kind = column.type
+            if not (
+                pa.types.is_integer(kind)
+                or pa.types.is_floating(kind)
+                or pa.types.is_boolean(kind)
+                or pa.types.is_string(kind)
+                or pa.types.is_large_string(kind)
+            ):
+                values = [_json_value(value) for value in values]
+            columns.append(values)
+        yield names, columns
+
+
+async def read_table_blocks(
+    path: Path, block_rows: int, reserved: frozenset[str]
+) -> Iterator[tuple[list[str], list[list[Any]]]]:
+    if path.suffix.lower() == ".parquet":
+        return _parquet_blocks(path, block_rows, reserved)
+    parsers = await infer_csv_parsers(path, block_rows, reserved)
+    return _csv_blocks(path, block_rows, reserved, parsers)
+
+
+def _row_text(
+    raw_data: dict[str, Any], embed_columns: list[str]
+) -> str:
+    """Text embedded for a row: the column's value, or "column: value" lines."""
+    if len(embed_columns) == 1:
+        value = raw_data.get(embed_columns[0])
+        return "" if value is None else str(value)
+    return "\n".join(
+        f"{column}: {raw_data[column]}"
+        for column in embed_columns
+        if raw_data.get(column) not in (None, "")
+    )
+
+
+def _row_events(
+    table: TabularFile,
+    names: list[str],
+    columns: list[list[Any]],
+    first_row: int,
+) -> list[dict[str, Any]]:
+    missing = [c for c in table.embed_columns if c not in names]
+    if missing:
+        msg = f"embed_columns not in {table.source}: {', '.join(missing)} (columns: {', '.join(names)})"
+        raise ValueError(msg)
+    count = len(columns[0]) if columns else 0
+    ids = table_row_event_ids(
+        table.workspace_id,
+        table.dataset_id,
+        table.source,
+        table.content_hash,
+        range(first_row, first_row + count),
+    )
+    events = []
+    for row_index, row_id, values in zip(
+        itertools.count(first_row),
+        ids,
+        zip(*columns, strict=True),
+        strict=False,
+    ):
+        raw_data = dict(zip(names, values, strict=True))
+        raw_data["source"] = table.source
+        raw_data["chunk_index"] = row_index
+        if table.embed_columns:
+            raw_data["text"] = _row_text(
+                raw_data, table.embed_columns
+            )
+        events.append(
+            {
+                "id": row_id,
+                "agent_id": table.agent_id,
+                "task_id": table.task_id,
+                "workspace_id": table.workspace_id,
+                "dataset_id": table.dataset_id,
+                "event_name": table.event_name,
+                "raw_data": raw_data,
+                "tags": table.tags,
+            }
+        )
+    return events
+
+
+async def _embed_rows(
+    table: TabularFile, events: list[dict[str, Any]]
+) -> None:
+    """Set embedding on every event whose embed text is not blank."""
+    to_embed = [
+        event
+        for event in events
+        if event["raw_data"]["text"].strip()
+    ]
+    if not to_embed:
+        return
+    embeddings = await get_text_embedder(
+        table.model_id, bulk=True
+    ).embed_batch(
+        [event["raw_data"]["text"] for event in to_embed]
+    )
+    for event, embedding in zip(
+        to_embed, embeddings, strict=True
+    ):
+        event["embedding"] = embedding
+
+
+async def ingest_tabular_file(table: TabularFile) -> int:
+    """Stream the table into pipeline_events block by block; returns rows stored."""
+    reserved = _ROW_KEYS
+    # raw_data.text is the embedded text; a "text" column stays as is only
+    # when it is the one column embedded
+    if table.embed_columns and table.embed_columns != ["text"]:
+        if "text" in table.embed_columns:
+            msg = (
+                "embed_columns cannot list 'text' with other columns: "
+                "raw_data.text holds the embedded text, so the table's "
+                "text column is stored as text_2 (or the next free "
+                "name); list it under that name"
+            )
+            raise ValueError(msg)
+        reserved |= {"text"}
+    blocks = await read_table_blocks(
+        Path(table.path), _ingest_block_size(), reserved
+    )
+    column_names = [*PIPELINE_EVENTS_COLUMNS, "embedding_model"]
+    client = await get_clickhouse_shared_client()
+    start_time = time.perf_counter()
+    rows = 0
+    # Parsing runs off the event loop, one block at a time
+    while (
+        block := await asyncio.to_thread(next, blocks, None)
+    ) is not None:
+        names, columns = block
+        events = _row_events(table, names, columns, rows)
+        if table.embed_columns:
+            await _embed_rows(table, events)
+        event_columns = _build_event_columns(events)
+        event_columns.append(
+            [
+                table.model_id if embedding else ""
+                for embedding in event_columns[
+                    PIPELINE_EVENTS_COLUMNS.index("embedding")
+                ]
+            ]
+        )
+        await _insert_columns_to_clickhouse(
+            client, event_columns, column_names
+        )
+        rows += len(events)
+        heartbeat(f"tabular: {rows} rows of {table.source}")
+    elapsed = time.perf_counter() - start_time
+    logger.info(
+        "Ingested %d rows of %s in %.1fs",
+        rows,
+        table.source,
+        elapsed,
+    )
+    return rows
@@ -1,12 +1,17 @@
 """Functions to query tasks by metric failures.
 
 Performant queries against ClickHouse to filter tasks by metric results.
+The task_metrics rollups are checked first, so a filter with no matching
+rows returns without scanning task_metrics.
 """
 
+from typing import Any
+
 from pydantic import BaseModel, Field
 from restack_ai.function import function, log
 
 from src.database.connection import get_clickhouse_async_client
+from src.functions.analytics_helpers import rollup_source
 
 
 class TasksByMetricInput(BaseModel):
@@ -45,10 +50,10 @@ class TaskIdsOutput(BaseModel):
     count: int
 
 
-def _build_date_filter(date_range: str) -> str:
-    """Build date filter clause for ClickHouse query."""
+def _range_days(date_range: str) -> int | None:
+    """Number of days in the date range, None for "all"."""
     if date_range == "all":
-        return ""
+        return None
 
     days_map = {
         "1d": 1,
@@ -56,10 +61,36 @@ def _build_date_filter(date_range: str) -> str:
         "30d": 30,
         "90d": 90,
     }
-    days = days_map.get(date_range, 7)
+    return days_map.get(date_range, 7)
+
+
+def _build_date_filter(date_range: str) -> str:
+    """Build date filter clause for ClickHouse query."""
+    days = _range_days(date_range)
+    if days is None:
+        return ""
     return f"AND created_at >= now() - INTERVAL {days} DAY"
 
 
+async def _rollup_has_matches(
+    client: Any,
+    where_conditions: list[str],
+    params: dict[str, Any],
+    count_column: str,
+    date_range: str,
+) -> bool:
+    """Whether the rollups count any row for the filter (before the pass filter).
+
+    count_column is passed_count or failed_count.
+    """
+    source = rollup_source(
+        " AND ".join(where_conditions), _range_days(date_range)
+    )
+    query = f"SELECT sum({count_column}) AS matches FROM {source}"  # noqa: S608
+    result = await client.query(query, parameters=params)
+    return next(iter(result.named_results()))["matches"] > 0
+
+
 @function.defn()
 async def get_tasks_by_metric_failure(
     function_input: TasksByMetricInput,
@@ -80,12 +111,6 @@ async def get_tasks_by_metric_failure(
             "metric_name = {metric_name:String}",
         ]
 
-        # Add status filter (failed means passed = 0, passed means passed = 1)
-        if function_input.status == "failed":
-            where_conditions.append("passed = 0")
-        else:
-            where_conditions.append("passed = 1")
-
         # Optional filters
         if function_input.agent_id:
             where_conditions.append("agent_id = {agent_id:UUID}")
@@ -95,6 +120,34 @@ async def get_tasks_by_metric_failure(
                 "agent_version = {version:String}"
             )
 
+        params = {
+            "workspace_id": function_input.workspace_id,
+            "metric_name": function_input.metric_name,
+        }
+
+        if function_input.agent_id:
+            params["agent_id"] = function_input.agent_id
+
+        if function_input.version:
+            params["version"] = function_input.version
+
+        # Add status filter (failed means passed = 0, passed means passed = 1)
+        if function_input.status == "failed":
+            count_column = "failed_count"
+            where_conditions.append("passed = 0")
+        else:
+            count_column = "passed_count"
+            where_conditions.append("passed = 1")
+
+        if not await _rollup_has_matches(
+            client,
+            where_conditions[:-1],
+            params,
+            count_column,
+            function_input.date_range,
+        ):
+            return TaskIdsOutput(task_ids=[], count=0)
+
         # Date filter
         date_filter = _build_date_filter(
             function_input.date_range
@@ -115,17 +168,6 @@ async def get_tasks_by_metric_failure(
             ORDER BY created_at DESC
         """  # noqa: S608
 
-        params = {
-            "workspace_id": function_input.workspace_id,
-            "metric_name": function_input.metric_name,
-        }
-
-        if function_input.agent_id:
-            params["agent_id"] = function_input.agent_id
-
-        if function_input.version:
-            params["version"] = function_input.version
-
         result = await client.query(query, parameters=params)
         task_ids = [
             str(row["task_id"]) for row in result.named_results()
@@ -170,12 +212,6 @@ async def get_tasks_by_feedback(
             "metric_category = 'feedback'",
         ]
 
-        # Add feedback type filter
-        if function_input.feedback_type == "negative":
-            where_conditions.append("passed = 0")
-        else:
-            where_conditions.append("passed = 1")
-
         # Optional filters
         if function_input.agent_id:
             where_conditions.append("agent_id = {agent_id:UUID}")
@@ -185,6 +221,33 @@ async def get_tasks_by_feedback(
                 "agent_version = {version:String}"
             )
 
+        params = {
+            "workspace_id": function_input.workspace_id,
+        }
+
+        if function_input.agent_id:
+            params["agent_id"] = function_input.agent_id
+
+        if function_input.version:
+            params["version"] = function_input.version
+
+        # Add feedback type filter
+        if function_input.feedback_type == "negative":
+            count_column = "failed_count"
+            where_conditions.append("passed = 0")
+        else:
+            count_column = "passed_count"
+            where_conditions.append("passed = 1")
+
+        if not await _rollup_has_matches(
+            client,
+            where_conditions[:-1],
+            params,
+            count_column,
+            function_input.date_range,
+        ):
+            return TaskIdsOutput(task_ids=[], count=0)
+
         # Date filter
         date_filter = _build_date_filter(
             function_input.date_range
@@ -205,16 +268,6 @@ async def get_tasks_by_feedback(
             ORDER BY created_at DESC
         """  # noqa: S608
 
-        params = {
-            "workspace_id": function_input.workspace_id,
-        }
-
-        if function_input.agent_id:
-            params["agent_id"] = function_input.agent_id
-
-        if function_input.version:
-            params["version"] = function_input.version
-
         result = await client.query(query, parameters=params)
         task_ids = [
             str(row["task_id"]) for row in result.named_results()
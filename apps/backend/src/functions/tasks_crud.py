@@ -2,17 +2,19 @@ import uuid
 
 from pydantic import BaseModel, Field, field_validator
 from restack_ai.function import NonRetryableError, function, log
-from sqlalchemy import func, or_, select
+from sqlalchemy import delete, func, or_, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import selectinload
 
 from src.database.connection import get_async_db
-from src.database.models import Agent, Dataset, Task
+from src.database.models import Agent, Dataset, Task, TaskView
 from src.functions.datasets_crud import (
     DatasetFileSummary,
     ListDatasetFilesInput,
     list_dataset_files,
 )
+from src.functions.raw_data_paths import record_view_path_usage
 
 
 # Pydantic models for input validation
@@ -416,6 +418,9 @@ async def tasks_create(
             )
 
             db.add(task)
+            if task.view_specs:
+                await db.flush()
+                await _sync_task_views(db, task)
             await db.commit()
             await db.refresh(task)
 
@@ -555,6 +560,8 @@ async def tasks_update(
                     else:
                         setattr(task, key, value)
 
+            if update_data.get("view_specs") is not None:
+                await _sync_task_views(db, task)
             await db.commit()
             await db.refresh(task)
 
@@ -1096,47 +1103,69 @@ async def tasks_get_build_session(
     )
 
 
-def _view_specs_for_dataset(
-    view_specs: list | None, dataset_id: str
-) -> list[dict]:
-    """Return view specs that reference the given dataset_id."""
-    if not view_specs or not isinstance(view_specs, list):
-        return []
-    return [
-        v
-        for v in view_specs
-        if isinstance(v, dict)
-        and v.get("dataset_id") == dataset_id
-    ]
+async def _sync_task_views(db: AsyncSession, task: Task) -> None:
+    """Rewrite task_views rows for a task from its view_specs (caller commits)."""
+    await db.execute(
+        delete(TaskView).where(TaskView.task_id == task.id)
+    )
+    rows = {
+        (str(spec["dataset_id"]), str(spec["id"])): {
+            "workspace_id": task.workspace_id,
+            "dataset_id": str(spec["dataset_id"]),
+            "view_id": str(spec["id"]),
+            "task_id": task.id,
+            "position": position,
+            "spec": spec,
+        }
+        for position, spec in enumerate(task.view_specs or [])
+        if isinstance(spec, dict)
+        and spec.get("dataset_id")
+        and spec.get("id")
+    }
+    if not rows:
+        return
+    # A view id another task already defines for the dataset moves here
+    insert_stmt = pg_insert(TaskView).values(list(rows.values()))
+    await db.execute(
+        insert_stmt.on_conflict_do_update(
+            index_elements=[
+                TaskView.workspace_id,
+                TaskView.dataset_id,
+                TaskView.view_id,
+            ],
+            set_={
+                "task_id": insert_stmt.excluded.task_id,
+                "position": insert_stmt.excluded.position,
+                "spec": insert_stmt.excluded.spec,
+                "updated_at": func.now(),
+            },
+        )
+    )
 
 
 @function.defn()
 async def tasks_list_views_for_dataset(
     function_input: ListViewsForDatasetInput,
 ) -> ListViewsForDatasetOutput:
-    """List view specs that reference the given dataset (from tasks.view_specs)."""
+    """List view specs that reference the given dataset (task_views index)."""
     if isinstance(function_input, dict):
         function_input = ListViewsForDatasetInput.model_validate(
             function_input
         )
     async for db in get_async_db():
         try:
-            tasks_query = select(Task).where(
-                Task.workspace_id
-                == uuid.UUID(function_input.workspace_id)
-            )
-            result = await db.execute(tasks_query)
-            tasks = result.scalars().all()
-            views: list[dict] = []
-            for task in tasks:
-                specs = getattr(task, "view_specs", None) or []
-                views.extend(
-                    _view_specs_for_dataset(
-                        specs, function_input.dataset_id
-                    )
+            result = await db.execute(
+                select(TaskView.spec)
+                .where(
+                    TaskView.workspace_id
+                    == uuid.UUID(function_input.workspace_id),
+                    TaskView.dataset_id
+                    == function_input.dataset_id,
                 )
+                .order_by(TaskView.task_id, TaskView.position)
+            )
             return ListViewsForDatasetOutput(
-                success=True, views=views
+                success=True, views=list(result.scalars().all())
             )
         except Exception as e:  # noqa: BLE001
             log.error(
@@ -1161,23 +1190,22 @@ async def tasks_get_view_by_id(
         )
     async for db in get_async_db():
         try:
-            tasks_query = select(Task).where(
-                Task.workspace_id
-                == uuid.UUID(function_input.workspace_id)
+            view = await db.scalar(
+                select(TaskView.spec).where(
+                    TaskView.workspace_id
+                    == uuid.UUID(function_input.workspace_id),
+                    TaskView.dataset_id
+                    == function_input.dataset_id,
+                    TaskView.view_id == function_input.view_id,
+                )
             )
-            result = await db.execute(tasks_query)
-            tasks = result.scalars().all()
-            for task in tasks:
-                specs = getattr(task, "view_specs", None) or []
-                for v in _view_specs_for_dataset(
-                    specs, function_input.dataset_id
-                ):
-                    if (
-                        isinstance(v, dict)
-                        and v.get("id") == function_input.view_id
-                    ):
-                        return GetViewOutput(success=True, view=v)
-            return GetViewOutput(success=True, view=None)
+            if view is not None:
+                await record_view_path_usage(
+                    view,
+                    workspace_id=function_input.workspace_id,
+                    dataset_id=function_input.dataset_id,
+                )
+            return GetViewOutput(success=True, view=view)
         except Exception as e:  # noqa: BLE001
             log.error(f"tasks_get_view_by_id failed: {e!s}")
             return GetViewOutput(
@@ -159,16 +159,77 @@ async def query_traces_for_response(
         raise
 
 
+def _retroactive_trace_filter(
+    workspace_id: str, filters: dict[str, Any]
+) -> tuple[str, dict[str, Any]]:
+    """WHERE clause and parameters for the response spans a retroactive run reads.
+
+    filters: agent_id, agent_version, date_from, date_to (ISO datetimes) and
+    partition (a task_traces partition, YYYYMM).
+    """
+    where_conditions = ["workspace_id = {workspace_id:UUID}"]
+    params: dict[str, Any] = {"workspace_id": workspace_id}
+
+    if filters.get("agent_id"):
+        where_conditions.append("agent_id = {agent_id:UUID}")
+        params["agent_id"] = filters["agent_id"]
+
+    if filters.get("agent_version"):
+        where_conditions.append(
+            "agent_version = {agent_version:String}"
+        )
+        params["agent_version"] = filters["agent_version"]
+
+    # The date bounds are repeated on the partition column (date) so
+    # ClickHouse skips partitions outside the range
+    if filters.get("date_from"):
+        where_conditions.append(
+            "started_at >= {date_from:String}"
+        )
+        where_conditions.append(
+            "date >= toDate(toDateTime64({date_from:String}, 3))"
+        )
+        # Remove 'Z' suffix if present for ClickHouse compatibility
+        params["date_from"] = (
+            filters["date_from"]
+            .replace("Z", "")
+            .replace("T", " ")
+        )
+
+    if filters.get("date_to"):
+        where_conditions.append("started_at <= {date_to:String}")
+        where_conditions.append(
+            "date <= toDate(toDateTime64({date_to:String}, 3))"
+        )
+        params["date_to"] = (
+            filters["date_to"].replace("Z", "").replace("T", " ")
+        )
+
+    if filters.get("partition"):
+        where_conditions.append(
+            "toYYYYMM(date) = {partition:UInt32}"
+        )
+        params["partition"] = filters["partition"]
+
+    # Only response spans (for quality evaluation)
+    where_conditions.append("span_type = 'response'")
+
+    return " AND ".join(where_conditions), params
+
+
 @function.defn()
 async def query_traces_batch(
     function_input: dict[str, Any],
 ) -> dict[str, Any]:
     """Query traces in batches for retroactive evaluation.
 
-    Supports filtering by workspace, agent, date range, etc.
+    Supports filtering by workspace, agent, date range, etc. Batches are
+    newest first and keyset paginated on (started_at, span_id): pass the
+    previous batch's next_cursor as cursor, so a batch costs the same
+    however deep the run is.
 
     Args:
-        function_input: Dict with workspace_id, filters, limit, offset
+        function_input: Dict with workspace_id, filters, limit, cursor
 
     Returns:
         Dict with spans array and pagination info
@@ -176,57 +237,29 @@ async def query_traces_batch(
     workspace_id = function_input["workspace_id"]
     filters = function_input.get("filters", {})
     limit = function_input.get("limit", 100)
-    offset = function_input.get("offset", 0)
+    cursor = function_input.get("cursor")
 
     log.info(
-        f"Querying trace batch for workspace {workspace_id}, offset {offset}"
+        f"Querying trace batch for workspace {workspace_id}, cursor {cursor}"
     )
 
     try:
         client = await get_clickhouse_async_client()
 
-        # Build WHERE clause from filters
-        where_conditions = ["workspace_id = {workspace_id:UUID}"]
-        params = {"workspace_id": workspace_id}
-
-        if filters.get("agent_id"):
-            where_conditions.append("agent_id = {agent_id:UUID}")
-            params["agent_id"] = filters["agent_id"]
-
-        if filters.get("agent_version"):
-            where_conditions.append(
-                "agent_version = {agent_version:String}"
-            )
-            params["agent_version"] = filters["agent_version"]
-
-        if filters.get("date_from"):
-            where_conditions.append(
-                "started_at >= {date_from:String}"
-            )
-            # Remove 'Z' suffix if present for ClickHouse compatibility
-            date_from_str = (
-                filters["date_from"]
-                .replace("Z", "")
-                .replace("T", " ")
-            )
-            params["date_from"] = date_from_str
-
-        if filters.get("date_to"):
-            where_conditions.append(
-                "started_at <= {date_to:String}"
-            )
-            # Remove 'Z' suffix if present for ClickHouse compatibility
-            date_to_str = (
-                filters["date_to"]
-                .replace("Z", "")
-                .replace("T", " ")
+        where_clause, params = _retroactive_trace_filter(
+            workspace_id, filters
+        )
+        if cursor:
+            # started_at is repeated alone so partitions and granules
+            # after the cursor are skipped before the tuple comparison
+            where_clause += (
+                " AND started_at <= {after_started_at:DateTime64(3)}"
+                " AND date <= toDate({after_started_at:DateTime64(3)})"
+                " AND (started_at, span_id)"
+                " < ({after_started_at:DateTime64(3)}, {after_span_id:String})"
             )
-            params["date_to"] = date_to_str
-
-        # Only response spans (for quality evaluation)
-        where_conditions.append("span_type = 'response'")
-
-        where_clause = " AND ".join(where_conditions)
+            params["after_started_at"] = cursor["started_at"]
+            params["after_span_id"] = cursor["span_id"]
 
         query = (
             """
@@ -255,14 +288,12 @@ async def query_traces_batch(
         WHERE """
             + where_clause
             + """
-        ORDER BY started_at DESC
+        ORDER BY started_at DESC, span_id DESC
         LIMIT {limit:UInt32}
-        OFFSET {offset:UInt32}
         """
         )
 
         params["limit"] = limit
-        params["offset"] = offset
 
         result = await client.query(query, parameters=params)
 
@@ -317,11 +348,21 @@ async def query_traces_batch(
 
         log.info(f"Retrieved {len(spans)} traces for batch")
 
+        next_cursor = None
+        if result.result_rows:
+            last = result.result_rows[-1]
+            next_cursor = {
+                "started_at": last[18].strftime(
+                    "%Y-%m-%d %H:%M:%S.%f"
+                )[:-3],
+                "span_id": last[1],
+            }
+
         return {
             "spans": spans,
             "count": len(spans),
             "has_more": len(spans) == limit,
-            "next_offset": offset + len(spans),
+            "next_cursor": next_cursor,
         }
 
     except Exception as e:
@@ -409,13 +450,15 @@ async def count_traces_for_retroactive(
 ) -> dict[str, Any]:
     """Count traces matching retroactive evaluation filters.
 
-    Used to show progress on the frontend before starting evaluation.
+    Used to show progress on the frontend before starting evaluation, and
+    by RetroactiveMetrics to report progress and split large runs.
 
     Args:
         function_input: Dict with workspace_id and filters
 
     Returns:
-        Dict with total_count of matching traces
+        Dict with total_count of matching traces and partitions, the
+        count per task_traces partition (YYYYMM), newest first
     """
     workspace_id = function_input["workspace_id"]
     filters = function_input.get("filters", {})
@@ -427,59 +470,26 @@ async def count_traces_for_retroactive(
     try:
         client = await get_clickhouse_async_client()
 
-        # Build WHERE clause (same logic as query_traces_batch)
-        where_conditions = ["workspace_id = {workspace_id:UUID}"]
-        params = {"workspace_id": workspace_id}
-
-        if filters.get("agent_id"):
-            where_conditions.append("agent_id = {agent_id:UUID}")
-            params["agent_id"] = filters["agent_id"]
-
-        if filters.get("agent_version"):
-            where_conditions.append(
-                "agent_version = {agent_version:String}"
-            )
-            params["agent_version"] = filters["agent_version"]
-
-        if filters.get("date_from"):
-            where_conditions.append(
-                "started_at >= {date_from:String}"
-            )
-            date_from_str = (
-                filters["date_from"]
-                .replace("Z", "")
-                .replace("T", " ")
-            )
-            params["date_from"] = date_from_str
-
-        if filters.get("date_to"):
-            where_conditions.append(
-                "started_at <= {date_to:String}"
-            )
-            date_to_str = (
-                filters["date_to"]
-                .replace("Z", "")
-                .replace("T", " ")
-            )
-            params["date_to"] = date_to_str
-
-        # Only response spans (for quality evaluation)
-        where_conditions.append("span_type = 'response'")
-
-        where_clause = " AND ".join(where_conditions)
+        # Same filter as query_traces_batch
+        where_clause, params = _retroactive_trace_filter(
+            workspace_id, filters
+        )
 
         query = (
-            "SELECT COUNT(*) as total "
+            "SELECT toYYYYMM(date) as partition, COUNT(*) as total "
             "FROM task_traces "
-            "WHERE " + where_clause
+            "WHERE " + where_clause + " "
+            "GROUP BY partition "
+            "ORDER BY partition DESC"
         )
 
         result = await client.query(query, parameters=params)
 
-        if not result.result_rows:
-            return {"total_count": 0}
-
-        total_count = result.result_rows[0][0]
+        partitions = [
+            {"partition": int(row[0]), "count": int(row[1])}
+            for row in result.result_rows
+        ]
+        total_count = sum(p["count"] for p in partitions)
 
         log.info(f"Found {total_count} traces matching filters")
 
@@ -487,4 +497,7 @@ async def count_traces_for_retroactive(
         log.error(f"Error counting traces: {e}")
         raise
     else:
-        return {"total_count": total_count}
+        return {
+            "total_count": total_count,
+            "partitions": partitions,
+        }
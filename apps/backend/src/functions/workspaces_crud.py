@@ -25,6 +25,11 @@ class WorkspaceCreateInput(BaseModel):
 class WorkspaceUpdateInput(BaseModel):
     workspace_id: str = Field(..., min_length=1)
     name: str | None = Field(None, min_length=1, max_length=255)
+    trace_retention_days: int | None = Field(
+        None,
+        ge=1,
+        description="Days to keep task traces; null keeps them indefinitely",
+    )
 
 
 class WorkspaceReadInput(BaseModel):
@@ -46,6 +51,7 @@ class WorkspaceOutput(BaseModel):
     id: str
     name: str
     is_admin: bool = False
+    trace_retention_days: int | None = None
     created_at: str | None = None
     updated_at: str | None = None
     openai_mcp_server_id: str | None = None
@@ -89,6 +95,9 @@ async def workspaces_read(
                 id=str(workspace.id),
                 name=workspace.name,
                 is_admin=getattr(workspace, "is_admin", False),
+                trace_retention_days=getattr(
+                    workspace, "trace_retention_days", None
+                ),
                 created_at=workspace.created_at.isoformat()
                 if workspace.created_at
                 else None,
@@ -169,6 +178,9 @@ async def workspaces_create(
                 id=str(workspace.id),
                 name=workspace.name,
                 is_admin=getattr(workspace, "is_admin", False),
+                trace_retention_days=getattr(
+                    workspace, "trace_retention_days", None
+                ),
                 created_at=workspace.created_at.isoformat()
                 if workspace.created_at
                 else None,
@@ -217,6 +229,9 @@ async def workspaces_update(
             id=str(workspace.id),
             name=workspace.name,
             is_admin=getattr(workspace, "is_admin", False),
+            trace_retention_days=getattr(
+                workspace, "trace_retention_days", None
+            ),
             created_at=workspace.created_at.isoformat()
             if workspace.created_at
             else None,
@@ -271,6 +286,9 @@ async def workspaces_get_by_id(
             id=str(workspace.id),
             name=workspace.name,
             is_admin=getattr(workspace, "is_admin", False),
+            trace_retention_days=getattr(
+                workspace, "trace_retention_days", None
+            ),
             created_at=workspace.created_at.isoformat()
             if workspace.created_at
             else None,
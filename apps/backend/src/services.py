@@ -10,7 +10,11 @@ from watchfiles import run_process
 
 from src.agents.agent_task import AgentTask
 from src.client import client
-from src.constants import TASK_QUEUE, TASK_QUEUE_EMBED
+from src.constants import (
+    TASK_QUEUE,
+    TASK_QUEUE_EMBED,
+    TASK_QUEUE_EMBED_QUERY,
+)
 from src.database.connection import init_async_db
 from src.functions.agent_subagents_crud import (
     agent_subagents_create,
@@ -49,6 +53,7 @@ from src.functions.auth_crud import (
     user_login,
     user_signup,
 )
+from src.functions.blob_sweep import sweep_abandoned_uploads
 from src.functions.channels_crud import (
     channel_consume_pending_welcome,
     channel_create,
@@ -62,23 +67,47 @@ from src.functions.channels_crud import (
     channels_by_integration,
     channels_by_workspace,
 )
+from src.functions.compiled_views import (
+    query_view_rows,
+    sync_compiled_views,
+)
 from src.functions.data_ingestion import (
     ingest_pipeline_events,
     ingest_pipeline_events_cockroachdb,
+    ingest_pipeline_events_columnar,
+    ingest_staged_pipeline_events_cockroachdb,
     query_clickhouse_data,
+    stage_load_chunks,
+)
+from src.functions.dataset_reembed import (
+    complete_dataset_reembed,
+    reembed_dataset_batch,
+    start_dataset_reembed,
 )
 from src.functions.datasets_crud import (
+    create_upload_url,
     datasets_create,
     datasets_get_by_id,
+    datasets_get_embedding_config,
     datasets_read,
+    datasets_resolve_by_name,
     datasets_update,
     delete_dataset_events_by_source,
+    export_dataset_events,
+    get_dataset_delete_status,
+    get_dataset_files,
     list_dataset_files,
     query_dataset_events,
+    stage_inline_files,
 )
 from src.functions.embed_anything_ingestion import (
     embed_anything_pdf_to_events,
 )
+from src.functions.embed_texts import (
+    EMBED_TEXTS_CONCURRENCY,
+    embed_texts,
+)
+from src.functions.embed_worker_pool import get_embed_worker_pool
 from src.functions.feedback_metrics import (
     get_detailed_feedbacks,
     get_feedback_analytics,
@@ -133,18 +162,27 @@ from src.functions.metrics_evaluation import (
     ingest_performance_metrics,
     ingest_quality_metrics,
 )
+from src.functions.raw_data_paths import (
+    promote_hot_raw_data_paths,
+    run_raw_data_select_query,
+)
 from src.functions.remote_mcp_directory import (
     remote_mcp_directory_read,
 )
 from src.functions.restack_engine import (
     restack_engine_api_schedule,
 )
+from src.functions.retention import apply_retention_policies
 from src.functions.schedule_crud import (
     schedule_create_workflow,
     schedule_get_task_info,
     schedule_update_database,
     schedule_update_workflow,
 )
+from src.functions.semantic_search import (
+    benchmark_semantic_search_recall,
+    semantic_search_dataset,
+)
 from src.functions.send_agent_event import send_agent_event
 from src.functions.slack_api import (
     slack_build_install_url,
@@ -233,6 +271,10 @@ from src.functions.workspaces_crud import (
     workspaces_update,
 )
 from src.workflows.analytics_metrics import GetAnalyticsMetrics
+from src.workflows.compiled_views import (
+    QueryViewRowsWorkflow,
+    SyncCompiledViewsWorkflow,
+)
 from src.workflows.create_metric_with_retroactive import (
     CreateMetricWithRetroactiveWorkflow,
 )
@@ -283,11 +325,15 @@ from src.workflows.crud.channels_crud import (
     ChannelsByWorkspaceWorkflow,
 )
 from src.workflows.crud.datasets_crud import (
+    AddFilesToDatasetBatchWorkflow,
     AddFilesToDatasetWorkflow,
+    CreateUploadUrlWorkflow,
     DatasetsCreateWorkflow,
     DatasetsGetByIdWorkflow,
     DatasetsReadWorkflow,
     DeleteDatasetEventsBySourceWorkflow,
+    ExportDatasetEventsWorkflow,
+    GetDatasetDeleteStatusWorkflow,
     GetViewWorkflow,
     ListDatasetFilesWorkflow,
     ListViewsForDatasetWorkflow,
@@ -380,6 +426,7 @@ from src.workflows.crud.workspaces_crud import (
     WorkspacesReadWorkflow,
     WorkspacesUpdateWorkflow,
 )
+from src.workflows.dataset_reembed import ReembedDatasetWorkflow
 from src.workflows.feedback_submission import (
     FeedbackSubmissionWorkflow,
     GetDetailedFeedbacksWorkflow,
@@ -387,9 +434,20 @@ from src.workflows.feedback_submission import (
     GetTaskFeedbackWorkflow,
 )
 from src.workflows.get_task_traces import GetTaskTracesWorkflow
+from src.workflows.raw_data_paths import (
+    PromoteHotRawDataPathsWorkflow,
+)
+from src.workflows.retention import (
+    ApplyRetentionPoliciesWorkflow,
+    SweepAbandonedUploadsWorkflow,
+)
 from src.workflows.retroactive_metrics import (
     RetroactiveMetrics,
 )
+from src.workflows.semantic_search import (
+    BenchmarkSemanticSearchRecallWorkflow,
+    SemanticSearchDatasetWorkflow,
+)
 from src.workflows.slack_refresh_channel_names import (
     SlackRefreshChannelNamesWorkflow,
 )
@@ -471,6 +529,9 @@ async def run_restack_service() -> None:
             QueryDatasetEventsWorkflow,
             ListDatasetFilesWorkflow,
             DeleteDatasetEventsBySourceWorkflow,
+            GetDatasetDeleteStatusWorkflow,
+            ExportDatasetEventsWorkflow,
+            CreateUploadUrlWorkflow,
             ListViewsForDatasetWorkflow,
             GetViewWorkflow,
             McpServersReadWorkflow,
@@ -525,6 +586,17 @@ async def run_restack_service() -> None:
             ChannelRouteEventWorkflow,
             ChannelConsumePendingWelcomeWorkflow,
             SlackRefreshChannelNamesWorkflow,
+            # Retention
+            ApplyRetentionPoliciesWorkflow,
+            SweepAbandonedUploadsWorkflow,
+            # raw_data path promotion
+            PromoteHotRawDataPathsWorkflow,
+            SemanticSearchDatasetWorkflow,
+            BenchmarkSemanticSearchRecallWorkflow,
+            ReembedDatasetWorkflow,
+            # Compiled dataset views
+            SyncCompiledViewsWorkflow,
+            QueryViewRowsWorkflow,
             # Analytics workflow
             GetAnalyticsMetrics,
             # Feedback workflows
@@ -616,16 +688,25 @@ async def run_restack_service() -> None:
             reset_password,
             # Datasets functions
             datasets_read,
+            datasets_resolve_by_name,
             datasets_get_by_id,
             query_dataset_events,
             list_dataset_files,
+            get_dataset_files,
             delete_dataset_events_by_source,
+            get_dataset_delete_status,
+            export_dataset_events,
+            create_upload_url,
+            stage_inline_files,
             datasets_create,
             datasets_update,
             # Data ingestion functions
             ingest_pipeline_events,
             ingest_pipeline_events_cockroachdb,
+            ingest_pipeline_events_columnar,
+            ingest_staged_pipeline_events_cockroachdb,
             query_clickhouse_data,
+            stage_load_chunks,
             mcp_servers_read,
             mcp_servers_create,
             mcp_servers_update,
@@ -701,6 +782,20 @@ async def run_restack_service() -> None:
             slack_build_install_url,
             slack_join_channel,
             slack_refresh_channel_names,
+            # Retention
+            apply_retention_policies,
+            sweep_abandoned_uploads,
+            # raw_data path promotion
+            promote_hot_raw_data_paths,
+            run_raw_data_select_query,
+            semantic_search_dataset,
+            benchmark_semantic_search_recall,
+            datasets_get_embedding_config,
+            start_dataset_reembed,
+            complete_dataset_reembed,
+            # Compiled dataset views
+            sync_compiled_views,
+            query_view_rows,
             # Feedback functions
             ingest_feedback_metric,
             get_task_feedback,
@@ -711,18 +806,45 @@ async def run_restack_service() -> None:
 
 
 async def run_embed_service() -> None:
-    """Run the embedding service (one concurrent run per worker; scale horizontally).
+    """Run the embedding service (one run per embed pool slot; scale horizontally).
+
+    Memory: embed pool workers run in the same container as the worker and share
+    its limit; each holds the model (~0.5 GiB) and is recycled above
+    EMBED_WORKER_MAX_RSS_MB. Size EMBED_POOL_WORKERS to the container.
+
+    The file queue is bounded by the pool's capacity, not by a rate, so
+    small files and parallel uploads keep every pool worker busy. Set
+    EMBED_QUEUE_RATE_LIMIT (runs per second across the queue) where inserts
+    must be throttled; re-embedding paces itself (rows_per_second).
 
-    Memory: subprocess runs in the same container as the worker; parent + child
-    share the container limit. Recommend >= 1.5 GiB for the embed worker to avoid OOM.
+    Online text embedding (embed_texts) has its own queue so queries are
+    not stuck behind files; its runs share one resident model process and
+    are micro-batched.
     """
-    await client.start_service(
-        task_queue=TASK_QUEUE_EMBED,
-        workflows=[AddFilesToDatasetWorkflow],
-        functions=[embed_anything_pdf_to_events],
-        options=ServiceOptions(
-            rate_limit=1,
-            max_concurrent_function_runs=1,
+    queue_rate = os.getenv("EMBED_QUEUE_RATE_LIMIT")
+    rate_limit = int(queue_rate) if queue_rate else None
+    await asyncio.gather(
+        client.start_service(
+            task_queue=TASK_QUEUE_EMBED,
+            workflows=[
+                AddFilesToDatasetWorkflow,
+                AddFilesToDatasetBatchWorkflow,
+            ],
+            functions=[
+                embed_anything_pdf_to_events,
+                reembed_dataset_batch,
+            ],
+            options=ServiceOptions(
+                rate_limit=rate_limit,
+                max_concurrent_function_runs=get_embed_worker_pool().capacity,
+            ),
+        ),
+        client.start_service(
+            task_queue=TASK_QUEUE_EMBED_QUERY,
+            functions=[embed_texts],
+            options=ServiceOptions(
+                max_concurrent_function_runs=EMBED_TEXTS_CONCURRENCY,
+            ),
         ),
     )
 
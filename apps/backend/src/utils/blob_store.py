@@ -0,0 +1,337 @@
+"""Blob store for staging large payloads outside workflow history.
+
+Workflows pass blob keys between steps instead of inline data. With
+BLOB_STORE_URL=s3://<bucket>/<prefix> blobs live in S3 (or an S3-compatible
+store at BLOB_STORE_S3_ENDPOINT_URL, e.g. MinIO), shared by every worker
+host; credentials come from the usual AWS environment. Otherwise the local
+backend writes to BLOB_STORE_DIR, which only works while every worker and
+the frontend share that directory. Uploaded files are staged by the
+frontend's /api/uploads route under 'uploads/<workspace_id>/...', one key
+per upload; uploads that are never ingested are removed by
+sweep_abandoned_uploads.
+"""
+
+import hashlib
+import os
+import shutil
+import tempfile
+import uuid
+from abc import ABC, abstractmethod
+from datetime import UTC, datetime
+from pathlib import Path
+from typing import Any, BinaryIO
+from urllib.parse import urlparse
+
+BLOB_STORE_URL_ENV = "BLOB_STORE_URL"
+BLOB_STORE_S3_ENDPOINT_ENV = "BLOB_STORE_S3_ENDPOINT_URL"
+BLOB_STORE_DIR_ENV = "BLOB_STORE_DIR"
+DEFAULT_BLOB_STORE_DIR = (
+    Path(tempfile.gettempdir()) / "restack-blobs"
+)
+_STREAM_CHUNK_BYTES = 1 << 20
+# Lifetime of presigned download and upload URLs
+_PRESIGNED_URL_SECONDS = 3600
+
+
+class BlobStore(ABC):
+    """Minimal key/value interface for staged payloads."""
+
+    @abstractmethod
+    def put_bytes(self, data: bytes, *, prefix: str) -> str:
+        """Store data and return its key."""
+
+    @abstractmethod
+    def put_file(self, path: Path, *, key: str) -> str:
+        """Move a local file into the store under key and return the key."""
+
+    @abstractmethod
+    def put_stream(
+        self, stream: BinaryIO, *, prefix: str, suffix: str = ""
+    ) -> str:
+        """Store a stream without buffering it; key is '<prefix>/<sha256><suffix>'."""
+
+    @abstractmethod
+    def get_bytes(self, key: str) -> bytes:
+        """Return the stored data for key."""
+
+    @abstractmethod
+    def open(self, key: str) -> BinaryIO:
+        """Open key for streaming reads; the caller closes it."""
+
+    def local_path(self, key: str) -> Path | None:
+        """Filesystem path of key when the store is local, else None."""
+        del key
+
+    @abstractmethod
+    def url(self, key: str) -> str:
+        """Return a URL readers can fetch key from."""
+
+    def upload_url(self, key: str) -> str | None:
+        """URL a client can PUT key's content to; None when the store has none."""
+        del key
+
+    @abstractmethod
+    def exists(self, key: str) -> bool:
+        """Return True if key is stored."""
+
+    @abstractmethod
+    def delete(self, key: str) -> None:
+        """Remove key; missing keys are ignored."""
+
+    @abstractmethod
+    def list_older_than(
+        self, prefix: str, cutoff: datetime
+    ) -> list[str]:
+        """Keys under prefix last written before cutoff."""
+
+
+class LocalBlobStore(BlobStore):
+    """Filesystem blob store; keys are '<prefix>/<sha256>'."""
+
+    def __init__(self, root: Path) -> None:
+        self.root = root
+
+    def _path(self, key: str) -> Path:
+        path = (self.root / key).resolve()
+        if not path.is_relative_to(self.root.resolve()):
+            msg = f"Invalid blob key: {key}"
+            raise ValueError(msg)
+        return path
+
+    def put_bytes(self, data: bytes, *, prefix: str) -> str:
+        key = f"{prefix}/{hashlib.sha256(data).hexdigest()}"
+        path = self._path(key)
+        if path.exists():
+            return key
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Write then rename so readers never see a partial blob
+        tmp_path = path.with_suffix(f".{uuid.uuid4().hex}.tmp")
+        tmp_path.write_bytes(data)
+        tmp_path.replace(path)
+        return key
+
+    def put_file(self, path: Path, *, key: str) -> str:
+        target = self._path(key)
+        target.parent.mkdir(parents=True, exist_ok=True)
+        shutil.move(path, target)
+        return key
+
+    def put_stream(
+        self, stream: BinaryIO, *, prefix: str, suffix: str = ""
+    ) -> str:
+        self.root.mkdir(parents=True, exist_ok=True)
+        digest = hashlib.sha256()
+        tmp_path = self.root / f".upload.{uuid.uuid4().hex}.tmp"
+        try:
+            with tmp_path.open("wb") as out:
+                while chunk := stream.read(_STREAM_CHUNK_BYTES):
+                    digest.update(chunk)
+                    out.write(chunk)
+            key = f"{prefix}/{digest.hexdigest()}{suffix}"
+            path = self._path(key)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path.replace(path)
+        finally:
+            tmp_path.unlink(missing_ok=True)
+        return key
+
+    def get_bytes(self, key: str) -> bytes:
+        return self._path(key).read_bytes()
+
+    def open(self, key: str) -> BinaryIO:
+        return self._path(key).open("rb")
+
+    def local_path(self, key: str) -> Path | None:
+        return self._path(key)
+
+    def url(self, key: str) -> str:
+        return self._path(key).as_uri()
+
+    def exists(self, key: str) -> bool:
+        return self._path(key).is_file()
+
+    def delete(self, key: str) -> None:
+        self._path(key).unlink(missing_ok=True)
+
+    def list_older_than(
+        self, prefix: str, cutoff: datetime
+    ) -> list[str]:
+        base = self._path(prefix)
+        if not base.is_dir():
+            return []
+        root = self.root.resolve()
+        return [
+            path.relative_to(root).as_posix()
+            for path in base.rglob("*")
+            if path.is_file()
+            and datetime.fromtimestamp(
+                path.stat().st_mtime, tz=UTC
+            )
+            < cutoff
+        ]
+
+
+class S3BlobStore(BlobStore):
+    """S3 (or S3-compatible) blob store; keys live under prefix in bucket."""
+
+    def __init__(
+        self,
+        bucket: str,
+        prefix: str = "",
+        endpoint_url: str | None = None,
+    ) -> None:
+        import boto3
+
+        self.bucket = bucket
+        self.prefix = prefix.strip("/")
+        self._client: Any = boto3.client(
+            "s3", endpoint_url=endpoint_url
+        )
+
+    def _object_key(self, key: str) -> str:
+        if ".." in key.split("/") or key.startswith("/"):
+            msg = f"Invalid blob key: {key}"
+            raise ValueError(msg)
+        return f"{self.prefix}/{key}" if self.prefix else key
+
+    def put_bytes(self, data: bytes, *, prefix: str) -> str:
+        key = f"{prefix}/{hashlib.sha256(data).hexdigest()}"
+        self._client.put_object(
+            Bucket=self.bucket,
+            Key=self._object_key(key),
+            Body=data,
+        )
+        return key
+
+    def put_file(self, path: Path, *, key: str) -> str:
+        self._client.upload_file(
+            str(path), self.bucket, self._object_key(key)
+        )
+        path.unlink(missing_ok=True)
+        return key
+
+    def put_stream(
+        self, stream: BinaryIO, *, prefix: str, suffix: str = ""
+    ) -> str:
+        # The key is the content hash, so spool locally before uploading
+        digest = hashlib.sha256()
+        with tempfile.NamedTemporaryFile(
+            prefix="upload_", delete=False
+        ) as out:
+            tmp_path = Path(out.name)
+            while chunk := stream.read(_STREAM_CHUNK_BYTES):
+                digest.update(chunk)
+                out.write(chunk)
+        try:
+            return self.put_file(
+                tmp_path,
+                key=f"{prefix}/{digest.hexdigest()}{suffix}",
+            )
+        finally:
+            tmp_path.unlink(missing_ok=True)
+
+    def get_bytes(self, key: str) -> bytes:
+        with self.open(key) as body:
+            return body.read()
+
+    def open(self, key: str) -> BinaryIO:
+        response = self._client.get_object(
+            Bucket=self.bucket, Key=self._object_key(key)
+        )
+        return response["Body"]
+
+    def url(self, key: str) -> str:
+        return self._client.generate_presigned_url(
+            "get_object",
+            Params={
+                "Bucket": self.bucket,
+                "Key": self._object_key(key),
+            },
+            ExpiresIn=_PRESIGNED_URL_SECONDS,
+        )
+
+    def upload_url(self, key: str) -> str | None:
+        return self._client.generate_presigned_url(
+            "put_object",
+            Params={
+                "Bucket": self.bucket,
+                "Key": self._object_key(key),
+            },
+            ExpiresIn=_PRESIGNED_URL_SECONDS,
+        )
+
+    def exists(self, key: str) -> bool:
+        from botocore.exceptions import ClientError
+
+        try:
+            self._client.head_object(
+                Bucket=self.bucket, Key=self._object_key(key)
+            )
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") in {
+                "404",
+                "NoSuchKey",
+                "NotFound",
+            }:
+                return False
+            raise
+        return True
+
+    def delete(self, key: str) -> None:
+        self._client.delete_object(
+            Bucket=self.bucket, Key=self._object_key(key)
+        )
+
+    def list_older_than(
+        self, prefix: str, cutoff: datetime
+    ) -> list[str]:
+        object_prefix = self._object_key(prefix.rstrip("/") + "/")
+        strip = len(self.prefix) + 1 if self.prefix else 0
+        keys: list[str] = []
+        paginator = self._client.get_paginator("list_objects_v2")
+        for page in paginator.paginate(
+            Bucket=self.bucket, Prefix=object_prefix
+        ):
+            keys.extend(
+                item["Key"][strip:]
+                for item in page.get("Contents", [])
+                if item["LastModified"] < cutoff
+            )
+        return keys
+
+
+_blob_store: BlobStore | None = None
+
+
+def hash_blob(store: BlobStore, key: str) -> str:
+    """Stream key through sha256 and return the hex digest."""
+    digest = hashlib.sha256()
+    with store.open(key) as stream:
+        while chunk := stream.read(_STREAM_CHUNK_BYTES):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def get_blob_store() -> BlobStore:
+    """Return the process-wide blob store (S3 when BLOB_STORE_URL is set)."""
+    global _blob_store  # noqa: PLW0603
+    if _blob_store is None:
+        url = os.getenv(BLOB_STORE_URL_ENV)
+        if url:
+            parsed = urlparse(url)
+            if parsed.scheme != "s3" or not parsed.netloc:
+                msg = f"{BLOB_STORE_URL_ENV} must be s3://<bucket>/<prefix>, got {url}"
+                raise ValueError(msg)
+            _blob_store = S3BlobStore(
+                parsed.netloc,
+                parsed.path,
+                endpoint_url=os.getenv(BLOB_STORE_S3_ENDPOINT_ENV)
+                or None,
+            )
+        else:
+            root = Path(
+                os.getenv(BLOB_STORE_DIR_ENV)
+                or DEFAULT_BLOB_STORE_DIR
+            )
+            _blob_store = LocalBlobStore(root)
+    return _blob_store
@@ -0,0 +1,143 @@
+"""Deterministic pipeline_events ids and insert deduplication tokens.
+
+Ids are derived from what an event is rather than when it was inserted, so a
+retried insert writes the same ids and ClickHouse drops the repeated block
+by its deduplication token.
+"""
+
+import hashlib
+import json
+import uuid
+from collections.abc import Iterable
+from typing import Any
+
+# Fixed namespace so ids are stable across processes and releases.
+EVENT_ID_NAMESPACE = uuid.UUID(
+    "6f1c9a52-3d0e-4b7a-9c55-2a8e0f4d7b13"
+)
+
+
+def _content_hash(value: Any) -> str:
+    """sha256 of a canonical JSON encoding (sorted keys)."""
+    encoded = json.dumps(
+        value, sort_keys=True, separators=(",", ":"), default=str
+    )
+    return hashlib.sha256(encoded.encode()).hexdigest()
+
+
+def chunk_event_id(
+    workspace_id: str,
+    dataset_id: str,
+    source: str,
+    chunk_index: int,
+    text: str,
+) -> str:
+    """Id of a document chunk: dataset, source, chunk index and text."""
+    text_hash = hashlib.sha256(text.encode()).hexdigest()
+    return str(
+        uuid.uuid5(
+            EVENT_ID_NAMESPACE,
+            f"{workspace_id}|{dataset_id}|{source}|{chunk_index}|{text_hash}",
+        )
+    )
+
+
+def table_row_event_ids(
+    workspace_id: str,
+    dataset_id: str,
+    source: str,
+    content_hash: str,
+    rows: range,
+) -> list[str]:
+    """Ids of rows of an uploaded table: dataset, file content and row number.
+
+    One uuid5 per file; the row number fills the last 12 hex digits, so a
+    million-row file costs no per-row hashing.
+    """
+    file_id = str(
+        uuid.uuid5(
+            EVENT_ID_NAMESPACE,
+            f"{workspace_id}|{dataset_id}|{source}|{content_hash}",
+        )
+    )[:24]
+    return [f"{file_id}{row:012x}" for row in rows]
+
+
+def event_id(
+    event: dict[str, Any], occurrence: int = 0, salt: str = ""
+) -> str:
+    """Id of a generic event from its identity fields and raw_data.
+
+    Events that carry raw_data.source and raw_data.chunk_index get the same
+    id as chunk_event_id would give them. Otherwise salt (a load id) and
+    occurrence tell apart events with equal fields (see event_ids); without
+    either the event keeps the plain id.
+    """
+    raw_data = event.get("raw_data") or {}
+    source = raw_data.get("source")
+    chunk_index = raw_data.get("chunk_index")
+    if isinstance(source, str) and isinstance(chunk_index, int):
+        return chunk_event_id(
+            str(event.get("workspace_id") or ""),
+            str(event.get("dataset_id") or ""),
+            source,
+            chunk_index,
+            str(raw_data.get("text") or ""),
+        )
+    key = "|".join(
+        str(event.get(field) or "")
+        for field in (
+            "workspace_id",
+            "dataset_id",
+            "agent_id",
+            "task_id",
+            "event_name",
+            "event_timestamp",
+        )
+    )
+    name = f"{key}|{_content_hash(raw_data)}"
+    if salt:
+        name = f"{name}|{salt}"
+    if occurrence:
+        name = f"{name}|{occurrence}"
+    return str(uuid.uuid5(EVENT_ID_NAMESPACE, name))
+
+
+def event_ids(
+    events: Iterable[dict[str, Any]],
+    salt: str = "",
+    first_row: int = 0,
+) -> list[str]:
+    """Ids for a batch: the caller's "id" when set, else event_id.
+
+    Without a salt, events with equal fields are numbered by their order in
+    the batch, so each is stored while a retry of the same batch still
+    writes the same ids. A load split into batches passes its load id as
+    salt and the batch's first row number in the load: each event is then
+    numbered by its row in the load, so equal records in different batches
+    or loads get distinct ids and a retried batch the same ones.
+    """
+    seen: dict[str, int] = {}
+    ids: list[str] = []
+    for row, event in enumerate(events, start=first_row):
+        if event.get("id"):
+            ids.append(str(event["id"]))
+            continue
+        if salt:
+            ids.append(event_id(event, row, salt))
+            continue
+        base = event_id(event)
+        occurrence = seen.get(base, 0)
+        seen[base] = occurrence + 1
+        ids.append(
+            event_id(event, occurrence) if occurrence else base
+        )
+    return ids
+
+
+def dedup_token(ids: Iterable[str]) -> str:
+    """insert_deduplication_token for a block: hash of its row ids in order."""
+    digest = hashlib.sha256()
+    for row_id in ids:
+        digest.update(row_id.encode())
+    return digest.hexdigest()
@@ -0,0 +1,76 @@
+"""Workflows for compiled dataset views (see functions.compiled_views)."""
+
+from datetime import timedelta
+
+from restack_ai.workflow import (
+    NonRetryableError,
+    import_functions,
+    log,
+    workflow,
+)
+
+from src.constants import TASK_QUEUE
+
+with import_functions():
+    from src.functions.compiled_views import (
+        QueryViewRowsInput,
+        SyncCompiledViewsInput,
+        SyncCompiledViewsOutput,
+        query_view_rows,
+        sync_compiled_views,
+    )
+    from src.functions.datasets_crud import (
+        QueryDatasetEventsOutput,
+    )
+
+
+@workflow.defn()
+class SyncCompiledViewsWorkflow:
+    """Compile a task's views after view_specs change; drop removed ones.
+
+    Started as a detached child by task updates, deletes and UpdateView,
+    since backfilling a large dataset can take minutes.
+    """
+
+    @workflow.run
+    async def run(
+        self, workflow_input: SyncCompiledViewsInput
+    ) -> SyncCompiledViewsOutput:
+        log.info(
+            "SyncCompiledViewsWorkflow started",
+            task_id=workflow_input.task_id,
+        )
+        try:
+            return await workflow.step(
+                function=sync_compiled_views,
+                function_input=workflow_input,
+                task_queue=TASK_QUEUE,
+                start_to_close_timeout=timedelta(hours=1),
+                heartbeat_timeout=timedelta(minutes=30),
+            )
+        except Exception as e:
+            error_message = f"Error in sync_compiled_views: {e}"
+            log.error(error_message)
+            raise NonRetryableError(message=error_message) from e
+
+
+@workflow.defn()
+class QueryViewRowsWorkflow:
+    """Rows of a view, from its compiled table when available."""
+
+    @workflow.run
+    async def run(
+        self, workflow_input: QueryViewRowsInput
+    ) -> QueryDatasetEventsOutput:
+        log.info("QueryViewRowsWorkflow started")
+        try:
+            return await workflow.step(
+                function=query_view_rows,
+                function_input=workflow_input,
+                task_queue=TASK_QUEUE,
+                start_to_close_timeout=timedelta(seconds=30),
+            )
+        except Exception as e:
+            error_message = f"Error in query_view_rows: {e}"
+            log.error(error_message)
+            raise NonRetryableError(message=error_message) from e
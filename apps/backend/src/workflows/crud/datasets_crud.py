@@ -1,3 +1,4 @@
+import asyncio
 from datetime import timedelta
 from typing import Any
 
@@ -7,34 +8,53 @@ from restack_ai.workflow import (
     import_functions,
     log,
     workflow,
+    workflow_info,
 )
+from temporalio.workflow import query
 
 from src.constants import TASK_QUEUE, TASK_QUEUE_EMBED
 
 with import_functions():
     from src.functions.datasets_crud import (
+        CreateUploadUrlInput,
+        CreateUploadUrlOutput,
         DatasetCreateInput,
+        DatasetDeleteJob,
+        DatasetDeleteStatusOutput,
         DatasetGetByIdInput,
         DatasetGetByWorkspaceInput,
         DatasetListOutput,
         DatasetSingleOutput,
         DeleteDatasetEventsBySourceInput,
         DeleteDatasetEventsBySourceOutput,
+        ExportDatasetEventsInput,
+        ExportDatasetEventsOutput,
+        GetDatasetFilesInput,
         ListDatasetFilesInput,
         ListDatasetFilesOutput,
         QueryDatasetEventsInput,
         QueryDatasetEventsOutput,
+        StageInlineFilesInput,
+        create_upload_url,
         datasets_create,
         datasets_get_by_id,
         datasets_read,
         delete_dataset_events_by_source,
+        export_dataset_events,
+        get_dataset_delete_status,
+        get_dataset_files,
         list_dataset_files,
         query_dataset_events,
+        stage_inline_files,
     )
     from src.functions.embed_anything_ingestion import (
         EmbedAnythingPdfInput,
         embed_anything_pdf_to_events,
     )
+    from src.functions.tabular_ingestion import (
+        TABLE_ROW_EVENT_NAME,
+        is_tabular,
+    )
     from src.functions.tasks_crud import (
         GetViewInput,
         GetViewOutput,
@@ -205,6 +225,78 @@ class DeleteDatasetEventsBySourceWorkflow:
             ) from e
 
 
+@workflow.defn()
+class GetDatasetDeleteStatusWorkflow:
+    """Poll a delete started by DeleteDatasetEventsBySourceWorkflow."""
+
+    @workflow.run
+    async def run(
+        self, function_input: DatasetDeleteJob
+    ) -> DatasetDeleteStatusOutput:
+        log.info("GetDatasetDeleteStatusWorkflow started")
+        try:
+            return await workflow.step(
+                function=get_dataset_delete_status,
+                function_input=function_input,
+                start_to_close_timeout=timedelta(seconds=30),
+                task_queue=TASK_QUEUE,
+            )
+        except Exception as e:
+            log.error(
+                "Error during get_dataset_delete_status: %s", e
+            )
+            raise NonRetryableError(
+                message=f"Error during get_dataset_delete_status: {e}"
+            ) from e
+
+
+@workflow.defn()
+class ExportDatasetEventsWorkflow:
+    """Export a dataset to Parquet, Arrow IPC or NDJSON; returns a blob key and URL."""
+
+    @workflow.run
+    async def run(
+        self, function_input: ExportDatasetEventsInput
+    ) -> ExportDatasetEventsOutput:
+        log.info("ExportDatasetEventsWorkflow started")
+        try:
+            return await workflow.step(
+                function=export_dataset_events,
+                function_input=function_input,
+                start_to_close_timeout=timedelta(hours=1),
+                heartbeat_timeout=timedelta(minutes=2),
+                task_queue=TASK_QUEUE,
+            )
+        except Exception as e:
+            log.error("Error during export_dataset_events: %s", e)
+            raise NonRetryableError(
+                message=f"Error during export_dataset_events: {e}"
+            ) from e
+
+
+@workflow.defn()
+class CreateUploadUrlWorkflow:
+    """Presigned URL the upload route PUTs to when blobs live in an object store."""
+
+    @workflow.run
+    async def run(
+        self, function_input: CreateUploadUrlInput
+    ) -> CreateUploadUrlOutput:
+        log.info("CreateUploadUrlWorkflow started")
+        try:
+            return await workflow.step(
+                function=create_upload_url,
+                function_input=function_input,
+                start_to_close_timeout=timedelta(seconds=30),
+                task_queue=TASK_QUEUE,
+            )
+        except Exception as e:
+            log.error("Error during create_upload_url: %s", e)
+            raise NonRetryableError(
+                message=f"Error during create_upload_url: {e}"
+            ) from e
+
+
 @workflow.defn()
 class ListViewsForDatasetWorkflow:
     """List view specs that reference the given dataset (from tasks.view_specs)."""
@@ -256,8 +348,33 @@ class GetViewWorkflow:
 # --- Seed dataset from PDFs (EmbedAnything: one workflow, no API key) ---
 
 
+# Default number of files a workflow embeds at once
+ADD_FILES_MAX_PARALLEL = 4
+# Uploads above this many files are split into child workflows of this size
+ADD_FILES_CHILD_BATCH_SIZE = 20
+
+
+class UploadedFileRef(BaseModel):
+    """A file staged by the upload route; only the reference enters history."""
+
+    filename: str = Field(..., min_length=1)
+    blob_key: str = Field(
+        ...,
+        min_length=1,
+        description="Blob store key, uploads/<workspace_id>/<sha256>-<uuid><ext>; one per upload",
+    )
+    size_bytes: int = 0
+    content_hash: str | None = Field(
+        default=None, description="sha256 of the content"
+    )
+    embed_columns: list[str] = Field(
+        default_factory=list,
+        description="CSV/Parquet: columns embedded per row; none stores rows only.",
+    )
+
+
 class AddFilesToDatasetInput(BaseModel):
-    """Input for adding files to a dataset. Files as base64; EmbedAnything does extract+embed."""
+    """Input for adding files to a dataset. Files as blob references (or legacy base64); EmbedAnything does extract+embed."""
 
     workspace_id: str = Field(..., min_length=1)
     dataset_id: str = Field(
@@ -266,48 +383,430 @@ class AddFilesToDatasetInput(BaseModel):
         description="Dataset UUID; events are stored with this id for scoped queries.",
     )
     task_id: str | None = None
+    files: list[UploadedFileRef] = Field(
+        default_factory=list,
+        description="Files staged via /api/uploads",
+    )
     files_with_content: list[dict[str, Any]] = Field(
-        ...,
-        description="List of { filename: string, content_base64: string }",
+        default_factory=list,
+        description="Legacy inline files: list of { filename: string, content_base64: string }",
+    )
+    max_parallel_files: int = Field(
+        default=ADD_FILES_MAX_PARALLEL,
+        ge=1,
+        le=32,
+        description="Files embedded at once (spread over the embed queue).",
+    )
+    child_batch_size: int = Field(
+        default=ADD_FILES_CHILD_BATCH_SIZE,
+        ge=1,
+        description="Uploads with more files run as child workflows of this many files.",
     )
 
+    def file_items(self) -> list[dict[str, Any]]:
+        """Staged references followed by any inline files."""
+        return [
+            f.model_dump() for f in self.files
+        ] + self.files_with_content
+
+
+class AddFilesFileResult(BaseModel):
+    """Per-file state: pending → running → done | failed."""
+
+    filename: str
+    status: str = "pending"
+    chunks_count: int = 0
+    cache_hits: int = 0
+    error: str | None = None
+
 
 class AddFilesToDatasetOutput(BaseModel):
     """Result of adding files to a dataset."""
 
     success: bool
     files_processed: int = 0
+    files_failed: int = 0
     total_chunks_ingested: int = 0
     errors: list[str] = Field(default_factory=list)
+    files: list[AddFilesFileResult] = Field(default_factory=list)
+
+
+class AddFilesProgress(BaseModel):
+    """Answer to the ``progress`` query of the add-files workflows."""
+
+    files_total: int = 0
+    files_done: int = 0
+    files_failed: int = 0
+    total_chunks_ingested: int = 0
+    files: list[AddFilesFileResult] = Field(default_factory=list)
+    active_batch_workflow_id: str | None = None
+
+
+class AddFilesBatchInput(BaseModel):
+    """One child batch of an AddFilesToDatasetWorkflow upload."""
+
+    workspace_id: str = Field(..., min_length=1)
+    dataset_id: str = Field(..., min_length=1)
+    task_id: str | None = None
+    items: list[dict[str, Any]] = Field(
+        ...,
+        description="UploadedFileRef dicts or legacy { filename, content_base64 }",
+    )
+    max_parallel_files: int = Field(
+        default=ADD_FILES_MAX_PARALLEL, ge=1, le=32
+    )
+
+
+def _expected_content_hash(item: dict[str, Any]) -> str | None:
+    """sha256 of a file ref: given, or the one in its upload key."""
+    if item.get("content_hash"):
+        return item["content_hash"]
+    name = (item.get("blob_key") or "").rsplit("/", 1)[-1]
+    digest = name.split("-", 1)[0]
+    if len(digest) == 64:  # noqa: PLR2004
+        return digest
+    return None
+
+
+class _AddFilesRun:
+    """Fan-out and progress shared by the add-files workflows."""
+
+    def __init__(self) -> None:
+        self.files: list[AddFilesFileResult] = []
+        self.active_batch_workflow_id: str | None = None
+
+    def progress(self) -> AddFilesProgress:
+        done = [f for f in self.files if f.status == "done"]
+        return AddFilesProgress(
+            files_total=len(self.files),
+            files_done=len(done),
+            files_failed=sum(
+                1 for f in self.files if f.status == "failed"
+            ),
+            total_chunks_ingested=sum(
+                f.chunks_count for f in done
+            ),
+            files=self.files,
+            active_batch_workflow_id=self.active_batch_workflow_id,
+        )
+
+    def output(self) -> AddFilesToDatasetOutput:
+        progress = self.progress()
+        errors = [
+            f"{f.filename}: {f.error}"
+            for f in self.files
+            if f.status == "failed"
+        ]
+        return AddFilesToDatasetOutput(
+            success=len(errors) == 0,
+            files_processed=progress.files_done,
+            files_failed=progress.files_failed,
+            total_chunks_ingested=progress.total_chunks_ingested,
+            errors=errors,
+            files=self.files,
+        )
+
+    async def _embed_file(
+        self,
+        item: dict[str, Any],
+        result: AddFilesFileResult,
+        workflow_input: AddFilesToDatasetInput
+        | AddFilesBatchInput,
+        slots: asyncio.Semaphore,
+    ) -> None:
+        blob_key = item.get("blob_key")
+        content_b64 = item.get("content_base64")
+        if not blob_key and not content_b64:
+            result.status = "failed"
+            result.error = "missing blob_key or content_base64"
+            return
+        # Tables: one event per row; other files: text chunks
+        tabular = is_tabular(result.filename)
+        async with slots:
+            result.status = "running"
+            # One step: file → events (extract + chunk + embed via EmbedAnything)
+            try:
+                to_events_result = await workflow.step(
+                    function=embed_anything_pdf_to_events,
+                    function_input=EmbedAnythingPdfInput(
+                        filename=result.filename,
+                        blob_key=blob_key,
+                        content_base64=content_b64,
+                        workspace_id=workflow_input.workspace_id,
+                        dataset_id=workflow_input.dataset_id,
+                        task_id=workflow_input.task_id,
+                        event_name=TABLE_ROW_EVENT_NAME
+                        if tabular
+                        else "PDF Chunk",
+                        tags=["tabular"]
+                        if tabular
+                        else ["pdf", "embed_anything"],
+                        embed_columns=item.get("embed_columns")
+                        or [],
+                    ),
+                    start_to_close_timeout=timedelta(minutes=15),
+                    heartbeat_timeout=timedelta(minutes=2),
+                    task_queue=TASK_QUEUE_EMBED,
+                )
+            except Exception as e:  # noqa: BLE001
+                result.status = "failed"
+                result.error = str(e)
+                return
+        to_err = getattr(to_events_result, "error", None) or (
+            to_events_result.get("error")
+            if isinstance(to_events_result, dict)
+            else None
+        )
+        if to_err:
+            result.status = "failed"
+            result.error = str(to_err)
+            return
+        # Ingest is done via ClickHouse adapter inside embed_anything_pdf_to_events
+        result.chunks_count = getattr(
+            to_events_result, "chunks_count", 0
+        ) or (
+            to_events_result.get("chunks_count", 0)
+            if isinstance(to_events_result, dict)
+            else 0
+        )
+        result.cache_hits = getattr(
+            to_events_result, "cache_hits", 0
+        ) or (
+            to_events_result.get("cache_hits", 0)
+            if isinstance(to_events_result, dict)
+            else 0
+        )
+        result.status = "done"
+
+    async def embed_files(
+        self,
+        items: list[dict[str, Any]],
+        workflow_input: AddFilesToDatasetInput
+        | AddFilesBatchInput,
+    ) -> None:
+        """Embed every file, at most ``max_parallel_files`` at once.
+
+        A failed file is recorded and does not stop the others.
+        """
+        self.files = [
+            AddFilesFileResult(
+                filename=item.get("filename") or "document.pdf"
+            )
+            for item in items
+        ]
+        slots = asyncio.Semaphore(
+            workflow_input.max_parallel_files
+        )
+        await asyncio.gather(
+            *(
+                self._embed_file(
+                    item, result, workflow_input, slots
+                )
+                for item, result in zip(
+                    items,
+                    self.files,
+                    strict=True,
+                )
+            )
+        )
+
+
+@workflow.defn(
+    description="Embed one batch of an AddFilesToDatasetWorkflow upload (child workflow)."
+)
+class AddFilesToDatasetBatchWorkflow:
+    """Child of AddFilesToDatasetWorkflow; keeps per-file steps out of the parent's history."""
+
+    def __init__(self) -> None:
+        self._run = _AddFilesRun()
+
+    @query
+    def progress(self) -> AddFilesProgress:
+        return self._run.progress()
+
+    @workflow.run
+    async def run(
+        self, workflow_input: AddFilesBatchInput
+    ) -> AddFilesToDatasetOutput:
+        await self._run.embed_files(
+            workflow_input.items, workflow_input
+        )
+        return self._run.output()
 
 
 @workflow.defn(
     description="Add files to a dataset: EmbedAnything does extract, chunk, embed; then save to ClickHouse. Supports PDF, text, images. One workflow, local, no API key."
 )
 class AddFilesToDatasetWorkflow:
-    """Files → extract/chunk/embed (EmbedAnything) → ingest into ClickHouse."""
+    """Files → extract/chunk/embed (EmbedAnything) → ingest into ClickHouse.
+
+    Files are embedded ``max_parallel_files`` at a time; uploads larger
+    than ``child_batch_size`` run as a sequence of child batch workflows.
+    Query ``progress`` for per-file status.
+    """
+
+    def __init__(self) -> None:
+        self._run = _AddFilesRun()
+
+    @query
+    def progress(self) -> AddFilesProgress:
+        return self._run.progress()
+
+    async def _recover_batch(
+        self,
+        items: list[dict[str, Any]],
+        batch: list[AddFilesFileResult],
+        workflow_input: AddFilesToDatasetInput,
+        error: str,
+    ) -> None:
+        """Per-file status of a failed batch, from the dataset_files manifest.
+
+        A file whose manifest row carries its content hash was ingested
+        before the batch failed; every other file is marked failed.
+        """
+        ingested: dict[str, Any] = {}
+        try:
+            manifest = await workflow.step(
+                function=get_dataset_files,
+                function_input=GetDatasetFilesInput(
+                    workspace_id=workflow_input.workspace_id,
+                    dataset_id=workflow_input.dataset_id,
+                    sources=[r.filename for r in batch],
+                ),
+                start_to_close_timeout=timedelta(seconds=60),
+                task_queue=TASK_QUEUE,
+            )
+            files = (
+                manifest.get("files", [])
+                if isinstance(manifest, dict)
+                else manifest.files
+            )
+            for f in files:
+                row = f if isinstance(f, dict) else f.model_dump()
+                ingested[row["source"]] = row
+        except Exception as e:  # noqa: BLE001
+            log.error(
+                f"[AddFilesToDataset] manifest lookup failed: {e}"
+            )
+        for item, result in zip(items, batch, strict=True):
+            row = ingested.get(result.filename)
+            expected = _expected_content_hash(item)
+            if (
+                row is not None
+                and expected
+                and row.get("content_hash") == expected
+            ):
+                result.status = "done"
+                result.chunks_count = row.get("chunk_count") or 0
+                result.error = None
+            else:
+                result.status = "failed"
+                result.error = error
+
+    async def _stage_inline_items(
+        self,
+        items: list[dict[str, Any]],
+        workflow_input: AddFilesToDatasetInput,
+    ) -> list[dict[str, Any]]:
+        """Replace legacy base64 items with upload refs (blob keys).
+
+        Child batch inputs then carry keys, not file contents.
+        """
+        inline = [i for i in items if i.get("content_base64")]
+        if not inline:
+            return items
+        staged = await workflow.step(
+            function=stage_inline_files,
+            function_input=StageInlineFilesInput(
+                workspace_id=workflow_input.workspace_id,
+                files=inline,
+            ),
+            start_to_close_timeout=timedelta(minutes=5),
+            task_queue=TASK_QUEUE,
+        )
+        refs = iter(
+            staged.get("files", [])
+            if isinstance(staged, dict)
+            else staged.files
+        )
+        return [
+            next(refs) if item.get("content_base64") else item
+            for item in items
+        ]
+
+    async def _embed_in_batches(
+        self,
+        items: list[dict[str, Any]],
+        workflow_input: AddFilesToDatasetInput,
+    ) -> None:
+        size = workflow_input.child_batch_size
+        self._run.files = [
+            AddFilesFileResult(
+                filename=item.get("filename") or "document.pdf"
+            )
+            for item in items
+        ]
+        for index, start in enumerate(range(0, len(items), size)):
+            batch = self._run.files[start : start + size]
+            for result in batch:
+                result.status = "running"
+            child_id = f"add_files_batch_{workflow_info().workflow_id}_{index}"
+            self._run.active_batch_workflow_id = child_id
+            try:
+                child_result = await workflow.child_execute(
+                    workflow=AddFilesToDatasetBatchWorkflow,
+                    workflow_input=AddFilesBatchInput(
+                        workspace_id=workflow_input.workspace_id,
+                        dataset_id=workflow_input.dataset_id,
+                        task_id=workflow_input.task_id,
+                        items=items[start : start + size],
+                        max_parallel_files=workflow_input.max_parallel_files,
+                    ),
+                    workflow_id=child_id,
+                    task_queue=TASK_QUEUE_EMBED,
+                )
+            except Exception as e:  # noqa: BLE001
+                log.error(
+                    f"[AddFilesToDataset] batch {child_id} failed: {e}"
+                )
+                await self._recover_batch(
+                    items[start : start + size],
+                    batch,
+                    workflow_input,
+                    f"batch failed: {e}",
+                )
+                continue
+            child_files = (
+                child_result.get("files", [])
+                if isinstance(child_result, dict)
+                else child_result.files
+            )
+            self._run.files[start : start + len(batch)] = [
+                AddFilesFileResult.model_validate(f)
+                if isinstance(f, dict)
+                else f
+                for f in child_files
+            ]
+        self._run.active_batch_workflow_id = None
 
     @workflow.run
     async def run(
         self, workflow_input: AddFilesToDatasetInput
     ) -> AddFilesToDatasetOutput:
-        errors: list[str] = []
-        total_chunks = 0
-        files_processed = 0
-
-        if not workflow_input.files_with_content:
+        items = workflow_input.file_items()
+        if not items:
             raise NonRetryableError(
-                message="files_with_content is required (list of { filename, content_base64 })."
+                message="files is required (list of { filename, blob_key } from /api/uploads)."
             )
 
         log.info(
-            f"AddFilesToDatasetWorkflow started: dataset_id={workflow_input.dataset_id}, files={len(workflow_input.files_with_content)}"
+            f"AddFilesToDatasetWorkflow started: dataset_id={workflow_input.dataset_id}, files={len(items)}"
         )
 
-        for item in workflow_input.files_with_content:
+        for item in items:
             filename = item.get("filename") or "document"
             content_b64 = item.get("content_base64") or ""
-            size_bytes = (
+            size_bytes = item.get("size_bytes") or (
                 len(content_b64) * 3 // 4 if content_b64 else 0
             )
             size_mb = (
@@ -335,56 +834,17 @@ class AddFilesToDatasetWorkflow:
                 message=f"Dataset '{workflow_input.dataset_id}' not found in workspace. Create it first."
             )
 
-        for item in workflow_input.files_with_content:
-            filename = item.get("filename") or "document.pdf"
-            content_b64 = item.get("content_base64")
-            if not content_b64:
-                errors.append(
-                    f"{filename}: missing content_base64"
-                )
-                continue
-            # One step: file → events (extract + chunk + embed via EmbedAnything)
-            try:
-                to_events_result = await workflow.step(
-                    function=embed_anything_pdf_to_events,
-                    function_input=EmbedAnythingPdfInput(
-                        filename=filename,
-                        content_base64=content_b64,
-                        workspace_id=workflow_input.workspace_id,
-                        dataset_id=workflow_input.dataset_id,
-                        task_id=workflow_input.task_id,
-                        event_name="PDF Chunk",
-                        tags=["pdf", "embed_anything"],
-                    ),
-                    start_to_close_timeout=timedelta(minutes=15),
-                    heartbeat_timeout=timedelta(minutes=2),
-                    task_queue=TASK_QUEUE_EMBED,
-                )
-            except Exception as e:  # noqa: BLE001
-                errors.append(f"{filename}: {e}")
-                continue
-            to_err = getattr(to_events_result, "error", None) or (
-                to_events_result.get("error")
-                if isinstance(to_events_result, dict)
-                else None
+        if len(items) > workflow_input.child_batch_size:
+            items = await self._stage_inline_items(
+                items, workflow_input
             )
-            if to_err:
-                errors.append(f"{filename}: {to_err}")
-                continue
-            # Ingest is done via ClickHouse adapter inside embed_anything_pdf_to_events
-            chunks_count = getattr(
-                to_events_result, "chunks_count", 0
-            ) or (
-                to_events_result.get("chunks_count", 0)
-                if isinstance(to_events_result, dict)
-                else 0
-            )
-            files_processed += 1
-            total_chunks += chunks_count
+            await self._embed_in_batches(items, workflow_input)
+        else:
+            await self._run.embed_files(items, workflow_input)
 
-        return AddFilesToDatasetOutput(
-            success=len(errors) == 0,
-            files_processed=files_processed,
-            total_chunks_ingested=total_chunks,
-            errors=errors or [],
+        output = self._run.output()
+        log.info(
+            f"AddFilesToDatasetWorkflow done: dataset_id={workflow_input.dataset_id}, "
+            f"processed={output.files_processed}, failed={output.files_failed}"
         )
+        return output
@@ -10,9 +10,11 @@ from restack_ai.workflow import (
     workflow,
     workflow_info,
 )
+from temporalio.exceptions import WorkflowAlreadyStartedError
 
 from src.agents.agent_task import AgentTask, AgentTaskInput
 from src.constants import TASK_QUEUE
+from src.workflows.compiled_views import SyncCompiledViewsWorkflow
 
 with import_functions():
     from src.functions.agents_crud import (
@@ -21,6 +23,9 @@ with import_functions():
         agents_get_by_id,
         agents_resolve_by_name,
     )
+    from src.functions.compiled_views import (
+        SyncCompiledViewsInput,
+    )
     from src.functions.llm_response_stream import Message
     from src.functions.send_agent_event import (
         SendAgentEventInput,
@@ -43,6 +48,7 @@ with import_functions():
         TaskGetByStatusInput,
         TaskGetByWorkspaceInput,
         TaskListOutput,
+        TaskOutput,
         TaskSingleOutput,
         TaskStatsOutput,
         TaskUpdateAgentTaskIdInput,
@@ -98,6 +104,7 @@ class TasksCreateWorkflowInput(BaseModel):
     temporal_schedule_id: str | None = None
     team_id: str | None = None
     task_metadata: dict | None = None
+    view_specs: list | None = None
 
     @model_validator(mode="after")
     def public_path_requires_agent_id(
@@ -136,6 +143,7 @@ class TasksCreateWorkflowInput(BaseModel):
             if team_id is not None
             else self.team_id,
             task_metadata=self.task_metadata,
+            view_specs=self.view_specs,
         )
 
 
@@ -245,6 +253,8 @@ class TasksCreateWorkflow:
                 start_to_close_timeout=timedelta(seconds=2),
             )
 
+            await _compile_new_task_views(result.task)
+
             task_metadata = result.task.task_metadata or {}
             if (
                 not task_metadata.get("slack_channel")
@@ -362,6 +372,34 @@ class TasksCreateWorkflow:
             return updated_result
 
 
+async def _start_compiled_views_sync(task_id: str) -> None:
+    """Recompile a task's views in a detached child workflow.
+
+    One workflow id per task keeps syncs of a task from racing; a sync
+    already running re-reads view_specs before it finishes.
+    """
+    try:
+        await workflow.child_start(
+            workflow=SyncCompiledViewsWorkflow,
+            workflow_input=SyncCompiledViewsInput(
+                task_id=task_id
+            ),
+            workflow_id=f"sync_compiled_views_{task_id}",
+            task_queue=TASK_QUEUE,
+            parent_close_policy=ParentClosePolicy.ABANDON,
+        )
+    except WorkflowAlreadyStartedError:
+        log.info(
+            f"Compiled views sync of task {task_id} already running"
+        )
+
+
+async def _compile_new_task_views(task: TaskOutput) -> None:
+    """Start compiling the views of a task created with view_specs."""
+    if task.view_specs:
+        await _start_compiled_views_sync(task.id)
+
+
 @workflow.defn()
 class TasksUpdateWorkflow:
     """Workflow to update an existing task."""
@@ -453,6 +491,11 @@ class TasksUpdateWorkflow:
                 start_to_close_timeout=timedelta(seconds=30),
             )
 
+            if workflow_input.view_specs is not None:
+                await _start_compiled_views_sync(
+                    workflow_input.task_id
+                )
+
             # Notify Slack if task has Slack metadata and reached a terminal status
             if (
                 result
@@ -505,12 +548,17 @@ class TasksDeleteWorkflow:
     ) -> TaskDeleteOutput:
         log.info("TasksDeleteWorkflow started")
         try:
-            return await workflow.step(
+            result = await workflow.step(
                 function=tasks_delete,
                 function_input=workflow_input,
                 task_queue=TASK_QUEUE,
                 start_to_close_timeout=timedelta(seconds=30),
             )
+            # Drops the deleted task's compiled views
+            await _start_compiled_views_sync(
+                workflow_input.task_id
+            )
+            return result  # noqa: TRY300
 
         except Exception as e:
             error_message = f"Error during tasks_delete: {e}"
@@ -0,0 +1,228 @@
+"""Re-embed a dataset into another embedding model, resumably and rate limited."""
+
+import asyncio
+from datetime import timedelta
+
+from pydantic import BaseModel, Field
+from restack_ai.workflow import (
+    NonRetryableError,
+    import_functions,
+    log,
+    workflow,
+)
+from temporalio.workflow import continue_as_new, query
+
+from src.constants import TASK_QUEUE, TASK_QUEUE_EMBED
+
+with import_functions():
+    from src.functions.dataset_reembed import (
+        ReembedBatchInput,
+        ReembedBatchOutput,
+        ReembedDatasetInput,
+        complete_dataset_reembed,
+        reembed_dataset_batch,
+        start_dataset_reembed,
+    )
+
+
+class ReembedDatasetProgress(BaseModel):
+    source_model: str | None = None
+    target_model: str
+    rows_done: int = 0
+    phase: str = "starting"  # backfill, missing, catch_up, done
+    after_ingested_at: str | None = None
+    after_id: str | None = None
+
+
+class ReembedDatasetWorkflowInput(ReembedDatasetInput):
+    batches_per_run: int = Field(
+        default=100,
+        ge=1,
+        description="Batches before the workflow continues as new.",
+    )
+    progress: ReembedDatasetProgress | None = Field(
+        default=None, description="Set when continued as new."
+    )
+
+
+@workflow.defn()
+class ReembedDatasetWorkflow:
+    """Backfill target_model vectors batch by batch, then switch the dataset.
+
+    Reads stay on the current model until every chunk has a target vector.
+    Progress is saved per batch in storage_config.embedding.reembed; running
+    the workflow again for the same target resumes from it. Batches run on
+    the file queue, so a backfill never competes with interactive queries.
+    Every batches_per_run batches the workflow continues as new with its
+    progress (phase and cursor), so history stays bounded.
+    """
+
+    def __init__(self) -> None:
+        self._progress: ReembedDatasetProgress | None = None
+        self._batches = 0
+
+    @query
+    def progress(self) -> ReembedDatasetProgress | None:
+        return self._progress
+
+    async def _batch(
+        self,
+        workflow_input: ReembedDatasetWorkflowInput,
+        progress: ReembedDatasetProgress,
+        *,
+        save_cursor: bool,
+        missing_only: bool = False,
+    ) -> ReembedBatchOutput:
+        batch = await workflow.step(
+            function=reembed_dataset_batch,
+            function_input=ReembedBatchInput(
+                workspace_id=workflow_input.workspace_id,
+                dataset_id=workflow_input.dataset_id,
+                source_model=progress.source_model or "",
+                target_model=workflow_input.target_model,
+                after_ingested_at=progress.after_ingested_at,
+                after_id=progress.after_id,
+                batch_size=workflow_input.batch_size,
+                save_cursor=save_cursor,
+                missing_only=missing_only,
+            ),
+            task_queue=TASK_QUEUE_EMBED,
+            start_to_close_timeout=timedelta(minutes=10),
+        )
+        if not batch.success:
+            msg = f"Re-embed batch failed: {batch.error}"
+            raise ValueError(msg)
+        progress.rows_done += batch.embedded
+        if not missing_only:
+            progress.after_ingested_at = batch.after_ingested_at
+            progress.after_id = batch.after_id
+        return batch
+
+    async def _drain(
+        self,
+        workflow_input: ReembedDatasetWorkflowInput,
+        progress: ReembedDatasetProgress,
+        *,
+        save_cursor: bool,
+        missing_only: bool = False,
+    ) -> None:
+        """Re-embed batches until one comes back short, pacing to rows_per_second."""
+        while True:
+            if self._batches >= workflow_input.batches_per_run:
+                log.info(
+                    "ReembedDatasetWorkflow continuing as new",
+                    phase=progress.phase,
+                    rows_done=progress.rows_done,
+                )
+                continue_as_new(
+                    workflow_input.model_copy(
+                        update={"progress": progress}
+                    )
+                )
+            self._batches += 1
+            batch = await self._batch(
+                workflow_input,
+                progress,
+                save_cursor=save_cursor,
+                missing_only=missing_only,
+            )
+            if (
+                batch.scanned < workflow_input.batch_size
+                or batch.embedded == 0
+            ):
+                return
+            await asyncio.sleep(
+                batch.scanned / workflow_input.rows_per_second
+            )
+
+    async def _start(
+        self, workflow_input: ReembedDatasetWorkflowInput
+    ) -> ReembedDatasetProgress:
+        """Record the target model and load the saved backfill cursor."""
+        progress = ReembedDatasetProgress(
+            target_model=workflow_input.target_model
+        )
+        self._progress = progress
+        started = await workflow.step(
+            function=start_dataset_reembed,
+            function_input=workflow_input,
+            task_queue=TASK_QUEUE,
+            start_to_close_timeout=timedelta(seconds=30),
+        )
+        if not started.success or started.config is None:
+            msg = f"Could not start re-embed: {started.error}"
+            raise ValueError(msg)
+        progress.source_model = started.config.model
+        state = started.config.reembed
+        if state is None:
+            # Already on the target model
+            progress.phase = "done"
+            return progress
+        progress.rows_done = state.rows_done
+        progress.after_ingested_at = state.after_ingested_at
+        progress.after_id = state.after_id
+        progress.phase = "backfill"
+        return progress
+
+    @workflow.run
+    async def run(
+        self, workflow_input: ReembedDatasetWorkflowInput
+    ) -> ReembedDatasetProgress:
+        progress = workflow_input.progress
+        log.info(
+            "ReembedDatasetWorkflow started",
+            dataset_id=workflow_input.dataset_id,
+            target_model=workflow_input.target_model,
+            phase=progress.phase if progress else "starting",
+        )
+        try:
+            if progress is None:
+                progress = await self._start(workflow_input)
+            self._progress = progress
+            if progress.phase == "done":
+                return progress
+
+            if progress.phase == "backfill":
+                await self._drain(
+                    workflow_input, progress, save_cursor=True
+                )
+                # Rows committed behind the cursor (older ingested_at)
+                progress.phase = "missing"
+            if progress.phase == "missing":
+                await self._drain(
+                    workflow_input,
+                    progress,
+                    save_cursor=False,
+                    missing_only=True,
+                )
+                completed = await workflow.step(
+                    function=complete_dataset_reembed,
+                    function_input=workflow_input,
+                    task_queue=TASK_QUEUE,
+                    start_to_close_timeout=timedelta(seconds=30),
+                )
+                if not completed.success:
+                    msg = f"Could not switch model: {completed.error}"
+                    raise ValueError(msg)
+                # Files embedded with the old model between the last
+                # batch and the switch
+                progress.phase = "catch_up"
+            await self._drain(
+                workflow_input,
+                progress,
+                save_cursor=False,
+                missing_only=True,
+            )
+        except Exception as e:
+            error_message = (
+                f"Error in ReembedDatasetWorkflow: {e}"
+            )
+            log.error(error_message)
+            raise NonRetryableError(message=error_message) from e
+        progress.phase = "done"
+        log.info(
+            "ReembedDatasetWorkflow completed",
+            dataset_id=workflow_input.dataset_id,
+            rows_done=progress.rows_done,
+        )
+        return progress
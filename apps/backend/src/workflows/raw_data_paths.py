@@ -0,0 +1,50 @@
+"""Workflow wrapper for promoting hot raw_data paths to typed columns.
+
+Meant to run on a daily Restack schedule; run it with dry_run=True to see
+which paths would be promoted and the type inferred for each.
+"""
+
+from datetime import timedelta
+
+from restack_ai.workflow import (
+    NonRetryableError,
+    import_functions,
+    log,
+    workflow,
+)
+
+from src.constants import TASK_QUEUE
+
+with import_functions():
+    from src.functions.raw_data_paths import (
+        PromoteRawDataPathsInput,
+        PromoteRawDataPathsOutput,
+        promote_hot_raw_data_paths,
+    )
+
+
+@workflow.defn()
+class PromoteHotRawDataPathsWorkflow:
+    """Add typed MATERIALIZED columns for the most used raw_data paths."""
+
+    @workflow.run
+    async def run(
+        self, workflow_input: PromoteRawDataPathsInput
+    ) -> PromoteRawDataPathsOutput:
+        log.info(
+            "PromoteHotRawDataPathsWorkflow started",
+            dry_run=workflow_input.dry_run,
+        )
+        try:
+            return await workflow.step(
+                function=promote_hot_raw_data_paths,
+                function_input=workflow_input,
+                task_queue=TASK_QUEUE,
+                start_to_close_timeout=timedelta(minutes=10),
+            )
+        except Exception as e:
+            error_message = (
+                f"Error in promote_hot_raw_data_paths: {e}"
+            )
+            log.error(error_message)
+            raise NonRetryableError(message=error_message) from e
@@ -0,0 +1,84 @@
+"""Workflow wrappers for retention: ClickHouse policies and staged uploads.
+
+ApplyRetentionPoliciesWorkflow is meant to run on a daily Restack schedule
+with dry_run=False; run it with dry_run=True (the default) to see the bytes
+each policy would reclaim. SweepAbandonedUploadsWorkflow is meant to run
+hourly.
+"""
+
+from datetime import timedelta
+
+from restack_ai.workflow import (
+    NonRetryableError,
+    import_functions,
+    log,
+    workflow,
+)
+
+from src.constants import TASK_QUEUE
+
+with import_functions():
+    from src.functions.blob_sweep import (
+        SweepUploadsInput,
+        SweepUploadsOutput,
+        sweep_abandoned_uploads,
+    )
+    from src.functions.retention import (
+        ApplyRetentionInput,
+        RetentionReport,
+        apply_retention_policies,
+    )
+
+
+@workflow.defn()
+class ApplyRetentionPoliciesWorkflow:
+    """Delete expired dataset events and traces; drop or tier old partitions."""
+
+    @workflow.run
+    async def run(
+        self, workflow_input: ApplyRetentionInput
+    ) -> RetentionReport:
+        log.info(
+            "ApplyRetentionPoliciesWorkflow started",
+            dry_run=workflow_input.dry_run,
+        )
+        try:
+            return await workflow.step(
+                function=apply_retention_policies,
+                function_input=workflow_input,
+                task_queue=TASK_QUEUE,
+                start_to_close_timeout=timedelta(minutes=30),
+            )
+        except Exception as e:
+            error_message = (
+                f"Error in apply_retention_policies: {e}"
+            )
+            log.error(error_message)
+            raise NonRetryableError(message=error_message) from e
+
+
+@workflow.defn()
+class SweepAbandonedUploadsWorkflow:
+    """Delete staged uploads that were never ingested."""
+
+    @workflow.run
+    async def run(
+        self, workflow_input: SweepUploadsInput
+    ) -> SweepUploadsOutput:
+        log.info(
+            "SweepAbandonedUploadsWorkflow started",
+            dry_run=workflow_input.dry_run,
+        )
+        try:
+            return await workflow.step(
+                function=sweep_abandoned_uploads,
+                function_input=workflow_input,
+                task_queue=TASK_QUEUE,
+                start_to_close_timeout=timedelta(minutes=10),
+            )
+        except Exception as e:
+            error_message = (
+                f"Error in sweep_abandoned_uploads: {e}"
+            )
+            log.error(error_message)
+            raise NonRetryableError(message=error_message) from e
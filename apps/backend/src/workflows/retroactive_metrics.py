@@ -5,10 +5,17 @@ This enables evaluating past agent runs with newly defined metrics.
 """
 
 import asyncio
-from dataclasses import dataclass
-from datetime import timedelta
-
-from restack_ai.workflow import import_functions, log, workflow
+from dataclasses import dataclass, field, replace
+from datetime import datetime, timedelta
+
+from restack_ai.workflow import (
+    import_functions,
+    log,
+    workflow,
+    workflow_info,
+)
+from temporalio.workflow import continue_as_new, query
+from temporalio.workflow import now as workflow_now
 
 from src.constants import TASK_QUEUE
 
@@ -25,7 +32,30 @@ with import_functions():
     from src.functions.metrics_helpers import (
         build_performance_data_dict,
     )
-    from src.functions.traces_query import query_traces_batch
+    from src.functions.traces_query import (
+        count_traces_for_retroactive,
+        query_traces_batch,
+    )
+
+
+@dataclass
+class RetroactiveMetricsState:
+    """Cursor and totals carried from one run to the next (continue-as-new)."""
+
+    cursor: dict | None = (
+        None  # started_at, span_id of the last trace read
+    )
+    total_traces: int = (
+        0  # Matching traces when the evaluation started
+    )
+    traces_scanned: int = 0
+    traces_processed: int = 0
+    evaluations_completed: int = 0
+    evaluations_failed: int = 0
+    errors: list[str] = field(default_factory=list)
+    started_at: str | None = (
+        None  # ISO datetime, set by the first run
+    )
 
 
 @dataclass
@@ -42,6 +72,16 @@ class RetroactiveMetricsInput:
     sample_percentage: float | None = (
         None  # Sample X% of traces (e.g., 0.1 = 10%)
     )
+    batches_per_run: int = (
+        50  # Continue as new after this many batches
+    )
+    shard_min_traces: int = (
+        10_000  # Split larger runs by month into child workflows
+    )
+    max_parallel_shards: int = 4
+    state: RetroactiveMetricsState | None = (
+        None  # Set when continued as new
+    )
 
 
 @dataclass
@@ -54,6 +94,21 @@ class RetroactiveMetricsOutput:
     evaluations_completed: int
     evaluations_failed: int
     errors: list[str]
+    # Traces read, before sampling and agent filters
+    traces_scanned: int = 0
+
+
+@dataclass
+class RetroactiveMetricsProgress:
+    """Progress of a running evaluation (the progress query)."""
+
+    traces_scanned: int
+    traces_processed: int
+    total_traces: int
+    remaining: int
+    eta_seconds: float | None  # None until a batch has been read
+    shards_total: int = 0
+    shards_done: int = 0
 
 
 @workflow.defn()
@@ -66,12 +121,49 @@ class RetroactiveMetrics:
     3. Evaluates the metric against each trace's I/O
     4. Saves results to task_metrics table (linked to trace_id/span_id)
 
+    Batches are read newest first from a (started_at, span_id) cursor.
+    Every batches_per_run batches the workflow continues as new with the
+    cursor and totals, so history stays bounded and a long evaluation
+    resumes where it was. Runs over shard_min_traces spanning several
+    task_traces partitions (months) run one child workflow per month,
+    max_parallel_shards at a time; max_traces runs are never split.
+
     Use cases:
     - Created a new quality metric and want to evaluate all past runs
     - Changed a metric definition and want to re-evaluate
     - Analyzing performance of different agent versions
     """
 
+    def __init__(self) -> None:
+        self._state = RetroactiveMetricsState()
+        self._shards_total = 0
+        self._shards_done = 0
+
+    @query
+    def progress(self) -> RetroactiveMetricsProgress:
+        state = self._state
+        remaining = max(
+            state.total_traces - state.traces_scanned, 0
+        )
+        eta_seconds = None
+        if state.started_at and state.traces_scanned:
+            elapsed = (
+                workflow_now()
+                - datetime.fromisoformat(state.started_at)
+            ).total_seconds()
+            eta_seconds = round(
+                remaining * elapsed / state.traces_scanned, 1
+            )
+        return RetroactiveMetricsProgress(
+            traces_scanned=state.traces_scanned,
+            traces_processed=state.traces_processed,
+            total_traces=state.total_traces,
+            remaining=remaining,
+            eta_seconds=eta_seconds,
+            shards_total=self._shards_total,
+            shards_done=self._shards_done,
+        )
+
     async def _fetch_metric_definition(
         self, workflow_input: RetroactiveMetricsInput
     ) -> dict | None:
@@ -178,16 +270,20 @@ class RetroactiveMetrics:
         self,
         workflow_input: RetroactiveMetricsInput,
         metric_def: dict,
-        offset: int,
-    ) -> tuple[int, int, int, bool]:
-        """Process a batch of traces. Returns (processed, completed, failed, has_more)."""
+        cursor: dict | None,
+    ) -> tuple[int, int, int, int, dict | None]:
+        """Process a batch of traces.
+
+        Returns (scanned, processed, completed, failed, next_cursor);
+        next_cursor is None after the last batch.
+        """
         trace_batch = await workflow.step(
             function=query_traces_batch,
             function_input={
                 "workspace_id": workflow_input.workspace_id,
                 "filters": workflow_input.filters,
                 "limit": workflow_input.batch_size,
-                "offset": offset,
+                "cursor": cursor,
             },
             start_to_close_timeout=timedelta(seconds=60),
             task_queue=TASK_QUEUE,
@@ -195,10 +291,10 @@ class RetroactiveMetrics:
 
         if not trace_batch["spans"]:
             log.info("No more traces to process")
-            return (0, 0, 0, False)
+            return (0, 0, 0, 0, None)
 
         log.info(
-            f"Processing batch: {len(trace_batch['spans'])} traces (offset {offset})"
+            f"Processing batch: {len(trace_batch['spans'])} traces (after {cursor})"
         )
 
         # Apply sampling
@@ -260,8 +356,154 @@ class RetroactiveMetrics:
                 f"Batch complete: {completed} succeeded, {failed} failed"
             )
 
-        has_more = trace_batch.get("has_more", False)
-        return (processed_count, completed, failed, has_more)
+        next_cursor = (
+            trace_batch["next_cursor"]
+            if trace_batch.get("has_more", False)
+            else None
+        )
+        return (
+            len(trace_batch["spans"]),
+            processed_count,
+            completed,
+            failed,
+            next_cursor,
+        )
+
+    def _shard_filters(
+        self,
+        workflow_input: RetroactiveMetricsInput,
+        partitions: list[dict],
+    ) -> list[dict]:
+        """Filters for one child workflow per partition, or [] to run here."""
+        if (
+            workflow_input.filters.get("partition")
+            or workflow_input.max_traces
+            or len(partitions) < 2  # noqa: PLR2004
+            or self._state.total_traces
+            < workflow_input.shard_min_traces
+        ):
+            return []
+        return [
+            {
+                **workflow_input.filters,
+                "partition": p["partition"],
+            }
+            for p in partitions
+        ]
+
+    async def _run_shard(
+        self,
+        workflow_input: RetroactiveMetricsInput,
+        filters: dict,
+        limit: asyncio.Semaphore,
+    ) -> None:
+        """Run one partition as a child workflow and add its totals."""
+        state = self._state
+        async with limit:
+            child_id = f"{workflow_info().workflow_id}_{filters['partition']}"
+            try:
+                result = await workflow.child_execute(
+                    workflow=RetroactiveMetrics,
+                    workflow_input=replace(
+                        workflow_input,
+                        filters=filters,
+                        state=None,
+                    ),
+                    workflow_id=child_id,
+                    task_queue=TASK_QUEUE,
+                )
+            except Exception as e:  # noqa: BLE001
+                error_msg = f"Shard {child_id} failed: {e}"
+                log.error(error_msg)
+                state.errors.append(error_msg)
+                return
+            finally:
+                self._shards_done += 1
+        state.traces_scanned += result.traces_scanned
+        state.traces_processed += result.traces_processed
+        state.evaluations_completed += (
+            result.evaluations_completed
+        )
+        state.evaluations_failed += result.evaluations_failed
+        state.errors.extend(result.errors)
+
+    def _output(
+        self, metric_name: str, metric_id: str
+    ) -> RetroactiveMetricsOutput:
+        state = self._state
+        return RetroactiveMetricsOutput(
+            metric_id=metric_id,
+            metric_name=metric_name,
+            traces_processed=state.traces_processed,
+            evaluations_completed=state.evaluations_completed,
+            evaluations_failed=state.evaluations_failed,
+            errors=state.errors,
+            traces_scanned=state.traces_scanned,
+        )
+
+    async def _start(
+        self, workflow_input: RetroactiveMetricsInput
+    ) -> list[dict]:
+        """Count the matching traces; returns shard filters if the run splits."""
+        state = self._state
+        state.started_at = workflow_now().isoformat()
+        count_result = await workflow.step(
+            function=count_traces_for_retroactive,
+            function_input={
+                "workspace_id": workflow_input.workspace_id,
+                "filters": workflow_input.filters,
+            },
+            start_to_close_timeout=timedelta(seconds=60),
+            task_queue=TASK_QUEUE,
+        )
+        state.total_traces = count_result.get("total_count", 0)
+        return self._shard_filters(
+            workflow_input, count_result.get("partitions", [])
+        )
+
+    async def _run_batches(
+        self,
+        workflow_input: RetroactiveMetricsInput,
+        metric_def: dict,
+    ) -> bool:
+        """Process up to batches_per_run batches; True when the run is done."""
+        state = self._state
+        for _ in range(workflow_input.batches_per_run):
+            if self._should_stop_batch_processing(
+                workflow_input, state.traces_processed
+            ):
+                return True
+
+            try:
+                (
+                    scanned,
+                    processed,
+                    completed,
+                    failed,
+                    next_cursor,
+                ) = await self._process_batch(
+                    workflow_input, metric_def, state.cursor
+                )
+            except (
+                ValueError,
+                TypeError,
+                RuntimeError,
+                AttributeError,
+            ) as e:
+                error_msg = f"Error processing batch after {state.cursor}: {e}"
+                log.error(error_msg)
+                state.errors.append(error_msg)
+                return True
+
+            state.traces_scanned += scanned
+            state.traces_processed += processed
+            state.evaluations_completed += completed
+            state.evaluations_failed += failed
+            state.cursor = next_cursor
+
+            if next_cursor is None:
+                return True  # No more traces
+        return False
 
     @workflow.run
     async def run(
@@ -270,6 +512,8 @@ class RetroactiveMetrics:
         log.info(
             f"Starting retroactive evaluation for metric {workflow_input.metric_definition_id}"
         )
+        if workflow_input.state is not None:
+            self._state = workflow_input.state
 
         # Step 1: Fetch metric definition
         metric_def = await self._fetch_metric_definition(
@@ -286,63 +530,62 @@ class RetroactiveMetrics:
                 errors=[error_msg],
             )
 
-        # Step 2: Process traces in batches
-        offset = 0
-        total_processed = 0
-        total_completed = 0
-        total_failed = 0
-        errors = []
-
-        while True:
-            if self._should_stop_batch_processing(
-                workflow_input, total_processed
-            ):
-                break
-
+        # Step 2: Count traces and split large runs by partition
+        if self._state.started_at is None:
             try:
-                (
-                    processed,
-                    completed,
-                    failed,
-                    has_more,
-                ) = await self._process_batch(
-                    workflow_input, metric_def, offset
-                )
-
-                if processed == 0:
-                    break  # No more traces
-
-                total_processed += processed
-                total_completed += completed
-                total_failed += failed
-
-                offset += workflow_input.batch_size
-
-                if not has_more:
-                    break
-
+                shards = await self._start(workflow_input)
             except (
                 ValueError,
                 TypeError,
                 RuntimeError,
                 AttributeError,
             ) as e:
-                error_msg = f"Error processing batch at offset {offset}: {e}"
+                error_msg = f"Error counting traces: {e}"
                 log.error(error_msg)
-                errors.append(error_msg)
-                break
+                self._state.errors.append(error_msg)
+                return self._output(
+                    metric_def["name"],
+                    workflow_input.metric_definition_id,
+                )
+            if shards:
+                log.info(
+                    f"Splitting {self._state.total_traces} traces into {len(shards)} partition shards"
+                )
+                self._shards_total = len(shards)
+                limit = asyncio.Semaphore(
+                    workflow_input.max_parallel_shards
+                )
+                await asyncio.gather(
+                    *(
+                        self._run_shard(
+                            workflow_input, filters, limit
+                        )
+                        for filters in shards
+                    )
+                )
+                return self._output(
+                    metric_def["name"],
+                    workflow_input.metric_definition_id,
+                )
+
+        # Step 3: Process traces in batches, continuing as new between runs
+        if not await self._run_batches(
+            workflow_input, metric_def
+        ):
+            log.info(
+                f"Continuing as new after {self._state.traces_scanned} traces"
+            )
+            continue_as_new(
+                replace(workflow_input, state=self._state)
+            )
 
         log.info(
-            f"Retroactive evaluation complete: {total_completed}/{total_processed} traces evaluated successfully"
+            f"Retroactive evaluation complete: {self._state.evaluations_completed}/{self._state.traces_processed} traces evaluated successfully"
         )
 
-        return RetroactiveMetricsOutput(
-            metric_id=workflow_input.metric_definition_id,
-            metric_name=metric_def["name"],
-            traces_processed=total_processed,
-            evaluations_completed=total_completed,
-            evaluations_failed=total_failed,
-            errors=errors,
+        return self._output(
+            metric_def["name"],
+            workflow_input.metric_definition_id,
         )
 
     async def _evaluate_and_save_llm_judge(
@@ -0,0 +1,114 @@
+"""Workflow wrappers for dataset semantic search and its recall benchmark."""
+
+from datetime import timedelta
+
+from restack_ai.workflow import (
+    NonRetryableError,
+    import_functions,
+    log,
+    workflow,
+)
+
+from src.constants import TASK_QUEUE, TASK_QUEUE_EMBED_QUERY
+
+with import_functions():
+    from src.functions.datasets_crud import (
+        DatasetGetByIdInput,
+        datasets_get_embedding_config,
+    )
+    from src.functions.embed_texts import (
+        EmbedTextsInput,
+        embed_texts,
+    )
+    from src.functions.semantic_search import (
+        SemanticSearchInput,
+        SemanticSearchOutput,
+        SemanticSearchRecallInput,
+        SemanticSearchRecallOutput,
+        benchmark_semantic_search_recall,
+        semantic_search_dataset,
+    )
+
+
+@workflow.defn()
+class SemanticSearchDatasetWorkflow:
+    """Nearest dataset chunks to a query embedding or query text."""
+
+    @workflow.run
+    async def run(
+        self, workflow_input: SemanticSearchInput
+    ) -> SemanticSearchOutput:
+        try:
+            if workflow_input.query_embedding is None:
+                model = workflow_input.embedding_model
+                if model is None:
+                    dataset = await workflow.step(
+                        function=datasets_get_embedding_config,
+                        function_input=DatasetGetByIdInput(
+                            workspace_id=workflow_input.workspace_id,
+                            dataset_id=workflow_input.dataset_id,
+                        ),
+                        task_queue=TASK_QUEUE,
+                        start_to_close_timeout=timedelta(
+                            seconds=30
+                        ),
+                    )
+                    model = dataset.config.model
+                embedded = await workflow.step(
+                    function=embed_texts,
+                    function_input=EmbedTextsInput(
+                        texts=[workflow_input.query_text or ""],
+                        model_id=model,
+                    ),
+                    task_queue=TASK_QUEUE_EMBED_QUERY,
+                    start_to_close_timeout=timedelta(seconds=60),
+                )
+                if not embedded.success:
+                    msg = f"Query embedding failed: {embedded.error}"
+                    raise ValueError(msg)
+                # Search the model the query was embedded with
+                workflow_input = workflow_input.model_copy(
+                    update={
+                        "query_embedding": embedded.embeddings[0],
+                        "embedding_model": model,
+                    }
+                )
+            return await workflow.step(
+                function=semantic_search_dataset,
+                function_input=workflow_input,
+                task_queue=TASK_QUEUE,
+                start_to_close_timeout=timedelta(seconds=60),
+            )
+        except Exception as e:
+            error_message = (
+                f"Error in semantic_search_dataset: {e}"
+            )
+            log.error(error_message)
+            raise NonRetryableError(message=error_message) from e
+
+
+@workflow.defn()
+class BenchmarkSemanticSearchRecallWorkflow:
+    """Recall@k and bytes read of quantized vs exact semantic search."""
+
+    @workflow.run
+    async def run(
+        self, workflow_input: SemanticSearchRecallInput
+    ) -> SemanticSearchRecallOutput:
+        log.info(
+            "BenchmarkSemanticSearchRecallWorkflow started",
+            dataset_id=workflow_input.dataset_id,
+        )
+        try:
+            return await workflow.step(
+                function=benchmark_semantic_search_recall,
+                function_input=workflow_input,
+                task_queue=TASK_QUEUE,
+                start_to_close_timeout=timedelta(minutes=30),
+            )
+        except Exception as e:
+            error_message = (
+                f"Error in benchmark_semantic_search_recall: {e}"
+            )
+            log.error(error_message)
+            raise NonRetryableError(message=error_message) from e
@@ -0,0 +1,36 @@
+import pytest
+
+pytest.importorskip("asyncpg")
+pytest.importorskip("clickhouse_connect")
+pytest.importorskip("restack_ai")
+
+from src.functions.data_ingestion import (
+    COCKROACHDB_INGEST_BATCH_SIZE,
+    _cockroachdb_batch_size,
+)
+
+
+@pytest.mark.parametrize(
+    ("configured", "expected"),
+    [
+        (None, COCKROACHDB_INGEST_BATCH_SIZE),
+        ("1000", 1000),
+        ("0", 1),
+        ("-5", 1),
+        ("5000", 32767 // 12),
+    ],
+)
+def test_cockroachdb_batch_size_is_clamped(
+    monkeypatch: pytest.MonkeyPatch,
+    configured: str | None,
+    expected: int,
+) -> None:
+    if configured is None:
+        monkeypatch.delenv(
+            "COCKROACHDB_INGEST_BATCH_SIZE", raising=False
+        )
+    else:
+        monkeypatch.setenv(
+            "COCKROACHDB_INGEST_BATCH_SIZE", configured
+        )
+    assert _cockroachdb_batch_size() == expected
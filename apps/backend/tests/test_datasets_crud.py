@@ -0,0 +1,64 @@
+import asyncio
+from datetime import UTC, datetime
+from types import SimpleNamespace
+from typing import Any
+
+import pytest
+
+pytest.importorskip("clickhouse_connect")
+pytest.importorskip("restack_ai")
+
+from src.functions.datasets_crud import (
+    _source_delete_mutations,
+)
+
+
+class FakeMutationsClient:
+    """Returns every mutation whose command holds the predicate."""
+
+    def __init__(self, commands: dict[str, str]) -> None:
+        self.commands = commands
+
+    async def query(
+        self, _query: str, parameters: dict[str, Any]
+    ) -> SimpleNamespace:
+        return SimpleNamespace(
+            result_rows=[
+                (mutation_id, command)
+                for mutation_id, command in self.commands.items()
+                if parameters["predicate"] in command
+            ]
+        )
+
+
+def _mutations(
+    commands: dict[str, str], source: str
+) -> list[str]:
+    return asyncio.run(
+        _source_delete_mutations(
+            FakeMutationsClient(commands),
+            "pipeline_events",
+            source,
+            datetime(2026, 1, 1, tzinfo=UTC),
+        )
+    )
+
+
+def test_only_the_exact_source_predicate_matches() -> None:
+    commands = {
+        "mutation_1.txt": "UPDATE _row_exists = 0 WHERE (dataset_id = 'd') AND (source = 'a.pdf')",
+        "mutation_2.txt": "UPDATE _row_exists = 0 WHERE (dataset_id = 'd') AND (source = 'a.pdf.bak')",
+        "mutation_3.txt": "UPDATE _row_exists = 0 WHERE raw_source = 'a.pdf'",
+    }
+    assert _mutations(commands, "a.pdf") == ["mutation_1.txt"]
+
+
+def test_quoted_sources_match_their_escaped_literal() -> None:
+    commands = {
+        "mutation_1.txt": "UPDATE _row_exists = 0 WHERE source = 'it\\'s.txt'",
+        "mutation_2.txt": "UPDATE _row_exists = 0 WHERE source = 'it\\'s.txt\\\\'",
+    }
+    assert _mutations(commands, "it's.txt") == ["mutation_1.txt"]
+    assert _mutations(commands, "it's.txt\\") == [
+        "mutation_2.txt"
+    ]
@@ -0,0 +1,27 @@
+from src.functions.embed_chunk_cache import split_into_chunks
+
+PARAGRAPHS = [
+    f"Paragraph {i}. "
+    + " ".join(f"word{i}x{j}" for j in range(i % 40 + 5))
+    for i in range(120)
+]
+
+
+def test_edit_only_changes_nearby_chunks() -> None:
+    before = split_into_chunks("\n\n".join(PARAGRAPHS), 500)
+    edited = list(PARAGRAPHS)
+    edited[1] += " A sentence added near the start."
+    after = split_into_chunks("\n\n".join(edited), 500)
+    changed = set(after) - set(before)
+    assert len(changed) <= 3
+    assert len(after) > 10
+
+
+def test_long_paragraph_is_split_within_chunk_size() -> None:
+    long = " ".join(
+        f"Sentence number {i} here." for i in range(100)
+    )
+    chunks = split_into_chunks(f"Intro.\n\n{long}\n\nOutro.", 200)
+    assert all(len(chunk) <= 200 for chunk in chunks)
+    assert chunks[0] == "Intro."
+    assert chunks[-1] == "Outro."
@@ -0,0 +1,56 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("restack_ai")
+
+from src.functions.embed_texts import TextEmbedder
+from src.functions.embed_worker_pool import EmbedWorkerError
+
+
+class FailingEmbedder(TextEmbedder):
+    """Every request to the model process raises error."""
+
+    def __init__(self, error: BaseException) -> None:
+        super().__init__(batch_wait_ms=0, cache_size=0)
+        self.error = error
+
+    async def _request(
+        self, _texts: list[str]
+    ) -> list[list[float]]:
+        raise self.error
+
+
+def _embed_concurrently(
+    embedder: TextEmbedder, *requests: list[str]
+) -> list[object]:
+    async def run() -> list[object]:
+        return await asyncio.wait_for(
+            asyncio.gather(
+                *(embedder.embed(texts) for texts in requests),
+                return_exceptions=True,
+            ),
+            timeout=5,
+        )
+
+    return asyncio.run(run())
+
+
+@pytest.mark.parametrize(
+    "error",
+    [
+        EmbedWorkerError("model process exited"),
+        KeyError("embeddings"),
+        RuntimeError("unexpected"),
+        asyncio.CancelledError(),
+    ],
+)
+def test_batch_errors_fail_every_waiting_caller(
+    error: BaseException,
+) -> None:
+    embedder = FailingEmbedder(error)
+    results = _embed_concurrently(
+        embedder, ["a", "b"], ["b", "c"]
+    )
+    assert all(isinstance(r, EmbedWorkerError) for r in results)
+    assert embedder.idle
@@ -0,0 +1,71 @@
+from src.utils.event_ids import (
+    chunk_event_id,
+    dedup_token,
+    event_id,
+    event_ids,
+)
+
+EVENT = {
+    "workspace_id": "ws",
+    "dataset_id": "ds",
+    "agent_id": "agent",
+    "event_name": "Data Load",
+    "raw_data": {"value": 1},
+}
+
+
+def test_equal_events_in_one_batch_get_distinct_ids() -> None:
+    ids = event_ids([dict(EVENT), dict(EVENT), dict(EVENT)])
+    assert len(set(ids)) == 3
+    assert ids[0] == event_id(EVENT)
+
+
+def test_ids_are_stable_across_retries() -> None:
+    other = {**EVENT, "raw_data": {"value": 2}}
+    batch = [dict(EVENT), other, dict(EVENT)]
+    assert event_ids(batch) == event_ids(batch)
+
+
+def test_occurrences_count_equal_events_only() -> None:
+    other = {**EVENT, "raw_data": {"value": 2}}
+    ids = event_ids([dict(EVENT), other, dict(EVENT)])
+    assert ids[:2] == event_ids([dict(EVENT), other])
+    assert ids[1] == event_id(other)
+
+
+def test_caller_id_is_kept() -> None:
+    ids = event_ids([{**EVENT, "id": "given"}, dict(EVENT)])
+    assert ids == ["given", event_id(EVENT)]
+
+
+def test_chunks_keep_their_chunk_id() -> None:
+    chunk = {
+        **EVENT,
+        "raw_data": {
+            "source": "a.pdf",
+            "chunk_index": 3,
+            "text": "t",
+        },
+    }
+    expected = chunk_event_id("ws", "ds", "a.pdf", 3, "t")
+    assert event_ids([chunk, dict(chunk)]) == [expected, expected]
+
+
+def test_dedup_token_depends_on_salt_and_order() -> None:
+    assert dedup_token(["a", "b"]) == dedup_token(["a", "b"])
+    assert dedup_token(["a", "b"]) != dedup_token(["b", "a"])
+    assert dedup_token(["run-1", "a"]) != dedup_token(
+        ["run-2", "a"]
+    )
+
+
+def test_equal_records_split_across_chunks_get_distinct_ids() -> (
+    None
+):
+    records = [dict(EVENT) for _ in range(6)]
+    ids = event_ids(records[:4], "load-1", 0) + event_ids(
+        records[4:], "load-1", 4
+    )
+    assert len(set(ids)) == 6
+    assert ids == event_ids(records, "load-1")
+    assert set(ids).isdisjoint(event_ids(records, "load-2"))
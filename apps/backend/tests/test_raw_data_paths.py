@@ -0,0 +1,62 @@
+import pytest
+
+pytest.importorskip("clickhouse_connect")
+pytest.importorskip("restack_ai")
+
+from src.functions.raw_data_paths import (
+    rewrite_raw_data_query,
+)
+
+PROMOTED = {"status": "rd_status", "user.id": "rd_user__id"}
+
+
+def test_unaliased_projection_keeps_every_occurrence() -> None:
+    query = (
+        "SELECT raw_data.status, count() FROM pipeline_events "
+        "GROUP BY raw_data.status ORDER BY raw_data.status"
+    )
+    assert rewrite_raw_data_query(query, PROMOTED) == query
+
+
+def test_filters_sorts_and_aliased_projections_are_rewritten() -> (
+    None
+):
+    query = (
+        "SELECT raw_data.status AS status FROM pipeline_events "
+        "WHERE raw_data.user.id = 'a' GROUP BY raw_data.status"
+    )
+    assert rewrite_raw_data_query(query, PROMOTED) == (
+        "SELECT rd_status AS status FROM pipeline_events "
+        "WHERE rd_user__id = 'a' GROUP BY rd_status"
+    )
+
+
+def test_one_unsafe_occurrence_keeps_only_that_path() -> None:
+    query = (
+        "SELECT raw_data.status FROM pipeline_events "
+        "WHERE raw_data.user.id = 'a' AND raw_data.status = 'ok'"
+    )
+    assert rewrite_raw_data_query(query, PROMOTED) == (
+        "SELECT raw_data.status FROM pipeline_events "
+        "WHERE rd_user__id = 'a' AND raw_data.status = 'ok'"
+    )
+
+
+def test_literals_subcolumns_and_other_tables_are_left_alone() -> (
+    None
+):
+    literal = (
+        "SELECT 1 FROM pipeline_events "
+        "WHERE note = 'raw_data.status' AND raw_data.status = 'x'"
+    )
+    assert rewrite_raw_data_query(literal, PROMOTED) == (
+        "SELECT 1 FROM pipeline_events "
+        "WHERE note = 'raw_data.status' AND rd_status = 'x'"
+    )
+    typed = (
+        "SELECT 1 FROM pipeline_events "
+        "WHERE raw_data.status.:String = 'x' AND raw_data.status = 'y'"
+    )
+    assert rewrite_raw_data_query(typed, PROMOTED) == typed
+    other = "SELECT 1 FROM events WHERE raw_data.status = 'x'"
+    assert rewrite_raw_data_query(other, PROMOTED) == other
@@ -0,0 +1,85 @@
+import asyncio
+from pathlib import Path
+
+import pytest
+
+pytest.importorskip("clickhouse_connect")
+pytest.importorskip("pyarrow")
+pytest.importorskip("restack_ai")
+
+from src.functions import tabular_ingestion
+from src.functions.tabular_ingestion import (
+    TabularFile,
+    ingest_tabular_file,
+    read_table_blocks,
+)
+
+CSV = (
+    "id,zip,amount,flag,grouped,mixed\n"
+    "1,02134,1.5,true,1_000,1\n"
+    "2,10001,2,False,2_000,x\n"
+    "3,,3e2,TRUE,,2\n"
+)
+
+
+def _read_columns(
+    path: Path, block_rows: int
+) -> tuple[list[str], list[list[object]]]:
+    async def run() -> tuple[list[str], list[list[object]]]:
+        blocks = await read_table_blocks(
+            path, block_rows, frozenset({"source", "chunk_index"})
+        )
+        names: list[str] = []
+        columns: list[list[object]] = []
+        for names, block in blocks:
+            if not columns:
+                columns = [[] for _ in names]
+            for column, values in zip(
+                columns, block, strict=True
+            ):
+                column.extend(values)
+        return names, columns
+
+    return asyncio.run(run())
+
+
+def test_csv_columns_get_one_type_for_the_whole_file(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setattr(
+        tabular_ingestion, "heartbeat", lambda *_: None
+    )
+    path = tmp_path / "table.csv"
+    path.write_text(CSV)
+
+    # Two-row blocks: "x" in the first block keeps "mixed" text in both
+    names, columns = _read_columns(path, block_rows=2)
+
+    assert dict(zip(names, columns, strict=True)) == {
+        "id": [1, 2, 3],
+        "zip": ["02134", "10001", None],
+        "amount": [1.5, 2.0, 300.0],
+        "flag": [True, False, True],
+        "grouped": ["1_000", "2_000", None],
+        "mixed": ["1", "x", "2"],
+    }
+
+
+def test_text_listed_with_other_embed_columns_is_rejected() -> (
+    None
+):
+    table = TabularFile(
+        path="table.csv",
+        agent_id="agent",
+        task_id=None,
+        workspace_id="workspace",
+        dataset_id="dataset",
+        event_name="Table Row",
+        source="table.csv",
+        content_hash="hash",
+        tags=[],
+        embed_columns=["title", "text"],
+        model_id="model",
+    )
+    with pytest.raises(ValueError, match="text_2"):
+        asyncio.run(ingest_tabular_file(table))
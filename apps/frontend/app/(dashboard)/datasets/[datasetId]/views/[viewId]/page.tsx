@@ -74,9 +74,12 @@ export default function ViewDetailPage() {
     if (!currentWorkspaceId || !isReady || !datasetId) return;
     setEventsLoading(true);
     try {
-      const result = await executeWorkflow("QueryDatasetEventsWorkflow", {
+      // Served from the view's compiled table when ready; falls back to
+      // the dataset's events (same response shape)
+      const result = await executeWorkflow("QueryViewRowsWorkflow", {
         workspace_id: currentWorkspaceId,
         dataset_id: datasetId,
+        view_id: viewId,
         limit: 500,
         offset: 0,
       });
@@ -94,7 +97,7 @@ export default function ViewDetailPage() {
     } finally {
       setEventsLoading(false);
     }
-  }, [currentWorkspaceId, isReady, datasetId, executeWorkflow]);
+  }, [currentWorkspaceId, isReady, datasetId, viewId, executeWorkflow]);
 
   useEffect(() => {
     fetchView();
@@ -2,6 +2,7 @@
 
 import { useRef, useState } from "react";
 import { Button } from "@workspace/ui/components/ui/button";
+import { Input } from "@workspace/ui/components/ui/input";
 import { Label } from "@workspace/ui/components/ui/label";
 import {
   QuickActionDialog,
@@ -13,36 +14,23 @@ import {
   scheduleAddFilesToDatasetWorkflow,
   getWorkflowResult,
 } from "@/app/actions/workflow";
-import {
-  GRPC_MESSAGE_LIMIT_BYTES,
-  SAFE_PAYLOAD_BYTES,
-  splitPdfIntoParts,
-  batchUnderLimit,
-} from "../lib/pdf-split";
+import { uploadFiles } from "../lib/upload-files";
 
 const LOG_PREFIX = "[AddFilesToDataset]";
 
-function readFileAsBase64(file: File): Promise<string> {
-  return new Promise((resolve, reject) => {
-    const reader = new FileReader();
-    reader.onload = () => {
-      const result = reader.result as string;
-      const base64 = result.includes(",") ? result.split(",")[1] : result;
-      resolve(base64 ?? "");
-    };
-    reader.onerror = () => reject(reader.error);
-    reader.readAsDataURL(file);
-  });
-}
-
-function isPdf(file: File): boolean {
-  const name = (file.name || "").toLowerCase();
-  return name.endsWith(".pdf") || file.type === "application/pdf";
-}
-
 /** File types supported by EmbedAnything: documents, text, markdown, CSV, images */
 const ACCEPT_FILE_TYPES =
-  "application/pdf,.pdf,.txt,text/plain,.md,text/markdown,text/csv,.csv,image/jpeg,image/png,.jpg,.jpeg,.png";
+  "application/pdf,.pdf,.txt,text/plain,.md,text/markdown,text/csv,.csv,.parquet,image/jpeg,image/png,.jpg,.jpeg,.png";
+
+const TABULAR_FILE = /\.(csv|parquet)$/i;
+
+/** "title, body" → ["title", "body"] */
+function parseEmbedColumns(value: string): string[] {
+  return value
+    .split(",")
+    .map((column) => column.trim())
+    .filter(Boolean);
+}
 
 interface AddFilesDialogProps {
   datasetId: string;
@@ -63,6 +51,8 @@ export function AddFilesDialog({ datasetId, onSeeded }: AddFilesDialogProps) {
   } = useQuickActionDialog();
   const fileInputRef = useRef<HTMLInputElement>(null);
   const [selectedFiles, setSelectedFiles] = useState<File[]>([]);
+  const [embedColumns, setEmbedColumns] = useState("");
+  const hasTables = selectedFiles.some((f) => TABULAR_FILE.test(f.name));
 
   const handleFileChange = (e: React.ChangeEvent<HTMLInputElement>) => {
     const files = Array.from(e.target.files || []);
@@ -83,106 +73,46 @@ export function AddFilesDialog({ datasetId, onSeeded }: AddFilesDialogProps) {
       return;
     }
 
-    const tooLarge = selectedFiles.filter(
-      (f) => !isPdf(f) && f.size > GRPC_MESSAGE_LIMIT_BYTES,
-    );
-    if (tooLarge.length > 0) {
-      const names = tooLarge.map((f) => f.name).join(", ");
-      handleError(
-        `Restack has a 4 MB limit per message. The following files exceed 4 MB: ${names}. Use smaller files or split them; large documents are split automatically.`,
-      );
-      return;
-    }
-
     startLoading();
     try {
-      const filesWithContent: { filename: string; content_base64: string }[] =
-        [];
-      for (const file of selectedFiles) {
-        const baseName = file.name || "document";
-        const sizeMB = (file.size / (1024 * 1024)).toFixed(2);
-        const shouldSplit =
-          isPdf(file) && file.size > SAFE_PAYLOAD_BYTES;
-        console.log(
-          `${LOG_PREFIX} file=${baseName} size=${file.size} (${sizeMB} MB) isPdf=${isPdf(file)} safeLimit=${SAFE_PAYLOAD_BYTES} → ${shouldSplit ? "splitting" : "single"}`
-        );
-        if (shouldSplit) {
-          const parts = await splitPdfIntoParts(file, baseName);
-          console.log(
-            `${LOG_PREFIX} split "${baseName}" into ${parts.length} part(s)`
-          );
-          filesWithContent.push(...parts);
-        } else {
-          const base64 = await readFileAsBase64(file);
-          filesWithContent.push({
-            filename: baseName,
-            content_base64: base64,
-          });
-        }
-      }
-
-      console.log(
-        `${LOG_PREFIX} total items=${filesWithContent.length} batching...`
+      // Stream each file to the upload store; the workflow gets references only
+      const embed_columns = parseEmbedColumns(embedColumns);
+      const files = (await uploadFiles(selectedFiles, currentWorkspaceId)).map(
+        (f) =>
+          TABULAR_FILE.test(f.filename) && embed_columns.length > 0
+            ? { ...f, embed_columns }
+            : f,
       );
-      if (filesWithContent.length === 0) {
-        handleError("No files to upload");
-        stopLoading();
-        return;
-      }
-
-      const batches = batchUnderLimit(filesWithContent);
       console.log(
-        `${LOG_PREFIX} batches=${batches.length} (sizes: ${batches.map((b) => b.length).join(", ")})`
+        `${LOG_PREFIX} staged ${files.length} file(s) (${files.reduce((n, f) => n + f.size_bytes, 0)} bytes)`
       );
-      // Schedule all workflows first so each batch gets its own workflow (avoids serialization)
-      const scheduled = await Promise.all(
-        batches.map((batch) =>
-          scheduleAddFilesToDatasetWorkflow({
-            workspace_id: currentWorkspaceId,
-            dataset_id: datasetId,
-            files_with_content: batch,
-          }),
-        ),
-      );
-      const scheduleErrors = scheduled
-        .filter((s): s is { success: false; error: string } => !s.success)
-        .map((s) => s.error);
-      if (scheduleErrors.length > 0) {
-        throw new Error(scheduleErrors.join("; "));
+      // One workflow per upload; it fans out and batches files itself
+      const scheduled = await scheduleAddFilesToDatasetWorkflow({
+        workspace_id: currentWorkspaceId,
+        dataset_id: datasetId,
+        files,
+      });
+      if (!scheduled.success) {
+        throw new Error(scheduled.error);
       }
-      const ids = scheduled.filter(
-        (s): s is { success: true; workflowId: string; runId: string } =>
-          s.success && "workflowId" in s,
-      );
       console.log(
-        `${LOG_PREFIX} scheduled ${ids.length} workflow(s), waiting for results...`
-      );
-      const results = await Promise.all(
-        ids.map(({ workflowId, runId }) =>
-          getWorkflowResult({
-            workflowId,
-            runId,
-            timeoutMs: 5 * 60 * 1000,
-          }),
-        ),
+        `${LOG_PREFIX} scheduled workflowId=${scheduled.workflowId}, waiting for result...`
       );
-      const errors: string[] = [];
-      for (let i = 0; i < results.length; i++) {
-        const r = results[i] as
-          | { success?: boolean; errors?: string[] }
-          | null
-          | undefined;
-        if (r && typeof r === "object" && r.success === false) {
-          const batchErrs = r.errors?.length ? r.errors : ["Workflow failed"];
-          errors.push(...batchErrs.map((e) => `Batch ${i + 1}: ${e}`));
-        }
-      }
-
-      if (errors.length > 0) {
-        throw new Error(errors.join("; "));
+      const result = (await getWorkflowResult({
+        workflowId: scheduled.workflowId,
+        runId: scheduled.runId,
+        timeoutMs: 5 * 60 * 1000,
+      })) as { success?: boolean; errors?: string[] } | null | undefined;
+      if (result && typeof result === "object" && result.success === false) {
+        throw new Error(
+          (result.errors?.length ? result.errors : ["Workflow failed"]).join(
+            "; ",
+          ),
+        );
       }
       handleSuccess();
       setSelectedFiles([]);
+      setEmbedColumns("");
       if (fileInputRef.current) fileInputRef.current.value = "";
       onSeeded?.();
     } catch (err) {
@@ -242,10 +172,25 @@ export function AddFilesDialog({ datasetId, onSeeded }: AddFilesDialogProps) {
               </ul>
             )}
             <p className="text-xs text-muted-foreground">
-              TXT, MD, CSV, JPEG, PNG and documents supported. Max 4 MB per file;
-              large documents are split automatically.
+              TXT, MD, CSV, Parquet, JPEG, PNG and documents supported.
             </p>
           </div>
+          {hasTables && (
+            <div className="space-y-2">
+              <Label htmlFor="embed-columns">Embed columns</Label>
+              <Input
+                id="embed-columns"
+                placeholder="e.g. title, description"
+                value={embedColumns}
+                onChange={(e) => setEmbedColumns(e.target.value)}
+              />
+              <p className="text-xs text-muted-foreground">
+                CSV and Parquet files are stored one row per event. Columns
+                listed here (comma-separated) are embedded for each row;
+                leave empty to store rows without embeddings.
+              </p>
+            </div>
+          )}
         </div>
       </QuickActionDialog>
     </>
@@ -0,0 +1,43 @@
+/**
+ * Stage files through /api/uploads so AddFilesToDatasetWorkflow receives
+ * blob references instead of base64 content (no per-message size limit).
+ */
+
+export interface UploadedFileRef {
+  filename: string;
+  blob_key: string;
+  size_bytes: number;
+  content_hash: string;
+  /** CSV/Parquet: columns embedded per row; none stores rows only */
+  embed_columns?: string[];
+}
+
+export async function uploadFile(
+  file: File,
+  workspaceId: string,
+): Promise<UploadedFileRef> {
+  const filename = file.name || "document";
+  const params = new URLSearchParams({ workspace_id: workspaceId, filename });
+  const response = await fetch(`/api/uploads?${params.toString()}`, {
+    method: "POST",
+    headers: { "Content-Type": file.type || "application/octet-stream" },
+    body: file,
+  });
+  const result = (await response.json().catch(() => null)) as
+    | { success: true; data: UploadedFileRef }
+    | { success: false; error: string }
+    | null;
+  if (!response.ok || !result?.success) {
+    throw new Error(
+      `${filename}: ${result && !result.success ? result.error : `upload failed (${response.status})`}`,
+    );
+  }
+  return result.data;
+}
+
+export async function uploadFiles(
+  files: File[],
+  workspaceId: string,
+): Promise<UploadedFileRef[]> {
+  return Promise.all(files.map((file) => uploadFile(file, workspaceId)));
+}
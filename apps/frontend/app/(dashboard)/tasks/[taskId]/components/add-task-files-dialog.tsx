@@ -24,30 +24,7 @@ import {
   getDatasets,
   createDataset,
 } from "@/app/actions/workflow";
-import {
-  GRPC_MESSAGE_LIMIT_BYTES,
-  SAFE_PAYLOAD_BYTES,
-  splitPdfIntoParts,
-  batchUnderLimit,
-} from "@/app/(dashboard)/datasets/lib/pdf-split";
-
-function readFileAsBase64(file: File): Promise<string> {
-  return new Promise((resolve, reject) => {
-    const reader = new FileReader();
-    reader.onload = () => {
-      const result = reader.result as string;
-      const base64 = result.includes(",") ? result.split(",")[1] : result;
-      resolve(base64 ?? "");
-    };
-    reader.onerror = () => reject(reader.error);
-    reader.readAsDataURL(file);
-  });
-}
-
-function isPdf(file: File): boolean {
-  const name = (file.name || "").toLowerCase();
-  return name.endsWith(".pdf") || file.type === "application/pdf";
-}
+import { uploadFiles } from "@/app/(dashboard)/datasets/lib/upload-files";
 
 const ACCEPT_FILE_TYPES =
   "application/pdf,.pdf,.txt,text/plain,.md,text/markdown,text/csv,.csv,image/jpeg,image/png,.jpg,.jpeg,.png";
@@ -213,17 +190,6 @@ export function AddTaskFilesDialog({
       return;
     }
 
-    const tooLarge = selectedFiles.filter(
-      (f) => !isPdf(f) && f.size > GRPC_MESSAGE_LIMIT_BYTES,
-    );
-    if (tooLarge.length > 0) {
-      const names = tooLarge.map((f) => f.name).join(", ");
-      handleError(
-        `Restack has a 4 MB limit per message. The following files exceed 4 MB: ${names}. Use smaller files or split them; large documents are split automatically.`,
-      );
-      return;
-    }
-
     if (selectedDatasetId === "__new__") {
       handleError("Create a dataset first using the form above, or select an existing dataset.");
       return;
@@ -239,72 +205,31 @@ export function AddTaskFilesDialog({
     try {
       const datasetId = resolvedDatasetId;
 
-      const filesWithContent: { filename: string; content_base64: string }[] =
-        [];
-      for (const file of selectedFiles) {
-        const baseName = file.name || "document";
-        const shouldSplit = isPdf(file) && file.size > SAFE_PAYLOAD_BYTES;
-        if (shouldSplit) {
-          const parts = await splitPdfIntoParts(file, baseName);
-          filesWithContent.push(...parts);
-        } else {
-          const base64 = await readFileAsBase64(file);
-          filesWithContent.push({ filename: baseName, content_base64: base64 });
-        }
-      }
-
-      if (filesWithContent.length === 0) {
-        handleError("No files to upload");
-        stopLoading();
-        return;
-      }
-
-      const batches = batchUnderLimit(filesWithContent);
-      const scheduled = await Promise.all(
-        batches.map((batch) =>
-          scheduleAddFilesToDatasetWorkflow({
-            workspace_id: workspaceId,
-            dataset_id: datasetId,
-            task_id: taskId,
-            files_with_content: batch,
-          }),
-        ),
-      );
-      const scheduleErrors = scheduled
-        .filter((s): s is { success: false; error: string } => !s.success)
-        .map((s) => s.error);
-      if (scheduleErrors.length > 0) {
-        throw new Error(scheduleErrors.join("; "));
-      }
-      const ids = scheduled.filter(
-        (s): s is { success: true; workflowId: string; runId: string } =>
-          s.success && "workflowId" in s,
-      );
-      const results = await Promise.all(
-        ids.map(({ workflowId, runId }) =>
-          getWorkflowResult({
-            workflowId,
-            runId,
-            timeoutMs: 5 * 60 * 1000,
-          }),
-        ),
-      );
-      const errors: string[] = [];
-      for (let i = 0; i < results.length; i++) {
-        const r = results[i] as
-          | { success?: boolean; errors?: string[] }
-          | null
-          | undefined;
-        if (r && typeof r === "object" && r.success === false) {
-          const batchErrs = r.errors?.length ? r.errors : ["Workflow failed"];
-          errors.push(...batchErrs.map((e) => `Batch ${i + 1}: ${e}`));
-        }
+      // Stream each file to the upload store; the workflow gets references only
+      const files = await uploadFiles(selectedFiles, workspaceId);
+      const scheduled = await scheduleAddFilesToDatasetWorkflow({
+        workspace_id: workspaceId,
+        dataset_id: datasetId,
+        task_id: taskId,
+        files,
+      });
+      if (!scheduled.success) {
+        throw new Error(scheduled.error);
       }
-      if (errors.length > 0) {
-        throw new Error(errors.join("; "));
+      const result = (await getWorkflowResult({
+        workflowId: scheduled.workflowId,
+        runId: scheduled.runId,
+        timeoutMs: 5 * 60 * 1000,
+      })) as { success?: boolean; errors?: string[] } | null | undefined;
+      if (result && typeof result === "object" && result.success === false) {
+        throw new Error(
+          (result.errors?.length ? result.errors : ["Workflow failed"]).join(
+            "; ",
+          ),
+        );
       }
       if (temporalAgentId) {
-        const filenames = filesWithContent.map((f) => f.filename);
+        const filenames = files.map((f) => f.filename);
         const parts = [`User uploaded file(s): ${filenames.join(", ")}.`];
         if (datasetId) parts.push(` dataset_id: ${datasetId}`);
         const content = parts.join(" ");
@@ -460,8 +385,7 @@ export function AddTaskFilesDialog({
               </ul>
             )}
             <p className="text-xs text-muted-foreground">
-              TXT, MD, CSV, JPEG, PNG and documents supported. Max 4 MB per file;
-              large documents are split automatically.
+              TXT, MD, CSV, JPEG, PNG and documents supported.
             </p>
           </div>
         </div>
@@ -19,6 +19,8 @@ export interface PerformanceData {
   avgTokens: number;
   totalCost: number;
   taskCount: number;
+  p50Duration?: number;
+  p95Duration?: number;
 }
 
 export interface PerformanceTimeSeries {
@@ -95,6 +97,8 @@ export interface AnalyticsData {
     timeseries: FeedbackTimeSeries[];
     detailed: DetailedFeedback[];
   };
+  // Sections that failed or timed out (the others are still returned)
+  errors?: Record<string, string>;
 }
 
 /**
@@ -1,5 +1,6 @@
 "use server";
 import { client } from "./client";
+import type { UploadedFileRef } from "@/app/(dashboard)/datasets/lib/upload-files";
 
 const BACKEND_TASK_QUEUE = "backend";
 const BACKEND_EMBED_TASK_QUEUE = "backend-embed";
@@ -499,29 +500,32 @@ export async function createTaskForPublicAgent(params: {
   }
 }
 
-/** Schedule AddFilesToDataset workflow (no wait). Use with getWorkflowResult to wait. Ensures multiple batches each get their own workflow. */
+/** Schedule AddFilesToDataset workflow (no wait). Use with getWorkflowResult to wait. Pass files staged via /api/uploads (files_with_content is the legacy inline form). */
 export async function scheduleAddFilesToDatasetWorkflow(params: {
   workspace_id: string;
   dataset_id: string;
   task_id?: string | null;
-  files_with_content: { filename: string; content_base64: string }[];
+  files?: UploadedFileRef[];
+  files_with_content?: { filename: string; content_base64: string }[];
 }): Promise<
   | { success: true; workflowId: string; runId: string }
   | { success: false; error: string; workflowId?: never; runId?: never }
 > {
   try {
-    if (!params.files_with_content?.length) {
+    const fileCount =
+      (params.files?.length ?? 0) + (params.files_with_content?.length ?? 0);
+    if (fileCount === 0) {
       return {
         success: false,
-        error:
-          "files_with_content is required (list of { filename, content_base64 }).",
+        error: "files is required (list of staged uploads from /api/uploads).",
       };
     }
     const input: Record<string, unknown> = {
       workspace_id: params.workspace_id,
       dataset_id: params.dataset_id,
       task_id: params.task_id ?? undefined,
-      files_with_content: params.files_with_content,
+      files: params.files ?? [],
+      files_with_content: params.files_with_content ?? [],
     };
     const { workflowId, runId } = await runWorkflow({
       workflowName: "AddFilesToDatasetWorkflow",
@@ -530,7 +534,7 @@ export async function scheduleAddFilesToDatasetWorkflow(params: {
     });
     if (process.env.NODE_ENV === "development") {
       console.log(
-        `[scheduleAddFilesToDatasetWorkflow] scheduled workflowId=${workflowId} files=${params.files_with_content.length}`,
+        `[scheduleAddFilesToDatasetWorkflow] scheduled workflowId=${workflowId} files=${fileCount}`,
       );
     }
     return { success: true, workflowId, runId };
@@ -548,22 +552,13 @@ export async function addFilesToDataset(params: {
   workspace_id: string;
   dataset_id: string;
   task_id?: string | null;
-  /** Inline file content (base64). Required. */
+  /** Files staged via /api/uploads. */
+  files?: UploadedFileRef[];
+  /** Legacy inline file content (base64). */
   files_with_content?: { filename: string; content_base64: string }[];
 }) {
   try {
-    if (!params.files_with_content?.length) {
-      return {
-        success: false,
-        error:
-          "files_with_content is required (list of { filename, content_base64 }).",
-        data: null,
-      };
-    }
-    const scheduled = await scheduleAddFilesToDatasetWorkflow({
-      ...params,
-      files_with_content: params.files_with_content,
-    });
+    const scheduled = await scheduleAddFilesToDatasetWorkflow(params);
     if ("error" in scheduled) {
       return { success: false, error: scheduled.error, data: null };
     }
@@ -0,0 +1,129 @@
+import { createHash, randomUUID } from "crypto";
+import { createReadStream, createWriteStream } from "fs";
+import { mkdir, rename, rm } from "fs/promises";
+import os from "os";
+import path from "path";
+import { Readable, Transform } from "stream";
+import { pipeline } from "stream/promises";
+import type { ReadableStream as NodeReadableStream } from "stream/web";
+import { NextRequest, NextResponse } from "next/server";
+import { executeWorkflow } from "@/app/actions/workflow";
+import type { UploadedFileRef } from "@/app/(dashboard)/datasets/lib/upload-files";
+
+export const runtime = "nodejs";
+
+/**
+ * Upload staging: streams the request body into the blob store the backend
+ * reads (BLOB_STORE_DIR, shared volume in docker-compose, or the object
+ * store named by BLOB_STORE_URL) and returns a reference. Workflows receive
+ * only { filename, blob_key }, never file bytes.
+ * Each upload gets its own key, uploads/<workspace_id>/<sha256>-<uuid><ext>,
+ * so ingestion can delete it without touching a concurrent upload of the
+ * same file; uploads never ingested are removed by the backend's
+ * SweepAbandonedUploadsWorkflow.
+ */
+const BLOB_STORE_DIR =
+  process.env.BLOB_STORE_DIR || path.join(os.tmpdir(), "restack-blobs");
+// Set when blobs live in an object store; uploads then go through a
+// presigned PUT URL from the backend instead of BLOB_STORE_DIR.
+const BLOB_STORE_URL = process.env.BLOB_STORE_URL || "";
+const UPLOAD_MAX_BYTES = Number(
+  process.env.UPLOAD_MAX_BYTES || 512 * 1024 * 1024,
+);
+const SAFE_SEGMENT = /^[A-Za-z0-9_-]+$/;
+const SAFE_EXTENSION = /^\.[a-z0-9]{1,10}$/;
+
+export async function POST(request: NextRequest) {
+  const workspaceId = request.nextUrl.searchParams.get("workspace_id") ?? "";
+  const filename = request.nextUrl.searchParams.get("filename") ?? "";
+  if (!SAFE_SEGMENT.test(workspaceId) || !filename) {
+    return NextResponse.json(
+      { success: false, error: "workspace_id and filename are required" },
+      { status: 400 },
+    );
+  }
+  if (!request.body) {
+    return NextResponse.json(
+      { success: false, error: "Empty upload" },
+      { status: 400 },
+    );
+  }
+  const extension = path.extname(filename).toLowerCase();
+  const suffix = SAFE_EXTENSION.test(extension) ? extension : "";
+
+  const dir = BLOB_STORE_URL
+    ? path.join(os.tmpdir(), "restack-uploads")
+    : path.join(BLOB_STORE_DIR, "uploads", workspaceId);
+  const tmpPath = path.join(dir, `.upload.${randomUUID()}.tmp`);
+  const hash = createHash("sha256");
+  let size = 0;
+  try {
+    await mkdir(dir, { recursive: true });
+    const meter = new Transform({
+      transform(chunk: Buffer, _encoding, callback) {
+        size += chunk.length;
+        if (size > UPLOAD_MAX_BYTES) {
+          callback(new Error(`File exceeds ${UPLOAD_MAX_BYTES} bytes`));
+          return;
+        }
+        hash.update(chunk);
+        callback(null, chunk);
+      },
+    });
+    await pipeline(
+      Readable.fromWeb(request.body as unknown as NodeReadableStream),
+      meter,
+      createWriteStream(tmpPath),
+    );
+    const contentHash = hash.digest("hex");
+    const blobKey = `uploads/${workspaceId}/${contentHash}-${randomUUID()}${suffix}`;
+    if (BLOB_STORE_URL) {
+      await putToObjectStore(workspaceId, blobKey, tmpPath, size);
+      await rm(tmpPath, { force: true });
+    } else {
+      await rename(tmpPath, path.join(BLOB_STORE_DIR, blobKey));
+    }
+    const ref: UploadedFileRef = {
+      filename,
+      blob_key: blobKey,
+      size_bytes: size,
+      content_hash: contentHash,
+    };
+    return NextResponse.json({ success: true, data: ref });
+  } catch (error) {
+    console.error("Upload staging failed:", error);
+    await rm(tmpPath, { force: true });
+    return NextResponse.json(
+      {
+        success: false,
+        error: error instanceof Error ? error.message : "Upload failed",
+      },
+      { status: size > UPLOAD_MAX_BYTES ? 413 : 500 },
+    );
+  }
+}
+
+async function putToObjectStore(
+  workspaceId: string,
+  blobKey: string,
+  filePath: string,
+  size: number,
+) {
+  const result = await executeWorkflow("CreateUploadUrlWorkflow", {
+    workspace_id: workspaceId,
+    blob_key: blobKey,
+  });
+  const url = (result.data as { url?: string | null } | null)?.url;
+  if (!result.success || !url) {
+    throw new Error(result.error || "Blob store did not return an upload URL");
+  }
+  const response = await fetch(url, {
+    method: "PUT",
+    body: Readable.toWeb(createReadStream(filePath)) as ReadableStream,
+    headers: { "Content-Length": String(size) },
+    duplex: "half",
+  } as RequestInit);
+  if (!response.ok) {
+    throw new Error(`Blob store upload failed: ${response.status}`);
+  }
+}
@@ -23,6 +23,11 @@ with import_functions():
     )
 
 
+def _reads_raw_data(query: str) -> bool:
+    """True if the query reads raw_data paths of pipeline_events."""
+    return "pipeline_events" in query and "raw_data." in query
+
+
 @workflow.defn(
     mcp=True,
     description="""Run a SELECT query in ClickHouse.
@@ -56,6 +61,22 @@ class ClickHouseRunSelectQuery:
             f"ClickHouseRunSelectQuery started with query: {workflow_input.query}"
         )
         try:
+            if _reads_raw_data(workflow_input.query):
+                # The backend records raw_data path usage, swaps in
+                # promoted columns and runs the query in one step
+                result = await workflow.step(
+                    function="run_raw_data_select_query",
+                    function_input={
+                        "query": workflow_input.query
+                    },
+                    task_queue="backend",
+                    start_to_close_timeout=timedelta(seconds=60),
+                )
+                return (
+                    ClickHouseRunSelectQueryOutput.model_validate(
+                        result
+                    )
+                )
             return await workflow.step(
                 task_queue="mcp_server",
                 function=clickhouse_run_select_query,
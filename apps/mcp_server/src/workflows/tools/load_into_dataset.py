@@ -1,31 +1,30 @@
 """MCP tool for loading data into datasets."""
 
+import asyncio
+import itertools
 import json
 import re
+from datetime import timedelta
 from typing import Any
 
 from pydantic import BaseModel, Field
-from restack_ai.workflow import NonRetryableError, log, workflow
-
-# Import PipelineEventInput to create proper objects
-# Note: This creates a cross-app dependency but is necessary for proper type validation
-try:
-    from apps.backend.src.functions.data_ingestion import (
-        PipelineEventInput,
-    )
-except ImportError:
-    # Fallback: Define a local version if import fails
-    class PipelineEventInput(BaseModel):
-        agent_id: str = Field(..., min_length=1)
-        task_id: str | None = None
-        workspace_id: str = Field(..., min_length=1)
-        dataset_id: str | None = None
-        event_name: str = Field(..., min_length=1)
-        raw_data: dict[str, Any] = Field(default_factory=dict)
-        transformed_data: dict[str, Any] | None = None
-        tags: list[str] | None = None
-        embedding: list[float] | None = None
-        event_timestamp: str | None = None
+from restack_ai.workflow import (
+    NonRetryableError,
+    log,
+    workflow,
+    workflow_info,
+)
+
+# Chunking bounds. Each chunk is one ingest step, so MAX_CHUNK_BYTES keeps
+# step payloads well under Temporal's 2 MB payload limit. Loads too large to
+# pass inline are uploaded first and passed as input_blob_key; the backend
+# then splits them into staged chunks and history carries only blob keys.
+MAX_CHUNK_ROWS = 5_000
+MAX_CHUNK_BYTES = 1_000_000
+# Ingest steps running at once.
+MAX_PARALLEL_CHUNKS = 4
+# Approximate serialized size of the event envelope around each record.
+EVENT_OVERHEAD_BYTES = 256
 
 
 def sanitize_json_string(json_str: str) -> str:
@@ -112,9 +111,13 @@ class LoadIntoDatasetInput(BaseModel):
     """Input for loading data into a dataset."""
 
     input_data: list[dict[str, Any]] = Field(
-        ...,
+        default_factory=list,
         description="Data to load as an array of objects. Example: [{'record': {...}}] or [{'record': {...}}, {'record': {...}}]",
     )
+    input_blob_key: str | None = Field(
+        default=None,
+        description="Instead of input_data: blob store key (uploads/<workspace_id>/...) of an uploaded JSON array or JSON Lines file of records. Use for large loads so the records never enter workflow history.",
+    )
     dataset_name: str = Field(
         ..., description="Name of the dataset"
     )
@@ -133,6 +136,25 @@ class LoadIntoDatasetInput(BaseModel):
     tags: list[str] | None = Field(
         default=None, description="Tags for the event"
     )
+    chunk_indexes: list[int] | None = Field(
+        default=None,
+        description="Resume a partial load: only ingest these chunks (failed_chunk_indexes from a previous call with the same input_data or input_blob_key).",
+    )
+    load_id: str | None = Field(
+        default=None,
+        description="With chunk_indexes: load_id from the previous call, so resumed rows get the same ids.",
+    )
+
+
+class LoadChunkReport(BaseModel):
+    """Result of ingesting one chunk."""
+
+    index: int
+    rows: int
+    success: bool
+    inserted_rows: int = 0
+    staged: bool = False
+    error: str | None = None
 
 
 class LoadIntoDatasetOutput(BaseModel):
@@ -151,6 +173,79 @@ class LoadIntoDatasetOutput(BaseModel):
         ...,
         description="Name of the dataset where data was loaded",
     )
+    chunks: list[LoadChunkReport] = Field(
+        default_factory=list,
+        description="Per-chunk ingestion report",
+    )
+    failed_chunk_indexes: list[int] = Field(
+        default_factory=list,
+        description="Chunks to pass as chunk_indexes to retry only what failed",
+    )
+    load_id: str = Field(
+        default="",
+        description="Pass back as load_id with chunk_indexes when resuming",
+    )
+
+
+def split_into_chunks(
+    events: list[dict[str, Any]],
+) -> list[tuple[list[dict[str, Any]], int]]:
+    """Split events into (chunk, approx_bytes) bounded by MAX_CHUNK_ROWS and MAX_CHUNK_BYTES.
+
+    Deterministic for the same input, so chunk indexes are stable across calls.
+    A single record larger than MAX_CHUNK_BYTES becomes its own chunk.
+    """
+    chunks: list[tuple[list[dict[str, Any]], int]] = []
+    current: list[dict[str, Any]] = []
+    current_bytes = 0
+    for event in events:
+        size = (
+            len(json.dumps(event["raw_data"], default=str))
+            + EVENT_OVERHEAD_BYTES
+        )
+        if current and (
+            len(current) >= MAX_CHUNK_ROWS
+            or current_bytes + size > MAX_CHUNK_BYTES
+        ):
+            chunks.append((current, current_bytes))
+            current, current_bytes = [], 0
+        current.append(event)
+        current_bytes += size
+    if current:
+        chunks.append((current, current_bytes))
+    return chunks
+
+
+def inline_chunks(
+    events: list[dict[str, Any]],
+    load_id: str,
+    chunk_indexes: list[int] | None,
+) -> tuple[list[dict[str, Any]], int]:
+    """Selected chunks of an inline load, and the total chunk count.
+
+    Each chunk carries the row number of its first event in the load; the
+    backend numbers events by it within load_id, so equal records in
+    different chunks are stored as distinct rows (staged chunks get their
+    ids when they are staged).
+    """
+    chunks = split_into_chunks(events)
+    first_rows = itertools.accumulate(
+        (len(chunk) for chunk, _ in chunks), initial=0
+    )
+    selected = [
+        {
+            "index": index,
+            "rows": len(chunk),
+            "events": chunk,
+            "load_id": load_id,
+            "first_row": first_row,
+        }
+        for index, ((chunk, _), first_row) in enumerate(
+            zip(chunks, first_rows, strict=False)
+        )
+        if chunk_indexes is None or index in chunk_indexes
+    ]
+    return selected, len(chunks)
 
 
 @workflow.defn(mcp=True, description="Load data into dataset")
@@ -172,12 +267,87 @@ class LoadIntoDataset:
         error_message = f"Failed to ingest data: {error_details}"
         raise NonRetryableError(error_message)
 
+    async def _ingest_chunk(
+        self,
+        chunk: dict[str, Any],
+        storage_type: str,
+        slots: asyncio.Semaphore,
+    ) -> LoadChunkReport:
+        """Ingest one chunk (see inline_chunks), inline or by its staged key."""
+        index = chunk["index"]
+        rows = chunk["rows"]
+        staged = chunk.get("blob_key") is not None
+        try:
+            async with slots:
+                ingest_result = await workflow.step(
+                    function=(
+                        "ingest_staged_pipeline_events_cockroachdb"
+                        if storage_type == "cockroachdb"
+                        else "ingest_pipeline_events_columnar"
+                    ),
+                    function_input=(
+                        {"blob_keys": [chunk["blob_key"]]}
+                        if staged
+                        else {
+                            "chunks": [chunk["events"]],
+                            "load_id": chunk["load_id"],
+                            "first_row": chunk["first_row"],
+                        }
+                    ),
+                    task_queue="backend",
+                    start_to_close_timeout=timedelta(minutes=5),
+                )
+        except Exception as step_error:  # noqa: BLE001
+            error_message = f"Workflow step failed: {type(step_error).__name__}: {step_error}"
+            log.error(f"Chunk {index} failed: {error_message}")
+            return LoadChunkReport(
+                index=index,
+                rows=rows,
+                success=False,
+                staged=staged,
+                error=error_message,
+            )
+
+        if not ingest_result.get("success"):
+            log.error(
+                f"Chunk {index} ingestion failed with details: {ingest_result}"
+            )
+            return LoadChunkReport(
+                index=index,
+                rows=rows,
+                success=False,
+                # Blocks committed before the failing one
+                inserted_rows=ingest_result.get(
+                    "inserted_rows", 0
+                ),
+                staged=staged,
+                error=ingest_result.get("error", "Unknown error"),
+            )
+        return LoadChunkReport(
+            index=index,
+            rows=rows,
+            success=True,
+            inserted_rows=ingest_result.get("inserted_rows", 0),
+            staged=staged,
+        )
+
     @workflow.run
     async def run(
         self, workflow_input: LoadIntoDatasetInput
     ) -> LoadIntoDatasetOutput:
         """Load data into dataset."""
-        log.info("LoadIntoDataset started", input=workflow_input)
+        log.info(
+            "LoadIntoDataset started",
+            dataset=workflow_input.dataset_name,
+            records=len(workflow_input.input_data),
+            input_blob_key=workflow_input.input_blob_key,
+        )
+
+        if workflow_input.input_blob_key and (
+            workflow_input.input_data
+        ):
+            msg = "Pass either input_data or input_blob_key, not both"
+            raise NonRetryableError(msg)
 
         try:
             # Process the data - ensure all records are dictionaries
@@ -190,24 +360,19 @@ class LoadIntoDataset:
                 else:
                     processed_data.append(record)
 
-            # Check if dataset exists, create if it doesn't
-
-            # Get existing datasets to check if our dataset exists
-            datasets_result = await workflow.step(
-                function="datasets_read",
+            # Resolve dataset by name; pipeline_events.dataset_id must match the
+            # UUID used by QueryDatasetEventsWorkflow / UI (not the display name).
+            resolve_result = await workflow.step(
+                function="datasets_resolve_by_name",
                 function_input={
-                    "workspace_id": workflow_input.workspace_id
+                    "workspace_id": workflow_input.workspace_id,
+                    "name": workflow_input.dataset_name,
                 },
                 task_queue="backend",
             )
-
-            # Resolve dataset by name; pipeline_events.dataset_id must match the
-            # UUID used by QueryDatasetEventsWorkflow / UI (not the display name).
-            matched: dict[str, Any] | None = None
-            for dataset in datasets_result["datasets"]:
-                if dataset["name"] == workflow_input.dataset_name:
-                    matched = dataset
-                    break
+            matched: dict[str, Any] | None = resolve_result.get(
+                "dataset"
+            )
 
             if matched is None:
                 self._raise_dataset_not_found(
@@ -225,82 +390,117 @@ class LoadIntoDataset:
                 or workflow_input.dataset_name
             )
 
-            # Build events list (same shape regardless of storage backend)
-            events = []
-            for record in processed_data:
-                event = PipelineEventInput(
-                    agent_id=workflow_input.agent_id,
-                    task_id=workflow_input.task_id,
-                    workspace_id=workflow_input.workspace_id,
-                    dataset_id=dataset_row_id,
-                    event_name=workflow_input.event_name,
-                    raw_data=record,
-                    transformed_data=None,
-                    tags=workflow_input.tags
-                    or [
-                        workflow_input.event_name,
-                        workflow_input.dataset_name,
-                    ],
-                    embedding=None,
-                    event_timestamp=None,
-                )
-                events.append(event)
-
-            # Route ingestion to the correct storage backend
-            ingest_function = (
-                "ingest_pipeline_events_cockroachdb"
-                if storage_type == "cockroachdb"
-                else "ingest_pipeline_events"
+            # Build events (same shape regardless of storage backend);
+            # plain dicts so the backend can build columns without re-validation.
+            load_id = (
+                workflow_input.load_id
+                or workflow_info().workflow_id
             )
+            tags = workflow_input.tags or [
+                workflow_input.event_name,
+                workflow_input.dataset_name,
+            ]
+            if workflow_input.input_blob_key:
+                staged_result = await workflow.step(
+                    function="stage_load_chunks",
+                    function_input={
+                        "blob_key": workflow_input.input_blob_key,
+                        "workspace_id": workflow_input.workspace_id,
+                        "agent_id": workflow_input.agent_id,
+                        "task_id": workflow_input.task_id,
+                        "dataset_id": dataset_row_id,
+                        "event_name": workflow_input.event_name,
+                        "tags": tags,
+                        "chunk_indexes": workflow_input.chunk_indexes,
+                        "max_chunk_rows": MAX_CHUNK_ROWS,
+                        "max_chunk_bytes": MAX_CHUNK_BYTES,
+                    },
+                    task_queue="backend",
+                    start_to_close_timeout=timedelta(minutes=10),
+                )
+                staged_chunks = staged_result["chunks"]
+                total_rows = staged_result["total_rows"]
+                pending = [
+                    {
+                        "index": chunk["index"],
+                        "rows": chunk["rows"],
+                        "blob_key": chunk["blob_key"],
+                    }
+                    for chunk in staged_chunks
+                    if chunk.get("blob_key")
+                ]
+                chunk_count = len(staged_chunks)
+            else:
+                events = [
+                    {
+                        "agent_id": workflow_input.agent_id,
+                        "task_id": workflow_input.task_id,
+                        "workspace_id": workflow_input.workspace_id,
+                        "dataset_id": dataset_row_id,
+                        "event_name": workflow_input.event_name,
+                        "raw_data": record,
+                        "tags": tags,
+                    }
+                    for record in processed_data
+                ]
+                total_rows = len(events)
+                pending, chunk_count = inline_chunks(
+                    events, load_id, workflow_input.chunk_indexes
+                )
             log.info(
-                f"Ingesting {len(events)} events into {storage_type} "
-                f"via {ingest_function} "
+                f"Ingesting {total_rows} events into {storage_type} "
+                f"as {len(pending)}/{chunk_count} chunks "
                 f"(dataset={workflow_input.dataset_name}, workspace={workflow_input.workspace_id})"
             )
-            log.info(
-                f"First event sample: {events[0].model_dump() if events else 'No events'}"
-            )
 
-            try:
-                ingest_result = await workflow.step(
-                    function=ingest_function,
-                    function_input=events,
-                    task_queue="backend",
+            # At most MAX_PARALLEL_CHUNKS steps at once; a slow chunk holds
+            # only its own slot
+            slots = asyncio.Semaphore(MAX_PARALLEL_CHUNKS)
+            reports: list[LoadChunkReport] = list(
+                await asyncio.gather(
+                    *(
+                        self._ingest_chunk(
+                            chunk, storage_type, slots
+                        )
+                        for chunk in pending
+                    )
                 )
-            except Exception as step_error:
-                error_message = f"Workflow step failed: {type(step_error).__name__}: {step_error}"
-                log.error(f"Detailed step error: {error_message}")
-                log.error(
-                    f"Step error args: {getattr(step_error, 'args', 'No args')}"
-                )
-                raise NonRetryableError(
-                    error_message
-                ) from step_error
+            )
 
-            if not ingest_result.get("success"):
-                error_details = ingest_result.get(
-                    "error", "Unknown error"
+            failed = [r.index for r in reports if not r.success]
+            inserted_rows = sum(r.inserted_rows for r in reports)
+            if reports and len(failed) == len(reports):
+                self._raise_ingestion_failed(
+                    reports[0].error or "Unknown error"
                 )
-                log.error(
-                    f"Ingestion failed with details: {ingest_result}"
+
+            if failed:
+                message = (
+                    f"Loaded {inserted_rows} rows into dataset '{workflow_input.dataset_name}'; "
+                    f"{len(failed)} of {len(reports)} chunks failed. "
+                    f"Retry with chunk_indexes={failed} and load_id='{load_id}' "
+                    "to load only the failed chunks."
                 )
-                self._raise_ingestion_failed(error_details)
+            else:
+                message = f"Successfully loaded {inserted_rows} rows into dataset '{workflow_input.dataset_name}'"
 
             output = LoadIntoDatasetOutput(
-                success=True,
-                message=f"Successfully loaded {ingest_result.get('inserted_rows', 0)} rows into dataset '{workflow_input.dataset_name}'",
-                inserted_rows=ingest_result.get(
-                    "inserted_rows", 0
-                ),
+                success=not failed,
+                message=message,
+                inserted_rows=inserted_rows,
                 dataset_name=workflow_input.dataset_name,
+                chunks=reports,
+                failed_chunk_indexes=failed,
+                load_id=load_id,
             )
 
             log.info(
-                "LoadIntoDataset completed successfully",
+                "LoadIntoDataset completed",
                 dataset=output.dataset_name,
                 rows=output.inserted_rows,
                 storage_type=storage_type,
-                table=ingest_result.get("table_name", "unknown"),
+                chunks=len(reports),
+                failed_chunks=len(failed),
             )
 
         except Exception as e:
@@ -243,23 +243,17 @@ class MockAIIntegration:
                     EMPTY_GENERATED_RECORDS_MESSAGE
                 )
 
-            datasets_result = await workflow.step(
-                function="datasets_read",
+            resolve_result = await workflow.step(
+                function="datasets_resolve_by_name",
                 function_input={
-                    "workspace_id": workflow_input.workspace_id
+                    "workspace_id": workflow_input.workspace_id,
+                    "name": workflow_input.dataset_name,
                 },
                 task_queue="backend",
             )
-            datasets_payload = _as_dict(datasets_result)
-
-            dataset: dict[str, Any] | None = None
-            for item in datasets_payload.get("datasets", []):
-                if (
-                    item.get("name")
-                    == workflow_input.dataset_name
-                ):
-                    dataset = item
-                    break
+            dataset: dict[str, Any] | None = _as_dict(
+                resolve_result
+            ).get("dataset")
 
             if dataset is None:
                 create_result = await workflow.step(
@@ -3,7 +3,13 @@
 from datetime import timedelta
 
 from pydantic import BaseModel, Field
-from restack_ai.workflow import NonRetryableError, log, workflow
+from restack_ai.workflow import (
+    NonRetryableError,
+    ParentClosePolicy,
+    log,
+    workflow,
+)
+from temporalio.exceptions import WorkflowAlreadyStartedError
 
 
 class ViewColumnSpec(BaseModel):
@@ -134,6 +140,23 @@ class UpdateView:
                     success=False,
                     error="Failed to update task with view",
                 )
+            # Recompile the task's views in the background; one sync per
+            # task at a time, and a running one re-reads view_specs
+            try:
+                await workflow.child_start(
+                    workflow="SyncCompiledViewsWorkflow",
+                    workflow_id=f"sync_compiled_views_{workflow_input.task_id}",
+                    workflow_input={
+                        "task_id": workflow_input.task_id
+                    },
+                    task_queue="backend",
+                    parent_close_policy=ParentClosePolicy.ABANDON,
+                )
+            except WorkflowAlreadyStartedError:
+                log.info(
+                    "Compiled views sync already running",
+                    task_id=workflow_input.task_id,
+                )
             return UpdateViewOutput(
                 success=True,
                 view_id=workflow_input.view_id,
@@ -0,0 +1,28 @@
+-- Full-text search column for dataset events
+-- Materializes the searchable text from event_name and the raw_data paths used for
+-- content (records loaded via LoadIntoDataset) and text (document chunks), lower-cased
+-- so LIKE filters can use the token and ngram bloom filter skip indexes below instead
+-- of stringifying raw_data on every row.
+
+USE boilerplate_clickhouse;
+
+ALTER TABLE pipeline_events
+    ADD COLUMN IF NOT EXISTS search_text String MATERIALIZED lower(concatWithSeparator(
+        ' ',
+        event_name,
+        ifNull(toString(raw_data.content), ''),
+        ifNull(toString(raw_data.text), '')
+    ));
+
+-- Whole-word lookups
+ALTER TABLE pipeline_events
+    ADD INDEX IF NOT EXISTS idx_pipeline_search_tokens search_text TYPE tokenbf_v1(32768, 3, 0) GRANULARITY 1;
+
+-- Substring lookups (LIKE '%q%')
+ALTER TABLE pipeline_events
+    ADD INDEX IF NOT EXISTS idx_pipeline_search_ngrams search_text TYPE ngrambf_v1(3, 65536, 3, 0) GRANULARITY 1;
+
+-- Backfill existing parts
+ALTER TABLE pipeline_events MATERIALIZE COLUMN search_text;
+ALTER TABLE pipeline_events MATERIALIZE INDEX idx_pipeline_search_tokens;
+ALTER TABLE pipeline_events MATERIALIZE INDEX idx_pipeline_search_ngrams;
@@ -0,0 +1,54 @@
+-- Document chunk columns and dataset file manifest
+-- Promotes raw_data.source and raw_data.chunk_index (written by the EmbedAnything
+-- adapter) to materialized columns so listing and deleting files no longer
+-- stringify the JSON column on every row, and adds dataset_files: one row per
+-- ingested file, written at ingest time, so listing files is a key lookup.
+
+USE boilerplate_clickhouse;
+
+ALTER TABLE pipeline_events
+    ADD COLUMN IF NOT EXISTS source String MATERIALIZED ifNull(toString(raw_data.source), '');
+
+ALTER TABLE pipeline_events
+    ADD COLUMN IF NOT EXISTS chunk_index Nullable(UInt32) MATERIALIZED toUInt32OrNull(toString(raw_data.chunk_index));
+
+ALTER TABLE pipeline_events
+    ADD INDEX IF NOT EXISTS idx_pipeline_source source TYPE bloom_filter GRANULARITY 1;
+
+-- Backfill existing parts
+ALTER TABLE pipeline_events MATERIALIZE COLUMN source;
+ALTER TABLE pipeline_events MATERIALIZE COLUMN chunk_index;
+ALTER TABLE pipeline_events MATERIALIZE INDEX idx_pipeline_source;
+
+-- One row per (workspace, dataset, source); re-ingesting a file replaces its row
+-- and deleting it writes a row with is_deleted = 1. Read with FINAL.
+CREATE TABLE IF NOT EXISTS dataset_files (
+    workspace_id UUID,
+    dataset_id String,
+    source String,
+    task_id Nullable(UUID),
+    chunk_count UInt32,
+    size_bytes UInt64,
+    content_hash String, -- sha256 of the uploaded file
+    embed_model LowCardinality(String),
+    ingested_at DateTime64(3) DEFAULT now64(3),
+    is_deleted UInt8 DEFAULT 0
+) ENGINE = ReplacingMergeTree(ingested_at, is_deleted)
+ORDER BY (workspace_id, dataset_id, source)
+SETTINGS index_granularity = 8192;
+
+-- Seed the manifest from chunks already ingested (hash and model are unknown)
+INSERT INTO dataset_files (workspace_id, dataset_id, source, task_id, chunk_count, size_bytes, content_hash, embed_model, ingested_at)
+SELECT
+    workspace_id,
+    ifNull(dataset_id, ''),
+    source,
+    any(task_id),
+    toUInt32(count()),
+    sum(length(ifNull(toString(raw_data.text), ''))),
+    '',
+    '',
+    max(ingested_at)
+FROM pipeline_events
+WHERE source != ''
+GROUP BY workspace_id, dataset_id, source;
@@ -0,0 +1,10 @@
+-- Insert deduplication for pipeline_events
+-- Ingest paths assign deterministic row ids and send insert_deduplication_token per
+-- block (hash of the block's ids). Non-replicated MergeTree only honours tokens when
+-- a deduplication window is set, so retried or repeated blocks within the last
+-- 10000 inserts are dropped instead of written twice.
+
+USE boilerplate_clickhouse;
+
+ALTER TABLE pipeline_events
+    MODIFY SETTING non_replicated_deduplication_window = 10000;
@@ -0,0 +1,19 @@
+-- raw_data path usage
+-- Counts how often each raw_data.<path> is filtered, sorted or projected per
+-- dataset (SQL tools and view reads). The promote_hot_raw_data_paths job reads
+-- it to add typed MATERIALIZED columns for the hottest paths.
+
+USE boilerplate_clickhouse;
+
+CREATE TABLE IF NOT EXISTS raw_data_path_usage (
+    date Date DEFAULT today(),
+    workspace_id String, -- '' when the query is not scoped to a workspace
+    dataset_id String, -- '' when the query is not scoped to a dataset
+    path String, -- dotted path below raw_data, e.g. 'address.city'
+    usage LowCardinality(String), -- 'filter', 'sort' or 'project'
+    hits UInt64
+) ENGINE = SummingMergeTree(hits)
+PARTITION BY toYYYYMM(date)
+ORDER BY (date, workspace_id, dataset_id, path, usage)
+TTL date + INTERVAL 90 DAY
+SETTINGS index_granularity = 8192;
@@ -0,0 +1,23 @@
+-- Compiled dataset views
+-- Each saved view (tasks.view_specs) gets a view_rows_<hash> table fed by a
+-- materialized view over pipeline_events that pre-extracts the view's columns.
+-- This registry maps a view to its current table; a changed spec gets a new
+-- table (the hash covers the spec) and the old one is dropped once the new one
+-- is backfilled. Read with FINAL.
+
+USE boilerplate_clickhouse;
+
+CREATE TABLE IF NOT EXISTS compiled_views (
+    workspace_id UUID,
+    dataset_id String,
+    view_id String,
+    task_id String,
+    table_name String,
+    spec_hash String,
+    column_keys Array(String), -- view column keys, in table order (c0, c1, ...)
+    status LowCardinality(String), -- 'backfilling' or 'ready'
+    updated_at DateTime64(3) DEFAULT now64(3),
+    is_deleted UInt8 DEFAULT 0
+) ENGINE = ReplacingMergeTree(updated_at, is_deleted)
+ORDER BY (workspace_id, dataset_id, view_id)
+SETTINGS index_granularity = 8192;
@@ -0,0 +1,18 @@
+-- Chunk embedding cache
+-- The embed workers look up each chunk here before running the model, keyed by
+-- model, chunking config and the sha256 of the whitespace-normalized chunk text,
+-- so re-uploads and the same document in several datasets reuse embeddings.
+-- Entries expire 180 days after they were embedded; a later miss re-embeds them.
+
+USE boilerplate_clickhouse;
+
+CREATE TABLE IF NOT EXISTS embedding_cache (
+    model_id LowCardinality(String),
+    chunk_config LowCardinality(String), -- e.g. 'sentence:1200'
+    text_hash FixedString(64), -- hex sha256 of the normalized chunk text
+    embedding Array(Float32),
+    created_at DateTime DEFAULT now()
+) ENGINE = ReplacingMergeTree(created_at)
+ORDER BY (model_id, chunk_config, text_hash)
+TTL created_at + INTERVAL 180 DAY
+SETTINGS index_granularity = 8192;
@@ -0,0 +1,23 @@
+-- Int8 scalar-quantized embeddings for semantic search
+-- embedding_i8 holds each vector scaled by its largest absolute component to
+-- [-127, 127] (384 bytes for a 384-dim vector instead of 1.5 KB). Semantic
+-- search ranks candidates by cosine distance over embedding_i8 (the scale
+-- cancels out in cosine) and re-ranks the top candidates on the exact Float32
+-- embedding, so the coarse pass reads a quarter of the vector bytes.
+--
+-- This speeds up search scans; it does not save storage. The Float32
+-- embedding stays: exact re-ranking, exact searches, re-embedding and
+-- exports read it, and embedding_i8 is computed from it. Vector storage grows
+-- by about a quarter.
+
+USE boilerplate_clickhouse;
+
+ALTER TABLE pipeline_events
+    ADD COLUMN IF NOT EXISTS embedding_scale Float32 MATERIALIZED arrayMax(arrayMap(x -> abs(x), embedding));
+
+ALTER TABLE pipeline_events
+    ADD COLUMN IF NOT EXISTS embedding_i8 Array(Int8) MATERIALIZED arrayMap(x -> toInt8(round(x * 127 / greatest(embedding_scale, 1e-12))), embedding) CODEC(ZSTD(1));
+
+-- Backfill existing parts
+ALTER TABLE pipeline_events MATERIALIZE COLUMN embedding_scale;
+ALTER TABLE pipeline_events MATERIALIZE COLUMN embedding_i8;
@@ -0,0 +1,34 @@
+-- Model-versioned embeddings
+-- pipeline_events.embedding_model records which model produced embedding
+-- ('' when a row has no embedding or it came from a caller). Rows embedded
+-- before this migration all came from the former hard-coded model.
+--
+-- pipeline_event_embeddings holds a dataset's vectors for another model:
+-- ReembedDatasetWorkflow fills it while reads stay pinned to the dataset's
+-- current model (datasets.storage_config.embedding.model), then switches the
+-- dataset over. Semantic search for model M reads pipeline_events rows with
+-- embedding_model = M plus this table's rows for M, so chunks are never
+-- copied and every other dataset read is unaffected.
+
+USE boilerplate_clickhouse;
+
+ALTER TABLE pipeline_events
+    ADD COLUMN IF NOT EXISTS embedding_model LowCardinality(String) DEFAULT '';
+
+ALTER TABLE pipeline_events
+    UPDATE embedding_model = 'sentence-transformers/all-MiniLM-L6-v2'
+    WHERE notEmpty(embedding) AND embedding_model = '';
+
+CREATE TABLE IF NOT EXISTS pipeline_event_embeddings (
+    workspace_id UUID,
+    dataset_id String,
+    embedding_model LowCardinality(String),
+    id UUID, -- pipeline_events.id
+    source String, -- pipeline_events.source, for deletes by file
+    embedding Array(Float32),
+    embedding_scale Float32 MATERIALIZED arrayMax(arrayMap(x -> abs(x), embedding)),
+    embedding_i8 Array(Int8) MATERIALIZED arrayMap(x -> toInt8(round(x * 127 / greatest(embedding_scale, 1e-12))), embedding) CODEC(ZSTD(1)),
+    created_at DateTime64(3) DEFAULT now64(3)
+) ENGINE = ReplacingMergeTree(created_at)
+ORDER BY (workspace_id, dataset_id, embedding_model, id)
+SETTINGS index_granularity = 8192, non_replicated_deduplication_window = 1000;
@@ -0,0 +1,184 @@
+-- task_metrics hourly and daily rollups
+-- Analytics (performance, quality, overview, feedback) used to aggregate raw
+-- task_metrics rows over up to 90 days per request. These AggregatingMergeTree
+-- tables hold per-hour and per-day states by (workspace_id, metric_category,
+-- agent_id, agent_version, metric_name), fed by materialized views.
+--
+-- Readers (src/functions/analytics_helpers.py rollup_source) stay exact for a
+-- window starting at now() - N DAY: raw rows for the window's first partial
+-- hour, hourly rows for the rest of its first day, daily rows after that.
+-- Hourly rows are only needed that far back, so they expire after 100 days.
+--
+-- The state expressions below must match ROLLUP_STATES in analytics_helpers.py
+-- (reads union rollup rows with raw rows aggregated the same way).
+--
+-- Backfill and views split task_metrics at one cutoff on created_at (set by
+-- the server on insert), kept in task_metrics_rollup_cutoff: the views only
+-- take rows at or after it, the backfill only rows before it. While the
+-- cutoff table is empty the views take nothing. Each run empties it, empties
+-- the rollups, sets a cutoff just ahead of now (so it is taken after the
+-- views exist), waits for it to pass and backfills, so a rerun after a
+-- failure rebuilds the rollups instead of adding to them.
+--
+-- packages/database/scripts/check_task_metrics_rollups.sql compares the
+-- rollups with task_metrics; migrate.sh runs it afterwards and only warns.
+
+USE boilerplate_clickhouse;
+
+CREATE TABLE IF NOT EXISTS task_metrics_hourly (
+    workspace_id UUID,
+    agent_id UUID,
+    agent_version String,
+    metric_category LowCardinality(String),
+    metric_name String, -- '' when the row has none (performance, feedback)
+    hour DateTime,
+    row_count SimpleAggregateFunction(sum, UInt64),
+    completed_count SimpleAggregateFunction(sum, UInt64),
+    passed_count SimpleAggregateFunction(sum, UInt64),
+    failed_count SimpleAggregateFunction(sum, UInt64),
+    completed_cost SimpleAggregateFunction(sum, Float64),
+    completed_duration_avg AggregateFunction(avgIf, Nullable(UInt32), UInt8),
+    completed_tokens_avg AggregateFunction(avgIf, Nullable(UInt64), UInt8),
+    completed_duration_quantiles AggregateFunction(quantilesIf(0.5, 0.95), Nullable(UInt32), UInt8),
+    score_avg AggregateFunction(avg, Nullable(Float64)),
+    tasks AggregateFunction(uniqExact, UUID)
+) ENGINE = AggregatingMergeTree()
+PARTITION BY toYYYYMM(hour)
+ORDER BY (workspace_id, metric_category, hour, agent_id, agent_version, metric_name)
+TTL hour + INTERVAL 100 DAY
+SETTINGS index_granularity = 8192;
+
+CREATE TABLE IF NOT EXISTS task_metrics_daily (
+    workspace_id UUID,
+    agent_id UUID,
+    agent_version String,
+    metric_category LowCardinality(String),
+    metric_name String,
+    day Date,
+    row_count SimpleAggregateFunction(sum, UInt64),
+    completed_count SimpleAggregateFunction(sum, UInt64),
+    passed_count SimpleAggregateFunction(sum, UInt64),
+    failed_count SimpleAggregateFunction(sum, UInt64),
+    completed_cost SimpleAggregateFunction(sum, Float64),
+    completed_duration_avg AggregateFunction(avgIf, Nullable(UInt32), UInt8),
+    completed_tokens_avg AggregateFunction(avgIf, Nullable(UInt64), UInt8),
+    completed_duration_quantiles AggregateFunction(quantilesIf(0.5, 0.95), Nullable(UInt32), UInt8),
+    score_avg AggregateFunction(avg, Nullable(Float64)),
+    tasks AggregateFunction(uniqExact, UUID)
+) ENGINE = AggregatingMergeTree()
+PARTITION BY toYYYYMM(day)
+ORDER BY (workspace_id, metric_category, day, agent_id, agent_version, metric_name)
+SETTINGS index_granularity = 8192;
+
+CREATE TABLE IF NOT EXISTS task_metrics_rollup_cutoff (
+    cutoff DateTime64(3)
+) ENGINE = MergeTree()
+ORDER BY tuple();
+
+-- Pause the views (if this is a rerun) before emptying the rollups
+TRUNCATE TABLE task_metrics_rollup_cutoff;
+
+CREATE MATERIALIZED VIEW IF NOT EXISTS task_metrics_hourly_mv
+TO task_metrics_hourly AS
+SELECT
+    workspace_id,
+    agent_id,
+    agent_version,
+    metric_category,
+    ifNull(task_metrics.metric_name, '') AS metric_name,
+    toDateTime(toStartOfHour(created_at)) AS hour,
+    count() AS row_count,
+    countIf(ifNull(status, '') = 'completed') AS completed_count,
+    countIf(passed = 1) AS passed_count,
+    countIf(passed = 0) AS failed_count,
+    sumIf(ifNull(cost_usd, 0), ifNull(status, '') = 'completed') AS completed_cost,
+    avgIfState(duration_ms, ifNull(status, '') = 'completed') AS completed_duration_avg,
+    avgIfState(input_tokens + output_tokens, ifNull(status, '') = 'completed') AS completed_tokens_avg,
+    quantilesIfState(0.5, 0.95)(duration_ms, ifNull(status, '') = 'completed') AS completed_duration_quantiles,
+    avgState(score) AS score_avg,
+    uniqExactState(task_id) AS tasks
+FROM task_metrics
+WHERE created_at >= ifNull(
+    (SELECT maxOrNull(cutoff) FROM task_metrics_rollup_cutoff),
+    toDateTime64('2106-01-01 00:00:00', 3)
+)
+GROUP BY workspace_id, agent_id, agent_version, metric_category, metric_name, hour;
+
+CREATE MATERIALIZED VIEW IF NOT EXISTS task_metrics_daily_mv
+TO task_metrics_daily AS
+SELECT
+    workspace_id,
+    agent_id,
+    agent_version,
+    metric_category,
+    ifNull(task_metrics.metric_name, '') AS metric_name,
+    toDate(created_at) AS day,
+    count() AS row_count,
+    countIf(ifNull(status, '') = 'completed') AS completed_count,
+    countIf(passed = 1) AS passed_count,
+    countIf(passed = 0) AS failed_count,
+    sumIf(ifNull(cost_usd, 0), ifNull(status, '') = 'completed') AS completed_cost,
+    avgIfState(duration_ms, ifNull(status, '') = 'completed') AS completed_duration_avg,
+    avgIfState(input_tokens + output_tokens, ifNull(status, '') = 'completed') AS completed_tokens_avg,
+    quantilesIfState(0.5, 0.95)(duration_ms, ifNull(status, '') = 'completed') AS completed_duration_quantiles,
+    avgState(score) AS score_avg,
+    uniqExactState(task_id) AS tasks
+FROM task_metrics
+WHERE created_at >= ifNull(
+    (SELECT maxOrNull(cutoff) FROM task_metrics_rollup_cutoff),
+    toDateTime64('2106-01-01 00:00:00', 3)
+)
+GROUP BY workspace_id, agent_id, agent_version, metric_category, metric_name, day;
+
+TRUNCATE TABLE task_metrics_hourly;
+TRUNCATE TABLE task_metrics_daily;
+
+-- Views take rows from here on; rows created until then are backfilled
+INSERT INTO task_metrics_rollup_cutoff SELECT now64(3) + INTERVAL 2 SECOND;
+SELECT sleep(3) FORMAT Null;
+
+-- Backfill: rows created before the cutoff
+INSERT INTO task_metrics_hourly
+SELECT
+    workspace_id,
+    agent_id,
+    agent_version,
+    metric_category,
+    ifNull(task_metrics.metric_name, '') AS metric_name,
+    toDateTime(toStartOfHour(created_at)) AS hour,
+    count() AS row_count,
+    countIf(ifNull(status, '') = 'completed') AS completed_count,
+    countIf(passed = 1) AS passed_count,
+    countIf(passed = 0) AS failed_count,
+    sumIf(ifNull(cost_usd, 0), ifNull(status, '') = 'completed') AS completed_cost,
+    avgIfState(duration_ms, ifNull(status, '') = 'completed') AS completed_duration_avg,
+    avgIfState(input_tokens + output_tokens, ifNull(status, '') = 'completed') AS completed_tokens_avg,
+    quantilesIfState(0.5, 0.95)(duration_ms, ifNull(status, '') = 'completed') AS completed_duration_quantiles,
+    avgState(score) AS score_avg,
+    uniqExactState(task_id) AS tasks
+FROM task_metrics
+WHERE created_at >= toStartOfHour(now() - INTERVAL 100 DAY)
+  AND created_at < (SELECT max(cutoff) FROM task_metrics_rollup_cutoff)
+GROUP BY workspace_id, agent_id, agent_version, metric_category, metric_name, hour;
+
+INSERT INTO task_metrics_daily
+SELECT
+    workspace_id,
+    agent_id,
+    agent_version,
+    metric_category,
+    ifNull(task_metrics.metric_name, '') AS metric_name,
+    toDate(created_at) AS day,
+    count() AS row_count,
+    countIf(ifNull(status, '') = 'completed') AS completed_count,
+    countIf(passed = 1) AS passed_count,
+    countIf(passed = 0) AS failed_count,
+    sumIf(ifNull(cost_usd, 0), ifNull(status, '') = 'completed') AS completed_cost,
+    avgIfState(duration_ms, ifNull(status, '') = 'completed') AS completed_duration_avg,
+    avgIfState(input_tokens + output_tokens, ifNull(status, '') = 'completed') AS completed_tokens_avg,
+    quantilesIfState(0.5, 0.95)(duration_ms, ifNull(status, '') = 'completed') AS completed_duration_quantiles,
+    avgState(score) AS score_avg,
+    uniqExactState(task_id) AS tasks
+FROM task_metrics
+WHERE created_at < (SELECT max(cutoff) FROM task_metrics_rollup_cutoff)
+GROUP BY workspace_id, agent_id, agent_version, metric_category, metric_name, day;
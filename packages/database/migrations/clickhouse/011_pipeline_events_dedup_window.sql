@@ -0,0 +1,10 @@
+-- Narrow the pipeline_events insert deduplication window to retry scale
+-- Tokens are now salted with the inserting activity run, so only retries of the
+-- same block can match. A window of 100 recent inserts covers those; the wider
+-- window from 004 only served to drop legitimate re-uploads (e.g. a file loaded
+-- again after its events were deleted).
+
+USE boilerplate_clickhouse;
+
+ALTER TABLE pipeline_events
+    MODIFY SETTING non_replicated_deduplication_window = 100;
@@ -0,0 +1,21 @@
+-- raw_data promotion checks
+-- For each promoted raw_data.<path>, the type family of its values per
+-- dataset over all pipeline_events rows, written by every
+-- promote_hot_raw_data_paths run. SQL is rewritten to the promoted rd_<path>
+-- column only for datasets whose latest check matches the column's type, so
+-- a path that is Int64 in one dataset and String in another still reads the
+-- raw JSON in the second.
+
+USE boilerplate_clickhouse;
+
+CREATE TABLE IF NOT EXISTS raw_data_promotion_checks (
+    checked_at DateTime, -- one value per run; readers take the latest per path
+    path String, -- dotted path below raw_data, e.g. 'address.city'
+    workspace_id String,
+    dataset_id String,
+    value_type LowCardinality(String), -- Int64, Float64, Bool, String; '' when mixed
+    row_count UInt64
+) ENGINE = MergeTree()
+ORDER BY (path, checked_at, workspace_id, dataset_id)
+TTL checked_at + INTERVAL 30 DAY
+SETTINGS index_granularity = 8192;
@@ -0,0 +1,39 @@
+-- Per-file chunk counts for every pipeline_events insert
+-- dataset_files (003) is written only by file uploads (EmbedAnything and
+-- tables), so events carrying raw_data.source from generic, staged or MCP
+-- ingestion never showed up in a dataset's file list. Every insert block now
+-- adds its chunk counts per (workspace, dataset, source) here, with the
+-- block's deduplication token, so a retried block is not counted twice.
+-- list_dataset_files shows these sources where dataset_files has no live row.
+-- Deleting a file by source removes its row here too.
+
+USE boilerplate_clickhouse;
+
+CREATE TABLE IF NOT EXISTS dataset_file_chunks (
+    workspace_id UUID,
+    dataset_id String,
+    source String,
+    task_id SimpleAggregateFunction(any, Nullable(UUID)),
+    chunk_count SimpleAggregateFunction(sum, UInt64),
+    size_bytes SimpleAggregateFunction(sum, UInt64), -- characters of raw_data.text
+    last_ingested_at SimpleAggregateFunction(max, DateTime64(3))
+) ENGINE = AggregatingMergeTree()
+ORDER BY (workspace_id, dataset_id, source)
+SETTINGS index_granularity = 8192, non_replicated_deduplication_window = 100;
+
+-- Seed from chunks already ingested; emptied first so a rerun does not add
+-- them twice
+TRUNCATE TABLE dataset_file_chunks;
+
+INSERT INTO dataset_file_chunks
+SELECT
+    workspace_id,
+    ifNull(dataset_id, ''),
+    source,
+    any(task_id),
+    count(),
+    sum(length(ifNull(toString(raw_data.text), ''))),
+    max(ingested_at)
+FROM pipeline_events
+WHERE source != ''
+GROUP BY workspace_id, dataset_id, source;
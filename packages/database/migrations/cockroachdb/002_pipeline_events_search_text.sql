@@ -0,0 +1,13 @@
+-- Full-text search column for dataset events
+-- Stored computed column over event_name and the raw_data content/text paths, with a
+-- trigram GIN index so LIKE '%q%' filters and similarity() ranking avoid full scans.
+
+USE boilerplate_cockroachdb;
+
+ALTER TABLE pipeline_events
+    ADD COLUMN IF NOT EXISTS search_text STRING AS (
+        lower(concat_ws(' ', event_name, raw_data->>'content', raw_data->>'text'))
+    ) STORED;
+
+CREATE INDEX IF NOT EXISTS idx_pipeline_search_trgm
+    ON pipeline_events USING GIN (search_text gin_trgm_ops);
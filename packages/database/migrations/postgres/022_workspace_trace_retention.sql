@@ -0,0 +1,6 @@
+-- Per-workspace retention for ClickHouse task_traces. NULL keeps traces
+-- indefinitely; otherwise ApplyRetentionPoliciesWorkflow deletes spans older
+-- than this many days. Dataset retention lives in datasets.storage_config.retention.
+
+ALTER TABLE workspaces
+    ADD COLUMN IF NOT EXISTS trace_retention_days INTEGER CHECK (trace_retention_days > 0);
@@ -0,0 +1,38 @@
+-- Index of view specs by dataset. tasks.view_specs stays the source of truth;
+-- task_views holds one row per view so tasks_list_views_for_dataset and
+-- tasks_get_view_by_id are index lookups instead of loading every task in the
+-- workspace (agent_state included). tasks_create / tasks_update rewrite a
+-- task's rows whenever its view_specs change; deleting a task cascades.
+
+CREATE TABLE IF NOT EXISTS task_views (
+    workspace_id    UUID NOT NULL REFERENCES workspaces(id) ON DELETE CASCADE,
+    dataset_id      TEXT NOT NULL,
+    view_id         TEXT NOT NULL,
+    task_id         UUID NOT NULL REFERENCES tasks(id) ON DELETE CASCADE,
+    position        INTEGER NOT NULL DEFAULT 0, -- index within tasks.view_specs
+    spec            JSONB NOT NULL,
+    updated_at      TIMESTAMPTZ NOT NULL DEFAULT now(),
+    PRIMARY KEY (workspace_id, dataset_id, view_id)
+);
+
+CREATE INDEX IF NOT EXISTS idx_task_views_task ON task_views(task_id);
+
+-- Backfill from existing tasks; when two tasks define the same view id for a
+-- dataset, the most recently updated task wins.
+INSERT INTO task_views (workspace_id, dataset_id, view_id, task_id, position, spec)
+SELECT DISTINCT ON (t.workspace_id, v.spec->>'dataset_id', v.spec->>'id')
+    t.workspace_id,
+    v.spec->>'dataset_id',
+    v.spec->>'id',
+    t.id,
+    (v.ordinality - 1)::INTEGER,
+    v.spec
+FROM tasks t
+CROSS JOIN LATERAL jsonb_array_elements(
+    CASE WHEN jsonb_typeof(t.view_specs) = 'array' THEN t.view_specs ELSE '[]'::jsonb END
+) WITH ORDINALITY AS v(spec, ordinality)
+WHERE jsonb_typeof(v.spec) = 'object'
+  AND v.spec->>'dataset_id' IS NOT NULL
+  AND v.spec->>'id' IS NOT NULL
+ORDER BY t.workspace_id, v.spec->>'dataset_id', v.spec->>'id', t.updated_at DESC NULLS LAST
+ON CONFLICT (workspace_id, dataset_id, view_id) DO NOTHING;
@@ -0,0 +1,95 @@
+-- task_metrics rollup consistency check
+-- Compares task_metrics_hourly and task_metrics_daily with task_metrics per
+-- closed bucket (rollup minus raw counts must be zero) and raises if any
+-- bucket differs. migrate.sh runs it after applying
+-- 010_task_metrics_rollups.sql and only warns on failure; it can also be run
+-- by hand with clickhouse-client --multiquery.
+--
+-- Rows past the hourly TTL or removed from task_metrics by retention after
+-- they were rolled up show up as differences too.
+
+USE boilerplate_clickhouse;
+
+SELECT throwIf(
+    count() > 0,
+    'task_metrics_daily does not match task_metrics'
+)
+FROM (
+    SELECT
+        workspace_id,
+        metric_category,
+        bucket,
+        sum(row_diff) AS rows_off,
+        sum(completed_diff) AS completed_off,
+        sum(passed_diff) AS passed_off,
+        sum(failed_diff) AS failed_off
+    FROM (
+        SELECT
+            workspace_id,
+            metric_category,
+            day AS bucket,
+            toInt64(row_count) AS row_diff,
+            toInt64(completed_count) AS completed_diff,
+            toInt64(passed_count) AS passed_diff,
+            toInt64(failed_count) AS failed_diff
+        FROM task_metrics_daily
+        WHERE day < today()
+        UNION ALL
+        SELECT
+            workspace_id,
+            metric_category,
+            toDate(created_at),
+            -toInt64(count()),
+            -toInt64(countIf(ifNull(status, '') = 'completed')),
+            -toInt64(countIf(passed = 1)),
+            -toInt64(countIf(passed = 0))
+        FROM task_metrics
+        WHERE toDate(created_at) < today()
+        GROUP BY workspace_id, metric_category, toDate(created_at)
+    )
+    GROUP BY workspace_id, metric_category, bucket
+    HAVING rows_off != 0 OR completed_off != 0 OR passed_off != 0 OR failed_off != 0
+);
+
+SELECT throwIf(
+    count() > 0,
+    'task_metrics_hourly does not match task_metrics'
+)
+FROM (
+    SELECT
+        workspace_id,
+        metric_category,
+        bucket,
+        sum(row_diff) AS rows_off,
+        sum(completed_diff) AS completed_off,
+        sum(passed_diff) AS passed_off,
+        sum(failed_diff) AS failed_off
+    FROM (
+        SELECT
+            workspace_id,
+            metric_category,
+            hour AS bucket,
+            toInt64(row_count) AS row_diff,
+            toInt64(completed_count) AS completed_diff,
+            toInt64(passed_count) AS passed_diff,
+            toInt64(failed_count) AS failed_diff
+        FROM task_metrics_hourly
+        WHERE hour >= toStartOfHour(now() - INTERVAL 90 DAY)
+          AND hour < toStartOfHour(now())
+        UNION ALL
+        SELECT
+            workspace_id,
+            metric_category,
+            toDateTime(toStartOfHour(created_at)),
+            -toInt64(count()),
+            -toInt64(countIf(ifNull(status, '') = 'completed')),
+            -toInt64(countIf(passed = 1)),
+            -toInt64(countIf(passed = 0))
+        FROM task_metrics
+        WHERE created_at >= toStartOfHour(now() - INTERVAL 90 DAY)
+          AND created_at < toStartOfHour(now())
+        GROUP BY workspace_id, metric_category, toDateTime(toStartOfHour(created_at))
+    )
+    GROUP BY workspace_id, metric_category, bucket
+    HAVING rows_off != 0 OR completed_off != 0 OR passed_off != 0 OR failed_off != 0
+);
@@ -279,11 +279,35 @@ for migration_file in "$CLICKHOUSE_MIGRATIONS_DIR"/*.sql; do
     fi
     
     echo "  ✓ Applied: $migration_name"
+    if [ "$migration_name" = "010_task_metrics_rollups.sql" ]; then
+      CLICKHOUSE_CHECK_ROLLUPS=true
+    fi
   else
     echo "  ⊙ Skipped: $migration_name (already applied)"
   fi
 done
 
+# Rollup consistency check: a mismatch is reported, not fatal
+if [ "$CLICKHOUSE_CHECK_ROLLUPS" = true ]; then
+  rollup_check_file="$(dirname "$0")/check_task_metrics_rollups.sql"
+  if [ "$USE_DOCKER" = true ]; then
+    rollup_check_ok=$(docker exec -i boilerplate_clickhouse clickhouse-client \
+      --multiquery < "$rollup_check_file" > /dev/null && echo true || echo false)
+  elif [ "$CLICKHOUSE_SECURE" = true ]; then
+    rollup_check_ok=$(clickhouse-client --host $CLICKHOUSE_HOST --port $CLICKHOUSE_NATIVE_PORT --user $CLICKHOUSE_USER --password $CLICKHOUSE_PASSWORD --secure \
+      --multiquery < "$rollup_check_file" > /dev/null && echo true || echo false)
+  else
+    rollup_check_ok=$(clickhouse-client --host $CLICKHOUSE_HOST --port $CLICKHOUSE_NATIVE_PORT --user $CLICKHOUSE_USER --password $CLICKHOUSE_PASSWORD \
+      --multiquery < "$rollup_check_file" > /dev/null && echo true || echo false)
+  fi
+  if [ "$rollup_check_ok" = true ]; then
+    echo "  ✓ task_metrics rollups match task_metrics"
+  else
+    echo "  ⚠ Warning: task_metrics rollups do not match task_metrics"
+    echo "  Re-run with: clickhouse-client --multiquery < packages/database/scripts/check_task_metrics_rollups.sql"
+  fi
+fi
+
 echo "✓ ClickHouse migrations complete"
 echo ""
 